@@ -12,6 +12,7 @@ from dc_federated.backend import DCFServer, \
     GLOBAL_MODEL_VERSION, GLOBAL_MODEL
 
 from dc_federated.backend._constants import *
+from dc_federated.backend._async_logging import log_routine
 from dc_federated.algorithms.fed_avg.fed_avg_model_trainer import FedAvgModelTrainer
 
 import logging
@@ -56,6 +57,11 @@ class FedAvgServer(object):
     ssl_certfile: str
         Must be a valid path to the certificate.
         This is mandatory if ssl_enabled is True, ignored otherwise.
+
+    leak_detection: bool (default False)
+        If True, a snapshot of the memory of the server is taken at the start
+        of each round, once the global model has been aggregated and tested,
+        to report the memory that grows from round to round - see DCFServer.
     """
 
     def __init__(self,
@@ -66,7 +72,8 @@ class FedAvgServer(object):
                  server_port=8080,
                  ssl_enabled=False,
                  ssl_keyfile=None,
-                 ssl_certfile=None):
+                 ssl_certfile=None,
+                 leak_detection=False):
         logger.info(
             f"Initializing FedAvg server for model class {global_model_trainer.get_model().__class__.__name__}")
 
@@ -89,12 +96,19 @@ class FedAvgServer(object):
             ssl_enabled=ssl_enabled,
             ssl_keyfile=ssl_keyfile,
             ssl_certfile=ssl_certfile,
-            model_check_interval = 1
+            model_check_interval = 1,
+            leak_detection=leak_detection
         )
 
         self.unique_updates_since_last_agg = 0
         self.iteration = 0
         self.model_version = 0
+        self.round_timeline = self.server.round_timeline
+        self.round_timeline.start_round(self.model_version)
+        if self.server.leak_detector is not None:
+            self.server.leak_detector.add_size_probe('worker_updates', lambda: len(self.worker_updates))
+            self.server.leak_detector.add_size_probe('worker_update_bytes', self.get_worker_update_bytes)
+        self.server.snapshot_memory_round(self.model_version)
 
     def register_worker(self, worker_id):
         """
@@ -165,7 +179,9 @@ class FedAvgServer(object):
     def receive_worker_update(self, worker_id, model_update):
         """
         Given an update for a worker, adds its update to the dictionary of updates.
-        It also agg_model() to update the global model if necessary.
+        It also agg_model() to update the global model if necessary. The time
+        taken to deserialize the update, aggregate and test the model is
+        recorded in the timeline of the round.
 
         Returns
         ----------
@@ -178,21 +194,43 @@ class FedAvgServer(object):
             if self.worker_updates[worker_id] is None or \
                     self.worker_updates[worker_id][0] < self.last_global_model_update_timestamp:
                 self.unique_updates_since_last_agg += 1
-            update_size, model_bytes = msgpack.unpackb(model_update)
-            self.worker_updates[worker_id] = (
-                datetime.now(),
-                update_size,
-                torch.load(io.BytesIO(model_bytes))
-            )
-            logger.info(f"Model update from worker {worker_id[0:WID_LEN]} accepted.")
+            round_version = self.model_version
+            with self.round_timeline.span(DESERIALIZE_EVENT, worker_id):
+                update_size, model_bytes = msgpack.unpackb(model_update)
+                self.worker_updates[worker_id] = (
+                    datetime.now(),
+                    update_size,
+                    torch.load(io.BytesIO(model_bytes))
+                )
+            log_routine(logger, "Model update from worker %s accepted.", worker_id[0:WID_LEN])
+            aggregation_start = self.round_timeline.clock()
             if self.agg_model():
-                self.global_model_trainer.test()
+                self.round_timeline.record(AGGREGATE_EVENT, start=aggregation_start, version=round_version)
+                self.round_timeline.start_round(self.model_version)
+                with self.round_timeline.span(TEST_EVENT, version=round_version):
+                    self.global_model_trainer.test()
+                self.server.snapshot_memory_round(self.model_version)
             return f"Update received for worker {worker_id[0:WID_LEN]}"
         else:
             logger.warning(
                 f"Unregistered worker {worker_id[0:WID_LEN]} tried to send an update.")
             return f"Please register before sending an update."
 
+    def get_worker_update_bytes(self):
+        """
+        Returns the size of the tensors of the models held in the updates of
+        the workers.
+
+        Returns
+        ----------
+
+        int:
+            The size in bytes.
+        """
+        return sum(t.numel() * t.element_size()
+                   for update in self.worker_updates.values() if update is not None
+                   for t in update[2].state_dict().values())
+
     def agg_model(self):
         """
         Updates the global model by aggregating all the most recent updates
@@ -5,14 +5,18 @@ Contains the worker side implementation of the FedAvg algorithm.
 import io
 import time
 from datetime import datetime
+from collections import deque
 import logging
 import msgpack
 
+import gevent
 import torch
 
 from dc_federated.utils import get_host_ip
 from dc_federated.backend import GLOBAL_MODEL, GLOBAL_MODEL_VERSION, WID_LEN
 from dc_federated.backend import DCFWorker
+from dc_federated.backend.backend_utils import BufferReader
+from dc_federated.backend.worker_model_cache import WorkerModelCache
 
 
 logger = logging.getLogger(__name__)
@@ -39,10 +43,28 @@ class FedAvgWorker(object):
 
     server_port: int
         The port at which the serer should listen to
+
+    pipelined: bool (default False)
+        If True, the model update is uploaded in the background while the
+        local model is tested, and the worker goes back to waiting for the
+        next global model without waiting for the upload to finish. The
+        testing runs in a native thread so that it does not hold up the upload.
+
+    num_phase_timings: int (default 100)
+        The number of rounds for which the time spent in each phase is kept.
+
+    model_cache_file: str (default None)
+        If given, the latest global model is kept in this file, and a worker
+        restarted with the same file starts from the cached model and its
+        version instead of downloading the global model again.
     """
 
-    def __init__(self, fed_model_trainer, private_key_file, server_protocol=None, server_host_ip=None, server_port=None):
+    def __init__(self, fed_model_trainer, private_key_file, server_protocol=None, server_host_ip=None, server_port=None,
+                 pipelined=False, num_phase_timings=100, model_cache_file=None):
         self.fed_model = fed_model_trainer
+        self.pipelined = pipelined
+        self.phase_timings = deque(maxlen=num_phase_timings)
+        self.upload_greenlet = None
 
         server_protocol = 'http' if server_protocol is None else 'https'
         server_host_ip = get_host_ip() if not server_host_ip else server_host_ip
@@ -56,12 +78,16 @@ class FedAvgWorker(object):
             server_port=server_port,
             global_model_version_changed_callback=self.global_model_version_changed_callback,
             get_worker_version_of_global_model=lambda : self.worker_version_of_global_model,
-            private_key_file=private_key_file
+            private_key_file=private_key_file,
+            stream_global_model=True
         )
 
         self.global_model = None
         self.worker_id = None
 
+        self.model_cache = None if model_cache_file is None else WorkerModelCache(model_cache_file)
+        self.load_cached_global_model()
+
         self.initialize()
 
     def serialize_model(self):
@@ -88,17 +114,130 @@ class FedAvgWorker(object):
         logger.info(
             f"Finished training of local model for worker {self.worker_id[0:WID_LEN]}")
 
-    def send_model_update(self):
+    def send_model_update(self, serialized_model=None):
         """
         Sends the current model to the server.
+
+        Parameters
+        ----------
+
+        serialized_model: bytes (default None)
+            The serialized model to send. The current model is serialized
+            if None.
         """
+        if serialized_model is None:
+            serialized_model = self.serialize_model()
         self.worker.send_model_update(
             msgpack.packb((self.fed_model.get_per_session_train_size(),
-                          self.serialize_model()))
+                          serialized_model))
         )
         logger.info(
             f"Sent model update from worker {self.worker_id[0:WID_LEN]} to the server.")
 
+    def run_local_round(self, timings):
+        """
+        Trains and tests the local model and sends the update to the server,
+        recording the time spent in each phase in timings. In pipelined mode,
+        the upload runs in a background greenlet while the model is tested,
+        and may still be running when this returns.
+
+        Parameters
+        ----------
+
+        timings: dict
+            The dictionary to record the phase timings in.
+        """
+        start = time.perf_counter()
+        self.fed_model.train()
+        timings['train'] = time.perf_counter() - start
+
+        if not self.pipelined:
+            start = time.perf_counter()
+            self.fed_model.test()
+            timings['test'] = time.perf_counter() - start
+            logger.info(
+                f"Finished training of local model for worker {self.worker_id[0:WID_LEN]}")
+            start = time.perf_counter()
+            self.send_model_update()
+            timings['upload'] = time.perf_counter() - start
+            return
+
+        start = time.perf_counter()
+        serialized_model = self.serialize_model()
+        timings['serialize'] = time.perf_counter() - start
+
+        # updates have to reach the server in order
+        if self.upload_greenlet is not None:
+            start = time.perf_counter()
+            self.upload_greenlet.join()
+            timings['wait_previous_upload'] = time.perf_counter() - start
+
+        def upload():
+            upload_start = time.perf_counter()
+            self.send_model_update(serialized_model)
+            timings['upload'] = time.perf_counter() - upload_start
+        self.upload_greenlet = gevent.spawn(upload)
+
+        start = time.perf_counter()
+        gevent.get_hub().threadpool.apply(self.fed_model.test)
+        timings['test'] = time.perf_counter() - start
+        logger.info(
+            f"Finished training of local model for worker {self.worker_id[0:WID_LEN]}")
+
+    def record_phase_timings(self, timings, round_start):
+        """
+        Adds the timings of a round to the phase_timings.
+
+        Parameters
+        ----------
+
+        timings: dict
+            The time in seconds spent in each phase of the round.
+
+        round_start: float
+            The time.perf_counter() value at the start of the round.
+        """
+        timings['round'] = time.perf_counter() - round_start
+        self.phase_timings.append(timings)
+
+    def get_phase_timings(self):
+        """
+        Returns the time spent in each phase of the most recent rounds, so
+        that the overlap between the phases can be measured. Each entry is a
+        dictionary with the time in seconds spent loading the global model
+        ('load'), training ('train'), testing ('test'), and uploading
+        ('upload') and for the whole round ('round'). In pipelined mode the
+        entries also give the time spent serializing the model ('serialize')
+        and waiting for the previous upload to finish ('wait_previous_upload'),
+        and the upload time is filled in once the upload finishes.
+
+        Returns
+        -------
+
+        list of dict:
+            The timings of each round, oldest first.
+        """
+        return list(self.phase_timings)
+
+    def load_cached_global_model(self):
+        """
+        Loads the global model from the model cache, if there is one, into
+        the local model and takes on its version, so that the server does
+        not send the same model again.
+        """
+        if self.model_cache is None:
+            return
+        model_dict = self.model_cache.load()
+        if model_dict is None:
+            return
+        try:
+            new_model = torch.load(BufferReader(model_dict[GLOBAL_MODEL]))
+            self.fed_model.load_model_from_state_dict(new_model.state_dict())
+        except Exception as e:
+            logger.warning(f"Unable to load the cached global model: {e}")
+            return
+        self.worker_version_of_global_model = model_dict[GLOBAL_MODEL_VERSION]
+
     def initialize(self):
         """
         Initializes this FedAvg worker by registering the worker with the server,
@@ -110,8 +249,10 @@ class FedAvgWorker(object):
             logger.info(
                 f"Registered with FedAvg Server with worker id {self.worker_id[0:WID_LEN]}")
 
-        self.train_and_test_model()
-        self.send_model_update()
+        round_start = time.perf_counter()
+        timings = {}
+        self.run_local_round(timings)
+        self.record_phase_timings(timings, round_start)
 
     def global_model_version_changed_callback(self, model_dict):
         """
@@ -133,11 +274,16 @@ class FedAvgWorker(object):
             logger.error("Invalid model received from the server.")
             return
 
+        round_start = time.perf_counter()
+        timings = {}
         self.worker_version_of_global_model = model_dict[GLOBAL_MODEL_VERSION]
-        new_model = torch.load(io.BytesIO(model_dict[GLOBAL_MODEL]))
+        new_model = torch.load(BufferReader(model_dict[GLOBAL_MODEL]))
         self.fed_model.load_model_from_state_dict(new_model.state_dict())
-        self.train_and_test_model()
-        self.send_model_update()
+        if self.model_cache is not None:
+            self.model_cache.save(model_dict)
+        timings['load'] = time.perf_counter() - round_start
+        self.run_local_round(timings)
+        self.record_phase_timings(timings, round_start)
 
     def start(self):
         """
@@ -1,5 +1,6 @@
 from dc_federated.backend.dcf_server import DCFServer
 from dc_federated.backend.dcf_worker import DCFWorker
+from dc_federated.backend.dcf_async_worker import AsyncDCFWorker
 from dc_federated.backend._constants import GLOBAL_MODEL, \
     GLOBAL_MODEL_VERSION, LAST_WORKER_MODEL_VERSION, WID_LEN
 from dc_federated.backend.backend_utils import create_model_dict, is_valid_model_dict
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+The part of a multi-process DCFServer that runs the algorithm callbacks.
+"""
+import os
+import sqlite3
+
+import gevent
+import msgpack
+
+from dc_federated.backend._constants import GLOBAL_MODEL, GLOBAL_MODEL_VERSION, WID_LEN, \
+    REGISTER_WORKER_EVENT, UNREGISTER_WORKER_EVENT, WORKER_UPDATE_EVENT, \
+    AGGREGATION_LEASE_TTL, SHARED_STATE_POLL_INTERVAL
+from dc_federated.backend.backend_utils import is_valid_model_dict
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+class AggregationOwner(object):
+    """
+    When a DCFServer is served by several processes, exactly one of them,
+    the holder of a lease in the SharedState, runs the callbacks of the
+    federated learning algorithm. The other processes queue the worker
+    registrations and model updates they receive in the SharedState, and
+    the owner hands them to the callbacks in order, writes back the responses
+    to the updates and publishes each new global model to the SharedState.
+
+    The lease is renewed every SHARED_STATE_POLL_INTERVAL seconds, and taken
+    over by another process if the owner does not renew it for
+    AGGREGATION_LEASE_TTL seconds. The state of the algorithm lives in the
+    memory of the owner, so it is lost when another process takes over.
+
+    Parameters
+    ----------
+
+    shared_state: SharedState
+        The shared state.
+
+    register_worker_callback: str -> ()
+        The algorithm callback for new workers.
+
+    unregister_worker_callback: str -> ()
+        The algorithm callback for unregistered workers.
+
+    return_global_model_callback: () -> dict
+        The algorithm callback returning the global model.
+
+    is_global_model_most_recent: object -> bool
+        The algorithm callback checking the version of the global model.
+
+    receive_worker_update_callback: (str, bytes) -> str
+        The algorithm callback for the model updates.
+    """
+    def __init__(self,
+                 shared_state,
+                 register_worker_callback,
+                 unregister_worker_callback,
+                 return_global_model_callback,
+                 is_global_model_most_recent,
+                 receive_worker_update_callback):
+        self.shared_state = shared_state
+        self.register_worker_callback = register_worker_callback
+        self.unregister_worker_callback = unregister_worker_callback
+        self.return_global_model_callback = return_global_model_callback
+        self.is_global_model_most_recent = is_global_model_most_recent
+        self.receive_worker_update_callback = receive_worker_update_callback
+        self.is_owner = False
+        self.published_version = None
+
+    def get_owner_id(self):
+        """
+        Returns an id for this process and object, computed on each call so
+        that the processes forked from the one that created the object get
+        different ids.
+        """
+        return f"{os.getpid()}-{id(self)}"
+
+    def publish_global_model_if_changed(self):
+        """
+        Publishes the global model returned by the algorithm to the
+        SharedState if its version has changed since it was last published.
+        """
+        if self.published_version is not None and self.is_global_model_most_recent(self.published_version):
+            return
+        model_dict = self.return_global_model_callback()
+        if not is_valid_model_dict(model_dict):
+            logger.error(f"Expected dictionary with {GLOBAL_MODEL} and {GLOBAL_MODEL_VERSION} keys - "
+                         "return_global_model_callback() implementation is incorrect")
+            return
+        self.shared_state.publish_global_model(
+            msgpack.packb(model_dict[GLOBAL_MODEL_VERSION]), bytes(model_dict[GLOBAL_MODEL]))
+        self.published_version = model_dict[GLOBAL_MODEL_VERSION]
+        logger.info(f"Published global model version {self.published_version}.")
+
+    def handle_events(self):
+        """
+        Passes the queued worker registrations and model updates on to the
+        algorithm callbacks.
+        """
+        for event_id, kind, worker_id, payload in self.shared_state.get_pending_events():
+            response = None
+            if kind == REGISTER_WORKER_EVENT:
+                self.register_worker_callback(worker_id)
+            elif kind == UNREGISTER_WORKER_EVENT:
+                self.unregister_worker_callback(worker_id)
+            elif kind == WORKER_UPDATE_EVENT:
+                try:
+                    response = str(self.receive_worker_update_callback(worker_id, payload))
+                except Exception as e:
+                    logger.warning(f"Exception handling the update of worker {worker_id[0:WID_LEN]}: {e}")
+                    response = str(e)
+            self.shared_state.complete_event(event_id, response)
+
+    def run(self):
+        """
+        Greenlet function that keeps trying to acquire or renew the lease
+        and, while this process holds it, handles the queued events and
+        publishes the new global models.
+        """
+        while True:
+            try:
+                if self.shared_state.acquire_lease(self.get_owner_id(), AGGREGATION_LEASE_TTL):
+                    if not self.is_owner:
+                        logger.info(f"Process {os.getpid()} now owns the aggregation.")
+                        self.is_owner = True
+                    self.handle_events()
+                    self.publish_global_model_if_changed()
+                elif self.is_owner:
+                    logger.warning(f"Process {os.getpid()} lost the aggregation lease.")
+                    self.is_owner = False
+            except sqlite3.Error as e:
+                logger.warning(f"Unable to access the shared state: {e}")
+            gevent.sleep(SHARED_STATE_POLL_INTERVAL)
@@ -0,0 +1,237 @@
+"""
+A minimal asyncio HTTP/1.1 client with a keep-alive connection pool, used
+by the AsyncDCFWorker so that many worker identities can share connections
+within one event loop.
+"""
+import ssl
+import asyncio
+import secrets
+
+from urllib.parse import urlsplit
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+class AsyncHTTPResponse(object):
+    """
+    The response to a request made with the AsyncConnectionPool.
+
+    Parameters
+    ----------
+
+    status: int
+        The HTTP status code.
+
+    headers: dict
+        The response headers, with lower case names.
+
+    content: bytes
+        The body of the response.
+    """
+    def __init__(self, status, headers, content):
+        self.status = status
+        self.headers = headers
+        self.content = content
+
+
+class AsyncConnectionPool(object):
+    """
+    Pool of keep-alive HTTP/1.1 connections shared by all the requests made
+    through it, irrespective of the worker making them. Connections are
+    opened on demand and returned to the pool once a response has been read
+    in full, unless the server asks for the connection to be closed.
+
+    Parameters
+    ----------
+
+    max_connections: int (default None)
+        The maximum number of connections open at once. Requests wait for a
+        connection to become free once the limit is reached. Note that a
+        long polling request holds on to its connection until the server
+        responds. If None, the number of connections is not limited.
+
+    max_idle_connections: int (default 100)
+        The maximum number of idle connections kept open per host.
+
+    connect_timeout: float (default 60)
+        The time in seconds to wait for a connection to be established.
+
+    ssl_context: ssl.SSLContext (default None)
+        The SSL context used for https connections. The default context is
+        used if None.
+    """
+    def __init__(self, max_connections=None, max_idle_connections=100, connect_timeout=60, ssl_context=None):
+        self.max_connections = max_connections
+        self.max_idle_connections = max_idle_connections
+        self.connect_timeout = connect_timeout
+        self.ssl_context = ssl_context
+        # (scheme, host, port) -> [(reader, writer)]
+        self._idle = {}
+        self._semaphore = None
+
+    def _get_semaphore(self):
+        # created lazily so that it belongs to the loop running the requests
+        if self._semaphore is None and self.max_connections is not None:
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+        return self._semaphore
+
+    async def _open(self, key):
+        scheme, host, port = key
+        ssl_context = None
+        if scheme == 'https':
+            ssl_context = self.ssl_context if self.ssl_context is not None else ssl.create_default_context()
+        return await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=ssl_context), self.connect_timeout)
+
+    def _release(self, key, conn):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.max_idle_connections:
+            idle.append(conn)
+        else:
+            conn[1].close()
+
+    @staticmethod
+    async def _read_response(reader):
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        version, status = lines[0].split(' ', 2)[0:2]
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close' if version == 'HTTP/1.1' \
+            else headers.get('connection', '').lower() == 'keep-alive'
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    # skip the trailers
+                    while await reader.readuntil(b'\r\n') != b'\r\n':
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            content = b''.join(chunks)
+        elif 'content-length' in headers:
+            content = await reader.readexactly(int(headers['content-length']))
+        else:
+            content = await reader.read()
+            keep_alive = False
+        return AsyncHTTPResponse(int(status), headers, content), keep_alive
+
+    async def request(self, method, url, body=b'', headers=None):
+        """
+        Makes a request, reusing an idle connection to the host if there is
+        one. A request that fails on a reused connection, which the server
+        may have closed in the meantime, is retried once on a new connection.
+
+        Parameters
+        ----------
+
+        method: str
+            The HTTP method.
+
+        url: str
+            The url to send the request to.
+
+        body: bytes (default b'')
+            The body of the request.
+
+        headers: dict (default None)
+            Any additional headers to send.
+
+        Returns
+        -------
+
+        AsyncHTTPResponse:
+            The response from the server.
+        """
+        parts = urlsplit(url)
+        port = parts.port if parts.port is not None else (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path + (f"?{parts.query}" if parts.query else '')
+        request_head = f"{method} {path or '/'} HTTP/1.1\r\n" \
+                       f"Host: {parts.netloc}\r\n" \
+                       f"Content-Length: {len(body)}\r\n" \
+                       f"Connection: keep-alive\r\n"
+        for name, value in (headers or {}).items():
+            request_head += f"{name}: {value}\r\n"
+        request_bytes = (request_head + '\r\n').encode('latin-1')
+
+        semaphore = self._get_semaphore()
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            idle = self._idle.get(key)
+            reused = idle is not None and len(idle) > 0
+            while True:
+                reader, writer = idle.pop() if reused else await self._open(key)
+                try:
+                    writer.write(request_bytes)
+                    writer.write(body)
+                    await writer.drain()
+                    response, keep_alive = await self._read_response(reader)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    writer.close()
+                    if not reused:
+                        raise
+                    logger.debug(f"Reused connection failed ({e}) - retrying on a new connection.")
+                    reused = False
+                    continue
+                except BaseException:
+                    writer.close()
+                    raise
+                if keep_alive:
+                    self._release(key, (reader, writer))
+                else:
+                    writer.close()
+                return response
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    async def close(self):
+        """
+        Closes all the idle connections.
+        """
+        for idle in self._idle.values():
+            for _, writer in idle:
+                writer.close()
+        self._idle = {}
+
+
+def encode_multipart(fields):
+    """
+    Encodes the given fields as a multipart/form-data body, with each field
+    sent as a file named after the field, as requests does for the files
+    argument.
+
+    Parameters
+    ----------
+
+    fields: dict
+        Dictionary from the field names to their values as bytes or str.
+
+    Returns
+    -------
+
+    bytes, str:
+        The body and the value of the corresponding Content-Type header.
+    """
+    boundary = secrets.token_hex(16)
+    parts = []
+    for name, value in fields.items():
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        parts.append(f'--{boundary}\r\n'
+                     f'Content-Disposition: form-data; name="{name}"; filename="{name}"\r\n\r\n'.encode())
+        parts.append(value)
+        parts.append(b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
@@ -0,0 +1,279 @@
+"""
+A logging mode for busy servers, in which the log records are written by a
+background thread and routine per-request messages are sampled.
+"""
+import os
+import time
+import atexit
+import logging
+from collections import deque
+
+from gevent import monkey
+
+from dc_federated.backend._constants import LOG_SAMPLE_PERIOD, LOG_SAMPLE_BURST, \
+    LOG_FLUSH_INTERVAL, LOG_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+# the records are written from a real thread, whatever has been monkey patched
+_start_new_thread = monkey.get_original('_thread', 'start_new_thread')
+_RLock = monkey.get_original('_thread', 'RLock')
+_sleep = monkey.get_original('time', 'sleep')
+_srcfile = logging._srcfile
+
+
+class LogSampler(object):
+    """
+    Lets through at most burst of the routine messages logged from the same
+    place in each period of seconds, and notes on the first message let
+    through in the next period how many were dropped. The sampler is
+    disabled, letting every message through, until it is enabled.
+
+    Parameters
+    ----------
+
+    period: float (default LOG_SAMPLE_PERIOD)
+        The length in seconds of the sampling periods.
+
+    burst: int (default LOG_SAMPLE_BURST)
+        The number of routine records from the same place let through in
+        each period.
+
+    clock: () -> float (default time.monotonic)
+        The clock used to time the periods.
+    """
+    def __init__(self, period=LOG_SAMPLE_PERIOD, burst=LOG_SAMPLE_BURST, clock=time.monotonic):
+        self.period = period
+        self.burst = burst
+        self.clock = clock
+        self.enabled = False
+        # (logger name, message) -> [start of the period, messages let through, messages dropped]
+        self.windows = {}
+
+    def sample(self, name, msg):
+        """
+        Decides whether a routine message is logged.
+
+        Parameters
+        ----------
+
+        name: str
+            The name of the logger.
+
+        msg: str
+            The message, before its arguments are merged in.
+
+        Returns
+        -------
+
+        str:
+            The message to log, with the number of messages dropped in the
+            previous period if any, or None if the message is dropped.
+        """
+        if not self.enabled:
+            return msg
+        now = self.clock()
+        window = self.windows.get((name, msg))
+        if window is None:
+            window = self.windows[(name, msg)] = [now, 0, 0]
+        elif now - window[0] >= self.period:
+            num_dropped = window[2]
+            window[:] = [now, 0, 0]
+            if num_dropped > 0:
+                window[1] += 1
+                return f"{msg} [{num_dropped} similar messages dropped]"
+        if window[1] >= self.burst:
+            window[2] += 1
+            return None
+        window[1] += 1
+        return msg
+
+
+log_sampler = LogSampler()
+
+
+def log_routine(logger, msg, *args):
+    """
+    Logs at the INFO level one of the routine messages logged for every
+    request, which are sampled by the log_sampler once async logging is
+    enabled. The arguments are only merged into the message when it is
+    written, and the record is not even created if the message is dropped.
+    Warnings, errors and admin actions should be logged as usual, so that
+    they are never dropped.
+
+    Parameters
+    ----------
+
+    logger: logging.Logger
+        The logger of the module.
+
+    msg: str
+        The message, with %-style placeholders for the arguments.
+
+    args: object
+        The arguments of the message.
+    """
+    if logger.isEnabledFor(logging.INFO):
+        msg = log_sampler.sample(logger.name, msg)
+        if msg is not None:
+            logger.info(msg, *args)
+
+
+class AsyncLogHandler(logging.Handler):
+    """
+    Puts the log records on a queue that a separate operating system thread
+    hands to the given handlers, so that the formatting of the records and
+    the writes to the streams and files do not hold up the greenlets of the
+    server. Only the exception of a record is formatted when it is logged,
+    as the traceback it refers to may not live until the record is written;
+    the arguments of the message are merged in when it is written.
+    The thread is started again in the child process after a fork, as under
+    gunicorn. If the queue is full, further records are dropped and counted.
+
+    Parameters
+    ----------
+
+    handlers: list of logging.Handler
+        The handlers writing the records. They are only used by the thread.
+
+    flush_interval: float (default LOG_FLUSH_INTERVAL)
+        The number of seconds the thread waits when the queue is empty.
+
+    max_records: int (default LOG_QUEUE_SIZE)
+        The maximum number of records waiting to be written.
+    """
+    def __init__(self, handlers, flush_interval=LOG_FLUSH_INTERVAL, max_records=LOG_QUEUE_SIZE):
+        super().__init__()
+        self.handlers = handlers
+        for handler in handlers:
+            handler.lock = _RLock()
+        self.flush_interval = flush_interval
+        self.max_records = max_records
+        self.records = deque()
+        self.num_dropped = 0
+        self.running = False
+        self.writer_running = False
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def emit(self, record):
+        if len(self.records) >= self.max_records:
+            self.num_dropped += 1
+            return
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+    def start(self):
+        """
+        Starts the thread writing the records.
+        """
+        self.running = True
+        self.writer_running = True
+        _start_new_thread(self._run, ())
+
+    def stop(self):
+        """
+        Stops the thread once it has written the records on the queue.
+        """
+        self.running = False
+        while self.writer_running:
+            _sleep(self.flush_interval)
+
+    def after_fork(self):
+        self.records.clear()
+        if self.running:
+            self.start()
+
+    def _run(self):
+        try:
+            while True:
+                running = self.running
+                self.write_records()
+                if not running:
+                    break
+                _sleep(self.flush_interval)
+        finally:
+            self.writer_running = False
+
+    def write_records(self):
+        while len(self.records) > 0:
+            record = self.records.popleft()
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        if self.num_dropped > 0:
+            num_dropped, self.num_dropped = self.num_dropped, 0
+            record = logger.makeRecord(logger.name, logging.WARNING, __file__, 0,
+                                       f"{num_dropped} log records were dropped as the log queue was full.",
+                                       None, None)
+            for handler in self.handlers:
+                handler.handle(record)
+
+
+def enable_async_logging(period=LOG_SAMPLE_PERIOD, burst=LOG_SAMPLE_BURST):
+    """
+    Replaces the handlers of the root logger by an AsyncLogHandler writing
+    to them, and enables the sampling of the routine messages. The caller
+    location, thread, process and multiprocessing names of the records are
+    no longer looked up, as doing so is costly, in particular under gevent.
+    Does nothing if async logging is already enabled.
+
+    Parameters
+    ----------
+
+    period: float (default LOG_SAMPLE_PERIOD)
+        The length in seconds of the sampling periods.
+
+    burst: int (default LOG_SAMPLE_BURST)
+        The number of routine records from the same place logged in each
+        period.
+
+    Returns
+    -------
+
+    AsyncLogHandler:
+        The handler of the root logger.
+    """
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if isinstance(handler, AsyncLogHandler):
+            return handler
+    async_handler = AsyncLogHandler(list(root.handlers))
+    log_sampler.period = period
+    log_sampler.burst = burst
+    log_sampler.enabled = True
+    for handler in async_handler.handlers:
+        root.removeHandler(handler)
+    root.addHandler(async_handler)
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    async_handler.start()
+    atexit.register(async_handler.stop)
+    return async_handler
+
+
+def disable_async_logging():
+    """
+    Writes the records waiting on the queue, puts back the handlers of the
+    root logger replaced by enable_async_logging and logs every routine
+    message again.
+    """
+    log_sampler.enabled = False
+    log_sampler.windows = {}
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, AsyncLogHandler):
+            handler.stop()
+            root.removeHandler(handler)
+            for replaced in handler.handlers:
+                replaced.createLock()
+                root.addHandler(replaced)
+            atexit.unregister(handler.stop)
+    logging._srcfile = _srcfile
+    logging.logThreads = True
+    logging.logProcesses = True
+    logging.logMultiprocessing = True
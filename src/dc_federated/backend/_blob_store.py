@@ -0,0 +1,110 @@
+"""
+Keeps the compressed global models on disk, named by their content hash.
+"""
+import os
+import hashlib
+import tempfile
+
+from dc_federated.backend._constants import BLOB_STORE_VERSIONS, WID_LEN
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+class BlobStore(object):
+    """
+    A directory of content-addressed blobs: each blob is written once, to
+    a file named by the sha256 hash of its content, and is never changed
+    afterwards, so that it can be served straight from the file by several
+    requests, or processes, at once.
+
+    Parameters
+    ----------
+
+    directory: str
+        The directory to keep the blobs in. It is created if needed.
+
+    max_blobs: int (default BLOB_STORE_VERSIONS)
+        The number of most recently added blobs to keep - older ones are
+        deleted so that downloads of the previous version in progress can
+        still be resumed, but the directory does not grow without bound.
+    """
+    def __init__(self, directory, max_blobs=BLOB_STORE_VERSIONS):
+        self.directory = os.path.abspath(directory)
+        self.max_blobs = max_blobs
+        # the hashes of the blobs added by this object, most recent last
+        self.content_hashes = []
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, content_hash):
+        """
+        Returns the path of the blob with the given hash.
+
+        Parameters
+        ----------
+
+        content_hash: str
+            The sha256 hash of the blob.
+
+        Returns
+        -------
+
+        str:
+            The path of the file.
+        """
+        return os.path.join(self.directory, content_hash)
+
+    def put(self, content):
+        """
+        Writes the content to the store, unless it is already there, and
+        deletes the oldest blobs beyond max_blobs. The file is written under
+        a temporary name and then renamed, so that it is never seen partly
+        written.
+
+        Parameters
+        ----------
+
+        content: bytes
+            The content to write.
+
+        Returns
+        -------
+
+        str:
+            The sha256 hash of the content.
+        """
+        content_hash = hashlib.sha256(content).hexdigest()
+        if not os.path.exists(self.path(content_hash)):
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(content)
+                os.replace(temp_path, self.path(content_hash))
+            except OSError:
+                os.remove(temp_path)
+                raise
+            logger.info(f"Wrote blob {content_hash[0:WID_LEN]} of {len(content)} bytes.")
+        if content_hash in self.content_hashes:
+            self.content_hashes.remove(content_hash)
+        self.content_hashes.append(content_hash)
+        while len(self.content_hashes) > self.max_blobs:
+            self.remove(self.content_hashes.pop(0))
+        return content_hash
+
+    def remove(self, content_hash):
+        """
+        Deletes the blob with the given hash. Downloads that have already
+        opened the file carry on from the deleted file.
+
+        Parameters
+        ----------
+
+        content_hash: str
+            The sha256 hash of the blob.
+        """
+        try:
+            os.remove(self.path(content_hash))
+        except FileNotFoundError:
+            pass
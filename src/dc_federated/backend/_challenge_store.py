@@ -0,0 +1,183 @@
+"""
+The challenge phrase store used by the WorkerManager.
+"""
+import time
+import secrets
+
+from collections import OrderedDict
+
+from dc_federated.backend._constants import CHALLENGE_NONCE_BYTES
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+class ChallengeStore(object):
+    """
+    Stores the outstanding challenge phrases for the workers. Challenges
+    expire after a fixed time-to-live. Rather than tracking the expiry of
+    each challenge individually, the challenges are kept in a small number
+    of generations (buckets) each covering a slice of the time-to-live, so
+    that expired challenges are reclaimed by dropping a whole bucket at a
+    time.
+
+    Each worker may hold at most one outstanding challenge, and the rate at
+    which a worker can request challenges is limited with a per-worker
+    token bucket.
+
+    Parameters
+    ----------
+
+    ttl: float (default 60)
+        The time in seconds for which a challenge phrase is valid.
+
+    rate: float (default 1.0)
+        The number of challenges per second a worker is allowed to request
+        on average. If None, no rate limiting is done.
+
+    burst: int (default 10)
+        The maximum number of challenges a worker is allowed to request in a
+        single burst.
+
+    num_buckets: int (default 4)
+        The number of generations the ttl is split into.
+
+    clock: () -> float (default time.monotonic)
+        The clock used to measure time.
+    """
+    def __init__(self, ttl=60, rate=1.0, burst=10, num_buckets=4, clock=time.monotonic):
+        if ttl <= 0:
+            raise ValueError("The challenge phrase ttl must be positive.")
+        if num_buckets < 1:
+            raise ValueError("The number of challenge phrase buckets must be at least 1.")
+        if rate is not None and rate <= 0:
+            raise ValueError("The challenge phrase rate must be positive or None.")
+        if burst < 1:
+            raise ValueError("The challenge phrase burst must be at least 1.")
+        self.ttl = ttl
+        self.rate = rate
+        self.burst = burst
+        self.bucket_width = ttl / num_buckets
+        self.clock = clock
+
+        # bucket index -> {worker_id: (challenge_phrase, time_issued)}
+        self._buckets = OrderedDict()
+        # worker_id -> [tokens, time_last_updated]
+        self._token_buckets = {}
+
+    def _bucket_index(self, now):
+        return int(now // self.bucket_width)
+
+    def _expire(self, now):
+        """
+        Drops all the buckets whose challenges have all expired.
+        """
+        oldest_live = self._bucket_index(now - self.ttl)
+        while len(self._buckets) > 0:
+            idx = next(iter(self._buckets))
+            if idx >= oldest_live:
+                break
+            del self._buckets[idx]
+
+    def _pop(self, worker_id):
+        """
+        Removes the outstanding challenge of the worker, if any, and returns it.
+        """
+        for bucket in self._buckets.values():
+            if worker_id in bucket:
+                return bucket.pop(worker_id)
+        return None
+
+    def _consume_token(self, worker_id, now):
+        """
+        Takes a token from the token bucket of the worker and returns
+        whether one was available.
+        """
+        if self.rate is None:
+            return True
+        token_bucket = self._token_buckets.get(worker_id)
+        if token_bucket is None:
+            token_bucket = [self.burst, now]
+            self._token_buckets[worker_id] = token_bucket
+        tokens = min(self.burst, token_bucket[0] + (now - token_bucket[1]) * self.rate)
+        token_bucket[1] = now
+        if tokens < 1:
+            token_bucket[0] = tokens
+            return False
+        token_bucket[0] = tokens - 1
+        return True
+
+    def issue(self, worker_id):
+        """
+        Issues a new challenge phrase for the worker, replacing any challenge
+        the worker held previously.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker to issue the challenge to.
+
+        Returns
+        -------
+
+        str:
+            The challenge phrase, or None if the worker has exceeded its rate limit.
+        """
+        now = self.clock()
+        self._expire(now)
+        if not self._consume_token(worker_id, now):
+            return None
+        self._pop(worker_id)
+
+        challenge_phrase = secrets.token_hex(CHALLENGE_NONCE_BYTES)
+        idx = self._bucket_index(now)
+        if idx not in self._buckets:
+            self._buckets[idx] = {}
+        self._buckets[idx][worker_id] = (challenge_phrase, now)
+        return challenge_phrase
+
+    def consume(self, worker_id):
+        """
+        Removes the outstanding challenge phrase of the worker and returns
+        it if it has not expired. A challenge can only be consumed once.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker to get the challenge for.
+
+        Returns
+        -------
+
+        str:
+            The challenge phrase, or None if there is no valid challenge.
+        """
+        now = self.clock()
+        self._expire(now)
+        challenge = self._pop(worker_id)
+        if challenge is None:
+            return None
+        challenge_phrase, time_issued = challenge
+        if now - time_issued > self.ttl:
+            return None
+        return challenge_phrase
+
+    def forget(self, worker_id):
+        """
+        Removes all the state held for the worker.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker to remove.
+        """
+        self._pop(worker_id)
+        self._token_buckets.pop(worker_id, None)
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets.values())
@@ -9,6 +9,16 @@ QUERY_GLOBAL_MODEL_STATUS_ROUTE = 'query_global_model_status'
 RECEIVE_WORKER_UPDATE_ROUTE = 'receive_worker_update'
 WORKERS_ROUTE = 'workers'
 CHALLENGE_PHRASE_ROUTE = 'challenge_phrase'
+IDLE_WORKERS_ROUTE = 'idle_workers'
+UPLOAD_SESSION_ROUTE = 'upload_session'
+MODEL_VERSION_EVENTS_ROUTE = 'model_version_events'
+PEER_MANIFEST_ROUTE = 'peer_manifest'
+PEER_ANNOUNCE_ROUTE = 'peer_announce'
+PEER_MODEL_ROUTE = 'peer_model'
+METRICS_ROUTE = 'metrics'
+ROUND_TIMELINE_ROUTE = 'round_timeline'
+PROFILER_ROUTE = 'profiler'
+MEMORY_ROUNDS_ROUTE = 'memory_rounds'
 
 WORKER_ID_KEY = 'worker_id'
 WORKER_MODEL_UPDATE_KEY = 'worker_model_update'
@@ -22,16 +32,96 @@ NO_AUTHENTICATION = 'No Authentication'
 AUTHENTICATED = 'Authenticated'
 INVALID_WORKER = "Invalid Worker"
 UNREGISTERED_WORKER = 'Unregistered Worker'
+IDLE_UNREGISTERED_WORKER = 'Idle Unregistered Worker'
+RATE_LIMITED_WORKER = 'Rate Limited Worker'
 
 PUBLIC_KEY_STR = 'public_key_str'
 SIGNED_PHRASE = 'signed_phrase'
 
 REGISTRATION_STATUS_KEY = 'registered'
+LAST_SEEN_KEY = 'last_seen'
+IDLE_TIME_KEY = 'idle_time'
+
+UPLOAD_ID_KEY = 'upload_id'
+UPLOAD_SIZE_KEY = 'upload_size'
+UPLOAD_OFFSET_KEY = 'upload_offset'
+UPLOAD_RESPONSE_KEY = 'upload_response'
+UPLOAD_OFFSET_HEADER = 'X-Upload-Offset'
+UPLOAD_CHECKSUM_HEADER = 'X-Chunk-Checksum'
+UNCOMPRESSED_SIZE_HEADER = 'X-Uncompressed-Size'
+SIGNATURE_HEADER = 'X-Signature'
+BINARY_PROTOCOL_HEADER = 'X-Binary-Protocol'
+BINARY_PROTOCOL_VERSION = '1'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+OCTET_STREAM_CONTENT_TYPE = 'application/octet-stream'
+EVENT_STREAM_CONTENT_TYPE = 'text/event-stream'
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+MODEL_VERSION_EVENT = 'model_version'
+WORKER_STATUS_EVENT = 'worker_status'
+DOWNLOAD_SCHEDULE_KEY = 'accepts_download_schedule'
+DOWNLOAD_DELAY_KEY = 'download_delay'
+CONTENT_HASH_KEY = 'content_hash'
+CONTENT_SIZE_KEY = 'content_size'
+CONTENT_SIGNATURE_KEY = 'content_signature'
+PEERS_KEY = 'peers'
+PEER_ADDRESS_KEY = 'peer_address'
+PEER_SITE_KEY = 'peer_site'
+UNKNOWN_UPLOAD = 'Unknown Upload'
+UPLOAD_FAILED = 'Upload Failed'
+UPDATE_NOT_HANDLED = 'Update Not Handled'
 
 ADMIN_PASSWORD = 'DCF_SERVER_ADMIN_PASSWORD'
 ADMIN_USERNAME = 'DCF_SERVER_ADMIN_USERNAME'
+PROFILE_SECONDS = 'DCF_SERVER_PROFILE_SECONDS'
+PROFILE_OUTPUT = 'DCF_SERVER_PROFILE_OUTPUT'
+DEFAULT_PROFILE_OUTPUT = 'dcf_server_profile'
+PROFILE_DURATION_KEY = 'duration'
+PROFILE_FORMAT_KEY = 'format'
+COLLAPSED_PROFILE_FORMAT = 'collapsed'
+PSTATS_PROFILE_FORMAT = 'pstats'
 
 ERROR_MESSAGE_KEY = 'error'
 SUCCESS_MESSAGE_KEY = 'success'
 
 WID_LEN = 8
+
+CHALLENGE_NONCE_BYTES = 28
+CHALLENGE_PHRASE_MAX_RETRIES = 5
+CHALLENGE_PHRASE_RETRY_INTERVAL = 1
+UPLOAD_MAX_RETRIES = 10
+UPLOAD_RETRY_INTERVAL = 1
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_MAX_RETRIES = 5
+DOWNLOAD_RETRY_INTERVAL = 1
+DOWNLOAD_DELAY_JITTER = 1
+PEER_LIST_SIZE = 3
+PEER_DOWNLOAD_TIMEOUT = 60
+BLOB_STORE_VERSIONS = 2
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = (100, 1000, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8, 10 ** 9)
+ROUND_TIMELINE_MAX_ROUNDS = 100
+PROFILER_SAMPLE_INTERVAL = 0.005
+PROFILER_MAX_DURATION = 600
+LEAK_DETECTOR_TOP_N = 10
+LEAK_DETECTOR_FRAMES = 1
+LOG_SAMPLE_PERIOD = 10
+LOG_SAMPLE_BURST = 10
+LOG_FLUSH_INTERVAL = 0.05
+LOG_QUEUE_SIZE = 100000
+EVENT_KEEP_ALIVE_INTERVAL = 30
+EVENT_RECONNECT_INTERVAL = 1
+SHARED_STATE_POLL_INTERVAL = 0.05
+AGGREGATION_LEASE_TTL = 10
+UPDATE_FORWARD_TIMEOUT = 600
+
+REGISTER_WORKER_EVENT = 'register'
+UNREGISTER_WORKER_EVENT = 'unregister'
+WORKER_UPDATE_EVENT = 'update'
+
+NOTIFY_EVENT = 'notify'
+DOWNLOAD_EVENT = 'download'
+UPLOAD_EVENT = 'upload'
+DESERIALIZE_EVENT = 'deserialize'
+AGGREGATE_EVENT = 'aggregate'
+TEST_EVENT = 'test'
+RESPONSE_SENT_CALLBACKS_KEY = 'dcf.response_sent_callbacks'
@@ -0,0 +1,58 @@
+"""
+Spreads the downloads of a newly released global model over time so that
+the workers do not all download it at the same instant.
+"""
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+class DownloadScheduler(object):
+    """
+    Assigns each worker notified of a new global model a slot in which to
+    download it, such that the total download rate stays within an egress
+    budget. Slots are handed out back to back in the order in which workers
+    are notified, so the delay of the last worker grows with the number of
+    workers waiting on the model.
+
+    Parameters
+    ----------
+
+    egress_budget: float
+        The number of bytes per second the server is willing to send to
+        the workers downloading the global model.
+
+    clock: () -> float (default time.monotonic)
+        The clock used to measure time.
+    """
+    def __init__(self, egress_budget, clock=time.monotonic):
+        if egress_budget <= 0:
+            raise ValueError(f"The egress budget must be positive, got {egress_budget}.")
+        self.egress_budget = egress_budget
+        self.clock = clock
+        # the time at which the next download slot starts
+        self.next_slot = clock()
+
+    def assign(self, download_size):
+        """
+        Assigns the next download slot.
+
+        Parameters
+        ----------
+
+        download_size: int
+            The size in bytes of the download.
+
+        Returns
+        -------
+
+        float:
+            The number of seconds to wait before starting the download.
+        """
+        now = self.clock()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + download_size / self.egress_budget
+        return slot - now
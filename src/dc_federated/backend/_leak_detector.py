@@ -0,0 +1,291 @@
+"""
+Finds the memory of the server that grows from one federated learning round
+to the next, with tracemalloc snapshots taken at the round boundaries.
+"""
+import gc
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+
+from dc_federated.backend._constants import ROUND_TIMELINE_MAX_ROUNDS, LEAK_DETECTOR_TOP_N, LEAK_DETECTOR_FRAMES
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+# the allocations of the import machinery and of the detector itself are not
+# those of the server
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+    tracemalloc.Filter(False, __file__)
+]
+
+
+class LeakDetector(object):
+    """
+    Takes a tracemalloc snapshot of the memory allocated by Python, and a
+    count of the objects tracked by the garbage collector per type, at the
+    start of each round, and reports what grew since the previous round and
+    since the first one: the traced memory, the allocation sites that grew
+    the most and the types whose number of objects grew the most. The
+    reports of the last max_rounds rounds are kept.
+
+    Size probes, added with add_size_probe, report the size of the
+    containers of the server and of the algorithm that could hold on to
+    memory across rounds, such as the pending long polling requests.
+
+    Tracing the allocations slows the process down and uses memory of its
+    own, and each snapshot walks all the objects of the process, so the
+    detector is meant for tests rather than production servers.
+
+    Parameters
+    ----------
+
+    top_n: int (default LEAK_DETECTOR_TOP_N)
+        The number of allocation sites and types reported.
+
+    num_frames: int (default LEAK_DETECTOR_FRAMES)
+        The number of frames of the traceback stored for each allocation. With
+        more than one frame, the allocation sites are grouped by traceback
+        rather than by line.
+
+    max_rounds: int (default ROUND_TIMELINE_MAX_ROUNDS)
+        The number of rounds whose reports are kept.
+    """
+    def __init__(self, top_n=LEAK_DETECTOR_TOP_N, num_frames=LEAK_DETECTOR_FRAMES,
+                 max_rounds=ROUND_TIMELINE_MAX_ROUNDS):
+        self.top_n = top_n
+        self.num_frames = num_frames
+        self.max_rounds = max_rounds
+        self.rounds = OrderedDict()
+        self.size_probes = OrderedDict()
+        self.first_snapshot = None
+        self.first_object_counts = None
+        self.last_snapshot = None
+        self.last_object_counts = None
+        self.started_tracing = False
+
+    def start(self):
+        """
+        Starts tracing the allocations, unless they are already traced.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.num_frames)
+            self.started_tracing = True
+            logger.info("Tracing the memory allocations of the server.")
+
+    def stop(self):
+        """
+        Stops tracing the allocations if the detector started it, and drops
+        the snapshots.
+        """
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        self.first_snapshot = self.last_snapshot = None
+
+    def add_size_probe(self, name, function):
+        """
+        Adds a probe whose value is read at the start of each round.
+
+        Parameters
+        ----------
+
+        name: str
+            The name of the probe.
+
+        function: () -> int
+            Returns the size, e.g. the number of entries of a dictionary.
+        """
+        self.size_probes[name] = function
+
+    def snapshot_round(self, version):
+        """
+        Takes the snapshot of the start of the round of the given version of
+        the global model, unless it has already been taken, and reports the
+        growth since the previous and the first rounds.
+
+        Parameters
+        ----------
+
+        version: object
+            The version of the global model.
+
+        Returns
+        -------
+
+        dict:
+            The report of the round, or None if the snapshot was already taken.
+        """
+        if version in self.rounds:
+            return None
+        self.start()
+        # unreachable cycles are not leaks, so they are collected first
+        gc.collect()
+        start = time.perf_counter()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        traced_bytes = sum(stat.size for stat in snapshot.statistics('filename'))
+        peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        # the containers of the reports kept are not counted, as they grow with each round
+        report_containers = set(_get_container_ids(self.rounds))
+        object_counts = Counter(f"{type(o).__module__}.{type(o).__qualname__}" for o in gc.get_objects()
+                                if id(o) not in report_containers)
+
+        sizes = OrderedDict()
+        for name, function in self.size_probes.items():
+            try:
+                sizes[name] = function()
+            except Exception as e:
+                logger.warning(f"Size probe {name} failed: {e}")
+                sizes[name] = None
+
+        report = {
+            'version': version,
+            'time': time.time(),
+            'traced_bytes': traced_bytes,
+            'peak_traced_bytes': peak_traced_bytes,
+            'objects': sum(object_counts.values()),
+            'sizes': sizes,
+            'growth': None,
+            'total_growth': None
+        }
+        if self.last_snapshot is not None:
+            report['growth'] = self.get_growth(snapshot, self.last_snapshot, object_counts, self.last_object_counts)
+            report['total_growth'] = self.get_growth(snapshot, self.first_snapshot, object_counts,
+                                                     self.first_object_counts)
+        else:
+            self.first_snapshot = snapshot
+            self.first_object_counts = object_counts
+        self.last_snapshot = snapshot
+        self.last_object_counts = object_counts
+        report['snapshot_duration'] = time.perf_counter() - start
+
+        self.rounds[version] = report
+        while len(self.rounds) > self.max_rounds:
+            self.rounds.popitem(last=False)
+        logger.info(f"Memory snapshot of round {version}: {traced_bytes} bytes traced.")
+        return report
+
+    def get_growth(self, snapshot, old_snapshot, object_counts, old_object_counts):
+        """
+        Compares a snapshot and the counts of objects with older ones.
+
+        Parameters
+        ----------
+
+        snapshot: tracemalloc.Snapshot
+            The snapshot.
+
+        old_snapshot: tracemalloc.Snapshot
+            The older snapshot.
+
+        object_counts: Counter
+            The number of objects of each type.
+
+        old_object_counts: Counter
+            The older number of objects of each type.
+
+        Returns
+        -------
+
+        dict:
+            The growth of the traced memory and of the number of objects, the
+            top_n allocation sites whose memory grew the most, each with its
+            traceback (most recent call last), the growth of its memory and
+            number of blocks and its memory, and the top_n types whose number
+            of objects grew the most.
+        """
+        key_type = 'traceback' if self.num_frames > 1 else 'lineno'
+        stats = snapshot.compare_to(old_snapshot, key_type)
+        growing_stats = [stat for stat in stats if stat.size_diff > 0]
+        object_growth = Counter(object_counts)
+        object_growth.subtract(old_object_counts)
+        return {
+            'traced_bytes': sum(stat.size_diff for stat in stats),
+            'objects': sum(object_counts.values()) - sum(old_object_counts.values()),
+            'sites': [{
+                'traceback': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                'size_diff': stat.size_diff,
+                'count_diff': stat.count_diff,
+                'size': stat.size
+            } for stat in growing_stats[:self.top_n]],
+            'types': [{
+                'type': type_name,
+                'count_diff': count_diff,
+                'count': object_counts[type_name]
+            } for type_name, count_diff in object_growth.most_common(self.top_n) if count_diff > 0]
+        }
+
+    def list_rounds(self):
+        """
+        Returns the reports of the rounds kept, oldest first.
+
+        Returns
+        -------
+
+        dict list:
+            The reports, as returned by snapshot_round.
+        """
+        return list(self.rounds.values())
+
+
+def _get_container_ids(obj):
+    """
+    Yields the ids of the dicts and lists nested in obj, including obj.
+    """
+    stack = [obj]
+    while len(stack) > 0:
+        container = stack.pop()
+        yield id(container)
+        values = container.values() if isinstance(container, dict) else container
+        stack.extend(value for value in values if isinstance(value, (dict, list)))
+
+
+def find_unbounded_growth(rounds, num_rounds, min_growth):
+    """
+    Checks whether the memory traced at the start of each of the last
+    num_rounds rounds was higher than at the start of the round before, and
+    grew by more than min_growth bytes in total over these rounds. Memory
+    that stops growing, such as a cache that has filled up, passes.
+
+    Parameters
+    ----------
+
+    rounds: dict list
+        The reports of the rounds, oldest first, as returned by
+        LeakDetector.list_rounds.
+
+    num_rounds: int
+        The number of rounds over which the memory must grow.
+
+    min_growth: int
+        The number of bytes above which the growth is a failure.
+
+    Returns
+    -------
+
+    str:
+        A description of the growth and of the allocation sites that grew
+        the most, or None if the memory did not grow without bound or there
+        are fewer than num_rounds + 1 rounds.
+    """
+    if len(rounds) < num_rounds + 1:
+        return None
+    traced_bytes = [r['traced_bytes'] for r in rounds[-(num_rounds + 1):]]
+    if any(later <= earlier for earlier, later in zip(traced_bytes, traced_bytes[1:])):
+        return None
+    growth = traced_bytes[-1] - traced_bytes[0]
+    if growth <= min_growth:
+        return None
+    sites = (rounds[-1]['total_growth'] or {}).get('sites', [])
+    description = f"The traced memory grew in each of the last {num_rounds} rounds, by {growth} bytes " \
+                  f"from {traced_bytes[0]} to {traced_bytes[-1]} bytes."
+    if len(sites) > 0:
+        description += " Top growing allocation sites since the first round: " + \
+            ', '.join(f"{site['traceback'][-1]} (+{site['size_diff']} bytes)" for site in sites[:3]) + '.'
+    return description
@@ -0,0 +1,343 @@
+"""
+Metrics of the server, exposed in the Prometheus text exposition format.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from dc_federated.backend._constants import LATENCY_BUCKETS, SIZE_BUCKETS, RESPONSE_SENT_CALLBACKS_KEY
+
+
+def format_labels(labelnames, labelvalues, extra=()):
+    """
+    Formats the labels of a sample.
+
+    Parameters
+    ----------
+
+    labelnames: tuple of str
+        The names of the labels.
+
+    labelvalues: tuple of str
+        The values of the labels.
+
+    extra: tuple of (str, str) (default ())
+        Further names and values, such as the bucket of a histogram.
+
+    Returns
+    -------
+
+    str:
+        The labels, in braces, or an empty string if there are none.
+    """
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if len(pairs) == 0:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def format_value(value):
+    """
+    Formats the value of a sample.
+    """
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+    """
+    The base class of the metrics. The values of a metric are kept per
+    tuple of label values, given positionally in the order of the label
+    names, so that recording a value is a single dictionary lookup.
+
+    Parameters
+    ----------
+
+    name: str
+        The name of the metric.
+
+    documentation: str
+        The help text of the metric.
+
+    labelnames: tuple of str (default ())
+        The names of the labels of the metric.
+    """
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def samples(self):
+        """
+        Returns the samples of the metric.
+
+        Returns
+        -------
+
+        generator of (str, str, object):
+            The suffixed name, the formatted labels and the value of each
+            sample.
+        """
+        for labelvalues, value in sorted(self.values.items()):
+            yield self.name, format_labels(self.labelnames, labelvalues), value
+
+    def render(self):
+        """
+        Returns the metric in the text exposition format.
+
+        Returns
+        -------
+
+        str:
+            The metric.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(f"{name}{labels} {format_value(value)}" for name, labels, value in self.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(Metric):
+    """
+    A value that only goes up.
+    """
+    metric_type = 'counter'
+
+    def inc(self, amount=1, *labelvalues):
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. If a function is given, the value is
+    read from it when the metric is rendered rather than set.
+
+    Parameters
+    ----------
+
+    function: () -> float (default None)
+        Returns the value of the gauge, for gauges without labels.
+    """
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, *labelvalues):
+        self.values[labelvalues] = value
+
+    def samples(self):
+        if self.function is not None:
+            yield self.name, '', self.function()
+        else:
+            yield from super().samples()
+
+
+class Histogram(Metric):
+    """
+    Counts the observed values in buckets with fixed upper bounds, and
+    keeps their sum and count.
+
+    Parameters
+    ----------
+
+    buckets: tuple of float (default LATENCY_BUCKETS)
+        The upper bounds of the buckets, in increasing order.
+    """
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, *labelvalues):
+        counts = self.values.get(labelvalues)
+        if counts is None:
+            # the count of each bucket, then the sum and the count of the values
+            counts = self.values[labelvalues] = [0] * len(self.buckets) + [0, 0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    @contextmanager
+    def time(self, *labelvalues):
+        """
+        Observes the time, in seconds, taken by the body of the with statement.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def samples(self):
+        for labelvalues, counts in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", \
+                    format_labels(self.labelnames, labelvalues, [('le', format_value(bound))]), cumulative
+            labels = format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum", labels, counts[-2]
+            yield f"{self.name}_count", labels, counts[-1]
+
+
+class ServerMetrics(object):
+    """
+    The metrics of a DCFServer process. Recording a value only updates a
+    few counters in memory, so the metrics are always collected.
+    """
+    def __init__(self):
+        self.request_duration = Histogram(
+            'dcf_request_duration_seconds',
+            'Time from the start of a request until its response was sent, by route.',
+            ['route', 'method'])
+        self.request_bytes = Counter(
+            'dcf_request_bytes_total', 'Bytes received in request bodies, by route.', ['route', 'method'])
+        self.response_bytes = Counter(
+            'dcf_response_bytes_total', 'Bytes sent in response bodies, by route.', ['route', 'method'])
+        self.response_size = Histogram(
+            'dcf_response_size_bytes', 'Size of the response bodies, by route.', ['route', 'method'],
+            buckets=SIZE_BUCKETS)
+        self.compression_duration = Histogram(
+            'dcf_compression_duration_seconds',
+            'Time taken to compress global models and decompress model updates.', ['operation'])
+        self.signature_verification_duration = Histogram(
+            'dcf_signature_verification_duration_seconds', 'Time taken to verify worker signatures.')
+        self.update_callback_duration = Histogram(
+            'dcf_worker_update_callback_duration_seconds',
+            'Time taken by the receive_worker_update_callback, including any aggregation it runs.')
+        self.metrics = [self.request_duration, self.request_bytes, self.response_bytes, self.response_size,
+                        self.compression_duration, self.signature_verification_duration,
+                        self.update_callback_duration]
+
+    def add_gauge(self, name, documentation, function):
+        """
+        Adds a gauge whose value is read from the function when the metrics
+        are rendered.
+
+        Parameters
+        ----------
+
+        name: str
+            The name of the gauge.
+
+        documentation: str
+            The help text of the gauge.
+
+        function: () -> float
+            Returns the value of the gauge.
+        """
+        self.metrics.append(Gauge(name, documentation, function=function))
+
+    def render(self):
+        """
+        Returns all the metrics in the text exposition format.
+
+        Returns
+        -------
+
+        str:
+            The metrics.
+        """
+        return ''.join(metric.render() for metric in self.metrics)
+
+
+class InstrumentedApplication(object):
+    """
+    A WSGI middleware recording the duration and the request and response
+    bytes of each request, labelled by the bottle route that handled it.
+    The duration runs until the response has been sent, so that of a long
+    polling request is the time the worker waited. Responses sent with the
+    wsgi.file_wrapper of the server are passed through untouched, so that
+    they can still be sent with sendfile; their duration is until the
+    response was ready to be sent. The functions a handler puts in the
+    RESPONSE_SENT_CALLBACKS_KEY list of the environ are called at the same
+    time as the request is recorded.
+
+    Parameters
+    ----------
+
+    application: callable
+        The WSGI application.
+
+    metrics: ServerMetrics
+        The metrics to record to.
+    """
+    def __init__(self, application, metrics):
+        self.application = application
+        self.metrics = metrics
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        response_headers = []
+
+        def recording_start_response(status, headers, exc_info=None):
+            response_headers[:] = headers
+            if exc_info is None:
+                return start_response(status, headers)
+            return start_response(status, headers, exc_info)
+
+        result = self.application(environ, recording_start_response)
+        route = environ.get('bottle.route')
+        labels = (route.rule if route is not None else 'unmatched', environ.get('REQUEST_METHOD', ''))
+        try:
+            request_bytes = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            request_bytes = 0
+        self.metrics.request_bytes.inc(request_bytes, *labels)
+
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(result, file_wrapper):
+            content_length = dict((name.lower(), value) for name, value in response_headers).get('content-length')
+            self.record_response(environ, labels, start, int(content_length or 0))
+            return result
+        return RecordedResponse(
+            result, lambda response_bytes: self.record_response(environ, labels, start, response_bytes))
+
+    def record_response(self, environ, labels, start, response_bytes):
+        self.metrics.request_duration.observe(time.perf_counter() - start, *labels)
+        self.metrics.response_bytes.inc(response_bytes, *labels)
+        self.metrics.response_size.observe(response_bytes, *labels)
+        for callback in environ.get(RESPONSE_SENT_CALLBACKS_KEY, []):
+            callback()
+
+
+class RecordedResponse(object):
+    """
+    Wraps the response of a WSGI application to count the bytes sent, and
+    reports them when the server closes the response.
+
+    Parameters
+    ----------
+
+    result: iterable of bytes
+        The response of the application.
+
+    on_close: int -> ()
+        Called with the number of bytes sent once the response is closed.
+    """
+    def __init__(self, result, on_close):
+        self.result = result
+        self.on_close = on_close
+        self.response_bytes = 0
+
+    def __iter__(self):
+        for chunk in self.result:
+            self.response_bytes += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.result, 'close'):
+                self.result.close()
+        finally:
+            if self.on_close is not None:
+                self.on_close(self.response_bytes)
+                self.on_close = None
@@ -0,0 +1,108 @@
+"""
+Decoding of msgpack maps without copying their binary values, used to
+decode the global model in place in the buffer it was downloaded into.
+"""
+import struct
+
+import msgpack
+
+
+# header byte -> size of the payload, for the types with a fixed size
+_FIXED_SIZES = {
+    0xc0: 0, 0xc2: 0, 0xc3: 0,
+    0xca: 4, 0xcb: 8,
+    0xcc: 1, 0xcd: 2, 0xce: 4, 0xcf: 8,
+    0xd0: 1, 0xd1: 2, 0xd2: 4, 0xd3: 8,
+    0xd4: 2, 0xd5: 3, 0xd6: 5, 0xd7: 9, 0xd8: 17,
+}
+# header byte -> number of bytes of the length field
+_LENGTH_PREFIXED = {
+    0xc4: 1, 0xc5: 2, 0xc6: 4,    # bin
+    0xd9: 1, 0xda: 2, 0xdb: 4,    # str
+}
+_EXT = {0xc7: 1, 0xc8: 2, 0xc9: 4}
+# header byte -> (number of bytes of the length field, objects per entry)
+_CONTAINERS = {0xdc: (2, 1), 0xdd: (4, 1), 0xde: (2, 2), 0xdf: (4, 2)}
+_LENGTH_FORMATS = {1: '>B', 2: '>H', 4: '>I'}
+
+
+def _read_length(buffer, pos, num_bytes):
+    return struct.unpack_from(_LENGTH_FORMATS[num_bytes], buffer, pos)[0]
+
+
+def _object_end(buffer, pos):
+    """
+    Returns the position just after the msgpack object starting at pos.
+    """
+    header = buffer[pos]
+    if header <= 0x7f or header >= 0xe0:
+        return pos + 1
+    if 0xa0 <= header <= 0xbf:
+        return pos + 1 + (header & 0x1f)
+    if 0x80 <= header <= 0x9f:
+        num_items = (header & 0x0f) * (2 if header <= 0x8f else 1)
+        pos += 1
+        for _ in range(num_items):
+            pos = _object_end(buffer, pos)
+        return pos
+    if header in _FIXED_SIZES:
+        return pos + 1 + _FIXED_SIZES[header]
+    if header in _LENGTH_PREFIXED:
+        num_bytes = _LENGTH_PREFIXED[header]
+        return pos + 1 + num_bytes + _read_length(buffer, pos + 1, num_bytes)
+    if header in _EXT:
+        num_bytes = _EXT[header]
+        return pos + 2 + num_bytes + _read_length(buffer, pos + 1, num_bytes)
+    if header in _CONTAINERS:
+        num_bytes, items_per_entry = _CONTAINERS[header]
+        num_items = _read_length(buffer, pos + 1, num_bytes) * items_per_entry
+        pos += 1 + num_bytes
+        for _ in range(num_items):
+            pos = _object_end(buffer, pos)
+        return pos
+    raise ValueError(f"Invalid msgpack header byte {header:#x} at position {pos}.")
+
+
+def unpack_map_view(buffer):
+    """
+    Decodes a msgpack serialized map. Values of the map that are binary
+    strings are returned as memoryviews of the buffer rather than copied,
+    everything else is decoded as by msgpack.unpackb.
+
+    Parameters
+    ----------
+
+    buffer: bytes-like
+        The msgpack serialized map.
+
+    Returns
+    -------
+
+    dict:
+        The decoded map.
+    """
+    view = memoryview(buffer)
+    header = view[0]
+    if 0x80 <= header <= 0x8f:
+        num_entries, pos = header & 0x0f, 1
+    elif header in (0xde, 0xdf):
+        num_bytes = _CONTAINERS[header][0]
+        num_entries, pos = _read_length(view, 1, num_bytes), 1 + num_bytes
+    else:
+        raise ValueError("The buffer does not contain a msgpack map.")
+
+    result = {}
+    for _ in range(num_entries):
+        key_end = _object_end(view, pos)
+        key = msgpack.unpackb(view[pos:key_end])
+        pos = key_end
+        value_end = _object_end(view, pos)
+        if view[pos] in (0xc4, 0xc5, 0xc6):
+            num_bytes = _LENGTH_PREFIXED[view[pos]]
+            result[key] = view[pos + 1 + num_bytes:value_end]
+        else:
+            result[key] = msgpack.unpackb(view[pos:value_end])
+        pos = value_end
+    if pos != len(view):
+        raise ValueError("Unexpected data after the msgpack map.")
+    return result
@@ -0,0 +1,127 @@
+"""
+Keeps track of the workers that can serve the global model to their peers.
+"""
+import random
+
+from dc_federated.backend._constants import PEER_LIST_SIZE
+
+
+class PeerRegistry(object):
+    """
+    Keeps, for the current global model, the addresses at which workers
+    holding it serve it to their peers, so that the server can point workers
+    downloading the model to peers on the same site rather than send it to
+    each of them itself.
+
+    Parameters
+    ----------
+
+    max_peers: int (default PEER_LIST_SIZE)
+        The maximum number of peers returned to a worker.
+    """
+    def __init__(self, max_peers=PEER_LIST_SIZE):
+        self.max_peers = max_peers
+        self.content_hash = None
+        # worker_id -> (address, site) of the workers holding the current model
+        self.peers = {}
+
+    def retain(self, content_hash):
+        """
+        Sets the hash of the current global model, forgetting the peers of
+        any previous model.
+
+        Parameters
+        ----------
+
+        content_hash: str
+            The sha256 hash of the compressed global model.
+        """
+        if content_hash != self.content_hash:
+            self.content_hash = content_hash
+            self.peers = {}
+
+    def announce(self, content_hash, worker_id, address, site=None):
+        """
+        Records that the worker serves the model with the given hash.
+
+        Parameters
+        ----------
+
+        content_hash: str
+            The sha256 hash of the compressed global model held by the worker.
+
+        worker_id: str
+            The id of the worker.
+
+        address: str
+            The url at which the worker serves the model.
+
+        site: str (default None)
+            The site the worker is on.
+
+        Returns
+        -------
+
+        bool:
+            True if the worker was recorded, False if it does not hold the
+            current global model.
+        """
+        if content_hash != self.content_hash:
+            return False
+        self.peers[worker_id] = (address, site)
+        return True
+
+    def get_peers(self, content_hash, site=None, worker_id=None, is_available=None):
+        """
+        Returns a random selection of the addresses of the workers on the
+        given site that serve the model with the given hash. Workers found
+        to be unavailable are forgotten.
+
+        Parameters
+        ----------
+
+        content_hash: str
+            The sha256 hash of the compressed global model.
+
+        site: str (default None)
+            The site of the worker asking for peers.
+
+        worker_id: str (default None)
+            The id of the worker asking for peers, which is left out.
+
+        is_available: str -> bool (default None)
+            If given, checks whether the worker with the given id, typically
+            still registered, can be handed out as a peer.
+
+        Returns
+        -------
+
+        list of str:
+            The addresses of the peers.
+        """
+        if content_hash != self.content_hash:
+            return []
+        candidates = [(peer_id, address) for peer_id, (address, peer_site) in self.peers.items()
+                      if peer_site == site and peer_id != worker_id]
+        random.shuffle(candidates)
+        addresses = []
+        for peer_id, address in candidates:
+            if len(addresses) == self.max_peers:
+                break
+            if is_available is not None and not is_available(peer_id):
+                self.forget(peer_id)
+                continue
+            addresses.append(address)
+        return addresses
+
+    def forget(self, worker_id):
+        """
+        Removes the worker from the peers.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+        """
+        self.peers.pop(worker_id, None)
@@ -0,0 +1,74 @@
+"""
+A small http server run by a worker to serve the global model to its peers.
+"""
+from gevent.pywsgi import WSGIServer
+
+from dc_federated.backend._constants import PEER_MODEL_ROUTE, OCTET_STREAM_CONTENT_TYPE
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+class PeerModelServer(object):
+    """
+    Serves the compressed global model last received by the worker at
+    /PEER_MODEL_ROUTE/<sha256 hash of the model>. Peers check the hash of
+    what they receive against the one signed by the server, so the content
+    itself needs no authentication.
+
+    Parameters
+    ----------
+
+    host: str
+        The address to listen at.
+
+    port: int
+        The port to listen at.
+    """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.content_hash = None
+        self.content = None
+        self.server = WSGIServer((host, port), self.application, log=None)
+
+    def set_content(self, content_hash, content):
+        """
+        Sets the model to serve.
+
+        Parameters
+        ----------
+
+        content_hash: str
+            The sha256 hash of the compressed model.
+
+        content: bytes
+            The compressed model.
+        """
+        self.content_hash = content_hash
+        self.content = content
+
+    def application(self, environ, start_response):
+        path = environ.get('PATH_INFO', '').strip('/').split('/')
+        if environ['REQUEST_METHOD'] == 'GET' and len(path) == 2 and path[0] == PEER_MODEL_ROUTE \
+                and self.content is not None and path[1] == self.content_hash:
+            start_response('200 OK', [('Content-Type', OCTET_STREAM_CONTENT_TYPE),
+                                      ('Content-Length', str(len(self.content)))])
+            return [self.content]
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'Not Found']
+
+    def start(self):
+        """
+        Starts serving in the background.
+        """
+        self.server.start()
+        logger.info(f"Serving the global model to peers at {self.host}:{self.port}.")
+
+    def stop(self):
+        """
+        Stops serving.
+        """
+        self.server.stop()
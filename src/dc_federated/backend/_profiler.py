@@ -0,0 +1,211 @@
+"""
+A sampling profiler for the gevent based server.
+"""
+import sys
+import time
+import marshal
+from collections import Counter
+
+from gevent import monkey
+
+from dc_federated.backend._constants import PROFILER_SAMPLE_INTERVAL, PROFILER_MAX_DURATION
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+# the profiler samples from a real thread, whatever has been monkey patched
+_start_new_thread = monkey.get_original('_thread', 'start_new_thread')
+_get_ident = monkey.get_original('_thread', 'get_ident')
+_allocate_lock = monkey.get_original('_thread', 'allocate_lock')
+_sleep = monkey.get_original('time', 'sleep')
+
+
+class SamplingProfiler(object):
+    """
+    Samples, from a separate operating system thread, the stack of the code
+    running in the thread that started the profiler every interval seconds
+    for a window of time. The greenlets of the server all run in that
+    thread, and only the one running when a sample is taken is seen, so a
+    greenlet waiting on a long poll is not counted while it waits and the
+    samples show where the CPU time actually goes. Samples taken while the
+    gevent hub waits for I/O show the hub's run loop.
+
+    The samples can be written as collapsed stacks, for flamegraph tools,
+    or as a pstats file, in which the call counts are sample counts. As the
+    sampling thread has to wait for the GIL, samples can be further apart
+    than the interval, so each sample is weighted by the time since the
+    previous one.
+
+    Parameters
+    ----------
+
+    interval: float (default PROFILER_SAMPLE_INTERVAL)
+        The number of seconds between samples.
+    """
+    def __init__(self, interval=PROFILER_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self.sample_seconds = Counter()
+        self.lock = _allocate_lock()
+        self.running = False
+        self.target_thread = None
+        # the error that stopped the last window, if any - the sampling
+        # thread does not log, as the logging locks belong to gevent
+        self.error = None
+
+    def start(self, duration, output_prefix=None):
+        """
+        Starts sampling the current thread for the given number of seconds,
+        discarding the samples of any previous window.
+
+        Parameters
+        ----------
+
+        duration: float
+            The number of seconds to sample for, at most PROFILER_MAX_DURATION.
+
+        output_prefix: str (default None)
+            If given, the samples are written to output_prefix + '.collapsed'
+            and output_prefix + '.pstats' at the end of the window.
+
+        Returns
+        -------
+
+        bool:
+            True if the profiler started, False if it was already running.
+        """
+        with self.lock:
+            if self.running:
+                return False
+            self.running = True
+            self.samples = Counter()
+            self.sample_seconds = Counter()
+            self.error = None
+        self.target_thread = _get_ident()
+        duration = min(duration, PROFILER_MAX_DURATION)
+        _start_new_thread(self._run, (duration, output_prefix))
+        logger.info(f"Profiling the server for {duration} seconds.")
+        return True
+
+    def _run(self, duration, output_prefix):
+        try:
+            last_sample = time.monotonic()
+            end = last_sample + duration
+            while last_sample < end:
+                _sleep(self.interval)
+                now = time.monotonic()
+                elapsed, last_sample = now - last_sample, now
+                frame = sys._current_frames().get(self.target_thread)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                stack = tuple(reversed(stack))
+                with self.lock:
+                    self.samples[stack] += 1
+                    self.sample_seconds[stack] += elapsed
+            if output_prefix is not None:
+                self.write(output_prefix)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            with self.lock:
+                self.running = False
+
+    def is_running(self):
+        return self.running
+
+    def get_samples(self):
+        """
+        Returns a copy of the samples.
+
+        Returns
+        -------
+
+        Counter, Counter:
+            The number of samples of each stack, given as a tuple of
+            (filename, first line, function name) from the outermost call,
+            and the number of seconds the samples of each stack stand for.
+        """
+        with self.lock:
+            return Counter(self.samples), Counter(self.sample_seconds)
+
+    def get_collapsed_stacks(self):
+        """
+        Returns the samples as collapsed stacks, one line per stack with the
+        functions from the outermost call separated by semicolons, followed
+        by the number of samples.
+
+        Returns
+        -------
+
+        str:
+            The collapsed stacks.
+        """
+        lines = []
+        for stack, count in sorted(self.get_samples()[0].items()):
+            frames = ';'.join(f"{name} ({filename}:{line})" for filename, line, name in stack)
+            lines.append(f"{frames} {count}")
+        return '\n'.join(lines) + '\n' if len(lines) > 0 else ''
+
+    def get_pstats(self):
+        """
+        Returns the samples in the marshalled format read by pstats.Stats.
+        The times are those the samples stand for, and the call counts are
+        the number of samples.
+
+        Returns
+        -------
+
+        bytes:
+            The profile.
+        """
+        stats = {}
+
+        def entry(function):
+            if function not in stats:
+                # primitive calls, calls, own time, cumulative time, callers
+                stats[function] = [0, 0, 0.0, 0.0, {}]
+            return stats[function]
+
+        samples, sample_seconds = self.get_samples()
+        for stack, count in samples.items():
+            seconds = sample_seconds[stack]
+            entry(stack[-1])[2] += seconds
+            seen = set()
+            for i, function in enumerate(stack):
+                function_stats = entry(function)
+                own = seconds if i == len(stack) - 1 else 0.0
+                if i > 0:
+                    calls, primitive_calls, own_time, cumulative_time = \
+                        function_stats[4].get(stack[i - 1], (0, 0, 0.0, 0.0))
+                    function_stats[4][stack[i - 1]] = \
+                        (calls + count, primitive_calls + count, own_time + own, cumulative_time + seconds)
+                # recursive calls count once towards the cumulative time
+                if function not in seen:
+                    seen.add(function)
+                    function_stats[0] += count
+                    function_stats[1] += count
+                    function_stats[3] += seconds
+        return marshal.dumps({function: tuple(function_stats) for function, function_stats in stats.items()})
+
+    def write(self, output_prefix):
+        """
+        Writes the samples to output_prefix + '.collapsed' and
+        output_prefix + '.pstats'.
+
+        Parameters
+        ----------
+
+        output_prefix: str
+            The path of the files, without the extension.
+        """
+        with open(output_prefix + '.collapsed', 'w') as f:
+            f.write(self.get_collapsed_stacks())
+        with open(output_prefix + '.pstats', 'wb') as f:
+            f.write(self.get_pstats())
@@ -0,0 +1,225 @@
+"""
+Records, for each version of the global model, when each stage of the
+federated learning round that follows its release happened.
+"""
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from dc_federated.backend._constants import ROUND_TIMELINE_MAX_ROUNDS, NOTIFY_EVENT, DOWNLOAD_EVENT, \
+    UPLOAD_EVENT, DESERIALIZE_EVENT, AGGREGATE_EVENT, TEST_EVENT
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+class RoundTimeline(object):
+    """
+    Keeps a timeline for each of the last max_rounds rounds, where a round
+    starts with the release of a version of the global model. The timeline
+    of a round is a list of events, each with a name, the id of the worker
+    it concerns (or None) and a start and end time - events that happen at
+    an instant have the same start and end time.
+
+    The DCFServer records the notifications, downloads and uploads of the
+    workers, and the algorithm records the stages it runs, such as the
+    deserialization of the updates, the aggregation and the testing of the
+    new global model. Each event is added to the current round, that of the
+    most recently released version, unless the version is given.
+
+    Parameters
+    ----------
+
+    max_rounds: int (default ROUND_TIMELINE_MAX_ROUNDS)
+        The number of rounds to keep.
+
+    clock: () -> float (default time.time)
+        The clock used to timestamp the events.
+    """
+    def __init__(self, max_rounds=ROUND_TIMELINE_MAX_ROUNDS, clock=time.time):
+        self.max_rounds = max_rounds
+        self.clock = clock
+        self.rounds = OrderedDict()
+        self.current_version = None
+
+    def start_round(self, version, released_at=None):
+        """
+        Starts the round of the given version of the global model, unless
+        it has already started.
+
+        Parameters
+        ----------
+
+        version: object
+            The version of the global model.
+
+        released_at: float (default None)
+            The time the version was released, now if None.
+        """
+        if version == self.current_version or version in self.rounds:
+            return
+        self.rounds[version] = {
+            'version': version,
+            'released_at': self.clock() if released_at is None else released_at,
+            'events': []
+        }
+        self.current_version = version
+        while len(self.rounds) > self.max_rounds:
+            self.rounds.popitem(last=False)
+
+    def record(self, event, worker_id=None, start=None, end=None, version=None):
+        """
+        Adds an event to the timeline of a round.
+
+        Parameters
+        ----------
+
+        event: str
+            The name of the event.
+
+        worker_id: str (default None)
+            The id of the worker the event concerns, if any.
+
+        start: float (default None)
+            The time the event started, now if None.
+
+        end: float (default None)
+            The time the event ended, now if None.
+
+        version: object (default None)
+            The version of the round, the current round if None. Events for
+            rounds that are not kept are dropped.
+        """
+        version = self.current_version if version is None else version
+        if version not in self.rounds:
+            return
+        now = self.clock()
+        self.rounds[version]['events'].append({
+            'event': event,
+            'worker_id': worker_id,
+            'start': now if start is None else start,
+            'end': now if end is None else end
+        })
+
+    @contextmanager
+    def span(self, event, worker_id=None, version=None):
+        """
+        Records an event lasting as long as the body of the with statement.
+        The round is the one current when the statement starts, unless the
+        version is given.
+        """
+        version = self.current_version if version is None else version
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record(event, worker_id, start=start, version=version)
+
+    def find_round(self, version_str):
+        """
+        Returns the round whose version has the given string form.
+
+        Parameters
+        ----------
+
+        version_str: str
+            The string form of the version, as given in a url.
+
+        Returns
+        -------
+
+        dict:
+            The round, or None if no round with this version is kept.
+        """
+        for version, timeline in self.rounds.items():
+            if str(version) == version_str:
+                return timeline
+        return None
+
+    def list_rounds(self):
+        """
+        Returns the rounds that are kept.
+
+        Returns
+        -------
+
+        list of dict:
+            The version, release time and number of events of each round.
+        """
+        return [{'version': timeline['version'],
+                 'released_at': timeline['released_at'],
+                 'num_events': len(timeline['events'])}
+                for timeline in self.rounds.values()]
+
+    @staticmethod
+    def get_critical_path(timeline):
+        """
+        Breaks down the time taken by a round along the path of the worker
+        holding it up, that is the worker whose update arrived last before
+        the aggregation that ended the round (or last of all if there was
+        no aggregation). Each stage is the time between one event of that
+        worker and the next - the time between the end of its download and
+        the arrival of its update is spent training and uploading on the
+        worker. The arrival of the update of every worker, relative to the
+        release, is also given, slowest first.
+
+        Parameters
+        ----------
+
+        timeline: dict
+            The timeline of the round.
+
+        Returns
+        -------
+
+        dict:
+            The id of the critical worker, its stages in order as (name,
+            seconds or None if not recorded) pairs, the total time from the
+            release to the end of the last event, and the workers.
+        """
+        released_at = timeline['released_at']
+        first_events = {}
+        aggregate = test = None
+        for e in timeline['events']:
+            if e['event'] == AGGREGATE_EVENT:
+                aggregate = e
+            elif e['event'] == TEST_EVENT:
+                test = e
+            elif e['worker_id'] is not None:
+                first_events.setdefault(e['worker_id'], {}).setdefault(e['event'], e)
+
+        cutoff = aggregate['start'] if aggregate is not None else float('inf')
+        uploads = [(events[UPLOAD_EVENT]['start'], worker_id) for worker_id, events in first_events.items()
+                   if UPLOAD_EVENT in events and events[UPLOAD_EVENT]['start'] <= cutoff]
+        critical_worker = max(uploads)[1] if len(uploads) > 0 else None
+        events = first_events.get(critical_worker, {})
+
+        def between(start, end):
+            return None if start is None or end is None else end - start
+
+        def time_of(event, key):
+            return events[event][key] if event in events else None
+
+        def duration(e):
+            return None if e is None else e['end'] - e['start']
+
+        stages = [
+            ('notify', between(released_at, time_of(NOTIFY_EVENT, 'start'))),
+            ('download_wait', between(time_of(NOTIFY_EVENT, 'start'), time_of(DOWNLOAD_EVENT, 'start'))),
+            ('download', duration(events.get(DOWNLOAD_EVENT))),
+            ('train_and_upload', between(time_of(DOWNLOAD_EVENT, 'end'), time_of(UPLOAD_EVENT, 'start'))),
+            ('deserialize', duration(events.get(DESERIALIZE_EVENT))),
+            ('aggregate', duration(aggregate)),
+            ('test', duration(test))
+        ]
+        end = max((e['end'] for e in timeline['events']), default=released_at)
+        workers = sorted(({'worker_id': worker_id, 'upload_after': upload_time - released_at}
+                          for upload_time, worker_id in uploads), key=lambda w: -w['upload_after'])
+        return {
+            'critical_worker': critical_worker,
+            'stages': stages,
+            'total': end - released_at,
+            'workers': workers
+        }
@@ -0,0 +1,363 @@
+"""
+State shared by the processes of a multi-process DCFServer, kept in a local
+SQLite database.
+"""
+import os
+import time
+import sqlite3
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    public_key TEXT,
+    registered INTEGER NOT NULL DEFAULT 0,
+    idle_unregistered INTEGER NOT NULL DEFAULT 0,
+    last_seen_clock REAL,
+    last_seen_time REAL
+);
+CREATE TABLE IF NOT EXISTS challenges (
+    worker_id TEXT PRIMARY KEY,
+    phrase TEXT NOT NULL,
+    time_issued REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS global_model (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version BLOB NOT NULL,
+    model BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    worker_id TEXT NOT NULL,
+    payload BLOB,
+    done INTEGER NOT NULL DEFAULT 0,
+    response TEXT
+);
+CREATE TABLE IF NOT EXISTS lease (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    owner TEXT,
+    expires REAL NOT NULL
+);
+"""
+
+
+class SharedState(object):
+    """
+    Stores the state that all the processes serving a DCFServer need to
+    agree on: the workers and their registration status, the outstanding
+    challenge phrases, the published global model, the queue of worker
+    events (registrations and model updates) to be handled by the process
+    owning the aggregation, and the lease naming that process.
+
+    Each process opens its own connection to the database, since SQLite
+    connections can not be shared across a fork.
+
+    Parameters
+    ----------
+
+    path: str
+        The path of the SQLite database file.
+
+    timeout: float (default 30)
+        The number of seconds to wait for another process to release a lock
+        on the database.
+    """
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._connection = None
+        self._connection_pid = None
+
+    def connection(self):
+        """
+        Returns the connection to the database of the current process,
+        opening it if necessary.
+
+        Returns
+        -------
+
+        sqlite3.Connection:
+            The connection.
+        """
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def clear(self):
+        """
+        Removes all the state, for instance from a previous run of the server.
+        """
+        connection = self.connection()
+        for table in ['workers', 'challenges', 'global_model', 'events', 'lease']:
+            connection.execute(f"DELETE FROM {table}")
+
+    # Workers
+
+    def add_worker(self, worker_id, public_key, clock_time, wall_time):
+        """
+        Adds a worker, unregistered.
+
+        Returns
+        -------
+
+        bool:
+            True if the worker was added, False if it was already there.
+        """
+        cursor = self.connection().execute(
+            "INSERT OR IGNORE INTO workers (worker_id, public_key, last_seen_clock, last_seen_time) "
+            "VALUES (?, ?, ?, ?)", (worker_id, public_key, clock_time, wall_time))
+        return cursor.rowcount == 1
+
+    def remove_worker(self, worker_id):
+        """
+        Removes a worker and its challenge phrase.
+
+        Returns
+        -------
+
+        bool:
+            True if the worker was removed, False if it was not there.
+        """
+        connection = self.connection()
+        connection.execute("DELETE FROM challenges WHERE worker_id = ?", (worker_id,))
+        return connection.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,)).rowcount == 1
+
+    def get_worker(self, worker_id):
+        """
+        Returns the stored state of a worker.
+
+        Returns
+        -------
+
+        tuple:
+            The public key, registration status, idle unregistration status and
+            the clock and wall clock times of the last contact, or None if the
+            worker is not known.
+        """
+        return self.connection().execute(
+            "SELECT public_key, registered, idle_unregistered, last_seen_clock, last_seen_time "
+            "FROM workers WHERE worker_id = ?", (worker_id,)).fetchone()
+
+    def get_workers(self):
+        """
+        Returns the ids, registration status and the last contact (clock and
+        wall clock) times of all the workers.
+
+        Returns
+        -------
+
+        list of tuple:
+            The workers, in the order they were added.
+        """
+        return self.connection().execute(
+            "SELECT worker_id, registered, last_seen_clock, last_seen_time FROM workers ORDER BY rowid").fetchall()
+
+    def get_public_keys(self):
+        """
+        Returns the public keys of all the workers that have one.
+        """
+        return [row[0] for row in self.connection().execute(
+            "SELECT public_key FROM workers WHERE public_key IS NOT NULL ORDER BY rowid")]
+
+    def set_registration_status(self, worker_id, registered, idle_unregistered=False):
+        """
+        Sets the registration status of a worker.
+
+        Returns
+        -------
+
+        bool:
+            The previous registration status, or None if the worker is not known.
+        """
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT registered FROM workers WHERE worker_id = ?", (worker_id,)).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE workers SET registered = ?, idle_unregistered = ? WHERE worker_id = ?",
+                    (int(registered), int(idle_unregistered), worker_id))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return None if row is None else bool(row[0])
+
+    def mark_worker_seen(self, worker_id, clock_time, wall_time):
+        """
+        Records the time of the last contact with a worker.
+        """
+        self.connection().execute(
+            "UPDATE workers SET last_seen_clock = ?, last_seen_time = ? WHERE worker_id = ?",
+            (clock_time, wall_time, worker_id))
+
+    # Challenge phrases
+
+    def set_challenge(self, worker_id, phrase, time_issued):
+        """
+        Stores the challenge phrase of a worker, replacing any previous one.
+        """
+        self.connection().execute(
+            "INSERT OR REPLACE INTO challenges (worker_id, phrase, time_issued) VALUES (?, ?, ?)",
+            (worker_id, phrase, time_issued))
+
+    def pop_challenge(self, worker_id):
+        """
+        Removes the challenge phrase of a worker and returns it.
+
+        Returns
+        -------
+
+        tuple:
+            The challenge phrase and the time it was issued, or None.
+        """
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT phrase, time_issued FROM challenges WHERE worker_id = ?", (worker_id,)).fetchone()
+            connection.execute("DELETE FROM challenges WHERE worker_id = ?", (worker_id,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return row
+
+    def count_challenges(self):
+        return self.connection().execute("SELECT COUNT(*) FROM challenges").fetchone()[0]
+
+    # Global model
+
+    def publish_global_model(self, version, model):
+        """
+        Publishes a new global model.
+
+        Parameters
+        ----------
+
+        version: bytes
+            The msgpack serialized version of the model.
+
+        model: bytes
+            The serialized model.
+        """
+        self.connection().execute(
+            "INSERT OR REPLACE INTO global_model (id, version, model) VALUES (0, ?, ?)", (version, model))
+
+    def get_global_model_version(self):
+        """
+        Returns the msgpack serialized version of the published global model,
+        or None if no model was published.
+        """
+        row = self.connection().execute("SELECT version FROM global_model WHERE id = 0").fetchone()
+        return None if row is None else row[0]
+
+    def get_global_model(self):
+        """
+        Returns the msgpack serialized version and the published global
+        model, or None if no model was published.
+        """
+        return self.connection().execute("SELECT version, model FROM global_model WHERE id = 0").fetchone()
+
+    # Events for the aggregation owner
+
+    def push_event(self, kind, worker_id, payload=None):
+        """
+        Queues an event for the process owning the aggregation.
+
+        Returns
+        -------
+
+        int:
+            The id of the event.
+        """
+        return self.connection().execute(
+            "INSERT INTO events (kind, worker_id, payload) VALUES (?, ?, ?)",
+            (kind, worker_id, payload)).lastrowid
+
+    def get_pending_events(self):
+        """
+        Returns the events that have not been handled yet, oldest first.
+
+        Returns
+        -------
+
+        list of tuple:
+            The id, kind, worker id and payload of each event.
+        """
+        return self.connection().execute(
+            "SELECT id, kind, worker_id, payload FROM events WHERE done = 0 ORDER BY id").fetchall()
+
+    def complete_event(self, event_id, response=None):
+        """
+        Marks an event as handled. Events with a response are kept until the
+        response is collected, the others are removed.
+        """
+        connection = self.connection()
+        if response is None:
+            connection.execute("DELETE FROM events WHERE id = ?", (event_id,))
+        else:
+            connection.execute("UPDATE events SET done = 1, payload = NULL, response = ? WHERE id = ?",
+                               (response, event_id))
+
+    def collect_event_response(self, event_id):
+        """
+        Returns the response to a handled event, removing the event.
+
+        Returns
+        -------
+
+        str:
+            The response, or None if the event has not been handled yet.
+        """
+        connection = self.connection()
+        row = connection.execute("SELECT response FROM events WHERE id = ? AND done = 1", (event_id,)).fetchone()
+        if row is None:
+            return None
+        connection.execute("DELETE FROM events WHERE id = ?", (event_id,))
+        return row[0]
+
+    # Aggregation lease
+
+    def acquire_lease(self, owner, ttl, now=None):
+        """
+        Acquires or renews the lease naming the process that owns the
+        aggregation. The lease can only be taken over once it has expired.
+
+        Parameters
+        ----------
+
+        owner: str
+            The id of the process.
+
+        ttl: float
+            The number of seconds the lease is valid for.
+
+        now: float (default None)
+            The current (wall clock) time, time.time() if None.
+
+        Returns
+        -------
+
+        bool:
+            True if the process holds the lease.
+        """
+        now = time.time() if now is None else now
+        connection = self.connection()
+        connection.execute("INSERT OR IGNORE INTO lease (id, owner, expires) VALUES (0, NULL, 0)")
+        cursor = connection.execute(
+            "UPDATE lease SET owner = ?, expires = ? WHERE id = 0 AND (owner = ? OR owner IS NULL OR expires < ?)",
+            (owner, now + ttl, owner, now))
+        return cursor.rowcount == 1
@@ -0,0 +1,179 @@
+"""
+A worker manager, for multi-process DCFServers, that keeps the state of the
+workers in the SharedState rather than in memory.
+"""
+import time
+import secrets
+
+from dc_federated.backend._constants import INVALID_WORKER, WORKER_ID_KEY, \
+    REGISTRATION_STATUS_KEY, PUBLIC_KEY_STR, WID_LEN, CHALLENGE_NONCE_BYTES, LAST_SEEN_KEY
+from dc_federated.backend.backend_utils import message_seriously_wrong
+from dc_federated.backend._challenge_store import ChallengeStore
+from dc_federated.backend._worker_manager import WorkerManager
+
+from tinydb import Query
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+class SharedChallengeStore(ChallengeStore):
+    """
+    A ChallengeStore that keeps the outstanding challenge phrases in the
+    SharedState, so that a worker can be given a challenge by one process
+    and answer it to another. The challenge rate limits are still applied
+    by each process separately.
+
+    Parameters
+    ----------
+
+    shared_state: SharedState
+        The shared state.
+
+    **kwargs:
+        The parameters of the ChallengeStore. The clock must measure the
+        same time in all the processes, as time.monotonic does.
+    """
+    def __init__(self, shared_state, **kwargs):
+        super().__init__(**kwargs)
+        self.shared_state = shared_state
+
+    def issue(self, worker_id):
+        if not self._consume_token(worker_id, self.clock()):
+            return None
+        challenge_phrase = secrets.token_hex(CHALLENGE_NONCE_BYTES)
+        self.shared_state.set_challenge(worker_id, challenge_phrase, self.clock())
+        return challenge_phrase
+
+    def consume(self, worker_id):
+        challenge = self.shared_state.pop_challenge(worker_id)
+        if challenge is None:
+            return None
+        challenge_phrase, time_issued = challenge
+        if self.clock() - time_issued > self.ttl:
+            return None
+        return challenge_phrase
+
+    def forget(self, worker_id):
+        self.shared_state.pop_challenge(worker_id)
+        self._token_buckets.pop(worker_id, None)
+
+    def __len__(self):
+        return self.shared_state.count_challenges()
+
+
+class SharedWorkerManager(WorkerManager):
+    """
+    A WorkerManager whose workers, registration status, last contact times
+    and challenge phrases are kept in the SharedState, so that all the
+    processes of a multi-process DCFServer agree on them. The public keys
+    of the workers are also kept there, and loaded into the memory of each
+    process when first needed.
+
+    Parameters
+    ----------
+
+    shared_state: SharedState
+        The shared state.
+
+    *args, **kwargs:
+        The parameters of the WorkerManager.
+    """
+    def __init__(self, shared_state, *args, **kwargs):
+        self.shared_state = shared_state
+        super().__init__(*args, **kwargs)
+        self.challenge_phrases = SharedChallengeStore(shared_state,
+                                                      ttl=self.challenge_phrases.ttl,
+                                                      rate=self.challenge_phrases.rate,
+                                                      burst=self.challenge_phrases.burst)
+
+    def _add_worker(self, public_key_str):
+        worker_id = self.generate_id_for_worker(public_key_str)
+        if self.do_public_key_auth and public_key_str not in self.public_keys:
+            err = message_seriously_wrong("trying to add worker without first adding its public key")
+            logger.error(err)
+            return err, False
+        public_key = public_key_str if self.do_public_key_auth else None
+        if self.shared_state.add_worker(worker_id, public_key, self.clock(), time.time()):
+            if self.public_keys_db is not None and \
+                    len(self.public_keys_db.search(Query()[PUBLIC_KEY_STR] == public_key_str)) == 0:
+                self.public_keys_db.insert({PUBLIC_KEY_STR: public_key_str})
+            logger.info(
+                f"Successfully added worker with public key (short) {public_key_str[0:WID_LEN]}")
+            return worker_id, True
+        else:
+            logger.info(f"Worker with public key (short) {public_key_str[0:WID_LEN]} was added previously "
+                        "- no additional actions taken.")
+            return worker_id, False
+
+    def set_registration_status(self, worker_id, should_register, idle_unregistered=False):
+        old_status = self.shared_state.set_registration_status(worker_id, should_register, idle_unregistered)
+        if old_status is None:
+            logger.warning(
+                f"Please add worker with public key {worker_id[0:WID_LEN]} before trying to change registration status.")
+            return INVALID_WORKER
+        logger.info(f"Set registration status of worker {worker_id[0:WID_LEN]} from {old_status} to {should_register}.")
+        return worker_id
+
+    def remove_worker(self, worker_id):
+        if not self.shared_state.remove_worker(worker_id):
+            logger.warning(f"Attempt to remove non-existent worker {worker_id[0:WID_LEN]}.")
+            return INVALID_WORKER
+        self.challenge_phrases.forget(worker_id)
+        if worker_id in self.public_keys:
+            self.delete_public_key(worker_id)
+        if self.public_keys_db is not None:
+            self.public_keys_db.remove(Query()[PUBLIC_KEY_STR] == worker_id)
+        logger.info(f"Worker {worker_id[0:WID_LEN]} was removed - this worker will "
+                    f"no longer be allowed to register or participate in federated learning. ")
+        return worker_id
+
+    def get_keys(self):
+        return self.shared_state.get_public_keys()
+
+    def authenticate_worker(self, public_key_str, signed_message, message_to_check=None):
+        if self.do_public_key_auth:
+            # the worker may have been added or removed by another process
+            worker = self.shared_state.get_worker(public_key_str)
+            if worker is None or worker[0] is None:
+                self.public_keys.pop(public_key_str, None)
+            elif public_key_str not in self.public_keys:
+                self.add_public_key(public_key_str)
+        return super().authenticate_worker(public_key_str, signed_message, message_to_check)
+
+    def get_worker_list(self):
+        return [{WORKER_ID_KEY: worker_id,
+                 REGISTRATION_STATUS_KEY: bool(registered),
+                 LAST_SEEN_KEY: last_seen_time}
+                for worker_id, registered, _, last_seen_time in self.shared_state.get_workers()]
+
+    def mark_worker_seen(self, worker_id):
+        self.shared_state.mark_worker_seen(worker_id, self.clock(), time.time())
+
+    def get_last_seen_time(self, worker_id):
+        worker = self.shared_state.get_worker(worker_id)
+        return None if worker is None else worker[4]
+
+    def get_idle_workers(self, idle_time):
+        cutoff = self.clock() - idle_time
+        return [{WORKER_ID_KEY: worker_id,
+                 REGISTRATION_STATUS_KEY: True,
+                 LAST_SEEN_KEY: last_seen_time}
+                for worker_id, registered, last_seen_clock, last_seen_time in self.shared_state.get_workers()
+                if registered and last_seen_clock is not None and last_seen_clock < cutoff]
+
+    def unregister_idle_worker(self, worker_id):
+        return self.set_registration_status(worker_id, False, idle_unregistered=True)
+
+    def is_worker_idle_unregistered(self, worker_id):
+        worker = self.shared_state.get_worker(worker_id)
+        return worker is not None and bool(worker[2])
+
+    def is_worker_allowed(self, worker_id):
+        return self.shared_state.get_worker(worker_id) is not None
+
+    def is_worker_registered(self, worker_id):
+        worker = self.shared_state.get_worker(worker_id)
+        return worker is not None and bool(worker[1])
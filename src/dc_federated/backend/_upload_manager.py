@@ -0,0 +1,214 @@
+"""
+Keeps track of the chunked model update uploads for the DCFServer.
+"""
+import time
+import secrets
+import hashlib
+
+from dc_federated.backend._constants import WID_LEN
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+class UploadSession(object):
+    """
+    The state of a single chunked upload.
+
+    Parameters
+    ----------
+
+    upload_id: str
+        The id of the upload.
+
+    worker_id: str
+        The id of the worker uploading the update.
+
+    size: int
+        The size in bytes of the (compressed) update.
+
+    signed_phrase: str
+        The sha256 hash of the uncompressed update, signed by the worker.
+
+    time_started: float
+        The time the upload was started.
+    """
+    def __init__(self, upload_id, worker_id, size, signed_phrase, time_started):
+        self.upload_id = upload_id
+        self.worker_id = worker_id
+        self.size = size
+        self.signed_phrase = signed_phrase
+        self.data = bytearray()
+        self.offset = 0
+        self.last_active = time_started
+        # the response to the update, kept once the upload is complete in
+        # case the worker did not receive it
+        self.response = None
+
+    def is_complete(self):
+        return self.offset == self.size
+
+
+class UploadManager(object):
+    """
+    Keeps the partially received model updates sent in chunks by the workers.
+    Each worker can have at most one upload in progress, and uploads that
+    have not received a chunk for a given time are dropped.
+
+    Parameters
+    ----------
+
+    ttl: float (default 600)
+        The number of seconds after the last received chunk for which an
+        upload is kept.
+
+    max_upload_size: int (default None)
+        The maximum size in bytes of an upload. If None, the size is not limited.
+
+    clock: () -> float (default time.monotonic)
+        The clock used to measure time.
+    """
+    def __init__(self, ttl=600, max_upload_size=None, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_upload_size = max_upload_size
+        self.clock = clock
+        # worker_id -> UploadSession
+        self.sessions = {}
+
+    def _expire(self, now):
+        """
+        Drops the uploads that have not been active for longer than the ttl.
+        """
+        for worker_id in [worker_id for worker_id, session in self.sessions.items()
+                          if now - session.last_active > self.ttl]:
+            logger.info(f"Dropping the stale upload {self.sessions[worker_id].upload_id[0:WID_LEN]}.")
+            del self.sessions[worker_id]
+
+    def start(self, worker_id, size, signed_phrase):
+        """
+        Starts a new upload for the worker, replacing any upload the worker
+        had in progress.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+
+        size: int
+            The size in bytes of the update to be uploaded.
+
+        signed_phrase: str
+            The signed hash of the update.
+
+        Returns
+        -------
+
+        UploadSession:
+            The new upload, or None if the size is not valid.
+        """
+        if size < 0 or (self.max_upload_size is not None and size > self.max_upload_size):
+            return None
+        now = self.clock()
+        self._expire(now)
+        session = UploadSession(secrets.token_hex(16), worker_id, size, signed_phrase, now)
+        self.sessions[worker_id] = session
+        return session
+
+    def get(self, worker_id, upload_id):
+        """
+        Returns the upload in progress for the worker with the given id.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+
+        upload_id: str
+            The id of the upload.
+
+        Returns
+        -------
+
+        UploadSession:
+            The upload, or None if there is no such upload.
+        """
+        self._expire(self.clock())
+        session = self.sessions.get(worker_id)
+        if session is None or not secrets.compare_digest(session.upload_id, upload_id):
+            return None
+        return session
+
+    def add_chunk(self, session, offset, chunk, checksum):
+        """
+        Appends the chunk to the upload if it starts at the current offset of
+        the upload and matches the checksum. Chunks that were already received,
+        for instance because the acknowledgement was lost, are ignored.
+
+        Parameters
+        ----------
+
+        session: UploadSession
+            The upload.
+
+        offset: int
+            The offset in the update the chunk starts at.
+
+        chunk: bytes
+            The chunk.
+
+        checksum: str
+            The hex sha256 hash of the chunk.
+
+        Returns
+        -------
+
+        bool:
+            True if the chunk was added or had already been received, False if it
+            was rejected.
+        """
+        session.last_active = self.clock()
+        if offset + len(chunk) <= session.offset:
+            return True
+        if offset != session.offset or offset + len(chunk) > session.size:
+            return False
+        if hashlib.sha256(chunk).hexdigest() != checksum:
+            logger.warning(f"Checksum mismatch for the chunk at offset {offset} of upload "
+                           f"{session.upload_id[0:WID_LEN]}.")
+            return False
+        session.data += chunk
+        session.offset += len(chunk)
+        return True
+
+    def complete(self, session, response):
+        """
+        Marks the upload as complete, releasing the received data. The upload
+        is kept, along with the response to the update, until it expires so
+        that a worker that missed the response can still get it.
+
+        Parameters
+        ----------
+
+        session: UploadSession
+            The upload.
+
+        response: str
+            The response to the update.
+        """
+        session.data = None
+        session.response = response
+
+    def finish(self, worker_id):
+        """
+        Removes the upload of the worker.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+        """
+        self.sessions.pop(worker_id, None)
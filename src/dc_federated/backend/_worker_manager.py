@@ -2,13 +2,17 @@
 The worker manager for the DCFServer class.
 """
 import os
-import hashlib
 import time
+import secrets
 import json
 
 from dc_federated.backend._constants import INVALID_WORKER, WORKER_ID_KEY, \
-    REGISTRATION_STATUS_KEY, PUBLIC_KEY_STR, WID_LEN
+    REGISTRATION_STATUS_KEY, PUBLIC_KEY_STR, WID_LEN, RATE_LIMITED_WORKER, CHALLENGE_NONCE_BYTES, \
+    NO_AUTHENTICATION, LAST_SEEN_KEY
 from dc_federated.backend.backend_utils import message_seriously_wrong
+from dc_federated.backend._challenge_store import ChallengeStore
+from dc_federated.backend._metrics import ServerMetrics
+from dc_federated.backend._async_logging import log_routine
 from nacl.encoding import HexEncoder
 from nacl.exceptions import BadSignatureError
 from nacl.signing import VerifyKey
@@ -47,17 +51,46 @@ class WorkerManager(object):
 
     path_to_keys_db: str
         Path to the database of workers' public keys.
+
+    challenge_ttl: float (default 60)
+        The number of seconds for which a challenge phrase remains valid.
+
+    challenge_rate: float (default 1.0)
+        The average number of challenge phrases per second a worker is
+        allowed to request. If None, the requests are not rate limited.
+
+    challenge_burst: int (default 10)
+        The number of challenge phrases a worker is allowed to request in
+        a single burst.
+
+    clock: () -> float (default time.monotonic)
+        The clock used to measure how long workers have been idle.
+
+    metrics: ServerMetrics (default None)
+        The metrics to record the signature verification times to.
     """
     def __init__(self,
                  server_mode_safe,
                  key_list_file,
                  load_last_session_workers=True,
-                 path_to_keys_db='.keys_db.json'):
+                 path_to_keys_db='.keys_db.json',
+                 challenge_ttl=60,
+                 challenge_rate=1.0,
+                 challenge_burst=10,
+                 clock=time.monotonic,
+                 metrics=None):
         self.public_keys = {}
+        self.metrics = ServerMetrics() if metrics is None else metrics
         self.allowed_workers = []
         self.registered_workers = {}
+        self.clock = clock
+        # worker_id -> (clock time, wall clock time) of the last contact
+        self.last_seen = {}
+        self.idle_unregistered_workers = set()
         self.public_keys_db = None
-        self.challenge_phrases = {}
+        self.challenge_phrases = ChallengeStore(ttl=challenge_ttl,
+                                                rate=challenge_rate,
+                                                burst=challenge_burst)
 
         if not server_mode_safe:
             if key_list_file is not None:
@@ -200,6 +233,7 @@ class WorkerManager(object):
         if worker_id not in self.allowed_workers:
             self.allowed_workers.append(worker_id)
             self.registered_workers[worker_id] = False
+            self.last_seen[worker_id] = (self.clock(), time.time())
             if self.public_keys_db is not None:
                     self.public_keys_db.insert({PUBLIC_KEY_STR: public_key_str})
             logger.info(
@@ -232,6 +266,7 @@ class WorkerManager(object):
         if worker_id in self.allowed_workers:
             old_status = self.registered_workers[worker_id]
             self.registered_workers[worker_id] = should_register
+            self.idle_unregistered_workers.discard(worker_id)
             logger.info(f"Set registration status of worker {worker_id[0:WID_LEN]} from {old_status} to {should_register}.")
             return worker_id
         else:
@@ -257,6 +292,9 @@ class WorkerManager(object):
         """
         if worker_id in self.allowed_workers:
             self.allowed_workers.remove(worker_id)
+            self.last_seen.pop(worker_id, None)
+            self.idle_unregistered_workers.discard(worker_id)
+            self.challenge_phrases.forget(worker_id)
             self.delete_public_key(worker_id)
             if self.public_keys_db is not None:
                 doc_ids = [doc.doc_id
@@ -367,13 +405,13 @@ class WorkerManager(object):
         if self.do_public_key_auth:
             return public_key_str
         else:
-            return hashlib.sha224(str(time.time()).encode(
-                    'utf-8')).hexdigest() + '_unauthenticated'
+            return secrets.token_hex(CHALLENGE_NONCE_BYTES) + '_unauthenticated'
 
     def get_challenge_phrase(self, worker_id):
         """
         Returns a challenge phrase for the worker to sign using
-        digital signatures for worker authentication.
+        digital signatures for worker authentication. The phrase is a
+        random nonce that expires after challenge_ttl seconds.
 
         Parameters
         ----------
@@ -384,13 +422,21 @@ class WorkerManager(object):
         Returns
         -------
         str:
-            The challenge phrase.
+            The challenge phrase, or RATE_LIMITED_WORKER if the worker has
+            requested too many challenge phrases. In unsafe mode, where
+            challenges are not verified, this is always NO_AUTHENTICATION.
         """
-        if worker_id not in self.allowed_workers:
+        if not self.is_worker_allowed(worker_id):
             return INVALID_WORKER
-        self.challenge_phrases[worker_id] = \
-            hashlib.sha224(str(time.time()).encode('utf-8')).hexdigest()
-        return self.challenge_phrases[worker_id]
+        if not self.do_public_key_auth:
+            # challenges are not checked in unsafe mode, so there is
+            # nothing to store or rate limit.
+            return NO_AUTHENTICATION
+        challenge_phrase = self.challenge_phrases.issue(worker_id)
+        if challenge_phrase is None:
+            logger.warning(f"Worker {worker_id[0:WID_LEN]} exceeded the challenge phrase rate limit.")
+            return RATE_LIMITED_WORKER
+        return challenge_phrase
 
     def verify_challenge(self, worker_id, signed_challenge):
         """
@@ -414,18 +460,13 @@ class WorkerManager(object):
         """
         if not self.do_public_key_auth:
             return True
-        if worker_id not in self.challenge_phrases:
-            logger.error(f"Worker id {worker_id[0:WID_LEN]} not found in challenge phrases")
+        challenge_phrase = self.challenge_phrases.consume(worker_id)
+        if challenge_phrase is None:
+            logger.error(f"No valid challenge phrase found for worker id {worker_id[0:WID_LEN]}")
             return False
-        if self.challenge_phrases[worker_id] is None:
-            logger.error(f"Challenge phrase for worker id {worker_id[0:WID_LEN]} is None")
-            return False
-
-        success = self.authenticate_worker(
-            worker_id, signed_challenge, self.challenge_phrases[worker_id].encode())
-        self.challenge_phrases[worker_id] = None
 
-        return success
+        return self.authenticate_worker(
+            worker_id, signed_challenge, challenge_phrase.encode())
 
     def authenticate_worker(self, public_key_str, signed_message, message_to_check=None):
         """
@@ -438,8 +479,8 @@ class WorkerManager(object):
         public_key_str: str
             UFT-8 encoded version of the public key
 
-        signed_message: str
-            message signed with the public key.
+        signed_message: str or bytes
+            message signed with the public key, as a hex string or as raw bytes.
 
         message_to_check: object (default None)
             If given confirms that signed message corresponds to this string.
@@ -457,8 +498,12 @@ class WorkerManager(object):
             if public_key_str not in self.public_keys:
                 logger.error(f"Unknown public key (short) {public_key_str[0:WID_LEN]}.")
                 return False
-            v = self.public_keys[public_key_str].verify(
-                signed_message.encode(), encoder=HexEncoder)
+            with self.metrics.signature_verification_duration.time():
+                if isinstance(signed_message, bytes):
+                    v = self.public_keys[public_key_str].verify(signed_message)
+                else:
+                    v = self.public_keys[public_key_str].verify(
+                        signed_message.encode(), encoder=HexEncoder)
             if message_to_check is not None:
                 if v != message_to_check:
                     logger.error(f"Message {message_to_check} does not match decrypted message {v}")
@@ -474,8 +519,8 @@ class WorkerManager(object):
             logger.error(f"Exception when trying to authenticate worker {str(e)}")
             return False
         else:
-            logger.info(
-                f"Successfully authenticated worker with public key (short) {public_key_str[0:WID_LEN]}.")
+            log_routine(logger, "Successfully authenticated worker with public key (short) %s.",
+                        public_key_str[0:WID_LEN])
             return True
 
     def get_worker_list(self):
@@ -486,12 +531,109 @@ class WorkerManager(object):
         -------
 
         list of dict:
-            Each dictionary has keys WORKER_ID_KEY, REGISTRATION_STATUS_KEY giving the
-            values.
+            Each dictionary has keys WORKER_ID_KEY, REGISTRATION_STATUS_KEY and
+            LAST_SEEN_KEY giving the values.
         """
-        return [{WORKER_ID_KEY: worker_id, REGISTRATION_STATUS_KEY: value}
+        return [{WORKER_ID_KEY: worker_id,
+                 REGISTRATION_STATUS_KEY: value,
+                 LAST_SEEN_KEY: self.get_last_seen_time(worker_id)}
                 for worker_id, value in self.registered_workers.items()]
 
+    def mark_worker_seen(self, worker_id):
+        """
+        Records that the worker has just been in contact with the server. This
+        should only be called once the worker has been authenticated.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+        """
+        if worker_id in self.registered_workers:
+            self.last_seen[worker_id] = (self.clock(), time.time())
+
+    def get_last_seen_time(self, worker_id):
+        """
+        Returns the wall clock time at which the worker was last in contact
+        with the server.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+
+        Returns
+        -------
+
+        float:
+            The time as a POSIX timestamp, or None if the worker is unknown.
+        """
+        if worker_id not in self.last_seen:
+            return None
+        return self.last_seen[worker_id][1]
+
+    def get_idle_workers(self, idle_time):
+        """
+        Returns the registered workers that have not been in contact with the
+        server for at least idle_time seconds.
+
+        Parameters
+        ----------
+
+        idle_time: float
+            The number of seconds without contact after which a worker is
+            considered idle.
+
+        Returns
+        -------
+
+        list of dict:
+            Each dictionary has keys WORKER_ID_KEY, REGISTRATION_STATUS_KEY and
+            LAST_SEEN_KEY giving the values.
+        """
+        cutoff = self.clock() - idle_time
+        return [{WORKER_ID_KEY: worker_id,
+                 REGISTRATION_STATUS_KEY: True,
+                 LAST_SEEN_KEY: self.get_last_seen_time(worker_id)}
+                for worker_id, registered in self.registered_workers.items()
+                if registered and worker_id in self.last_seen and self.last_seen[worker_id][0] < cutoff]
+
+    def unregister_idle_worker(self, worker_id):
+        """
+        Unregisters a worker because it has been idle, remembering the reason
+        so that the worker can be told it may register again.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+
+        Returns
+        -------
+
+        str:
+            The worker id if operation was successful and INVALID_WORKER otherwise.
+        """
+        worker_id = self.set_registration_status(worker_id, False)
+        if worker_id != INVALID_WORKER:
+            self.idle_unregistered_workers.add(worker_id)
+        return worker_id
+
+    def is_worker_idle_unregistered(self, worker_id):
+        """
+        Whether or not the worker was unregistered because it was idle.
+
+        Returns
+        -------
+
+        bool:
+            True if the worker was unregistered for being idle, False otherwise.
+        """
+        return worker_id in self.idle_unregistered_workers
+
     def is_worker_allowed(self, worker_id):
         """
         Whether or not the worker is allowed to register and/or
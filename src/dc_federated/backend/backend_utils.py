@@ -1,7 +1,12 @@
 """
 Some common utility functions.
 """
-from dc_federated.backend._constants import GLOBAL_MODEL, GLOBAL_MODEL_VERSION
+import io
+import json
+import socket
+import select
+
+from dc_federated.backend._constants import GLOBAL_MODEL, GLOBAL_MODEL_VERSION, DOWNLOAD_CHUNK_SIZE
 
 
 def create_model_dict(model_serialized, model_version):
@@ -84,9 +89,222 @@ def verify_dict(dct, keys, data_types):
             if key not in dct or not isinstance(dct[key], vt) ]
 
 
+def format_server_sent_event(event, data):
+    """
+    Formats an event to be sent to a client over a server-sent events stream.
+
+    Parameters
+    ----------
+
+    event: str
+        The type of the event.
 
+    data: dict
+        The data of the event, sent as JSON.
+
+    Returns
+    -------
+
+    str:
+        The formatted event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def parse_server_sent_events(lines):
+    """
+    Parses the events of a server-sent events stream. Comments, used by the
+    server to keep the stream alive, are skipped.
+
+    Parameters
+    ----------
+
+    lines: iterable of str
+        The lines of the stream.
+
+    Returns
+    -------
+
+    generator of (str, dict):
+        The type and the (JSON decoded) data of each event.
+    """
+    event, data = None, []
+    for line in lines:
+        if line == '':
+            if event is not None and len(data) > 0:
+                yield event, json.loads('\n'.join(data))
+            event, data = None, []
+        elif line.startswith('event:'):
+            event = line[len('event:'):].strip()
+        elif line.startswith('data:'):
+            data.append(line[len('data:'):].strip())
+
+
+def get_request_socket(environ):
+    """
+    Returns the client socket for the request with the given WSGI environment
+    if the server exposes it. This must be called before the body of the
+    request is read, because bottle replaces wsgi.input with an in-memory
+    copy of the body once it has been read.
+
+    Parameters
+    ----------
+
+    environ: dict
+        The WSGI environment of the request.
+
+    Returns
+    -------
+
+    socket.socket:
+        The client socket, or None if it could not be found.
+    """
+    if 'gunicorn.socket' in environ:
+        return environ['gunicorn.socket']
+    wsgi_input = environ.get('wsgi.input')
+    # gevent.pywsgi wraps the socket file in its own Input object.
+    wsgi_input = getattr(wsgi_input, 'rfile', wsgi_input)
+    # wsgiref and gevent.pywsgi read from a buffered socket file.
+    raw = getattr(wsgi_input, 'raw', None)
+    return getattr(raw, '_sock', None)
+
+
+def read_request_body(environ):
+    """
+    Reads the body of a request straight from the WSGI input stream into a
+    single buffer, rather than letting bottle first copy it into a spooled
+    file. The body must not have been read by bottle before, and its
+    length must be given in the Content-Length header.
+
+    Parameters
+    ----------
+
+    environ: dict
+        The WSGI environment of the request.
+
+    Returns
+    -------
+
+    bytearray:
+        The body of the request.
+    """
+    wsgi_input = environ['wsgi.input']
+    body = bytearray(int(environ.get('CONTENT_LENGTH') or 0))
+    view = memoryview(body)
+    pos = 0
+    while pos < len(body):
+        chunk = wsgi_input.read(min(DOWNLOAD_CHUNK_SIZE, len(body) - pos))
+        if len(chunk) == 0:
+            raise ValueError(f"The request body ended after {pos} of {len(body)} bytes.")
+        view[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+    return body
+
+
+def is_readable(sock):
+    """
+    Checks, without waiting, whether a socket has data or an end-of-file to
+    read. Uses poll where available, as select cannot watch the sockets
+    numbered 1024 or more that a server with many waiting clients holds.
+
+    Parameters
+    ----------
+
+    sock: socket.socket
+        The socket.
+
+    Returns
+    -------
+
+    bool:
+        True if the socket is readable.
+    """
+    if hasattr(select, 'poll'):
+        poller = select.poll()
+        poller.register(sock, select.POLLIN)
+        return len(poller.poll(0)) > 0
+    readable, _, _ = select.select([sock], [], [], 0)
+    return len(readable) > 0
+
+
+def is_client_connected(sock):
+    """
+    Checks, without blocking, whether the client at the other end of the
+    socket is still connected. This is meant for requests that are waiting
+    for a response, during which the client has nothing to send, so a
+    readable socket means that the client has closed the connection. For
+    plain sockets this is confirmed by peeking for an end-of-file, while
+    for SSL sockets, where peeking is not possible, any readable data
+    (typically the TLS close_notify alert) is taken as a disconnection.
+
+    Parameters
+    ----------
+
+    sock: socket.socket
+        The client socket, or None if it is unknown.
+
+    Returns
+    -------
+
+    bool:
+        True if the client is connected, False if it has disconnected and
+        None if the socket is unknown.
+    """
+    if sock is None:
+        return None
+    try:
+        if sock.fileno() < 0:
+            return False
+        if hasattr(sock, 'pending'):
+            if sock.pending() > 0:
+                return False
+            return not is_readable(sock)
+        if not is_readable(sock):
+            return True
+        return len(sock.recv(1, socket.MSG_PEEK)) > 0
+    except OSError:
+        return False
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Read-only binary file object reading from a bytes-like object without
+    copying it, unlike io.BytesIO which copies anything but bytes. Useful
+    for loading a model (e.g. with torch.load) from the memoryview returned
+    by DCFWorker.get_global_model when streaming is enabled.
+
+    Parameters
+    ----------
+
+    buffer: bytes-like
+        The data to read from.
+    """
+    def __init__(self, buffer):
+        self.view = memoryview(buffer).cast('B')
+        self.pos = 0
 
+    def readable(self):
+        return True
 
+    def seekable(self):
+        return True
 
+    def readinto(self, b):
+        data = self.view[self.pos:self.pos + len(b)]
+        b[0:len(data)] = data
+        self.pos += len(data)
+        return len(data)
 
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        elif whence == io.SEEK_END:
+            self.pos = len(self.view) + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}.")
+        return self.pos
 
+    def tell(self):
+        return self.pos
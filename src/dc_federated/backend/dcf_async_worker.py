@@ -0,0 +1,318 @@
+"""
+Defines an asyncio version of the DCFWorker, meant for simulating a large
+number of workers from a single process.
+"""
+import json
+import zlib
+import asyncio
+import hashlib
+import msgpack
+
+from dc_federated.backend._constants import *
+from dc_federated.backend._async_http import AsyncConnectionPool, encode_multipart
+from dc_federated.backend.dcf_worker import DCFWorker
+from dc_federated.backend.backend_utils import is_valid_model_dict
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+class AsyncDCFWorker(object):
+    """
+    This class implements the same worker API for the DCFServer as the
+    DCFWorker, with coroutines in place of the blocking calls. Any number
+    of AsyncDCFWorker objects can run in the same event loop, and they can
+    share a single AsyncConnectionPool so that the connections to the server
+    are reused across worker identities.
+
+    Parameters
+    ----------
+
+    server_protocol: str
+        The protocol to use, either 'http' or 'https'.
+
+    server_host_ip: str
+        The ip-address of the host of the server.
+
+    server_port: int
+        The port at which the serer should listen to
+
+    global_model_version_changed_callback: dict -> ()
+        The callback to run if server status has changed. The function
+        is expected to take a dictionary with two entries:
+        GLOBAL_MODEL: serialized version of the global model.
+        GLOBAL_MODEL_VERSION: str giving the version of the current
+        global model.
+
+    get_worker_version_of_global_model: () -> object
+        This function is expected to return the version of the last global
+        model that the worker received.
+
+    private_key_file: str
+        Name of the private key to use to authenticate the worker to the server.
+        No authentication is performed if a None is passed.  Name of the
+        corresponding public key file is assumed to be key_file + '.pub'
+
+    connection_pool: AsyncConnectionPool (default None)
+        The pool of connections to send the requests through. A pool is
+        created for this worker if None is given.
+    """
+    def __init__(
+            self,
+            server_protocol,
+            server_host_ip,
+            server_port,
+            global_model_version_changed_callback,
+            get_worker_version_of_global_model,
+            private_key_file,
+            connection_pool=None):
+        self.server_protocol = server_protocol
+
+        self.server_host_ip = server_host_ip
+        self.server_port = server_port
+        self.global_model_version_changed_callback = global_model_version_changed_callback
+        self.get_worker_version_global_model = get_worker_version_of_global_model
+        self.private_key, self.public_key_str = DCFWorker.get_keys_from_file(private_key_file)
+
+        self.server_loc = f"{self.server_protocol}://{self.server_host_ip}:{self.server_port}"
+        self.worker_id = None
+
+        self.connection_pool = AsyncConnectionPool() if connection_pool is None else connection_pool
+
+        if server_protocol == 'http' and server_host_ip != 'localhost':
+            logger.warning("Security alert: https is not enabled!")
+
+    def get_signed_phrase(self, phrase_to_sign=WORKER_AUTHENTICATION_PHRASE):
+        """
+        Returns the the authentication string signed using the private key of this
+        worker.
+
+        Parameters
+        ----------
+
+        phrase_to_sign: bytes (default WORKER_AUTHENTICATION_PHRASE)
+            The phrase to sign with the public key of this worker
+
+        Returns
+        -------
+        str:
+            The hex string corresponding to the signed string.
+        """
+        if self.private_key is None:
+            logger.warning(
+                "Unable to sign message - no private key file provided.")
+            return "No private key was provided when worker was started."
+        else:
+            return self.private_key.sign(phrase_to_sign).hex()
+
+    def get_public_key_str(self):
+        """
+        Returns the the string version of the public key for the private key of
+        the worker.
+
+        Returns
+        -------
+        str:
+            The hex string corresponding to the public key string.
+        """
+        if self.public_key_str is None:
+            logger.warning(
+                "No public key file provided - server side authentication will not succeed.")
+            return "No public key was provided when worker was started."
+
+        return self.public_key_str
+
+    async def post_json(self, route, data):
+        """
+        Posts the data as json to the given route of the server.
+
+        Parameters
+        ----------
+
+        route: str
+            The route to post to.
+
+        data: dict
+            The data to post.
+
+        Returns
+        -------
+
+        bytes:
+            The body of the response.
+        """
+        response = await self.connection_pool.request(
+            'POST', f"{self.server_loc}/{route}", json.dumps(data).encode(),
+            {'Content-Type': 'application/json'})
+        return response.content
+
+    async def register_worker(self):
+        """
+        Returns a registration number for the worker from the server.
+        Each object of this class is registered only once during its lifetime.
+
+        Returns
+        -------
+
+        str:
+            The worker id returned by the server.
+        """
+        if self.worker_id is None:
+            data = {
+                PUBLIC_KEY_STR: self.get_public_key_str(),
+                SIGNED_PHRASE: self.get_signed_phrase()
+            }
+            logger.info(f"Registering public key (short) {data[PUBLIC_KEY_STR][0:WID_LEN]} with server...")
+            self.worker_id = (await self.post_json(REGISTER_WORKER_ROUTE, data)).decode('UTF-8')
+
+            if self.worker_id == INVALID_WORKER:
+                raise ValueError(
+                    f"Server returned {INVALID_WORKER} which means it was unable to authenticate this worker. "
+                    "Please verify that the private key you started this worker with corresponds to the "
+                    "public key shared with the server.")
+
+            else:
+                logger.info(f"Registration for public key (short) {data[PUBLIC_KEY_STR][0:WID_LEN]} done.")
+        return self.worker_id
+
+    async def get_challenge_phrase(self):
+        """
+        Gets a challenge phrase for this worker from the server, waiting and
+        trying again if the worker is rate limited.
+
+        Returns
+        -------
+
+        bytes:
+            The challenge phrase returned by the server, or RATE_LIMITED_WORKER
+            (encoded) if the worker was still rate limited after
+            CHALLENGE_PHRASE_MAX_RETRIES attempts.
+        """
+        for attempt in range(CHALLENGE_PHRASE_MAX_RETRIES):
+            challenge_phrase = (await self.connection_pool.request(
+                'GET', f"{self.server_loc}/{CHALLENGE_PHRASE_ROUTE}/{self.worker_id}")).content
+            if challenge_phrase != RATE_LIMITED_WORKER.encode():
+                return challenge_phrase
+            logger.warning(f"Challenge phrase request for worker {self.worker_id[0:WID_LEN]} was "
+                           f"rate limited - retrying.")
+            await asyncio.sleep(CHALLENGE_PHRASE_RETRY_INTERVAL * (attempt + 1))
+        logger.error(f"Unable to get a challenge phrase for worker {self.worker_id[0:WID_LEN]} - "
+                     f"the server is still rate limiting it.")
+        return RATE_LIMITED_WORKER.encode()
+
+    async def get_global_model(self):
+        """
+        Waits for the global model to change from the version the worker has,
+        using long polling, and then gets it from the server.
+
+        Returns
+        -------
+
+        dict or bytes:
+            The current global model returned by the server, or the error
+            message from the server.
+        """
+        challenge_phrase = await self.get_challenge_phrase()
+        if not DCFWorker.is_valid_challenge_phrase(challenge_phrase):
+            logger.error(f"Unable to get a challenge phrase - received response {challenge_phrase}")
+            logger.error("Global model not retrieved.")
+            return challenge_phrase
+        data = {
+            WORKER_ID_KEY: self.worker_id,
+            LAST_WORKER_MODEL_VERSION: self.get_worker_version_global_model(),
+            SIGNED_PHRASE: self.get_signed_phrase(challenge_phrase)
+        }
+        response = await self.post_json(NOTIFY_ME_IF_GM_VERSION_UPDATED_ROUTE, data)
+        if response != GLOBAL_MODEL_UPDATED_STRING.encode():
+            logger.error(f"Unable to retrieve confirmation global model has changed - received response {response}")
+            logger.error("Global model not retrieved.")
+            await self.register_again_if_idle_unregistered(response)
+            return response
+
+        challenge_phrase = await self.get_challenge_phrase()
+        if not DCFWorker.is_valid_challenge_phrase(challenge_phrase):
+            logger.error(f"Unable to get a challenge phrase - received response {challenge_phrase}")
+            logger.error("Global model not retrieved.")
+            return challenge_phrase
+        data[SIGNED_PHRASE] = self.get_signed_phrase(challenge_phrase)
+        del data[LAST_WORKER_MODEL_VERSION]
+        response = await self.post_json(RETURN_GLOBAL_MODEL_ROUTE, data)
+        if await self.register_again_if_idle_unregistered(response):
+            return response
+        try:
+            model = msgpack.unpackb(zlib.decompress(response))
+            logger.info(f"Received global model for worker {self.worker_id[0:WID_LEN]}")
+            return model
+        except zlib.error as e:
+            logger.error(f"Exception {str(e)} - received error message from server: {response[0:200]}")
+            return response
+
+    async def send_model_update(self, model_update):
+        """
+        Sends the model update from the worker. Worker must register before sending
+        a model update.
+
+        Parameters
+        ----------
+
+        model_update: binary string
+            The model update to send to the server.
+
+        Returns
+        -------
+
+        bytes:
+            The response from the server.
+        """
+        body, content_type = encode_multipart({
+            WORKER_MODEL_UPDATE_KEY: zlib.compress(model_update),
+            SIGNED_PHRASE: self.get_signed_phrase(hashlib.sha256(model_update).digest())
+        })
+        for _ in range(2):
+            response = (await self.connection_pool.request(
+                'POST', f"{self.server_loc}/{RECEIVE_WORKER_UPDATE_ROUTE}/{self.worker_id}",
+                body, {'Content-Type': content_type})).content
+            if not await self.register_again_if_idle_unregistered(response):
+                break
+        return response
+
+    async def register_again_if_idle_unregistered(self, response):
+        """
+        Registers the worker with the server again if the response from the
+        server says that the worker was unregistered for being idle.
+
+        Parameters
+        ----------
+
+        response: bytes
+            The response from the server.
+
+        Returns
+        -------
+
+        bool:
+            True if the worker registered again, False otherwise.
+        """
+        if response != IDLE_UNREGISTERED_WORKER.encode():
+            return False
+        logger.info(f"Worker {self.worker_id[0:WID_LEN]} was unregistered for being idle - registering again.")
+        self.worker_id = None
+        await self.register_worker()
+        return True
+
+    async def run(self):
+        """
+        Runs the main worker loop - this calls the global_model_version_changed_callback
+        every time the global model changes.
+        """
+        try:
+            while True:
+                model_dict = await self.get_global_model()
+                if is_valid_model_dict(model_dict):
+                    self.global_model_version_changed_callback(model_dict)
+        except Exception as e:
+            logger.warning(str(e))
+            logger.info(f"Exiting AsyncDCFWorker {self.worker_id[0:WID_LEN]} run loop.")
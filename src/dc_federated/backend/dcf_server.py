@@ -8,19 +8,35 @@ from gevent import monkey; monkey.patch_all()
 from gevent import Greenlet, queue, pool
 
 import os
+import time
 import json
+import base64
 import os.path
 import zlib
 import msgpack
 import hashlib
+from nacl.signing import SigningKey
+from nacl.encoding import HexEncoder
 
-from bottle import Bottle, run, request, response, auth_basic, ServerAdapter
+from bottle import Bottle, run, request, response, auth_basic, ServerAdapter, static_file
 
 from dc_federated.backend._constants import *
 from dc_federated.backend.backend_utils import *
 from dc_federated.utils import get_host_ip
 from dc_federated.backend.backend_utils import is_valid_model_dict
 from dc_federated.backend._worker_manager import WorkerManager
+from dc_federated.backend._upload_manager import UploadManager
+from dc_federated.backend._download_scheduler import DownloadScheduler
+from dc_federated.backend._shared_state import SharedState
+from dc_federated.backend._shared_worker_manager import SharedWorkerManager
+from dc_federated.backend._aggregation_owner import AggregationOwner
+from dc_federated.backend._peer_registry import PeerRegistry
+from dc_federated.backend._blob_store import BlobStore
+from dc_federated.backend._metrics import ServerMetrics, InstrumentedApplication
+from dc_federated.backend._round_timeline import RoundTimeline
+from dc_federated.backend._profiler import SamplingProfiler
+from dc_federated.backend._leak_detector import LeakDetector
+from dc_federated.backend._async_logging import log_routine, enable_async_logging
 
 import logging
 
@@ -106,6 +122,86 @@ class DCFServer(object):
     model_check_interval: int
         The interval of time between the server checking for an updated
         model for the long polling.
+
+    challenge_ttl: float (default 60)
+        The number of seconds for which a challenge phrase remains valid.
+
+    challenge_rate: float (default 1.0)
+        The average number of challenge phrases per second a worker is
+        allowed to request. If None, the requests are not rate limited.
+
+    challenge_burst: int (default 10)
+        The number of challenge phrases a worker is allowed to request in
+        a single burst.
+
+    worker_idle_timeout: float (default None)
+        The number of seconds without contact after which a registered
+        worker is considered idle. Idle workers are listed via the admin
+        API. If None, the server does not check for idle workers.
+
+    unregister_idle_workers: bool (default False)
+        Whether idle workers should be unregistered automatically.
+
+    liveness_check_interval: float (default 60)
+        The interval in seconds between the checks for idle workers.
+
+    upload_ttl: float (default 600)
+        The number of seconds a chunked model update upload is kept after
+        its last chunk was received, so that the worker can resume it.
+
+    max_upload_size: int (default None)
+        The maximum size in bytes of a chunked model update upload. If None,
+        the size is not limited.
+
+    egress_budget: float (default None)
+        The number of bytes per second the server aims to send to workers
+        downloading a new global model. When set, workers that ask for it are
+        told how long to wait before downloading the model, so that the
+        downloads are spread out rather than all starting when the model is
+        released. If None, the workers download the model straight away.
+
+    shared_state_file: str (default None)
+        If given, the state of the workers, the challenge phrases and the
+        published global model are kept in a SQLite database at this path
+        rather than in memory, so that the server can be run by several
+        processes. Only one of the processes, chosen through a lease in the
+        database, runs the callbacks; the other processes forward the worker
+        registrations and updates to it through the database. Any state left
+        in the database by a previous run is removed.
+
+    num_server_processes: int (default 1)
+        The number of (gunicorn) processes serving the requests. A
+        shared_state_file is needed for more than one process.
+
+    model_signing_key_file: str (default None)
+        The name of a file containing a private key, as generated by the
+        worker_key_pair_tool.py tool, used to sign the sha256 hash of the
+        compressed global model given to workers that download the model
+        from their peers. The workers can check the signature against the
+        corresponding public key. If None, the hash is not signed.
+
+    model_blob_dir: str (default None)
+        If given, each version of the global model is compressed once and
+        written to a file in this directory named by its sha256 hash, and
+        workers download the model straight from the file. The file is sent
+        with the wsgi.file_wrapper of the server (sendfile under gunicorn),
+        and interrupted downloads can be resumed with HTTP Range requests.
+        The compressed model is then not kept in memory. If None, the
+        compressed model is kept in memory and sent from there.
+
+    async_logging: bool (default False)
+        If True, the log records of the process are written by a background
+        thread rather than by the greenlet logging them, and the routine
+        messages logged for each request are sampled - at most
+        LOG_SAMPLE_BURST of each kind are logged every LOG_SAMPLE_PERIOD
+        seconds. Warnings, errors and admin actions are always logged.
+
+    leak_detection: bool (default False)
+        If True, the memory allocations of the process are traced and a
+        snapshot is taken at the start of each round, when the server first
+        sees a new version of the global model (or when the algorithm calls
+        snapshot_memory_round), to report the memory that grows from round
+        to round. This slows the server down and is meant for tests.
     """
     def __init__(
         self,
@@ -124,10 +220,29 @@ class DCFServer(object):
         ssl_keyfile=None,
         ssl_certfile=None,
         model_check_interval=10,
-        debug=False
+        debug=False,
+        challenge_ttl=60,
+        challenge_rate=1.0,
+        challenge_burst=10,
+        worker_idle_timeout=None,
+        unregister_idle_workers=False,
+        liveness_check_interval=60,
+        upload_ttl=600,
+        max_upload_size=None,
+        egress_budget=None,
+        shared_state_file=None,
+        num_server_processes=1,
+        model_signing_key_file=None,
+        model_blob_dir=None,
+        async_logging=False,
+        leak_detection=False
     ):
+        if num_server_processes > 1 and shared_state_file is None:
+            raise ValueError("A shared_state_file is needed to run the server with more than one process.")
         self.server_host_ip = get_host_ip() if server_host_ip is None else server_host_ip
         self.server_port = server_port
+        if async_logging:
+            enable_async_logging()
 
         self.register_worker_callback = register_worker_callback
         self.unregister_worker_callback = unregister_worker_callback
@@ -135,16 +250,99 @@ class DCFServer(object):
         self.is_global_model_most_recent = is_global_model_most_recent
         self.receive_worker_update_callback = receive_worker_update_callback
 
-        self.worker_manager = WorkerManager(server_mode_safe,
-                                            key_list_file,
-                                            load_last_session_workers,
-                                            path_to_keys_db)
+        self.metrics = ServerMetrics()
+        self.round_timeline = RoundTimeline()
+        self.profiler = SamplingProfiler()
+        self.startup_profile_started = False
+        self.num_server_processes = num_server_processes
+        self.shared_state = None
+        self.aggregation_owner = None
+        self.aggregation_owner_greenlet = None
+        if shared_state_file is None:
+            self.worker_manager = WorkerManager(server_mode_safe,
+                                                key_list_file,
+                                                load_last_session_workers,
+                                                path_to_keys_db,
+                                                challenge_ttl=challenge_ttl,
+                                                challenge_rate=challenge_rate,
+                                                challenge_burst=challenge_burst,
+                                                metrics=self.metrics)
+        else:
+            self.shared_state = SharedState(shared_state_file)
+            self.shared_state.clear()
+            self.worker_manager = SharedWorkerManager(self.shared_state,
+                                                      server_mode_safe,
+                                                      key_list_file,
+                                                      load_last_session_workers,
+                                                      path_to_keys_db,
+                                                      challenge_ttl=challenge_ttl,
+                                                      challenge_rate=challenge_rate,
+                                                      challenge_burst=challenge_burst,
+                                                      metrics=self.metrics)
+            # only the process owning the aggregation runs the callbacks, the
+            # others go through the shared state
+            self.aggregation_owner = AggregationOwner(self.shared_state,
+                                                      register_worker_callback,
+                                                      unregister_worker_callback,
+                                                      return_global_model_callback,
+                                                      is_global_model_most_recent,
+                                                      receive_worker_update_callback)
+            self.register_worker_callback = \
+                lambda worker_id: self.shared_state.push_event(REGISTER_WORKER_EVENT, worker_id)
+            self.unregister_worker_callback = \
+                lambda worker_id: self.shared_state.push_event(UNREGISTER_WORKER_EVENT, worker_id)
+            self.return_global_model_callback = self.get_published_global_model
+            self.is_global_model_most_recent = self.is_published_global_model_version
+            self.receive_worker_update_callback = self.forward_worker_update
+            # the published model, cached by each process
+            self.published_model_dict = None
+            self.published_version = None
+            self.published_version_checked = None
+
+        self.upload_manager = UploadManager(upload_ttl, max_upload_size)
+        # each process sends its share of the egress budget
+        self.download_scheduler = None if egress_budget is None else \
+            DownloadScheduler(egress_budget / num_server_processes)
+
+        # (version, compressed model, compressed size, uncompressed size, sha256, signature)
+        # of the latest global model
+        self.compressed_global_model = None
+        self.blob_store = None if model_blob_dir is None else BlobStore(model_blob_dir)
+        self.peer_registry = PeerRegistry()
+        self.model_signing_key = None
+        if model_signing_key_file is not None:
+            with open(model_signing_key_file, 'r') as f:
+                self.model_signing_key = SigningKey(f.read().encode(), encoder=HexEncoder)
 
         self.gevent_pool = pool.Pool(None)
         self.model_version_req_dict = {}
+        # worker_id -> (greenlet, queue) of the model version event subscriptions
+        self.event_subscriptions = {}
         self.model_check_interval = model_check_interval
         self.debug = debug
 
+        self.metrics.add_gauge('dcf_active_long_polls', 'Long polling requests waiting for a new global model.',
+                               lambda: len(self.model_version_req_dict))
+        self.metrics.add_gauge('dcf_event_subscriptions', 'Workers subscribed to global model version events.',
+                               lambda: len(self.event_subscriptions))
+        self.metrics.add_gauge('dcf_gevent_pool_greenlets', 'Greenlets running in the gevent pool of the server.',
+                               lambda: len(self.gevent_pool))
+
+        self.leak_detector = None
+        if leak_detection:
+            self.leak_detector = LeakDetector()
+            self.leak_detector.add_size_probe('model_version_requests', lambda: len(self.model_version_req_dict))
+            self.leak_detector.add_size_probe('event_subscriptions', lambda: len(self.event_subscriptions))
+            self.leak_detector.add_size_probe('challenge_phrases', lambda: len(self.worker_manager.challenge_phrases))
+            self.leak_detector.add_size_probe('upload_sessions', lambda: len(self.upload_manager.sessions))
+            self.leak_detector.add_size_probe('gevent_pool_greenlets', lambda: len(self.gevent_pool))
+            self.leak_detector.start()
+
+        self.worker_idle_timeout = worker_idle_timeout
+        self.unregister_idle_workers = unregister_idle_workers
+        self.liveness_check_interval = liveness_check_interval
+        self.liveness_greenlet = None
+
         self.ssl_enabled = ssl_enabled
 
         if ssl_enabled:
@@ -221,6 +419,23 @@ class DCFServer(object):
         else:
             return {}
 
+    @staticmethod
+    def read_request_data():
+        """
+        Reads the data sent with a request from a worker, either as JSON or,
+        if the worker uses the binary protocol, as msgpack. In the latter case
+        signatures are sent as raw bytes rather than hex strings.
+
+        Returns
+        -------
+
+        object:
+            The decoded data, or None if it could not be decoded.
+        """
+        if request.content_type.split(';')[0].strip() == MSGPACK_CONTENT_TYPE:
+            return msgpack.unpackb(request.body.read())
+        return request.json
+
     def add_and_register_worker(self):
         """
         Registers the worker, adding it to the list of allowed workers
@@ -232,7 +447,7 @@ class DCFServer(object):
         str:
             The id of the new client, or INVALID_WORKER if the process failed.
         """
-        worker_data = request.json
+        worker_data = DCFServer.read_request_data()
         valid_failed = DCFServer.validate_input(worker_data, [PUBLIC_KEY_STR], [str])
         if ERROR_MESSAGE_KEY in valid_failed:
             logger.error(valid_failed[ERROR_MESSAGE_KEY])
@@ -248,9 +463,34 @@ class DCFServer(object):
         if not self.worker_manager.is_worker_registered(worker_id):
             self.worker_manager.set_registration_status(worker_id, True)
             self.register_worker_callback(worker_id)
+        self.worker_manager.mark_worker_seen(worker_id)
+        # lets the worker know that it can switch to the binary protocol
+        response.set_header(BINARY_PROTOCOL_HEADER, BINARY_PROTOCOL_VERSION)
 
         return worker_id
 
+    def unregistered_worker_response(self, worker_id):
+        """
+        Returns the response to send to a worker that is not registered. Workers
+        that were unregistered because they were idle are told so, so that
+        they can register again.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+
+        Returns
+        -------
+
+        str:
+            IDLE_UNREGISTERED_WORKER or UNREGISTERED_WORKER.
+        """
+        if self.worker_manager.is_worker_idle_unregistered(worker_id):
+            return IDLE_UNREGISTERED_WORKER
+        return UNREGISTERED_WORKER
+
     def admin_list_workers(self):
         """
         List all registered workers
@@ -263,6 +503,162 @@ class DCFServer(object):
         """
         return json.dumps(self.worker_manager.get_worker_list())
 
+    def admin_list_idle_workers(self):
+        """
+        List the registered workers that have not been in contact with the
+        server for a given number of seconds, given by the IDLE_TIME_KEY query
+        parameter or worker_idle_timeout by default.
+
+        Returns
+        -------
+
+        str:
+            JSON in string form containing the id of the idle workers, their
+            registration status and the time they were last seen, or an error
+            message if the idle time is not known.
+        """
+        idle_time = request.query.get(IDLE_TIME_KEY)
+        try:
+            idle_time = self.worker_idle_timeout if idle_time is None else float(idle_time)
+        except ValueError:
+            idle_time = None
+        if idle_time is None:
+            return json.dumps({ERROR_MESSAGE_KEY: f"Please provide a valid {IDLE_TIME_KEY} parameter."})
+        return json.dumps(self.worker_manager.get_idle_workers(idle_time))
+
+    def admin_get_metrics(self):
+        """
+        Returns the metrics of this server process in the Prometheus text
+        exposition format.
+
+        Returns
+        -------
+
+        str:
+            The metrics.
+        """
+        response.content_type = METRICS_CONTENT_TYPE
+        return self.metrics.render()
+
+    def admin_list_round_timelines(self):
+        """
+        Lists the rounds whose timelines are kept.
+
+        Returns
+        -------
+
+        str:
+            JSON in string form containing the version, release time and
+            number of events of each round.
+        """
+        return json.dumps(self.round_timeline.list_rounds(), default=str)
+
+    def admin_get_round_timeline(self, version):
+        """
+        Returns the timeline of the round of the given version of the global
+        model, and the breakdown of its critical path.
+
+        Parameters
+        ----------
+
+        version: str
+            The version of the global model, in string form.
+
+        Returns
+        -------
+
+        str:
+            JSON in string form containing the timeline of the round, or an
+            error message if the round is not known.
+        """
+        timeline = self.round_timeline.find_round(version)
+        if timeline is None:
+            return json.dumps({ERROR_MESSAGE_KEY: f"No timeline for global model version {version}."})
+        return json.dumps(dict(timeline, critical_path=RoundTimeline.get_critical_path(timeline)), default=str)
+
+    def admin_start_profiler(self):
+        """
+        Starts profiling this server process for the number of seconds given
+        by PROFILE_DURATION_KEY in the posted JSON.
+
+        Returns
+        -------
+
+        str:
+            A JSON success or error message.
+        """
+        profile_request = request.json
+        valid_failed = DCFServer.validate_input(profile_request, [PROFILE_DURATION_KEY], [(int, float)])
+        if ERROR_MESSAGE_KEY in valid_failed:
+            logger.error(valid_failed[ERROR_MESSAGE_KEY])
+            return json.dumps(valid_failed)
+        duration = min(profile_request[PROFILE_DURATION_KEY], PROFILER_MAX_DURATION)
+        if duration <= 0:
+            return json.dumps({ERROR_MESSAGE_KEY: f"{PROFILE_DURATION_KEY} must be positive."})
+        if not self.profiler.start(duration):
+            return json.dumps({ERROR_MESSAGE_KEY: "The profiler is already running."})
+        return json.dumps({SUCCESS_MESSAGE_KEY: f"Profiling process {os.getpid()} for {duration} seconds."})
+
+    def admin_get_profile(self):
+        """
+        Returns the profile collected in the last profiling window, as
+        collapsed stacks or, if the PROFILE_FORMAT_KEY query parameter is
+        PSTATS_PROFILE_FORMAT, as a pstats file.
+
+        Returns
+        -------
+
+        str or bytes:
+            The profile, or a JSON error message if the profiler is running
+            or has no samples.
+        """
+        if self.profiler.is_running():
+            return json.dumps({ERROR_MESSAGE_KEY: "The profiler is still running."})
+        if len(self.profiler.get_samples()[0]) == 0:
+            return json.dumps({ERROR_MESSAGE_KEY: "No profile has been collected."})
+        profile_format = request.query.get(PROFILE_FORMAT_KEY, COLLAPSED_PROFILE_FORMAT)
+        if profile_format == PSTATS_PROFILE_FORMAT:
+            response.content_type = OCTET_STREAM_CONTENT_TYPE
+            response.set_header('Content-Disposition', f'attachment; filename="{DEFAULT_PROFILE_OUTPUT}.pstats"')
+            return self.profiler.get_pstats()
+        if profile_format != COLLAPSED_PROFILE_FORMAT:
+            return json.dumps({ERROR_MESSAGE_KEY: f"Unknown profile format {profile_format}."})
+        response.content_type = 'text/plain; charset=utf-8'
+        response.set_header('Content-Disposition', f'attachment; filename="{DEFAULT_PROFILE_OUTPUT}.collapsed"')
+        return self.profiler.get_collapsed_stacks()
+
+    def admin_list_memory_rounds(self):
+        """
+        Returns the memory reports of the rounds kept by the leak detector.
+
+        Returns
+        -------
+
+        str:
+            JSON in string form containing the report of each round, oldest
+            first, or an error message if leak detection is not enabled.
+        """
+        if self.leak_detector is None:
+            return json.dumps({ERROR_MESSAGE_KEY: "Leak detection is not enabled on this server."})
+        return json.dumps(self.leak_detector.list_rounds(), default=str)
+
+    def snapshot_memory_round(self, version):
+        """
+        Takes the memory snapshot of the start of the round of the given
+        version of the global model, if leak detection is enabled and the
+        snapshot has not already been taken. Algorithms can call this once
+        the round has started, e.g. after aggregating the updates of the
+        previous round.
+
+        Parameters
+        ----------
+
+        version: object
+            The version of the global model.
+        """
+        if self.leak_detector is not None:
+            self.leak_detector.snapshot_round(version)
+
     def admin_add_worker(self):
         """
         Add a new worker to the list or allowed workers via the admin API.
@@ -340,8 +736,10 @@ class DCFServer(object):
         if worker_id != INVALID_WORKER:
             if was_registered:
                 self.unregister_worker_callback(worker_id)
+                self.terminate_model_version_requests(worker_id, "Worker was removed.")
                 logger.info(f"Worker {worker_id[0:WID_LEN]} was unregistered (removal)")
 
+        self.upload_manager.finish(worker_id)
         worker_id = self.worker_manager.remove_worker(worker_id)
         if worker_id == INVALID_WORKER:
             return json.dumps({ERROR_MESSAGE_KEY: f"Attempt to remove unknown worker {worker_id[0:WID_LEN]}."})
@@ -395,6 +793,7 @@ class DCFServer(object):
 
         if was_registered and not worker_data[REGISTRATION_STATUS_KEY]:
             self.unregister_worker_callback(worker_id)
+            self.terminate_model_version_requests(worker_id, "Worker was unregistered.")
 
         return json.dumps({
             SUCCESS_MESSAGE_KEY: f"Successfully changed status for worker {worker_id[0:WID_LEN]}.",
@@ -405,7 +804,9 @@ class DCFServer(object):
     def receive_worker_update(self, worker_id):
         """
         This receives the update from a worker and calls the corresponding callback function.
-        Expects that the worker_id and model-update were sent using the DCFWorker.send_model_update()
+        Expects that the worker_id and model-update were sent using the DCFWorker.send_model_update(),
+        either as a multipart form or, with the binary protocol, as the raw
+        compressed update with the signature in the SIGNATURE_HEADER header.
 
         Returns
         -------
@@ -415,70 +816,583 @@ class DCFServer(object):
             Otherwise any exception that was raised.
         """
         try:
+            if request.content_type == OCTET_STREAM_CONTENT_TYPE:
+                signature = request.get_header(SIGNATURE_HEADER)
+                if signature is None:
+                    error_message = f"{SIGNATURE_HEADER} header not found in worker update request."
+                    logger.error(error_message)
+                    return json.dumps({ERROR_MESSAGE_KEY: error_message})
+                with self.metrics.compression_duration.time('decompress'):
+                    model_update = zlib.decompress(read_request_body(request.environ))
+                return self.process_worker_update(worker_id, model_update, base64.b64decode(signature))
+
             worker_data = request.files
             if SIGNED_PHRASE not in worker_data:
                 error_message = f"{SIGNED_PHRASE} not found in worker update payload."
                 logger.error(error_message)
                 return json.dumps({ERROR_MESSAGE_KEY: error_message})
 
-            model_update = zlib.decompress(worker_data[WORKER_MODEL_UPDATE_KEY].file.read())
+            compressed_update = worker_data[WORKER_MODEL_UPDATE_KEY].file.read()
+            with self.metrics.compression_duration.time('decompress'):
+                model_update = zlib.decompress(compressed_update)
+            return self.process_worker_update(
+                worker_id, model_update, worker_data[SIGNED_PHRASE].file.read().decode('utf-8'))
 
-            verify_worker = self.worker_manager.authenticate_worker(
-                worker_id,
-                worker_data[SIGNED_PHRASE].file.read().decode('utf-8'),
-                hashlib.sha256(model_update).digest()
-            )
-            if not verify_worker:
-                logger.error(f"Unable to verify worker with id {worker_id[0:WID_LEN]}")
-                return INVALID_WORKER
+        except Exception as e:
+            logger.warning(e)
+            return str(e)
+
+    def process_worker_update(self, worker_id, model_update, signed_phrase):
+        """
+        Authenticates a model update received from a worker and passes it on
+        to the receive_worker_update_callback.
+
+        Parameters
+        ----------
 
-            if not self.worker_manager.is_worker_allowed(worker_id):
-                logger.warning(f"Unknown worker {worker_id[0:WID_LEN]} tried to send an update.")
-                return INVALID_WORKER
+        worker_id: str
+            The id of the worker.
 
-            if not self.worker_manager.is_worker_registered(worker_id):
-                logger.warning(f"Unregistered worker {worker_id[0:WID_LEN]} tried to send an update.")
-                return UNREGISTERED_WORKER
+        model_update: bytes
+            The (uncompressed) model update.
 
-            logger.info(f'Received model update from worker {worker_id[0:WID_LEN]}.')
+        signed_phrase: str or bytes
+            The sha256 hash of the model update signed by the worker, as a hex
+            string or as raw bytes.
+
+        Returns
+        -------
+
+        str:
+            The response from the callback or an error message.
+        """
+        verify_worker = self.worker_manager.authenticate_worker(
+            worker_id,
+            signed_phrase,
+            hashlib.sha256(model_update).digest()
+        )
+        if not verify_worker:
+            logger.error(f"Unable to verify worker with id {worker_id[0:WID_LEN]}")
+            return INVALID_WORKER
+
+        if not self.worker_manager.is_worker_allowed(worker_id):
+            logger.warning(f"Unknown worker {worker_id[0:WID_LEN]} tried to send an update.")
+            return INVALID_WORKER
+
+        if not self.worker_manager.is_worker_registered(worker_id):
+            logger.warning(f"Unregistered worker {worker_id[0:WID_LEN]} tried to send an update.")
+            return self.unregistered_worker_response(worker_id)
+
+        self.worker_manager.mark_worker_seen(worker_id)
+        log_routine(logger, "Received model update from worker %s.", worker_id[0:WID_LEN])
+        self.round_timeline.record(UPLOAD_EVENT, worker_id)
+        with self.metrics.update_callback_duration.time():
             return self.receive_worker_update_callback(worker_id, model_update)
 
+    def start_upload(self, worker_id):
+        """
+        Starts a chunked upload of a model update. Expects a json (or msgpack) with the
+        size of the compressed update and the sha256 hash of the uncompressed
+        update signed by the worker, which is checked once all the chunks
+        have been received.
+
+        Returns
+        -------
+
+        str:
+            JSON in string form with the upload id and the offset to start
+            uploading from, or with the response to the update if the upload
+            can not go ahead.
+        """
+        try:
+            query_request = DCFServer.read_request_data()
+            valid_failed = DCFServer.validate_input(
+                query_request, [UPLOAD_SIZE_KEY, SIGNED_PHRASE], [int, (str, bytes)])
+            if ERROR_MESSAGE_KEY in valid_failed:
+                logger.error(valid_failed[ERROR_MESSAGE_KEY])
+                return json.dumps({ERROR_MESSAGE_KEY: valid_failed[ERROR_MESSAGE_KEY]})
+
+            if not self.worker_manager.is_worker_allowed(worker_id) or \
+                    not self.worker_manager.authenticate_worker(worker_id, query_request[SIGNED_PHRASE]):
+                logger.warning(f"Unknown worker {worker_id[0:WID_LEN]} tried to start an upload.")
+                return json.dumps({UPLOAD_RESPONSE_KEY: INVALID_WORKER})
+
+            if not self.worker_manager.is_worker_registered(worker_id):
+                logger.warning(f"Unregistered worker {worker_id[0:WID_LEN]} tried to start an upload.")
+                return json.dumps({UPLOAD_RESPONSE_KEY: self.unregistered_worker_response(worker_id)})
+
+            session = self.upload_manager.start(
+                worker_id, query_request[UPLOAD_SIZE_KEY], query_request[SIGNED_PHRASE])
+            if session is None:
+                error_message = f"Invalid upload size {query_request[UPLOAD_SIZE_KEY]}."
+                logger.error(error_message)
+                return json.dumps({ERROR_MESSAGE_KEY: error_message})
+
+            self.worker_manager.mark_worker_seen(worker_id)
+            log_routine(logger, "Started upload %s of %d bytes for worker %s.",
+                        session.upload_id[0:WID_LEN], session.size, worker_id[0:WID_LEN])
+            return json.dumps({UPLOAD_ID_KEY: session.upload_id, UPLOAD_OFFSET_KEY: session.offset})
+
         except Exception as e:
             logger.warning(e)
-            return str(e)
+            return json.dumps({ERROR_MESSAGE_KEY: str(e)})
+
+    @staticmethod
+    def upload_status(session):
+        """
+        Returns the status of the upload to send back to the worker.
+
+        Parameters
+        ----------
+
+        session: UploadSession
+            The upload.
 
-    def check_model_version_updated(self, worker_id, body, last_worker_model_version):
+        Returns
+        -------
+
+        dict:
+            The offset of the upload and, if it is complete, the response to the update.
+        """
+        status = {UPLOAD_OFFSET_KEY: session.offset}
+        if session.response is not None:
+            status[UPLOAD_RESPONSE_KEY] = session.response
+        return status
+
+    def get_upload_status(self, worker_id, upload_id):
+        """
+        Returns the number of bytes of the upload received so far, so that an
+        interrupted upload can be resumed.
+
+        Returns
+        -------
+
+        str:
+            JSON in string form with the offset of the upload, and the response
+            to the update if it is complete, or an error message if the upload
+            is not known.
+        """
+        session = self.upload_manager.get(worker_id, upload_id)
+        if session is None:
+            return json.dumps({ERROR_MESSAGE_KEY: UNKNOWN_UPLOAD})
+        return json.dumps(DCFServer.upload_status(session))
+
+    def receive_upload_chunk(self, worker_id, upload_id):
+        """
+        Receives a chunk of a model update. The offset the chunk starts at and
+        the sha256 hash of the chunk are given in the UPLOAD_OFFSET_HEADER and
+        UPLOAD_CHECKSUM_HEADER headers. Once the last chunk is received, the
+        whole update is checked against the hash signed by the worker and
+        passed on to the receive_worker_update_callback.
+
+        Returns
+        -------
+
+        str:
+            JSON in string form with the offset of the upload after the chunk,
+            and with the response to the update once it is complete.
+        """
+        try:
+            session = self.upload_manager.get(worker_id, upload_id)
+            if session is None:
+                return json.dumps({ERROR_MESSAGE_KEY: UNKNOWN_UPLOAD})
+
+            if session.response is not None:
+                return json.dumps(DCFServer.upload_status(session))
+
+            offset = int(request.get_header(UPLOAD_OFFSET_HEADER, -1))
+            checksum = request.get_header(UPLOAD_CHECKSUM_HEADER, '')
+            if not self.upload_manager.add_chunk(session, offset, request.body.read(), checksum):
+                logger.warning(f"Rejected a chunk at offset {offset} of upload {upload_id[0:WID_LEN]} "
+                               f"from worker {worker_id[0:WID_LEN]}.")
+            elif session.is_complete():
+                with self.metrics.compression_duration.time('decompress'):
+                    model_update = zlib.decompress(session.data)
+                self.upload_manager.complete(
+                    session, self.process_worker_update(worker_id, model_update, session.signed_phrase))
+            return json.dumps(DCFServer.upload_status(session))
+
+        except Exception as e:
+            logger.warning(e)
+            return json.dumps({ERROR_MESSAGE_KEY: str(e)})
+
+    def check_worker_request(self, worker_id, signed_phrase):
+        """
+        Checks that a worker asking for the global model, or to be notified
+        of a new one, is allowed, has signed its challenge phrase and is
+        registered.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+
+        signed_phrase: str or bytes
+            The challenge phrase signed by the worker.
+
+        Returns
+        -------
+
+        str:
+            None if the request can go ahead, otherwise the response to send
+            back to the worker.
+        """
+        if not self.worker_manager.is_worker_allowed(worker_id):
+            logger.warning(f"Unknown worker {worker_id[0:WID_LEN]} tried to get the global model.")
+            return INVALID_WORKER
+
+        if not self.worker_manager.verify_challenge(worker_id, signed_phrase):
+            logger.error(f"Failed to verify worker with id {worker_id[0:WID_LEN]}")
+            return INVALID_WORKER
+
+        if not self.worker_manager.is_worker_registered(worker_id):
+            logger.warning(f"Unregistered worker {worker_id[0:WID_LEN]} tried to get the global model.")
+            return self.unregistered_worker_response(worker_id)
+        return None
+
+    def get_published_version(self):
+        """
+        Returns the msgpack serialized version of the global model published
+        in the shared state. The version is read from the shared state at most
+        every SHARED_STATE_POLL_INTERVAL seconds.
+
+        Returns
+        -------
+
+        bytes:
+            The serialized version, or None if no model was published.
+        """
+        now = time.monotonic()
+        if self.published_version_checked is None or \
+                now - self.published_version_checked >= SHARED_STATE_POLL_INTERVAL:
+            self.published_version = self.shared_state.get_global_model_version()
+            self.published_version_checked = now
+        return self.published_version
+
+    def is_published_global_model_version(self, version):
+        """
+        Used instead of the is_global_model_most_recent callback when the
+        state is shared between processes.
+
+        Parameters
+        ----------
+
+        version: object
+            The version of the global model of a worker.
+
+        Returns
+        -------
+
+        bool:
+            True if the version is that of the published global model, or if
+            no model has been published yet.
+        """
+        published_version = self.get_published_version()
+        return published_version is None or published_version == msgpack.packb(version)
+
+    def get_published_global_model(self):
+        """
+        Used instead of the return_global_model_callback when the state is
+        shared between processes.
+
+        Returns
+        -------
+
+        dict:
+            The global model published in the shared state, or None if no
+            model was published.
+        """
+        published = self.shared_state.get_global_model()
+        if published is None:
+            return None
+        version, model = published
+        if self.published_model_dict is None or self.published_model_dict[0] != version:
+            self.published_model_dict = (version, create_model_dict(model, msgpack.unpackb(version)))
+        return self.published_model_dict[1]
+
+    def forward_worker_update(self, worker_id, model_update):
+        """
+        Used instead of the receive_worker_update_callback when the state is
+        shared between processes: queues the update for the process owning the
+        aggregation and waits for its response.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+
+        model_update: bytes
+            The model update.
+
+        Returns
+        -------
+
+        str:
+            The response of the receive_worker_update_callback.
+        """
+        event_id = self.shared_state.push_event(WORKER_UPDATE_EVENT, worker_id, bytes(model_update))
+        waited = 0
+        while waited < UPDATE_FORWARD_TIMEOUT:
+            response = self.shared_state.collect_event_response(event_id)
+            if response is not None:
+                return response
+            gevent.sleep(SHARED_STATE_POLL_INTERVAL)
+            waited += SHARED_STATE_POLL_INTERVAL
+        logger.error(f"The update of worker {worker_id[0:WID_LEN]} was not handled within "
+                     f"{UPDATE_FORWARD_TIMEOUT} seconds.")
+        return UPDATE_NOT_HANDLED
+
+    def check_model_version_updated(self, worker_id, body, last_worker_model_version, client_socket=None,
+                                    accepts_download_schedule=False):
         """
         Greenlet function run to check with the implementation of the
         algorithm server-side logic to see if the global model is ready.
+        While waiting, it also checks that the worker is still connected
+        and stops waiting if it is not.
 
         Parameters
         ---------
 
+        worker_id: str
+            The id of the worker waiting for the notification.
+
         body: gevent.queue.Queue
             The Queue used to return the data to the calling worker and
             fulfill the WSGI promise/map.
 
         last_worker_model_version: object
             The version of the last model that the worker was using.
+
+        client_socket: socket.socket (default None)
+            The socket of the waiting request, if known.
+
+        accepts_download_schedule: bool (default False)
+            Whether the worker waits for a download slot if told to.
+        """
+        try:
+            while self.is_global_model_most_recent(last_worker_model_version):
+                gevent.sleep(self.model_check_interval)
+                connected = is_client_connected(client_socket)
+                if connected is False:
+                    log_routine(logger, "Worker %s disconnected while waiting for the global model version "
+                                "change notification.", worker_id[0:WID_LEN])
+                    body.put(StopIteration)
+                    return
+                # only a connection known to be open shows the worker is alive
+                if connected:
+                    self.worker_manager.mark_worker_seen(worker_id)
+
+            model_update = self.return_global_model_callback()
+            if not is_valid_model_dict(model_update):
+                logger.error(f"Expected dictionary with {GLOBAL_MODEL} and {GLOBAL_MODEL_VERSION} keys - "
+                             "return_global_model_callback() implementation is incorrect")
+            else:
+                self.round_timeline.start_round(model_update[GLOBAL_MODEL_VERSION])
+                self.round_timeline.record(NOTIFY_EVENT, worker_id, version=model_update[GLOBAL_MODEL_VERSION])
+            if accepts_download_schedule and self.download_scheduler is not None \
+                    and is_valid_model_dict(model_update):
+                delay = self.download_scheduler.assign(len(model_update[GLOBAL_MODEL]))
+                body.put(json.dumps({DOWNLOAD_DELAY_KEY: delay}))
+                log_routine(logger, "Notified global model version changed to %s, "
+                            "with a download delay of %.2f seconds.", worker_id[0:WID_LEN], delay)
+            else:
+                body.put(GLOBAL_MODEL_UPDATED_STRING)
+                log_routine(logger, "Notified global model version changed to %s.", worker_id[0:WID_LEN])
+            body.put(StopIteration)
+        finally:
+            # clean up the list of model requests for this worker
+            self.remove_model_version_request(worker_id, gevent.getcurrent())
+
+    def remove_model_version_request(self, worker_id, greenlet):
+        """
+        Removes the entry for the given long polling greenlet from the
+        requests of the worker, dropping the worker from the dictionary of
+        requests if it has none left.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+
+        greenlet: gevent.Greenlet
+            The greenlet serving the request.
+        """
+        pending = self.model_version_req_dict.get(worker_id)
+        if pending is None:
+            return
+        pending[:] = [(g, b) for g, b in pending if g is not greenlet]
+        if len(pending) == 0:
+            del self.model_version_req_dict[worker_id]
+        elif len(pending) > 1:
+            logger.error(message_seriously_wrong(
+                f"more than one entry in the 'model_version_req_dict' for {worker_id[0:WID_LEN]}"))
+
+    def terminate_model_version_requests(self, worker_id, msg):
+        """
+        Terminates any pending long polling request or event subscription of
+        the worker, sending it the given message.
+
+        Parameters
+        ----------
+
+        worker_id: str
+            The id of the worker.
+
+        msg: str
+            The message to send back to the worker.
+        """
+        for old_g, old_b in self.model_version_req_dict.pop(worker_id, []):
+            old_b.put(msg)
+            old_b.put(StopIteration)
+            old_g.kill()
+        if worker_id in self.event_subscriptions:
+            old_g, old_b = self.event_subscriptions.pop(worker_id)
+            old_b.put(format_server_sent_event(WORKER_STATUS_EVENT, {ERROR_MESSAGE_KEY: msg}))
+            old_b.put(StopIteration)
+            old_g.kill()
+
+    def check_worker_liveness(self):
+        """
+        Greenlet function that periodically checks for registered workers that
+        have not been in contact with the server for worker_idle_timeout
+        seconds and unregisters them if unregister_idle_workers is set.
+        """
+        while True:
+            gevent.sleep(self.liveness_check_interval)
+            if self.aggregation_owner is not None and not self.aggregation_owner.is_owner:
+                # the process owning the aggregation checks for all the processes
+                continue
+            idle_workers = self.worker_manager.get_idle_workers(self.worker_idle_timeout)
+            if len(idle_workers) == 0:
+                continue
+            logger.info(f"Found {len(idle_workers)} workers idle for more than "
+                        f"{self.worker_idle_timeout} seconds.")
+            if not self.unregister_idle_workers:
+                continue
+            for worker in idle_workers:
+                worker_id = worker[WORKER_ID_KEY]
+                self.worker_manager.unregister_idle_worker(worker_id)
+                self.unregister_worker_callback(worker_id)
+                self.terminate_model_version_requests(worker_id, IDLE_UNREGISTERED_WORKER)
+                logger.info(f"Worker {worker_id[0:WID_LEN]} was unregistered (idle).")
+
+    def push_model_version_events(self, worker_id, body, last_worker_model_version, client_socket=None,
+                                  accepts_download_schedule=False):
+        """
+        Greenlet function that sends an event to a subscribed worker each time
+        the global model changes, for as long as the worker stays connected.
+        A comment is sent every EVENT_KEEP_ALIVE_INTERVAL seconds while waiting
+        so that the connection is not closed as idle.
+
+        Parameters
+        ---------
+
+        worker_id: str
+            The id of the subscribed worker.
+
+        body: gevent.queue.Queue
+            The Queue used to stream the events to the worker.
+
+        last_worker_model_version: object
+            The version of the last model that the worker was using.
+
+        client_socket: socket.socket (default None)
+            The socket of the subscription request, if known.
+
+        accepts_download_schedule: bool (default False)
+            Whether the worker waits for a download slot if told to.
         """
-        while self.is_global_model_most_recent(last_worker_model_version):
-            gevent.sleep(self.model_check_interval)
+        try:
+            while True:
+                last_keep_alive = 0
+                while self.is_global_model_most_recent(last_worker_model_version):
+                    gevent.sleep(self.model_check_interval)
+                    connected = is_client_connected(client_socket)
+                    if connected is False:
+                        logger.info(f"Worker {worker_id[0:WID_LEN]} closed its model version event stream.")
+                        body.put(StopIteration)
+                        return
+                    if connected:
+                        self.worker_manager.mark_worker_seen(worker_id)
+                    last_keep_alive += self.model_check_interval
+                    if last_keep_alive >= EVENT_KEEP_ALIVE_INTERVAL:
+                        body.put(": keep-alive\n\n")
+                        last_keep_alive = 0
+
+                model_update = self.return_global_model_callback()
+                if not is_valid_model_dict(model_update):
+                    logger.error(f"Expected dictionary with {GLOBAL_MODEL} and {GLOBAL_MODEL_VERSION} keys - "
+                                 "return_global_model_callback() implementation is incorrect")
+                    gevent.sleep(self.model_check_interval)
+                    continue
+                last_worker_model_version = model_update[GLOBAL_MODEL_VERSION]
+                self.round_timeline.start_round(last_worker_model_version)
+                self.round_timeline.record(NOTIFY_EVENT, worker_id, version=last_worker_model_version)
+                delay = 0
+                if accepts_download_schedule and self.download_scheduler is not None:
+                    delay = self.download_scheduler.assign(len(model_update[GLOBAL_MODEL]))
+                body.put(format_server_sent_event(MODEL_VERSION_EVENT, {DOWNLOAD_DELAY_KEY: delay}))
+                log_routine(logger, "Pushed global model version change to %s.", worker_id[0:WID_LEN])
+        finally:
+            if self.event_subscriptions.get(worker_id, (None, None))[0] is gevent.getcurrent():
+                del self.event_subscriptions[worker_id]
+
+    def subscribe_to_model_version_events(self):
+        """
+        Opens a server-sent events stream over which the worker is sent a
+        MODEL_VERSION_EVENT, with its download delay, each time the global
+        model changes, and a WORKER_STATUS_EVENT if the worker is unregistered
+        or removed. The worker authenticates once, when it subscribes, rather
+        than for each round.
 
-        model_update = self.return_global_model_callback()
-        if not is_valid_model_dict(model_update):
-            logger.error(f"Expected dictionary with {GLOBAL_MODEL} and {GLOBAL_MODEL_VERSION} keys - "
-                         "return_global_model_callback() implementation is incorrect")
-        body.put(GLOBAL_MODEL_UPDATED_STRING)
-        body.put(StopIteration)
-        logger.info(f"Notified global model version changed to {worker_id[0:WID_LEN]}.")
+        Returns
+        -------
+
+        gevent.queue.Queue or str:
+            The Queue streaming the events, or a string indicating an error
+            has occured.
+        """
+        try:
+            # the socket has to be found before bottle reads the body
+            client_socket = get_request_socket(request.environ)
+            query_request = DCFServer.read_request_data()
+            valid_failed = DCFServer.validate_input(
+                query_request,
+                [WORKER_ID_KEY, LAST_WORKER_MODEL_VERSION, SIGNED_PHRASE],
+                [str, object, (str, bytes)]
+            )
+            if ERROR_MESSAGE_KEY in valid_failed:
+                logger.error(valid_failed[ERROR_MESSAGE_KEY])
+                return json.dumps({ERROR_MESSAGE_KEY: valid_failed[ERROR_MESSAGE_KEY]})
 
-        # clean up the list of model requests for this worker
-        if len(self.model_version_req_dict[worker_id]) > 0:
-            self.model_version_req_dict[worker_id].pop()
-        if len(self.model_version_req_dict[worker_id]) > 0:
-            message_seriously_wrong(f"in 'check_model_ready', "
-                                    f"more than one entry in the 'mode_req_dict' for {worker_id[0:WID_LEN]}")
+            worker_id = query_request[WORKER_ID_KEY]
+            failed_response = self.check_worker_request(worker_id, query_request[SIGNED_PHRASE])
+            if failed_response is not None:
+                return failed_response
+
+            self.worker_manager.mark_worker_seen(worker_id)
+            log_routine(logger, "Worker %s subscribed to global model version events.", worker_id[0:WID_LEN])
+            # a worker has at most one subscription or long polling request
+            self.terminate_model_version_requests(
+                worker_id, f"New subscription to global model version events received from {worker_id[0:WID_LEN]}.")
+            body = gevent.queue.Queue()
+            g = Greenlet(self.push_model_version_events, worker_id, body,
+                         query_request[LAST_WORKER_MODEL_VERSION], client_socket,
+                         query_request.get(DOWNLOAD_SCHEDULE_KEY) is True)
+            self.gevent_pool.add(g)
+            self.event_subscriptions[worker_id] = (g, body)
+            g.start()
+
+            response.content_type = EVENT_STREAM_CONTENT_TYPE
+            response.set_header('Cache-Control', 'no-cache')
+            return body
+
+        except Exception as e:
+            logger.warning(str(e.__class__) + str(e))
+            return str(e)
 
     def notify_me_if_gm_version_updated(self):
         """
@@ -487,49 +1401,38 @@ class DCFServer(object):
         the worker.
         """
         try:
-            query_request = request.json
+            # the socket has to be found before bottle reads the body
+            client_socket = get_request_socket(request.environ)
+            query_request = DCFServer.read_request_data()
             valid_failed = DCFServer.validate_input(
                 query_request,
                 [WORKER_ID_KEY, LAST_WORKER_MODEL_VERSION, SIGNED_PHRASE],
-                [str, object, str]
+                [str, object, (str, bytes)]
             )
             if ERROR_MESSAGE_KEY in valid_failed:
                 logger.error(valid_failed[ERROR_MESSAGE_KEY])
                 return json.dumps({ERROR_MESSAGE_KEY: valid_failed[ERROR_MESSAGE_KEY]})
 
             worker_id = query_request[WORKER_ID_KEY]
-            if not self.worker_manager.is_worker_allowed(worker_id):
-                logger.warning(f"Unknown worker {worker_id[0:WID_LEN]} tried to get the global model.")
-                return INVALID_WORKER
+            failed_response = self.check_worker_request(worker_id, query_request[SIGNED_PHRASE])
+            if failed_response is not None:
+                return failed_response
 
-            if not self.worker_manager.verify_challenge(worker_id, query_request[SIGNED_PHRASE]):
-                logger.error(f"Failed to verify worker with id {worker_id[0:WID_LEN]}")
-                return INVALID_WORKER
-
-            if not self.worker_manager.is_worker_registered(worker_id):
-                logger.warning(f"Unregistered worker {worker_id[0:WID_LEN]} tried to get the global model.")
-                return UNREGISTERED_WORKER
-
-            logger.info(f"Received request for global model version change notification from {worker_id[0:WID_LEN]}.")
+            self.worker_manager.mark_worker_seen(worker_id)
+            log_routine(logger, "Received request for global model version change notification from %s.",
+                        worker_id[0:WID_LEN])
             # in case a new request is made, terminate the old one
-            if worker_id in self.model_version_req_dict and \
-                    len(self.model_version_req_dict[worker_id]) > 0:
-                old_g, old_b = self.model_version_req_dict[worker_id].pop()
+            if worker_id in self.model_version_req_dict:
                 msg = f"New request for global model version change notification received from {worker_id[0:WID_LEN]} - " \
                       "existing request terminated."
                 logger.info(msg)
-                old_b.put(msg)
-                old_b.put(StopIteration)
-                old_g.kill()
-                if len(self.model_version_req_dict[worker_id]) > 0:
-                    message_seriously_wrong(f"in 'return_global_model', "
-                                            f"more than one entry in the 'mode_req_dict' for {worker_id[0:WID_LEN]}")
+                self.terminate_model_version_requests(worker_id, msg)
             body = gevent.queue.Queue()
-            g = Greenlet(self.check_model_version_updated, worker_id, body, query_request[LAST_WORKER_MODEL_VERSION])
+            g = Greenlet(self.check_model_version_updated, worker_id, body,
+                         query_request[LAST_WORKER_MODEL_VERSION], client_socket,
+                         query_request.get(DOWNLOAD_SCHEDULE_KEY) is True)
             self.gevent_pool.add(g)
-            if worker_id not in self.model_version_req_dict:
-                self.model_version_req_dict[worker_id] = []
-            self.model_version_req_dict[worker_id].append((g, body))
+            self.model_version_req_dict[worker_id] = [(g, body)]
             g.start()
 
             return body
@@ -546,7 +1449,9 @@ class DCFServer(object):
         Returns the global model by using the provided callback using gevent
         based long polling. It spawns a gevent Greenlet (a pseudo-thread) for
         check_model_ready, which returns a model when ready, but otherwise
-        waits.
+        waits. With a blob store the model is sent from its file, honouring
+        Range requests whose If-Range header matches the sha256 hash of the
+        current model.
 
         Returns
         -------
@@ -556,34 +1461,195 @@ class DCFServer(object):
             a string indicating an error has occured.
         """
         try:
-            query_request = request.json
+            query_request = DCFServer.read_request_data()
 
             valid_failed = DCFServer.validate_input(
-                query_request, [WORKER_ID_KEY, SIGNED_PHRASE], [str, str])
+                query_request, [WORKER_ID_KEY, SIGNED_PHRASE], [str, (str, bytes)])
             if ERROR_MESSAGE_KEY in valid_failed:
                 logger.error(valid_failed[ERROR_MESSAGE_KEY])
                 return json.dumps({ERROR_MESSAGE_KEY: valid_failed[ERROR_MESSAGE_KEY]})
 
             worker_id = query_request[WORKER_ID_KEY]
-            if not self.worker_manager.is_worker_allowed(worker_id):
-                logger.warning(f"Unknown worker {worker_id[0:WID_LEN]} tried to get the global model.")
-                return INVALID_WORKER
+            failed_response = self.check_worker_request(worker_id, query_request[SIGNED_PHRASE])
+            if failed_response is not None:
+                return failed_response
+
+            self.worker_manager.mark_worker_seen(worker_id)
+            log_routine(logger, "Returned global model to %s.", worker_id[0:WID_LEN])
+            download_start = self.round_timeline.clock()
+            _, compressed_model, _, uncompressed_size, content_hash, _ = self.get_compressed_global_model()
+            round_version = self.round_timeline.current_version
+            # the download ends once the whole response has been sent
+            request.environ.setdefault(RESPONSE_SENT_CALLBACKS_KEY, []).append(
+                lambda: self.round_timeline.record(DOWNLOAD_EVENT, worker_id, start=download_start,
+                                                   version=round_version))
+            if compressed_model is None:
+                # a range of a previous version must not be spliced onto the current one
+                if request.environ.get('HTTP_IF_RANGE', content_hash) != content_hash:
+                    request.environ.pop('HTTP_RANGE', None)
+                return static_file(content_hash, root=self.blob_store.directory,
+                                   mimetype=OCTET_STREAM_CONTENT_TYPE, etag=content_hash,
+                                   headers={UNCOMPRESSED_SIZE_HEADER: str(uncompressed_size)})
+            # lets the worker decompress the model straight into a buffer of the right size
+            response.set_header(UNCOMPRESSED_SIZE_HEADER, str(uncompressed_size))
+            return compressed_model
 
-            if not self.worker_manager.verify_challenge(worker_id, query_request[SIGNED_PHRASE]):
-                logger.error(f"Failed to verify worker with id {worker_id[0:WID_LEN]}")
-                return INVALID_WORKER
+        except Exception as e:
+            logger.warning(str(e.__class__) + str(e))
+            return str(e)
 
-            if not self.worker_manager.is_worker_registered(worker_id):
-                logger.warning(f"Unregistered worker {worker_id[0:WID_LEN]} tried to get the global model.")
-                return UNREGISTERED_WORKER
+    def get_compressed_global_model(self):
+        """
+        Returns the compressed global model, which is kept for as long as
+        the version of the global model does not change, so that the model
+        is compressed, hashed and signed once per version rather than for
+        each worker downloading it. With a blob store the compressed model
+        is written to the store instead of being kept in memory.
+
+        Returns
+        -------
+
+        (bytes, bytes, int, int, str, str):
+            The msgpack serialized version, the compressed model (None if it
+            is in the blob store), the sizes of the compressed and of the
+            uncompressed model, the sha256 hash of the compressed model and
+            its signature (or None if the server has no signing key). Invalid
+            model dictionaries are compressed but not kept, and their version
+            and hash are None.
+        """
+        model_dict = self.return_global_model_callback()
+        if not is_valid_model_dict(model_dict):
+            packed_model = msgpack.packb(model_dict)
+            compressed_model = zlib.compress(packed_model)
+            return None, compressed_model, len(compressed_model), len(packed_model), None, None
+        self.round_timeline.start_round(model_dict[GLOBAL_MODEL_VERSION])
+        version = msgpack.packb(model_dict[GLOBAL_MODEL_VERSION])
+        if self.compressed_global_model is None or self.compressed_global_model[0] != version:
+            self.snapshot_memory_round(model_dict[GLOBAL_MODEL_VERSION])
+            packed_model = msgpack.packb(model_dict)
+            with self.metrics.compression_duration.time('compress'):
+                compressed_model = zlib.compress(packed_model)
+            compressed_size = len(compressed_model)
+            if self.blob_store is None:
+                content_hash = hashlib.sha256(compressed_model).hexdigest()
+            else:
+                content_hash = self.blob_store.put(compressed_model)
+                compressed_model = None
+            signature = None if self.model_signing_key is None else \
+                self.model_signing_key.sign(content_hash.encode()).signature.hex()
+            self.compressed_global_model = \
+                (version, compressed_model, compressed_size, len(packed_model), content_hash, signature)
+            self.peer_registry.retain(content_hash)
+        return self.compressed_global_model
+
+    def return_peer_manifest(self):
+        """
+        Returns, to a worker about to download the global model, the sha256
+        hash of the compressed model, signed if the server has a signing key,
+        and the addresses of some of the workers on its site that serve the
+        model to their peers.
+
+        Returns
+        -------
+
+        str:
+            The JSON manifest, or a string indicating an error has occured.
+        """
+        try:
+            query_request = DCFServer.read_request_data()
+
+            valid_failed = DCFServer.validate_input(
+                query_request, [WORKER_ID_KEY, SIGNED_PHRASE], [str, (str, bytes)])
+            if ERROR_MESSAGE_KEY in valid_failed:
+                logger.error(valid_failed[ERROR_MESSAGE_KEY])
+                return json.dumps({ERROR_MESSAGE_KEY: valid_failed[ERROR_MESSAGE_KEY]})
 
-            logger.info(f"Returned global model to {worker_id[0:WID_LEN]}.")
-            return zlib.compress(msgpack.packb(self.return_global_model_callback()))
+            worker_id = query_request[WORKER_ID_KEY]
+            failed_response = self.check_worker_request(worker_id, query_request[SIGNED_PHRASE])
+            if failed_response is not None:
+                return failed_response
+
+            self.worker_manager.mark_worker_seen(worker_id)
+            _, _, compressed_size, _, content_hash, signature = self.get_compressed_global_model()
+            if content_hash is None:
+                return json.dumps({ERROR_MESSAGE_KEY: "No valid global model is available."})
+            peers = self.peer_registry.get_peers(
+                content_hash, query_request.get(PEER_SITE_KEY), worker_id, self.worker_manager.is_worker_registered)
+            log_routine(logger, "Returned %d peers for the global model to %s.", len(peers), worker_id[0:WID_LEN])
+            manifest = {
+                CONTENT_HASH_KEY: content_hash,
+                CONTENT_SIZE_KEY: compressed_size,
+                PEERS_KEY: peers
+            }
+            if signature is not None:
+                manifest[CONTENT_SIGNATURE_KEY] = signature
+            return json.dumps(manifest)
 
         except Exception as e:
             logger.warning(str(e.__class__) + str(e))
             return str(e)
 
+    def receive_peer_announcement(self):
+        """
+        Records that a worker serves the global model with the given hash to
+        its peers. Announcements for any model other than the current one are
+        rejected.
+
+        Returns
+        -------
+
+        str:
+            A JSON success or error message, or INVALID_WORKER and the like if
+            the worker could not be authenticated.
+        """
+        try:
+            query_request = DCFServer.read_request_data()
+
+            valid_failed = DCFServer.validate_input(
+                query_request,
+                [WORKER_ID_KEY, SIGNED_PHRASE, CONTENT_HASH_KEY, PEER_ADDRESS_KEY],
+                [str, (str, bytes), str, str])
+            if ERROR_MESSAGE_KEY in valid_failed:
+                logger.error(valid_failed[ERROR_MESSAGE_KEY])
+                return json.dumps({ERROR_MESSAGE_KEY: valid_failed[ERROR_MESSAGE_KEY]})
+
+            worker_id = query_request[WORKER_ID_KEY]
+            failed_response = self.check_worker_request(worker_id, query_request[SIGNED_PHRASE])
+            if failed_response is not None:
+                return failed_response
+
+            self.get_compressed_global_model()
+            if not self.peer_registry.announce(query_request[CONTENT_HASH_KEY], worker_id,
+                                               query_request[PEER_ADDRESS_KEY], query_request.get(PEER_SITE_KEY)):
+                logger.info(f"Worker {worker_id[0:WID_LEN]} announced an outdated global model.")
+                return json.dumps({ERROR_MESSAGE_KEY: "The global model announced is not the current one."})
+            log_routine(logger, "Worker %s serves the global model to its peers at %s.",
+                        worker_id[0:WID_LEN], query_request[PEER_ADDRESS_KEY])
+            return json.dumps({SUCCESS_MESSAGE_KEY: "Announcement received."})
+
+        except Exception as e:
+            logger.warning(str(e.__class__) + str(e))
+            return str(e)
+
+    def start_background_tasks(self):
+        """
+        Starts the background greenlets of the server, if they are not already
+        running. This is run before each request rather than in start_server
+        so that, under gunicorn, the greenlets run in the worker process
+        serving the requests rather than in the arbiter process. If the
+        PROFILE_SECONDS environment variable is set, the first request also
+        starts profiling the process for that many seconds, writing the
+        profile to files named after PROFILE_OUTPUT and the process id.
+        """
+        if self.worker_idle_timeout is not None and self.liveness_greenlet is None:
+            self.liveness_greenlet = self.gevent_pool.spawn(self.check_worker_liveness)
+        if self.aggregation_owner is not None and self.aggregation_owner_greenlet is None:
+            self.aggregation_owner_greenlet = self.gevent_pool.spawn(self.aggregation_owner.run)
+        if not self.startup_profile_started and os.environ.get(PROFILE_SECONDS) is not None:
+            self.startup_profile_started = True
+            output_prefix = f"{os.environ.get(PROFILE_OUTPUT, DEFAULT_PROFILE_OUTPUT)}_{os.getpid()}"
+            self.profiler.start(float(os.environ[PROFILE_SECONDS]), output_prefix)
+
     @staticmethod
     def enable_cors():
         """
@@ -613,8 +1679,20 @@ class DCFServer(object):
                           method='POST', callback=self.return_global_model)
         application.route(f"/{NOTIFY_ME_IF_GM_VERSION_UPDATED_ROUTE}",
                           method='POST', callback=self.notify_me_if_gm_version_updated)
+        application.route(f"/{MODEL_VERSION_EVENTS_ROUTE}",
+                          method='POST', callback=self.subscribe_to_model_version_events)
+        application.route(f"/{PEER_MANIFEST_ROUTE}",
+                          method='POST', callback=self.return_peer_manifest)
+        application.route(f"/{PEER_ANNOUNCE_ROUTE}",
+                          method='POST', callback=self.receive_peer_announcement)
         application.route(f"/{RECEIVE_WORKER_UPDATE_ROUTE}/<worker_id>",
                           method='POST', callback=self.receive_worker_update)
+        application.route(f"/{UPLOAD_SESSION_ROUTE}/<worker_id>",
+                          method='POST', callback=self.start_upload)
+        application.route(f"/{UPLOAD_SESSION_ROUTE}/<worker_id>/<upload_id>",
+                          method='GET', callback=self.get_upload_status)
+        application.route(f"/{UPLOAD_SESSION_ROUTE}/<worker_id>/<upload_id>",
+                          method='PUT', callback=self.receive_upload_chunk)
 
         application.add_hook('after_request', self.enable_cors)
 
@@ -627,13 +1705,34 @@ class DCFServer(object):
                            callback=auth_basic(self.is_admin)(self.admin_delete_worker))
         application.put(f"/{WORKERS_ROUTE}/<worker_id>",
                         callback=auth_basic(self.is_admin)(self.admin_set_worker_status))
+        application.get(
+            f"/{IDLE_WORKERS_ROUTE}", callback=auth_basic(self.is_admin)(self.admin_list_idle_workers))
+        application.get(
+            f"/{METRICS_ROUTE}", callback=auth_basic(self.is_admin)(self.admin_get_metrics))
+        application.get(f"/{ROUND_TIMELINE_ROUTE}",
+                        callback=auth_basic(self.is_admin)(self.admin_list_round_timelines))
+        application.get(f"/{ROUND_TIMELINE_ROUTE}/<version>",
+                        callback=auth_basic(self.is_admin)(self.admin_get_round_timeline))
+        application.post(
+            f"/{PROFILER_ROUTE}", callback=auth_basic(self.is_admin)(self.admin_start_profiler))
+        application.get(
+            f"/{PROFILER_ROUTE}", callback=auth_basic(self.is_admin)(self.admin_get_profile))
+        application.get(f"/{MEMORY_ROUNDS_ROUTE}",
+                        callback=auth_basic(self.is_admin)(self.admin_list_memory_rounds))
+
+        application.add_hook('before_request', self.start_background_tasks)
+        instrumented_application = InstrumentedApplication(application, self.metrics)
+
+        if self.aggregation_owner is not None:
+            # so that the workers can get the global model straight away
+            self.aggregation_owner.publish_global_model_if_changed()
 
         if server_adapter is not None and isinstance(server_adapter, ServerAdapter):
             self.server_host_ip = server_adapter.host
             self.server_port = server_adapter.port
-            run(application, server=server_adapter, debug=self.debug, quiet=True)
+            run(instrumented_application, server=server_adapter, debug=self.debug, quiet=True)
         elif self.ssl_enabled:
-            run(application,
+            run(instrumented_application,
                 host=self.server_host_ip,
                 port=self.server_port,
                 server='gunicorn',
@@ -642,13 +1741,15 @@ class DCFServer(object):
                 certfile=self.ssl_certfile,
                 debug=self.debug,
                 timeout=60*60*24,
+                workers=self.num_server_processes,
                 quiet=True)
         else:
-            run(application,
+            run(instrumented_application,
                 host=self.server_host_ip,
                 port=self.server_port,
                 server='gunicorn',
                 worker_class='gevent',
                 debug=self.debug,
                 timeout=60*60*24,
+                workers=self.num_server_processes,
                 quiet=True)
@@ -7,17 +7,24 @@ import gevent
 from gevent import monkey; monkey.patch_all()
 from datetime import datetime
 
+import json
 import zlib
+import base64
+import random
 import msgpack
 import hashlib
 from nacl.signing import SigningKey, VerifyKey
 from nacl.encoding import HexEncoder
+from nacl.exceptions import BadSignatureError
 
 import requests
 from requests.adapters import HTTPAdapter
 
 from dc_federated.backend._constants import *
-from dc_federated.backend.backend_utils import is_valid_model_dict
+from dc_federated.backend.backend_utils import is_valid_model_dict, parse_server_sent_events
+from dc_federated.backend._msgpack_view import unpack_map_view
+from dc_federated.backend._peer_server import PeerModelServer
+from dc_federated.utils import get_host_ip
 
 import logging
 
@@ -54,6 +61,53 @@ class DCFWorker(object):
         Name of the private key to use to authenticate the worker to the server.
         No authentication is performed if a None is passed.  Name of the
         corresponding public key file is assumed to be key_file + '.pub'
+
+    upload_chunk_size: int (default None)
+        If given, model updates are uploaded in chunks of this many bytes,
+        so that an interrupted upload can be resumed rather than sent again
+        from the start. If None, each update is sent in a single request.
+
+    stream_global_model: bool (default False)
+        If True, the global model is decompressed as it is downloaded into
+        a single buffer, and the GLOBAL_MODEL passed to the callback is a
+        memoryview of that buffer rather than bytes. This keeps the peak
+        memory use close to the size of the model.
+
+    follow_download_schedule: bool (default True)
+        Whether the worker asks the server for a slot in which to download
+        a new global model, and waits for it, rather than downloading it as
+        soon as it is released.
+
+    binary_protocol: bool (default False)
+        If True and the server supports it, the worker sends its requests
+        as msgpack with raw signatures rather than as JSON with hex encoded
+        signatures, and sends model updates as raw octet-stream bodies
+        rather than as multipart forms.
+
+    push_notifications: bool (default False)
+        If True, the worker subscribes once to a stream of global model
+        version change events from the server instead of making a new,
+        authenticated, long polling request for each round.
+
+    peer_port: int (default None)
+        If given, the worker first tries to download each new global model
+        from other workers on its site, falling back to the server, and then
+        serves the model to its peers at this port. If None, the worker
+        always downloads the global model from the server.
+
+    peer_host: str (default None)
+        The ip-address at which the worker serves the global model to its
+        peers. If None, the ip-address of the current machine is used.
+
+    peer_site: str (default None)
+        The site of the worker - peers are only exchanged between workers on
+        the same site.
+
+    server_public_key_file: str (default None)
+        The name of the file containing the public key matching the
+        model_signing_key_file of the server. If given, the worker only
+        downloads the global model from its peers if the server signed the
+        hash of the model.
     """
     def __init__(
             self,
@@ -62,7 +116,16 @@ class DCFWorker(object):
             server_port,
             global_model_version_changed_callback,
             get_worker_version_of_global_model,
-            private_key_file):
+            private_key_file,
+            upload_chunk_size=None,
+            stream_global_model=False,
+            follow_download_schedule=True,
+            binary_protocol=False,
+            push_notifications=False,
+            peer_port=None,
+            peer_host=None,
+            peer_site=None,
+            server_public_key_file=None):
         self.server_protocol = server_protocol
 
         self.server_host_ip = server_host_ip
@@ -73,6 +136,26 @@ class DCFWorker(object):
 
         self.server_loc = f"{self.server_protocol}://{self.server_host_ip}:{self.server_port}"
         self.worker_id = None
+        self.upload_chunk_size = upload_chunk_size
+        self.stream_global_model = stream_global_model
+        self.follow_download_schedule = follow_download_schedule
+        self.binary_protocol = binary_protocol
+        # whether the binary protocol is used - known once the worker is registered
+        self.use_binary_protocol = False
+        self.push_notifications = push_notifications
+        # (ETag, received bytes) of an interrupted global model download that can be resumed
+        self.partial_global_model = None
+
+        self.peer_server = None
+        if peer_port is not None:
+            peer_host = get_host_ip() if peer_host is None else peer_host
+            self.peer_server = PeerModelServer(peer_host, peer_port)
+            self.peer_address = f"http://{peer_host}:{peer_port}"
+        self.peer_site = peer_site
+        self.server_verify_key = None
+        if server_public_key_file is not None:
+            with open(server_public_key_file, 'r') as f:
+                self.server_verify_key = VerifyKey(f.read().encode(), encoder=HexEncoder)
 
         self.session = requests.Session()
         self.session.mount(f"{self.server_protocol}://", HTTPAdapter(max_retries=10))
@@ -123,15 +206,45 @@ class DCFWorker(object):
 
         Returns
         -------
-        str:
-            The hex string corresponding to the signed string.
+        str or bytes:
+            The hex string corresponding to the signed string, or the signed
+            string itself if the binary protocol is used.
         """
         if self.private_key is None:
             logger.warning(
                 "Unable to sign message - no private key file provided.")
-            return "No private key was provided when worker was started."
-        else:
-            return self.private_key.sign(phrase_to_sign).hex()
+            message = "No private key was provided when worker was started."
+            return message.encode() if self.use_binary_protocol else message
+        signed_phrase = self.private_key.sign(phrase_to_sign)
+        return bytes(signed_phrase) if self.use_binary_protocol else signed_phrase.hex()
+
+    def post_request_data(self, url, data, **kwargs):
+        """
+        Posts the data to the server, as msgpack if the binary protocol is
+        used and as JSON otherwise.
+
+        Parameters
+        ----------
+
+        url: str
+            The url to post the data to.
+
+        data: dict
+            The data to post.
+
+        **kwargs:
+            Further arguments for requests.Session.post.
+
+        Returns
+        -------
+
+        requests.Response:
+            The response from the server.
+        """
+        if self.use_binary_protocol:
+            headers = dict(kwargs.pop('headers', None) or {}, **{'Content-Type': MSGPACK_CONTENT_TYPE})
+            return self.session.post(url, data=msgpack.packb(data), headers=headers, **kwargs)
+        return self.session.post(url, json=data, **kwargs)
 
     def get_public_key_str(self):
         """
@@ -167,8 +280,10 @@ class DCFWorker(object):
                 SIGNED_PHRASE: self.get_signed_phrase()
             }
             logger.info(f"Registering public key (short) {data[PUBLIC_KEY_STR][0:WID_LEN]} with server...")
-            self.worker_id = self.session.post(
-                f"{self.server_loc}/{REGISTER_WORKER_ROUTE}", json=data).content.decode('UTF-8')
+            response = self.session.post(f"{self.server_loc}/{REGISTER_WORKER_ROUTE}", json=data)
+            self.worker_id = response.content.decode('UTF-8')
+            self.use_binary_protocol = self.binary_protocol and \
+                response.headers.get(BINARY_PROTOCOL_HEADER) == BINARY_PROTOCOL_VERSION
 
             if self.worker_id == INVALID_WORKER:
                 raise ValueError(
@@ -180,9 +295,57 @@ class DCFWorker(object):
                 logger.info(f"Registration for public key (short) {data[PUBLIC_KEY_STR][0:WID_LEN]} done.")
         return self.worker_id
 
+    def get_challenge_phrase(self):
+        """
+        Gets a challenge phrase for this worker from the server. If the server
+        reports that the worker has requested too many challenge phrases, it
+        waits and tries again.
+
+        Returns
+        -------
+
+        bytes:
+            The challenge phrase returned by the server, or RATE_LIMITED_WORKER
+            (encoded) if the worker was still rate limited after
+            CHALLENGE_PHRASE_MAX_RETRIES attempts.
+        """
+        for attempt in range(CHALLENGE_PHRASE_MAX_RETRIES):
+            challenge_phrase = self.session.get(
+                f"{self.server_loc}/{CHALLENGE_PHRASE_ROUTE}/{self.worker_id}").content
+            if challenge_phrase != RATE_LIMITED_WORKER.encode():
+                return challenge_phrase
+            logger.warning(f"Challenge phrase request for worker {self.worker_id[0:WID_LEN]} was "
+                           f"rate limited - retrying.")
+            gevent.sleep(CHALLENGE_PHRASE_RETRY_INTERVAL * (attempt + 1))
+        logger.error(f"Unable to get a challenge phrase for worker {self.worker_id[0:WID_LEN]} - "
+                     f"the server is still rate limiting it.")
+        return RATE_LIMITED_WORKER.encode()
+
+    @staticmethod
+    def is_valid_challenge_phrase(challenge_phrase):
+        """
+        Checks that the response from the challenge phrase route is a challenge
+        phrase rather than an error.
+
+        Parameters
+        ----------
+
+        challenge_phrase: bytes
+            The response from the challenge phrase route.
+
+        Returns
+        -------
+
+        bool:
+            True if the challenge phrase can be signed, False otherwise.
+        """
+        return challenge_phrase not in (RATE_LIMITED_WORKER.encode(), INVALID_WORKER.encode())
+
     def get_global_model(self):
         """
         Gets the binary string of the current global model from the server.
+        If the server schedules the downloads of the workers, the worker waits
+        for its slot, with some jitter, before downloading the model.
 
         Returns
         -------
@@ -192,29 +355,191 @@ class DCFWorker(object):
         """
         # First confirm that the global model version is newer
         # compared to the version that the worker has using long polling
-        response = self.session.get(f"{self.server_loc}/{CHALLENGE_PHRASE_ROUTE}/{self.worker_id}")
-        challenge_phrase = response.content
+        challenge_phrase = self.get_challenge_phrase()
+        if not DCFWorker.is_valid_challenge_phrase(challenge_phrase):
+            logger.error(f"Unable to get a challenge phrase - received response {challenge_phrase}")
+            logger.error("Global model not retrieved.")
+            return challenge_phrase
         data = {
             WORKER_ID_KEY: self.worker_id,
             LAST_WORKER_MODEL_VERSION: self.get_worker_version_global_model(),
-            SIGNED_PHRASE: self.get_signed_phrase(challenge_phrase)
+            SIGNED_PHRASE: self.get_signed_phrase(challenge_phrase),
+            DOWNLOAD_SCHEDULE_KEY: self.follow_download_schedule
         }
-        response = self.session.post(
-            f"{self.server_loc}/{NOTIFY_ME_IF_GM_VERSION_UPDATED_ROUTE}",
-            json=data
-        ).content
-        if response != GLOBAL_MODEL_UPDATED_STRING.encode():
+        response = self.post_request_data(
+            f"{self.server_loc}/{NOTIFY_ME_IF_GM_VERSION_UPDATED_ROUTE}", data).content
+        download_delay = DCFWorker.get_download_delay(response)
+        if download_delay is None:
             logger.error(f"Unable to retrieve confirmation global model has changed - received response {response}")
             logger.error("Global model not retrieved.")
+            self.register_again_if_idle_unregistered(response)
             return response
+        return self.fetch_global_model(download_delay)
+
+    def fetch_global_model(self, download_delay=0):
+        """
+        Downloads the global model after waiting for the download delay
+        assigned by the server, plus some jitter. Failed downloads are retried
+        with exponential backoff.
+
+        Parameters
+        ----------
+
+        download_delay: float (default 0)
+            The number of seconds to wait before downloading the model.
+
+        Returns
+        -------
+
+        dict or bytes:
+            The global model, or the error message from the server.
+        """
+        if download_delay > 0:
+            download_delay += random.uniform(0, DOWNLOAD_DELAY_JITTER)
+            logger.info(f"Worker {self.worker_id[0:WID_LEN]} waiting {download_delay:.2f} seconds "
+                        f"for its global model download slot.")
+            gevent.sleep(download_delay)
+
+        data = {WORKER_ID_KEY: self.worker_id}
+        for attempt in range(DOWNLOAD_MAX_RETRIES):
+            challenge_phrase = self.get_challenge_phrase()
+            if not DCFWorker.is_valid_challenge_phrase(challenge_phrase):
+                logger.error(f"Unable to get a challenge phrase - received response {challenge_phrase}")
+                logger.error("Global model not retrieved.")
+                return challenge_phrase
+            data[SIGNED_PHRASE] = self.get_signed_phrase(challenge_phrase)
+            try:
+                if self.peer_server is not None:
+                    return self.download_global_model_from_peers(data)
+                return self.download_global_model(data)
+            except requests.exceptions.RequestException as e:
+                if attempt == DOWNLOAD_MAX_RETRIES - 1:
+                    logger.error(f"Unable to download the global model: {str(e)}")
+                    return str(e).encode()
+                # exponential backoff with full jitter
+                backoff = random.uniform(0, DOWNLOAD_RETRY_INTERVAL * 2 ** attempt)
+                logger.warning(f"Global model download for worker {self.worker_id[0:WID_LEN]} failed ({str(e)}) "
+                               f"- retrying in {backoff:.2f} seconds.")
+                gevent.sleep(backoff)
+
+    @staticmethod
+    def get_download_delay(response):
+        """
+        Reads the response to the request for notification of a global
+        model version change.
+
+        Parameters
+        ----------
+
+        response: bytes
+            The response from the server.
+
+        Returns
+        -------
 
-        # Now get the model.
-        response = self.session.get(f"{self.server_loc}/{CHALLENGE_PHRASE_ROUTE}/{self.worker_id}")
-        challenge_phrase = response.content
-        data[SIGNED_PHRASE] = self.get_signed_phrase(challenge_phrase)
-        del data[LAST_WORKER_MODEL_VERSION]
-        response = self.session.post(f"{self.server_loc}/{RETURN_GLOBAL_MODEL_ROUTE}",
-                                     json=data).content
+        float:
+            The number of seconds the worker should wait before downloading
+            the global model, or None if the response does not say the global
+            model has changed.
+        """
+        if response == GLOBAL_MODEL_UPDATED_STRING.encode():
+            return 0
+        try:
+            schedule = json.loads(response)
+            return float(schedule[DOWNLOAD_DELAY_KEY])
+        except (ValueError, TypeError, KeyError):
+            return None
+
+    def download_global_model(self, data):
+        """
+        Downloads the global model from the server.
+
+        Parameters
+        ----------
+
+        data: dict
+            The id of the worker and the signed challenge phrase.
+
+        Returns
+        -------
+
+        dict or bytes:
+            The global model, or the error message from the server.
+        """
+        headers = {}
+        if not self.stream_global_model and self.partial_global_model is not None:
+            etag, received = self.partial_global_model
+            headers = {'Range': f"bytes={len(received)}-", 'If-Range': etag}
+            logger.info(f"Resuming global model download for worker {self.worker_id[0:WID_LEN]} "
+                        f"at offset {len(received)}.")
+        response = self.post_request_data(f"{self.server_loc}/{RETURN_GLOBAL_MODEL_ROUTE}",
+                                          data, stream=True, headers=headers)
+        if self.stream_global_model and UNCOMPRESSED_SIZE_HEADER in response.headers:
+            try:
+                model = DCFWorker.decompress_model_stream(response)
+                logger.info(f"Received global model for worker {self.worker_id[0:WID_LEN]}")
+                return model
+            except (zlib.error, ValueError) as e:
+                logger.error(f"Unable to decode the global model: {str(e)}")
+                return str(e).encode()
+            finally:
+                response.close()
+        response = self.read_global_model_download(response)
+        if self.register_again_if_idle_unregistered(response):
+            return response
+        return self.decode_global_model(response)
+
+    def read_global_model_download(self, response):
+        """
+        Reads the compressed global model from the response. If the server
+        sends the model from its blob store, which supports Range requests,
+        the bytes received are kept as they arrive, so that an interrupted
+        download is resumed by the next attempt rather than started again.
+
+        Parameters
+        ----------
+
+        response: requests.Response
+            The streamed response from the server.
+
+        Returns
+        -------
+
+        bytes:
+            The compressed global model, or an error message from the server.
+        """
+        etag = response.headers.get('ETag')
+        if response.status_code == 206 and self.partial_global_model is not None \
+                and self.partial_global_model[0] == etag:
+            received = self.partial_global_model[1]
+        else:
+            received = bytearray()
+        resumable = etag is not None and response.headers.get('Accept-Ranges') == 'bytes'
+        self.partial_global_model = (etag, received) if resumable else None
+        try:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                received += chunk
+        finally:
+            response.close()
+        self.partial_global_model = None
+        return bytes(received)
+
+    def decode_global_model(self, response):
+        """
+        Decompresses and decodes the global model.
+
+        Parameters
+        ----------
+
+        response: bytes
+            The compressed global model, or an error message from the server.
+
+        Returns
+        -------
+
+        dict or bytes:
+            The global model, or the error message from the server.
+        """
         try:
             model = msgpack.unpackb(zlib.decompress(response))
             logger.info(f"Received global model for worker {self.worker_id[0:WID_LEN]}")
@@ -226,6 +551,236 @@ class DCFWorker(object):
             logger.error(f"Exception {str(e)} - written error message from server to : {fn}")
             return response
 
+    def get_signed_data(self, data=None):
+        """
+        Returns the data to post to an authenticated route, with the id of
+        the worker and a newly signed challenge phrase.
+
+        Parameters
+        ----------
+
+        data: dict (default None)
+            Further data to post.
+
+        Returns
+        -------
+
+        dict or bytes:
+            The data, or the response from the challenge phrase route if no
+            challenge phrase could be obtained.
+        """
+        challenge_phrase = self.get_challenge_phrase()
+        if not DCFWorker.is_valid_challenge_phrase(challenge_phrase):
+            logger.error(f"Unable to get a challenge phrase - received response {challenge_phrase}")
+            return challenge_phrase
+        signed_data = {WORKER_ID_KEY: self.worker_id, SIGNED_PHRASE: self.get_signed_phrase(challenge_phrase)}
+        signed_data.update(data or {})
+        return signed_data
+
+    def is_valid_manifest(self, manifest):
+        """
+        Checks the peer manifest returned by the server and, if the worker
+        has the public key of the server, the signature of the content hash.
+
+        Parameters
+        ----------
+
+        manifest: dict
+            The manifest.
+
+        Returns
+        -------
+
+        bool:
+            True if the worker can download the model from the peers in the
+            manifest, False otherwise.
+        """
+        if not isinstance(manifest, dict) or not isinstance(manifest.get(CONTENT_HASH_KEY), str) \
+                or not isinstance(manifest.get(PEERS_KEY), list):
+            return False
+        if self.server_verify_key is None:
+            return True
+        try:
+            self.server_verify_key.verify(manifest[CONTENT_HASH_KEY].encode(),
+                                          bytes.fromhex(manifest[CONTENT_SIGNATURE_KEY]))
+            return True
+        except (KeyError, ValueError, TypeError, BadSignatureError):
+            logger.error("The server did not sign the hash of the global model - not downloading it from peers.")
+            return False
+
+    def download_global_model_from_peer(self, address, content_hash):
+        """
+        Downloads the compressed global model from a peer.
+
+        Parameters
+        ----------
+
+        address: str
+            The address of the peer.
+
+        content_hash: str
+            The sha256 hash of the compressed global model.
+
+        Returns
+        -------
+
+        bytes:
+            The compressed global model, or None if the peer did not return a
+            model with the given hash.
+        """
+        try:
+            # not through the session, which keeps retrying peers that are gone
+            response = requests.get(f"{address}/{PEER_MODEL_ROUTE}/{content_hash}", timeout=PEER_DOWNLOAD_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Unable to download the global model from peer {address}: {str(e)}")
+            return None
+        if response.status_code != 200 or hashlib.sha256(response.content).hexdigest() != content_hash:
+            logger.warning(f"Peer {address} did not return the global model with hash {content_hash[0:WID_LEN]}.")
+            return None
+        return response.content
+
+    def download_global_model_from_peers(self, data):
+        """
+        Downloads the global model from one of the peers given by the server,
+        or from the server if none of them has it, checking its hash before
+        decoding it, and then serves the model to the other peers.
+
+        Parameters
+        ----------
+
+        data: dict
+            The id of the worker and the signed challenge phrase.
+
+        Returns
+        -------
+
+        dict or bytes:
+            The global model, or the error message from the server.
+        """
+        data = dict(data)
+        data[PEER_SITE_KEY] = self.peer_site
+        response = self.post_request_data(f"{self.server_loc}/{PEER_MANIFEST_ROUTE}", data).content
+        if self.register_again_if_idle_unregistered(response):
+            return response
+        try:
+            manifest = json.loads(response)
+        except ValueError:
+            logger.error(f"Unable to get the peers for the global model - received response {response}")
+            return response
+        if ERROR_MESSAGE_KEY in manifest:
+            logger.error(f"Unable to get the peers for the global model - received response {response}")
+            return response
+        if not self.is_valid_manifest(manifest):
+            return self.download_global_model_from_server()
+
+        content_hash = manifest[CONTENT_HASH_KEY]
+        for address in manifest[PEERS_KEY]:
+            compressed_model = self.download_global_model_from_peer(address, content_hash)
+            if compressed_model is not None:
+                logger.info(f"Worker {self.worker_id[0:WID_LEN]} downloaded the global model from peer {address}.")
+                model = self.decode_global_model(compressed_model)
+                self.share_global_model(content_hash, compressed_model)
+                return model
+        return self.download_global_model_from_server(content_hash)
+
+    def download_global_model_from_server(self, content_hash=None):
+        """
+        Downloads the compressed global model from the server and, if its
+        hash is the one in the peer manifest, serves it to the other peers.
+
+        Parameters
+        ----------
+
+        content_hash: str (default None)
+            The sha256 hash of the compressed global model in the manifest,
+            if it can be trusted.
+
+        Returns
+        -------
+
+        dict or bytes:
+            The global model, or the error message from the server.
+        """
+        data = self.get_signed_data()
+        if not isinstance(data, dict):
+            return data
+        response = self.post_request_data(f"{self.server_loc}/{RETURN_GLOBAL_MODEL_ROUTE}", data).content
+        if self.register_again_if_idle_unregistered(response):
+            return response
+        model = self.decode_global_model(response)
+        if is_valid_model_dict(model) and hashlib.sha256(response).hexdigest() == content_hash:
+            self.share_global_model(content_hash, response)
+        return model
+
+    def share_global_model(self, content_hash, compressed_model):
+        """
+        Serves the compressed global model to the peers of the worker, and
+        lets the server know about it.
+
+        Parameters
+        ----------
+
+        content_hash: str
+            The sha256 hash of the compressed global model.
+
+        compressed_model: bytes
+            The compressed global model.
+        """
+        self.peer_server.set_content(content_hash, compressed_model)
+        if not self.peer_server.server.started:
+            self.peer_server.start()
+        data = self.get_signed_data({
+            CONTENT_HASH_KEY: content_hash,
+            PEER_ADDRESS_KEY: self.peer_address,
+            PEER_SITE_KEY: self.peer_site
+        })
+        if not isinstance(data, dict):
+            return
+        response = self.post_request_data(f"{self.server_loc}/{PEER_ANNOUNCE_ROUTE}", data).content
+        try:
+            accepted = SUCCESS_MESSAGE_KEY in json.loads(response)
+        except (ValueError, TypeError):
+            accepted = False
+        if not accepted:
+            logger.warning(f"The server did not accept the global model announcement of worker "
+                           f"{self.worker_id[0:WID_LEN]} - received response {response}")
+
+    @staticmethod
+    def decompress_model_stream(response):
+        """
+        Decompresses the global model as it is downloaded into a buffer of
+        the size given by the server, and decodes it in place.
+
+        Parameters
+        ----------
+
+        response: requests.Response
+            The streamed response from the server.
+
+        Returns
+        -------
+
+        dict:
+            The model dictionary, with the GLOBAL_MODEL as a memoryview of the
+            buffer.
+        """
+        buffer = bytearray(int(response.headers[UNCOMPRESSED_SIZE_HEADER]))
+        view = memoryview(buffer)
+        pos = 0
+        decompressor = zlib.decompressobj()
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            while chunk:
+                # never decompress more than there is room left for
+                data = decompressor.decompress(chunk, len(buffer) - pos + 1)
+                if pos + len(data) > len(buffer):
+                    raise ValueError("The global model is larger than the size given by the server.")
+                view[pos:pos + len(data)] = data
+                pos += len(data)
+                chunk = decompressor.unconsumed_tail
+        if not decompressor.eof or pos != len(buffer):
+            raise ValueError("The global model is incomplete.")
+        return unpack_map_view(view)
+
     def send_model_update(self, model_update):
         """
         Sends the model update from the worker. Worker must register before sending
@@ -236,13 +791,211 @@ class DCFWorker(object):
 
         model_update: binary string
             The model update to send to the server.
+
+        Returns
+        -------
+
+        bytes:
+            The response from the server.
+        """
+        compressed_update = zlib.compress(model_update)
+        signed_phrase = self.get_signed_phrase(hashlib.sha256(model_update).digest())
+        response = self.post_model_update(compressed_update, signed_phrase)
+        if self.register_again_if_idle_unregistered(response):
+            response = self.post_model_update(compressed_update, signed_phrase)
+        return response
+
+    def post_model_update(self, compressed_update, signed_phrase):
+        """
+        Posts the compressed model update to the server, either in a single
+        request or in chunks if upload_chunk_size is set.
+
+        Parameters
+        ----------
+
+        compressed_update: bytes
+            The compressed model update.
+
+        signed_phrase: str or bytes
+            The sha256 hash of the uncompressed model update signed by the worker.
+
+        Returns
+        -------
+
+        bytes:
+            The response from the server.
         """
+        if self.upload_chunk_size is not None:
+            return self.upload_model_update_in_chunks(compressed_update, signed_phrase)
+        if self.use_binary_protocol:
+            return self.session.post(
+                f"{self.server_loc}/{RECEIVE_WORKER_UPDATE_ROUTE}/{self.worker_id}",
+                data=compressed_update,
+                headers={'Content-Type': OCTET_STREAM_CONTENT_TYPE,
+                         SIGNATURE_HEADER: base64.b64encode(signed_phrase).decode('ascii')}).content
+        files = {WORKER_MODEL_UPDATE_KEY: compressed_update, SIGNED_PHRASE: signed_phrase}
         return self.session.post(
-            f"{self.server_loc}/{RECEIVE_WORKER_UPDATE_ROUTE}/{self.worker_id}",
-            files={WORKER_MODEL_UPDATE_KEY: zlib.compress(model_update),
-                   SIGNED_PHRASE: self.get_signed_phrase(hashlib.sha256(model_update).digest())
-                   },
-        ).content
+            f"{self.server_loc}/{RECEIVE_WORKER_UPDATE_ROUTE}/{self.worker_id}", files=files).content
+
+    def upload_model_update_in_chunks(self, compressed_update, signed_phrase):
+        """
+        Uploads the compressed model update in chunks of upload_chunk_size
+        bytes. If the connection fails, the worker waits, asks the server how
+        much of the update it has received and carries on from there, up to
+        UPLOAD_MAX_RETRIES times.
+
+        Parameters
+        ----------
+
+        compressed_update: bytes
+            The compressed model update.
+
+        signed_phrase: str or bytes
+            The sha256 hash of the uncompressed model update signed by the worker.
+
+        Returns
+        -------
+
+        bytes:
+            The response from the server to the complete update, or UPLOAD_FAILED
+            (encoded) if the upload could not be completed.
+        """
+        upload_loc = f"{self.server_loc}/{UPLOAD_SESSION_ROUTE}/{self.worker_id}"
+        upload_id = None
+        for attempt in range(UPLOAD_MAX_RETRIES):
+            try:
+                if upload_id is None:
+                    reply = self.post_request_data(upload_loc, {
+                        UPLOAD_SIZE_KEY: len(compressed_update),
+                        SIGNED_PHRASE: signed_phrase
+                    }).json()
+                    if UPLOAD_RESPONSE_KEY in reply:
+                        return reply[UPLOAD_RESPONSE_KEY].encode()
+                    if ERROR_MESSAGE_KEY in reply:
+                        logger.error(f"Unable to start upload - received response {reply}")
+                        return json.dumps(reply).encode()
+                    upload_id = reply[UPLOAD_ID_KEY]
+                else:
+                    reply = self.session.get(f"{upload_loc}/{upload_id}").json()
+                    if ERROR_MESSAGE_KEY in reply:
+                        logger.warning(f"Upload {upload_id[0:WID_LEN]} is no longer known to the server "
+                                       f"- starting again.")
+                        upload_id = None
+                        continue
+                    if UPLOAD_RESPONSE_KEY in reply:
+                        return reply[UPLOAD_RESPONSE_KEY].encode()
+                    logger.info(f"Resuming upload {upload_id[0:WID_LEN]} at offset {reply[UPLOAD_OFFSET_KEY]}.")
+                offset = reply[UPLOAD_OFFSET_KEY]
+
+                while True:
+                    chunk = compressed_update[offset:offset + self.upload_chunk_size]
+                    reply = self.session.put(f"{upload_loc}/{upload_id}", data=chunk, headers={
+                        UPLOAD_OFFSET_HEADER: str(offset),
+                        UPLOAD_CHECKSUM_HEADER: hashlib.sha256(chunk).hexdigest()
+                    }).json()
+                    if UPLOAD_RESPONSE_KEY in reply:
+                        logger.info(f"Upload {upload_id[0:WID_LEN]} for worker {self.worker_id[0:WID_LEN]} done.")
+                        return reply[UPLOAD_RESPONSE_KEY].encode()
+                    if ERROR_MESSAGE_KEY in reply:
+                        logger.warning(f"Upload {upload_id[0:WID_LEN]} failed - received response {reply}")
+                        upload_id = None
+                        break
+                    if reply[UPLOAD_OFFSET_KEY] <= offset:
+                        logger.warning(f"Chunk at offset {offset} of upload {upload_id[0:WID_LEN]} was rejected.")
+                        break
+                    offset = reply[UPLOAD_OFFSET_KEY]
+
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"Upload for worker {self.worker_id[0:WID_LEN]} was interrupted: {e}")
+            gevent.sleep(UPLOAD_RETRY_INTERVAL * (attempt + 1))
+
+        logger.error(f"Unable to upload the model update for worker {self.worker_id[0:WID_LEN]}.")
+        return UPLOAD_FAILED.encode()
+
+    def register_again_if_idle_unregistered(self, response):
+        """
+        Registers the worker with the server again if the response from the
+        server says that the worker was unregistered for being idle, for
+        instance because it was training for longer than the server's idle
+        timeout. Workers unregistered by the server admin are not registered
+        again.
+
+        Parameters
+        ----------
+
+        response: bytes
+            The response from the server.
+
+        Returns
+        -------
+
+        bool:
+            True if the worker registered again, False otherwise.
+        """
+        if response != IDLE_UNREGISTERED_WORKER.encode():
+            return False
+        logger.info(f"Worker {self.worker_id[0:WID_LEN]} was unregistered for being idle - registering again.")
+        self.worker_id = None
+        self.register_worker()
+        return True
+
+    def get_model_version_events(self):
+        """
+        Subscribes to the global model version events of the server and
+        returns the events as they arrive, until the server closes the stream.
+
+        Returns
+        -------
+
+        generator of (str, dict):
+            The type and data of each event.
+        """
+        challenge_phrase = self.get_challenge_phrase()
+        if not DCFWorker.is_valid_challenge_phrase(challenge_phrase):
+            logger.error(f"Unable to get a challenge phrase - received response {challenge_phrase}")
+            return
+        data = {
+            WORKER_ID_KEY: self.worker_id,
+            LAST_WORKER_MODEL_VERSION: self.get_worker_version_global_model(),
+            SIGNED_PHRASE: self.get_signed_phrase(challenge_phrase),
+            DOWNLOAD_SCHEDULE_KEY: self.follow_download_schedule
+        }
+        response = self.post_request_data(f"{self.server_loc}/{MODEL_VERSION_EVENTS_ROUTE}", data, stream=True)
+        try:
+            if not response.headers.get('Content-Type', '').startswith(EVENT_STREAM_CONTENT_TYPE):
+                logger.error(f"Unable to subscribe to global model version events - "
+                             f"received response {response.content}")
+                self.register_again_if_idle_unregistered(response.content)
+                return
+            logger.info(f"Worker {self.worker_id[0:WID_LEN]} subscribed to global model version events.")
+            # events are small and must be handled as soon as they arrive,
+            # rather than once a larger chunk of the stream has been read
+            yield from parse_server_sent_events(response.iter_lines(chunk_size=1, decode_unicode=True))
+        finally:
+            response.close()
+
+    def run_with_push_notifications(self):
+        """
+        Runs the main worker loop with push notifications - this calls the
+        global_model_version_changed_callback each time the server sends
+        an event that the global model has changed, and subscribes again
+        whenever the stream is closed.
+        """
+        while True:
+            try:
+                for event, data in self.get_model_version_events():
+                    if event == MODEL_VERSION_EVENT:
+                        model_dict = self.fetch_global_model(data.get(DOWNLOAD_DELAY_KEY, 0))
+                        if is_valid_model_dict(model_dict):
+                            self.global_model_version_changed_callback(model_dict)
+                    elif event == WORKER_STATUS_EVENT:
+                        logger.warning(f"Global model version events for worker {self.worker_id[0:WID_LEN]} "
+                                       f"stopped: {data[ERROR_MESSAGE_KEY]}")
+                        self.register_again_if_idle_unregistered(data[ERROR_MESSAGE_KEY].encode())
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Global model version event stream for worker {self.worker_id[0:WID_LEN]} "
+                               f"was interrupted: {str(e)}")
+            gevent.sleep(EVENT_RECONNECT_INTERVAL)
 
     def run(self):
         """
@@ -250,6 +1003,8 @@ class DCFWorker(object):
         has changed.
         """
         try:
+            if self.push_notifications:
+                self.run_with_push_notifications()
             while True:
                 model_dict = self.get_global_model()
                 if is_valid_model_dict(model_dict):
@@ -0,0 +1,124 @@
+"""
+On-disk cache of the latest global model received by a worker, so that a
+restarted worker can carry on from the model it had rather than download
+it again.
+"""
+import os
+import struct
+import hashlib
+import msgpack
+
+from dc_federated.backend._constants import GLOBAL_MODEL, GLOBAL_MODEL_VERSION
+from dc_federated.backend.backend_utils import create_model_dict
+
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+CACHE_VERSION_KEY = 'version'
+CACHE_SHA256_KEY = 'sha256'
+CACHE_SIZE_KEY = 'size'
+_HEADER_LEN_FORMAT = '>I'
+
+
+class WorkerModelCache(object):
+    """
+    Stores the latest global model along with its version and sha256 hash in
+    a single file. The file starts with the length of a msgpack header
+    holding the version, hash and size of the model, followed by the header
+    and the serialized model itself.
+
+    The file is replaced atomically: the new model is written to a temporary
+    file in the same folder, flushed to disk and then renamed over the old
+    one, so that a crash leaves either the old or the new model in place.
+    The hash guards against a file that was corrupted on disk.
+
+    Parameters
+    ----------
+
+    cache_file: str
+        The path of the cache file.
+    """
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+
+    def save(self, model_dict):
+        """
+        Saves the global model to the cache.
+
+        Parameters
+        ----------
+
+        model_dict: dict
+            Dictionary with the GLOBAL_MODEL and GLOBAL_MODEL_VERSION.
+        """
+        model = memoryview(model_dict[GLOBAL_MODEL]).cast('B')
+        header = msgpack.packb({
+            CACHE_VERSION_KEY: model_dict[GLOBAL_MODEL_VERSION],
+            CACHE_SHA256_KEY: hashlib.sha256(model).hexdigest(),
+            CACHE_SIZE_KEY: len(model)
+        })
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(struct.pack(_HEADER_LEN_FORMAT, len(header)))
+            f.write(header)
+            f.write(model)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.cache_file)
+        self._sync_folder()
+        logger.info(f"Cached global model version {model_dict[GLOBAL_MODEL_VERSION]} in {self.cache_file}.")
+
+    def _sync_folder(self):
+        """
+        Flushes the rename of the cache file to disk, where supported.
+        """
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.cache_file)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def load(self):
+        """
+        Loads the global model from the cache.
+
+        Returns
+        -------
+
+        dict:
+            Dictionary with the GLOBAL_MODEL (as a bytearray) and the
+            GLOBAL_MODEL_VERSION, or None if there is no valid cached model.
+        """
+        if not os.path.isfile(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file, 'rb') as f:
+                header_len = struct.unpack(_HEADER_LEN_FORMAT, f.read(struct.calcsize(_HEADER_LEN_FORMAT)))[0]
+                header = msgpack.unpackb(f.read(header_len))
+                model = bytearray(header[CACHE_SIZE_KEY])
+                if f.readinto(model) != len(model) or len(f.read(1)) > 0:
+                    raise ValueError("unexpected file size")
+        except (OSError, ValueError, KeyError, TypeError, struct.error, msgpack.UnpackException) as e:
+            logger.warning(f"Unable to read the cached global model in {self.cache_file}: {e}")
+            return None
+        if hashlib.sha256(model).hexdigest() != header[CACHE_SHA256_KEY]:
+            logger.warning(f"The cached global model in {self.cache_file} is corrupted - ignoring it.")
+            return None
+        logger.info(f"Loaded global model version {header[CACHE_VERSION_KEY]} from {self.cache_file}.")
+        return create_model_dict(model, header[CACHE_VERSION_KEY])
+
+    def clear(self):
+        """
+        Removes the cached global model.
+        """
+        for path in [self.cache_file, f"{self.cache_file}.tmp"]:
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,343 @@
+"""
+Benchmarks the aggregation of the model updates by the FedAvgServer over a
+matrix of models, dtypes and numbers of workers, without any network.
+"""
+
+from gevent import monkey; monkey.patch_all()
+
+import copy
+import time
+import weakref
+import argparse
+from datetime import datetime
+
+import torch
+from torch import nn
+from torch.utils._pytree import tree_leaves
+from torch.utils._python_dispatch import TorchDispatchMode
+
+from dc_federated.algorithms.fed_avg import FedAvgServer, FedAvgModelTrainer
+from dc_federated.stress_test.synthetic_model import make_synthetic_state_dict, parse_size, \
+    SYNTHETIC_DTYPES, SYNTHETIC_NUM_LAYERS
+from dc_federated.benchmark.benchmark_utils import get_result, write_results
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+MODELS = ['mnist', 'mobilenet_v2']
+
+
+class TensorAllocationCounter(TorchDispatchMode):
+    """
+    Counts the tensors allocated by the torch operations run while it is
+    active, and the most memory these tensors held at once. A tensor
+    sharing the storage of one of the inputs of its operation, such as a
+    view or the result of an in-place operation, is not counted.
+    """
+    def __init__(self):
+        super().__init__()
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.live_bytes = 0
+        self.peak_bytes = 0
+
+    def release(self, nbytes):
+        self.live_bytes -= nbytes
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        out = func(*args, **(kwargs or {}))
+        inputs = {t.untyped_storage().data_ptr() for t in tree_leaves((args, kwargs)) if isinstance(t, torch.Tensor)}
+        for t in tree_leaves(out):
+            if isinstance(t, torch.Tensor) and t.untyped_storage().data_ptr() not in inputs:
+                nbytes = t.untyped_storage().nbytes()
+                self.allocations += 1
+                self.allocated_bytes += nbytes
+                self.live_bytes += nbytes
+                self.peak_bytes = max(self.peak_bytes, self.live_bytes)
+                weakref.finalize(t, self.release, nbytes)
+        return out
+
+
+class SyntheticModel(nn.Module):
+    """
+    A model holding the tensors of a synthetic state dict, as made by
+    make_synthetic_state_dict, as buffers with the same keys.
+
+    Parameters
+    ----------
+
+    state_dict: OrderedDict
+        The synthetic state dict.
+    """
+    def __init__(self, state_dict):
+        super().__init__()
+        self.layers = nn.ModuleList()
+        for n in range(len(state_dict)):
+            layer = nn.Module()
+            layer.register_buffer('weight', state_dict[f"layers.{n}.weight"])
+            self.layers.append(layer)
+
+
+class AggregationBenchmarkTrainer(FedAvgModelTrainer):
+    """
+    Trainer holding the global model of the benchmark, which is never
+    trained or tested.
+
+    Parameters
+    ----------
+
+    model: nn.Module
+        The global model.
+    """
+    def __init__(self, model):
+        self.model = model
+
+    def train(self):
+        pass
+
+    def test(self):
+        pass
+
+    def get_model(self):
+        return self.model
+
+    def load_model(self, model_file):
+        self.model = torch.load(model_file)
+
+    def load_model_from_state_dict(self, state_dict):
+        self.model.load_state_dict(state_dict)
+
+    def get_per_session_train_size(self):
+        return 1
+
+
+def make_model(model_name, dtype, synthetic_layers=SYNTHETIC_NUM_LAYERS):
+    """
+    Makes a model of the benchmark, with randomly initialized weights.
+
+    Parameters
+    ----------
+
+    model_name: str
+        One of MODELS, or the size of a synthetic model such as '10MB'.
+
+    dtype: str
+        The dtype of the floating point tensors of the model, or of all the
+        tensors of a synthetic model, one of SYNTHETIC_DTYPES.
+
+    synthetic_layers: int (default SYNTHETIC_NUM_LAYERS)
+        The number of tensors of a synthetic model.
+
+    Returns
+    -------
+
+    nn.Module:
+        The model.
+    """
+    if model_name == 'mnist':
+        from dc_federated.examples.mnist.mnist_fed_model import MNISTNet
+        model = MNISTNet()
+    elif model_name == 'mobilenet_v2':
+        import torchvision.models as models
+        model = models.mobilenet_v2()
+    else:
+        return SyntheticModel(make_synthetic_state_dict(parse_size(model_name), synthetic_layers, dtype))
+    if not getattr(torch, dtype).is_floating_point:
+        raise ValueError(f"The weights of {model_name} cannot be converted to {dtype}.")
+    return model.to(getattr(torch, dtype))
+
+
+def benchmark_agg_model(model, num_workers, repeats):
+    """
+    Times FedAvgServer.agg_model aggregating the updates of num_workers
+    workers, each holding a copy of the model. The server is never started.
+    The first aggregation is run with a TensorAllocationCounter, and the
+    next repeats are timed.
+
+    Parameters
+    ----------
+
+    model: nn.Module
+        The model.
+
+    num_workers: int
+        The number of workers whose updates are aggregated.
+
+    repeats: int
+        The number of timed aggregations.
+
+    Returns
+    -------
+
+    float list, TensorAllocationCounter:
+        The time taken by each aggregation and the counter of the first.
+    """
+    server = FedAvgServer(AggregationBenchmarkTrainer(copy.deepcopy(model)), None,
+                          update_lim=num_workers, server_host_ip='localhost')
+    now = datetime.now()
+    # the workers trained on different amounts of data, so their updates have different weights
+    server.worker_updates = {f"worker_{i}": (now, 1 + i % 10, copy.deepcopy(model)) for i in range(num_workers)}
+
+    def aggregate():
+        server.last_global_model_update_timestamp = datetime(1980, 10, 10)
+        server.unique_updates_since_last_agg = num_workers
+        start = time.perf_counter()
+        if not server.agg_model():
+            raise RuntimeError("The server did not aggregate the updates.")
+        return time.perf_counter() - start
+
+    with TensorAllocationCounter() as counter:
+        aggregate()
+    return [aggregate() for _ in range(repeats)], counter
+
+
+def run_aggregation_benchmark(models, dtypes, worker_counts, repeats=3, synthetic_layers=SYNTHETIC_NUM_LAYERS):
+    """
+    Benchmarks the aggregation for each model, dtype and number of workers.
+    A combination that fails, e.g. because the aggregation does not support
+    the dtype, is reported with its error.
+
+    Parameters
+    ----------
+
+    models: str list
+        The models, from MODELS, or the sizes of synthetic models such as '10MB'.
+
+    dtypes: str list
+        The dtypes, from SYNTHETIC_DTYPES.
+
+    worker_counts: int list
+        The numbers of workers whose updates are aggregated.
+
+    repeats: int (default 3)
+        The number of timed aggregations of each combination.
+
+    synthetic_layers: int (default SYNTHETIC_NUM_LAYERS)
+        The number of tensors of the synthetic models.
+
+    Returns
+    -------
+
+    dict list:
+        The results of the benchmarks, as returned by get_result, with the
+        model, its size in bytes, the dtype, the number of workers, the
+        number and total size of the tensors allocated by the aggregation
+        and the most memory they held at once.
+    """
+    results = []
+    for model_name in models:
+        for dtype in dtypes:
+            try:
+                model = make_model(model_name, dtype, synthetic_layers)
+                model_size = sum(t.numel() * t.element_size() for t in model.state_dict().values())
+            except Exception as e:
+                logger.warning(f"Cannot benchmark {model_name} in {dtype}: {e}")
+                for num_workers in worker_counts:
+                    results.append(get_result('agg_model', [], repeats, 0, model=model_name, model_size=None,
+                                              dtype=dtype, num_workers=num_workers, error=str(e)))
+                continue
+            for num_workers in worker_counts:
+                parameters = {'model': model_name, 'model_size': model_size, 'dtype': dtype,
+                              'num_workers': num_workers}
+                try:
+                    durations, counter = benchmark_agg_model(model, num_workers, repeats)
+                    results.append(get_result('agg_model', durations, 0, sum(durations), **parameters,
+                                              allocations=counter.allocations,
+                                              allocated_bytes=counter.allocated_bytes,
+                                              peak_bytes=counter.peak_bytes))
+                except Exception as e:
+                    logger.warning(f"Aggregation of {num_workers} {model_name} models in {dtype} failed: {e}")
+                    results.append(get_result('agg_model', [], repeats, 0, **parameters, error=str(e)))
+                logger.info(f"Benchmarked the aggregation of {num_workers} {model_name} models in {dtype}.")
+    return results
+
+
+def format_aggregation_results(results):
+    """
+    Formats the results of the aggregation benchmark as a table, with the
+    times in milliseconds and the sizes in MB.
+
+    Parameters
+    ----------
+
+    results: dict list
+        The results, as returned by run_aggregation_benchmark.
+
+    Returns
+    -------
+
+    str:
+        The table.
+    """
+    lines = [f"{'model':<14} {'dtype':<9} {'workers':>7} {'size MB':>9} {'mean ms':>10} {'min ms':>10} "
+             f"{'max ms':>10} {'peak MB':>9} {'allocs':>8} {'alloc MB':>9}"]
+
+    def mb(nbytes):
+        return f"{nbytes / 10 ** 6:9.1f}" if nbytes is not None else f"{'-':>9}"
+
+    for r in results:
+        line = f"{r['model']:<14} {r['dtype']:<9} {r['num_workers']:>7} {mb(r['model_size'])} "
+        if 'error' in r:
+            lines.append(line + f"error: {r['error']}")
+        else:
+            lines.append(line + f"{r['latency']['mean'] * 1000:10.1f} {r['latency']['min'] * 1000:10.1f} "
+                                f"{r['latency']['max'] * 1000:10.1f} {mb(r['peak_bytes'])} "
+                                f"{r['allocations']:>8} {mb(r['allocated_bytes'])}")
+    return '\n'.join(lines)
+
+
+def get_args():
+    """
+    Parse the arguments of the benchmark.
+    """
+    p = argparse.ArgumentParser(
+        description="Benchmark the aggregation of the FedAvgServer, writing the results as JSON.\n")
+    p.add_argument("--models",
+                   help="The models whose updates are aggregated.",
+                   nargs='*',
+                   choices=MODELS,
+                   default=MODELS)
+    p.add_argument("--synthetic-sizes",
+                   help="The sizes of synthetic models whose updates are aggregated, e.g. 10MB or 1GB.",
+                   nargs='*',
+                   default=['10MB'])
+    p.add_argument("--synthetic-layers",
+                   help="The number of tensors of the synthetic models.",
+                   type=int,
+                   default=SYNTHETIC_NUM_LAYERS)
+    p.add_argument("--dtypes",
+                   help="The dtypes of the models.",
+                   nargs='+',
+                   choices=SYNTHETIC_DTYPES,
+                   default=['float32', 'float16'])
+    p.add_argument("--num-workers",
+                   help="The numbers of workers whose updates are aggregated.",
+                   type=int,
+                   nargs='+',
+                   default=[10, 50, 100])
+    p.add_argument("--repeats",
+                   help="The number of timed aggregations of each combination.",
+                   type=int,
+                   default=3)
+    p.add_argument("--output",
+                   help="The JSON file the results are written to.",
+                   type=str,
+                   default='benchmark_aggregation.json')
+    p.add_argument("--verbose",
+                   help="Log the messages of the server.",
+                   action='store_true')
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    results = run_aggregation_benchmark(args.models + args.synthetic_sizes, args.dtypes, args.num_workers,
+                                        args.repeats, args.synthetic_layers)
+    write_results(results, args.output, vars(args), torch=torch.__version__,
+                  torch_threads=torch.get_num_threads())
+    print(format_aggregation_results(results))
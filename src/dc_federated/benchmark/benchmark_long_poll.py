@@ -0,0 +1,467 @@
+"""
+Benchmarks how the long polling of the DCFServer scales with the number of
+workers waiting for a new global model: the memory each waiting request
+takes, the CPU used by the server while they wait and the time it takes to
+notify them all of a new version.
+"""
+
+from gevent import monkey; monkey.patch_all()
+import gevent
+from gevent import Greenlet
+from gevent.lock import BoundedSemaphore
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import resource
+import argparse
+import tempfile
+import subprocess
+
+import requests
+from bottle import GeventServer
+
+from dc_federated.backend import DCFServer, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.benchmark.benchmark_utils import get_result, write_results, get_rss, get_cpu_time, \
+    wait_for_server
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+# the connections from one source address to the server are limited by the
+# range of ephemeral ports, so the waiters are spread over loopback addresses
+WAITERS_PER_SOURCE_ADDRESS = 20000
+LISTEN_BACKLOG = 4096
+BENCHMARK_ADMIN_USERNAME = 'benchmark'
+BENCHMARK_ADMIN_PASSWORD = 'benchmark'
+PARK_POLL_INTERVAL = 0.5
+
+
+def raise_open_files_limit(num_files):
+    """
+    Raises the limit on the number of open files of this process to its
+    hard limit.
+
+    Parameters
+    ----------
+
+    num_files: int
+        The number of files the process needs to open.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and hard < num_files:
+        raise ValueError(f"{num_files} files need to be opened but at most {hard} can be - "
+                         "raise the limit on the number of open files (ulimit -n).")
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def serve_long_polls(num_workers, host, port, model_check_interval, ids_file):
+    """
+    Runs a DCFServer in unsafe mode for the benchmark, with num_workers
+    registered workers whose ids are written to ids_file. The version of
+    the global model goes up each time the process receives a SIGUSR1.
+
+    Parameters
+    ----------
+
+    num_workers: int
+        The number of workers.
+
+    host: str
+        The host the server listens on.
+
+    port: int
+        The port the server listens on.
+
+    model_check_interval: float
+        The interval at which the server checks for a new global model for
+        the waiting long polling requests.
+
+    ids_file: str
+        The file the ids of the workers are written to, one per line.
+    """
+    raise_open_files_limit(num_workers + 100)
+    version = 0
+
+    def release_new_version():
+        nonlocal version
+        version += 1
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(b'', version),
+        is_global_model_most_recent=lambda worker_version: worker_version == version,
+        receive_worker_update_callback=lambda worker_id, update: '',
+        server_mode_safe=False,
+        key_list_file=None,
+        load_last_session_workers=False,
+        path_to_keys_db=os.path.join(os.path.dirname(ids_file), 'keys_db.json'),
+        server_host_ip=host,
+        server_port=port,
+        model_check_interval=model_check_interval
+    )
+    worker_ids = []
+    for _ in range(num_workers):
+        worker_id, _ = dcf_server.worker_manager.add_worker('')
+        dcf_server.worker_manager.set_registration_status(worker_id, True)
+        worker_ids.append(worker_id)
+    with open(ids_file + '.tmp', 'w') as f:
+        f.write('\n'.join(worker_ids))
+    os.replace(ids_file + '.tmp', ids_file)
+
+    gevent.signal_handler(signal.SIGUSR1, release_new_version)
+    dcf_server.start_server(GeventServer(host=host, port=port, backlog=LISTEN_BACKLOG))
+
+
+class LongPollWaiter(object):
+    """
+    A long polling request for a new global model, sent over a raw socket so
+    that tens of thousands of them can wait in one process.
+
+    Parameters
+    ----------
+
+    worker_id: str
+        The id of the worker making the request.
+
+    host: str
+        The host of the server.
+
+    port: int
+        The port of the server.
+
+    source_address: str
+        The address the request is sent from.
+    """
+    def __init__(self, worker_id, host, port, source_address):
+        self.worker_id = worker_id
+        self.host = host
+        self.port = port
+        self.source_address = source_address
+        self.sent = False
+        self.notified_at = None
+        self.error = None
+
+    def wait(self, connect_semaphore):
+        """
+        Sends the request, waiting for no new global model beyond version 0,
+        and records when the notification is received.
+
+        Parameters
+        ----------
+
+        connect_semaphore: gevent.lock.BoundedSemaphore
+            Limits the number of connections being opened at once.
+        """
+        body = json.dumps({
+            WORKER_ID_KEY: self.worker_id,
+            LAST_WORKER_MODEL_VERSION: 0,
+            SIGNED_PHRASE: ''
+        }).encode()
+        request = (f"POST /{NOTIFY_ME_IF_GM_VERSION_UPDATED_ROUTE} HTTP/1.1\r\n"
+                   f"Host: {self.host}:{self.port}\r\n"
+                   f"Content-Type: application/json\r\n"
+                   f"Content-Length: {len(body)}\r\n"
+                   f"Connection: close\r\n\r\n").encode() + body
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            with connect_semaphore:
+                if self.source_address is not None:
+                    sock.bind((self.source_address, 0))
+                sock.connect((self.host, self.port))
+                sock.sendall(request)
+            self.sent = True
+            data = b''
+            while GLOBAL_MODEL_UPDATED_STRING.encode() not in data:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    self.error = f"Unexpected response: {data[-200:]}"
+                    return
+                data += chunk
+            self.notified_at = time.perf_counter()
+        except OSError as e:
+            self.error = str(e)
+        finally:
+            sock.close()
+
+
+def get_active_long_polls(host, port):
+    """
+    Returns the number of long polling requests waiting in the server,
+    read from its metrics.
+    """
+    metrics = requests.get(f"http://{host}:{port}/{METRICS_ROUTE}",
+                           auth=(BENCHMARK_ADMIN_USERNAME, BENCHMARK_ADMIN_PASSWORD)).text
+    for line in metrics.splitlines():
+        if line.startswith('dcf_active_long_polls '):
+            return int(float(line.split()[1]))
+    return None
+
+
+def benchmark_long_polls(num_waiters, host='127.0.0.1', port=5060, model_check_interval=1.0,
+                         idle_seconds=10, connect_concurrency=500, park_timeout=600, wakeup_timeout=600,
+                         verbose=False):
+    """
+    Starts a server in a subprocess and parks num_waiters long polling
+    requests on it, from as many workers. Once they are all waiting, the
+    resident memory and the CPU time of the server are measured over
+    idle_seconds, after which a new global model version is released and
+    the time each request takes to be answered is measured.
+
+    Parameters
+    ----------
+
+    num_waiters: int
+        The number of long polling requests.
+
+    host: str (default '127.0.0.1')
+        The host the server listens on.
+
+    port: int (default 5060)
+        The port the server listens on.
+
+    model_check_interval: float (default 1.0)
+        The interval at which the server checks for a new global model for
+        the waiting requests.
+
+    idle_seconds: float (default 10)
+        The number of seconds over which the CPU used by the server while the
+        requests wait is measured.
+
+    connect_concurrency: int (default 500)
+        The number of connections opened at once while parking the requests.
+
+    park_timeout: float (default 600)
+        The number of seconds after which the requests that are not waiting
+        in the server are given up on.
+
+    wakeup_timeout: float (default 600)
+        The number of seconds after which the requests not answered since
+        the release of the new version are counted as errors.
+
+    verbose: bool (default False)
+        Whether the server logs its messages.
+
+    Returns
+    -------
+
+    dict:
+        The result, as returned by get_result, with the latencies of the
+        notifications from the release of the new version, the memory of the
+        server before and after the requests were parked, the memory per
+        request, the share of a core used by the server while the requests
+        waited and the time taken to park them.
+    """
+    raise_open_files_limit(num_waiters + 100)
+    ids_file = os.path.join(tempfile.mkdtemp(prefix='dcf_benchmark_'), 'worker_ids.txt')
+    env = dict(os.environ, **{ADMIN_USERNAME: BENCHMARK_ADMIN_USERNAME, ADMIN_PASSWORD: BENCHMARK_ADMIN_PASSWORD})
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'dc_federated.benchmark.benchmark_long_poll', '--serve',
+         '--num-waiters', str(num_waiters), '--host', host, '--port', str(port),
+         '--model-check-interval', str(model_check_interval), '--ids-file', ids_file] +
+        (['--verbose'] if verbose else []), env=env)
+    try:
+        wait_for_server(server, port, host)
+        with open(ids_file) as f:
+            worker_ids = f.read().split()
+        rss_before = get_rss(server.pid)
+
+        loopback = host.startswith('127.')
+        waiters = [LongPollWaiter(worker_id, host, port,
+                                  f"127.0.0.{1 + i // WAITERS_PER_SOURCE_ADDRESS}" if loopback else None)
+                   for i, worker_id in enumerate(worker_ids)]
+        connect_semaphore = BoundedSemaphore(connect_concurrency)
+        park_start = time.perf_counter()
+        greenlets = [Greenlet.spawn(waiter.wait, connect_semaphore) for waiter in waiters]
+        while get_active_long_polls(host, port) < num_waiters:
+            if time.perf_counter() - park_start > park_timeout or all(g.ready() for g in greenlets):
+                logger.warning(f"Only {get_active_long_polls(host, port)} of {num_waiters} "
+                               f"requests are waiting in the server.")
+                break
+            gevent.sleep(PARK_POLL_INTERVAL)
+        park_duration = time.perf_counter() - park_start
+        rss_parked = get_rss(server.pid)
+        logger.info(f"Parked {num_waiters} requests in {park_duration:.1f} seconds.")
+
+        cpu_start = get_cpu_time(server.pid)
+        idle_start = time.perf_counter()
+        gevent.sleep(idle_seconds)
+        idle_cpu = (get_cpu_time(server.pid) - cpu_start) / (time.perf_counter() - idle_start)
+
+        released_at = time.perf_counter()
+        server.send_signal(signal.SIGUSR1)
+        gevent.joinall(greenlets, timeout=wakeup_timeout)
+        latencies = [waiter.notified_at - released_at for waiter in waiters if waiter.notified_at is not None]
+        errors = len(waiters) - len(latencies)
+        for waiter in waiters:
+            if waiter.error is not None:
+                logger.warning(f"Long polling request failed: {waiter.error}")
+                break
+        gevent.killall(greenlets)
+    finally:
+        server.terminate()
+        server.wait()
+
+    return get_result('long_poll_wakeup', latencies, errors, max(latencies) if len(latencies) > 0 else 0,
+                      waiters=num_waiters,
+                      model_check_interval=model_check_interval,
+                      park_duration=park_duration,
+                      server_rss_before=rss_before,
+                      server_rss_parked=rss_parked,
+                      server_rss_per_waiter=(rss_parked - rss_before) / num_waiters,
+                      server_idle_cpu=idle_cpu)
+
+
+def run_long_poll_benchmark(waiter_counts, host='127.0.0.1', port=5060, model_check_interval=1.0,
+                            idle_seconds=10, connect_concurrency=500, timeout=600, verbose=False):
+    """
+    Runs benchmark_long_polls for each number of waiting requests, each
+    against a new server process.
+
+    Parameters
+    ----------
+
+    waiter_counts: int list
+        The numbers of long polling requests.
+
+    host: str (default '127.0.0.1')
+        The host the server listens on.
+
+    port: int (default 5060)
+        The port the server listens on.
+
+    model_check_interval: float (default 1.0)
+        The interval at which the server checks for a new global model.
+
+    idle_seconds: float (default 10)
+        The number of seconds over which the idle CPU use is measured.
+
+    connect_concurrency: int (default 500)
+        The number of connections opened at once while parking the requests.
+
+    timeout: float (default 600)
+        The number of seconds given to park the requests, and then to
+        notify them.
+
+    verbose: bool (default False)
+        Whether the server logs its messages.
+
+    Returns
+    -------
+
+    dict list:
+        The results of the benchmarks.
+    """
+    results = []
+    for num_waiters in waiter_counts:
+        results.append(benchmark_long_polls(num_waiters, host, port, model_check_interval, idle_seconds,
+                                            connect_concurrency, timeout, timeout, verbose))
+        logger.info(f"Benchmarked {num_waiters} long polling requests.")
+    return results
+
+
+def format_long_poll_results(results):
+    """
+    Formats the results of the long polling benchmark as a table, with the
+    memory in MB, the memory per waiting request in KB, the idle CPU use in
+    percent of a core and the notification times in milliseconds.
+
+    Parameters
+    ----------
+
+    results: dict list
+        The results, as returned by run_long_poll_benchmark.
+
+    Returns
+    -------
+
+    str:
+        The table.
+    """
+    lines = [f"{'waiters':>8} {'errors':>6} {'park s':>8} {'RSS MB':>8} {'KB/waiter':>9} {'idle CPU %':>10} "
+             f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'last ms':>9}"]
+
+    def ms(seconds):
+        return f"{seconds * 1000:9.1f}" if seconds is not None else f"{'-':>9}"
+
+    for r in results:
+        lines.append(f"{r['waiters']:>8} {r['errors']:>6} {r['park_duration']:8.1f} "
+                     f"{r['server_rss_parked'] / 10 ** 6:8.1f} {r['server_rss_per_waiter'] / 1000:9.1f} "
+                     f"{r['server_idle_cpu'] * 100:10.1f} {ms(r['latency']['p50'])} {ms(r['latency']['p95'])} "
+                     f"{ms(r['latency']['p99'])} {ms(r['latency']['max'])}")
+    return '\n'.join(lines)
+
+
+def get_args():
+    """
+    Parse the arguments of the benchmark.
+    """
+    p = argparse.ArgumentParser(
+        description="Benchmark the memory, idle CPU and wake-up time of many long polling requests "
+                    "waiting in the DCFServer, writing the results as JSON.\n")
+    p.add_argument("--num-waiters",
+                   help="The numbers of long polling requests waiting at once.",
+                   type=int,
+                   nargs='+',
+                   default=[1000, 10000, 50000])
+    p.add_argument("--host",
+                   help="The host the server listens on.",
+                   type=str,
+                   default='127.0.0.1')
+    p.add_argument("--port",
+                   help="The port the server listens on.",
+                   type=int,
+                   default=5060)
+    p.add_argument("--model-check-interval",
+                   help="The interval at which the server checks for a new global model.",
+                   type=float,
+                   default=1.0)
+    p.add_argument("--idle-seconds",
+                   help="The number of seconds over which the CPU used by the idle server is measured.",
+                   type=float,
+                   default=10)
+    p.add_argument("--connect-concurrency",
+                   help="The number of connections opened at once while parking the requests.",
+                   type=int,
+                   default=500)
+    p.add_argument("--timeout",
+                   help="The number of seconds given to park the requests, and then to notify them.",
+                   type=float,
+                   default=600)
+    p.add_argument("--output",
+                   help="The JSON file the results are written to.",
+                   type=str,
+                   default='benchmark_long_poll.json')
+    p.add_argument("--verbose",
+                   help="Log the requests of the server.",
+                   action='store_true')
+    p.add_argument("--serve",
+                   help="Run the server of the benchmark - used by the benchmark itself.",
+                   action='store_true')
+    p.add_argument("--ids-file",
+                   help="The file the server writes the ids of the workers to - used with --serve.",
+                   type=str,
+                   default=None)
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    sys.argv = sys.argv[:1]
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    if args.serve:
+        serve_long_polls(args.num_waiters[0], args.host, args.port, args.model_check_interval, args.ids_file)
+    else:
+        results = run_long_poll_benchmark(args.num_waiters, args.host, args.port, args.model_check_interval,
+                                          args.idle_seconds, args.connect_concurrency, args.timeout, args.verbose)
+        write_results(results, args.output, vars(args))
+        print(format_long_poll_results(results))
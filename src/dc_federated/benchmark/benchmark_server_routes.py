@@ -0,0 +1,396 @@
+"""
+Benchmarks the routes of the DCFServer, run in the same process as the
+workers calling them.
+"""
+
+from gevent import monkey; monkey.patch_all()
+import gevent
+from gevent import Greenlet
+
+import io
+import os
+import sys
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+from nacl.encoding import HexEncoder
+
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict, is_valid_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.backend.worker_key_pair_tool import gen_pair
+from dc_federated.utils import StoppableConcurrentServer
+from dc_federated.benchmark.benchmark_utils import run_concurrently, get_result, write_results, format_results
+from dc_federated.benchmark.network_emulator import NetworkEmulator, LINK_PROFILES
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+OPERATIONS = ['registration', 'challenge_issue', 'challenge_verify', 'long_poll_wakeup',
+              'model_download', 'update_upload']
+PAYLOAD_OPERATIONS = ['model_download', 'update_upload']
+UPDATE_RECEIVED = "Update received."
+SERVER_START_TIMEOUT = 10
+
+
+class ServerRoutesBenchmark(object):
+    """
+    Starts a DCFServer in safe mode in the current process, on a server
+    handling each request in its own greenlet, along with a set of workers
+    whose keys are known to the server, and times the calls of the workers
+    to the routes of the server. As the workers run in the same process as
+    the server, the timings include the work of the workers (e.g. signing
+    and compression) and the results are best compared between runs on the
+    same machine.
+
+    Parameters
+    ----------
+
+    num_workers: int
+        The number of workers, which should be at least the highest
+        concurrency benchmarked.
+
+    host: str (default 'localhost')
+        The host the server listens on.
+
+    port: int (default 5050)
+        The port the server listens on.
+
+    model_check_interval: float (default 0.05)
+        The interval at which the server checks for a new global model for
+        the waiting long polling requests.
+
+    link_profile: LinkProfile or int -> LinkProfile (default None)
+        The network link of the workers, emulated by a NetworkEmulator
+        between the workers and the server, or None for the workers to call
+        the server directly.
+    """
+    def __init__(self, num_workers, host='localhost', port=5050, model_check_interval=0.05, link_profile=None):
+        self.num_workers = num_workers
+        self.host = host
+        self.port = port
+        self.model_check_interval = model_check_interval
+        self.link_profile = link_profile
+        self.network_emulator = None
+        self.global_model = b''
+        self.global_model_version = 1
+        self.key_dir = None
+        self.dcf_server = None
+        self.stoppable_server = None
+        self.workers = []
+
+    def start(self):
+        """
+        Generates the keys of the workers, starts the server and registers
+        the workers.
+        """
+        self.key_dir = tempfile.mkdtemp(prefix='dcf_benchmark_')
+        self.dcf_server = DCFServer(
+            register_worker_callback=lambda worker_id: None,
+            unregister_worker_callback=lambda worker_id: None,
+            return_global_model_callback=lambda: create_model_dict(self.global_model, self.global_model_version),
+            is_global_model_most_recent=lambda version: version == self.global_model_version,
+            receive_worker_update_callback=lambda worker_id, update: UPDATE_RECEIVED,
+            server_mode_safe=True,
+            key_list_file=None,
+            load_last_session_workers=False,
+            path_to_keys_db=os.path.join(self.key_dir, 'keys_db.json'),
+            server_host_ip=self.host,
+            server_port=self.port,
+            model_check_interval=self.model_check_interval,
+            challenge_rate=None
+        )
+        worker_port = self.port
+        if self.link_profile is not None:
+            self.network_emulator = NetworkEmulator(self.host, self.port, self.link_profile, listen_host=self.host)
+            self.network_emulator.start()
+            worker_port = self.network_emulator.listen_port
+        for i in range(self.num_workers):
+            key_file = os.path.join(self.key_dir, f"worker_{i}")
+            with contextlib.redirect_stdout(io.StringIO()):
+                _, public_key = gen_pair(key_file)
+            self.dcf_server.worker_manager.add_worker(public_key.encode(encoder=HexEncoder).decode('utf-8'))
+            self.workers.append(DCFWorker(
+                server_protocol='http',
+                server_host_ip=self.host,
+                server_port=worker_port,
+                global_model_version_changed_callback=lambda model_dict: None,
+                get_worker_version_of_global_model=lambda: self.global_model_version,
+                private_key_file=key_file))
+
+        self.stoppable_server = StoppableConcurrentServer(host=self.host, port=self.port)
+        self.stoppable_server.quiet = True
+        Greenlet.spawn(self.dcf_server.start_server, self.stoppable_server)
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            try:
+                socket.create_connection((self.host, self.port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"The server did not start on {self.host}:{self.port}.")
+                gevent.sleep(0.1)
+        for worker in self.workers:
+            worker.register_worker()
+
+    def stop(self):
+        """
+        Stops the server and removes the keys of the workers.
+        """
+        if self.network_emulator is not None:
+            self.network_emulator.stop()
+        if self.stoppable_server is not None and self.stoppable_server.server is not None:
+            self.stoppable_server.shutdown()
+        if self.key_dir is not None:
+            shutil.rmtree(self.key_dir, ignore_errors=True)
+
+    def get_signed_challenge(self, worker):
+        challenge_phrase = worker.get_challenge_phrase()
+        if not DCFWorker.is_valid_challenge_phrase(challenge_phrase):
+            raise ValueError(f"Unable to get a challenge phrase: {challenge_phrase}")
+        return worker.get_signed_phrase(challenge_phrase)
+
+    def register(self, client_index, call_index):
+        worker = self.workers[client_index]
+        worker.worker_id = None
+        return worker.register_worker() != INVALID_WORKER
+
+    def issue_challenge(self, client_index, call_index):
+        return DCFWorker.is_valid_challenge_phrase(self.workers[client_index].get_challenge_phrase())
+
+    def verify_challenge(self, client_index, call_index, signed_phrase):
+        # a stale version gets an answer straight away, once the signature is verified
+        worker = self.workers[client_index]
+        response = worker.post_request_data(f"{worker.server_loc}/{NOTIFY_ME_IF_GM_VERSION_UPDATED_ROUTE}", {
+            WORKER_ID_KEY: worker.worker_id,
+            LAST_WORKER_MODEL_VERSION: self.global_model_version - 1,
+            SIGNED_PHRASE: signed_phrase
+        }).content
+        return DCFWorker.get_download_delay(response) is not None
+
+    def download_model(self, client_index, call_index, signed_phrase):
+        worker = self.workers[client_index]
+        return is_valid_model_dict(worker.download_global_model({
+            WORKER_ID_KEY: worker.worker_id,
+            SIGNED_PHRASE: signed_phrase
+        }))
+
+    def upload_update(self, client_index, call_index, update):
+        return self.workers[client_index].send_model_update(update) == UPDATE_RECEIVED.encode()
+
+    def run_long_poll_wakeup(self, num_requests, concurrency):
+        """
+        Parks concurrency long polling requests waiting for a new global
+        model, releases a new version once they are all waiting and times
+        how long each waits from the release until it gets its answer, for
+        as many rounds as needed to make num_requests requests.
+        """
+        latencies = []
+        errors = 0
+        start = time.perf_counter()
+        for _ in range(max(num_requests // concurrency, 1)):
+            released_at = None
+
+            def wait_for_new_version(worker, signed_phrase):
+                nonlocal errors
+                response = worker.post_request_data(
+                    f"{worker.server_loc}/{NOTIFY_ME_IF_GM_VERSION_UPDATED_ROUTE}", {
+                        WORKER_ID_KEY: worker.worker_id,
+                        LAST_WORKER_MODEL_VERSION: self.global_model_version,
+                        SIGNED_PHRASE: signed_phrase
+                    }).content
+                if released_at is not None and DCFWorker.get_download_delay(response) is not None:
+                    latencies.append(time.perf_counter() - released_at)
+                else:
+                    errors += 1
+
+            signed_phrases = [self.get_signed_challenge(worker) for worker in self.workers[:concurrency]]
+            waiters = [Greenlet.spawn(wait_for_new_version, worker, signed_phrase)
+                       for worker, signed_phrase in zip(self.workers[:concurrency], signed_phrases)]
+            while len(self.dcf_server.model_version_req_dict) < concurrency and \
+                    not all(waiter.ready() for waiter in waiters):
+                gevent.sleep(0.01)
+            released_at = time.perf_counter()
+            self.global_model_version += 1
+            gevent.joinall(waiters)
+        return latencies, errors, time.perf_counter() - start
+
+    def run(self, operation, num_requests, concurrency, payload_size=None):
+        """
+        Benchmarks an operation.
+
+        Parameters
+        ----------
+
+        operation: str
+            One of OPERATIONS.
+
+        num_requests: int
+            The number of requests to make.
+
+        concurrency: int
+            The number of workers making requests at the same time.
+
+        payload_size: int (default None)
+            The size in bytes of the global model or of the model update,
+            for the operations in PAYLOAD_OPERATIONS.
+
+        Returns
+        -------
+
+        dict:
+            The result, as returned by get_result.
+        """
+        if concurrency > self.num_workers:
+            raise ValueError(f"The concurrency {concurrency} is higher than the number of workers.")
+        if operation == 'registration':
+            latencies, errors, duration = run_concurrently(self.register, num_requests, concurrency)
+        elif operation == 'challenge_issue':
+            latencies, errors, duration = run_concurrently(self.issue_challenge, num_requests, concurrency)
+        elif operation == 'challenge_verify':
+            latencies, errors, duration = run_concurrently(
+                self.verify_challenge, num_requests, concurrency, prepare=self.prepare_signed_challenge)
+        elif operation == 'long_poll_wakeup':
+            latencies, errors, duration = self.run_long_poll_wakeup(num_requests, concurrency)
+        elif operation == 'model_download':
+            # a new version, so that the model is compressed before the timed downloads
+            self.global_model = os.urandom(payload_size)
+            self.global_model_version += 1
+            self.dcf_server.get_compressed_global_model()
+            latencies, errors, duration = run_concurrently(
+                self.download_model, num_requests, concurrency, prepare=self.prepare_signed_challenge)
+        elif operation == 'update_upload':
+            update = os.urandom(payload_size)
+            latencies, errors, duration = run_concurrently(
+                lambda client_index, call_index: self.upload_update(client_index, call_index, update),
+                num_requests, concurrency)
+        else:
+            raise ValueError(f"Unknown operation {operation}.")
+        parameters = {'concurrency': concurrency}
+        if operation in PAYLOAD_OPERATIONS:
+            parameters['payload_size'] = payload_size
+        return get_result(operation, latencies, errors, duration, **parameters)
+
+    def prepare_signed_challenge(self, client_index, call_index):
+        return self.get_signed_challenge(self.workers[client_index])
+
+
+def run_server_routes_benchmark(operations, concurrencies, payload_sizes, num_requests,
+                                host='localhost', port=5050, model_check_interval=0.05, link_profile=None):
+    """
+    Benchmarks each of the operations at each concurrency, and for each of
+    the payload sizes for the operations with a payload.
+
+    Parameters
+    ----------
+
+    operations: str list
+        The operations to benchmark, from OPERATIONS.
+
+    concurrencies: int list
+        The numbers of workers making requests at the same time.
+
+    payload_sizes: int list
+        The sizes in bytes of the global model and of the model updates.
+
+    num_requests: int
+        The number of requests made for each benchmark.
+
+    host: str (default 'localhost')
+        The host the server listens on.
+
+    port: int (default 5050)
+        The port the server listens on.
+
+    model_check_interval: float (default 0.05)
+        The interval at which the server checks for a new global model.
+
+    link_profile: LinkProfile or int -> LinkProfile (default None)
+        The emulated network link of the workers, or None for the workers to
+        call the server directly.
+
+    Returns
+    -------
+
+    dict list:
+        The results of the benchmarks.
+    """
+    benchmark = ServerRoutesBenchmark(max(concurrencies), host, port, model_check_interval, link_profile)
+    results = []
+    try:
+        benchmark.start()
+        for operation in operations:
+            for concurrency in concurrencies:
+                for payload_size in (payload_sizes if operation in PAYLOAD_OPERATIONS else [None]):
+                    results.append(benchmark.run(operation, num_requests, concurrency, payload_size))
+                    logger.info(f"Benchmarked {operation} at concurrency {concurrency}"
+                                f"{'' if payload_size is None else f' with {payload_size} bytes'}.")
+    finally:
+        benchmark.stop()
+    return results
+
+
+def get_args():
+    """
+    Parse the arguments of the benchmark.
+    """
+    p = argparse.ArgumentParser(
+        description="Benchmark the routes of the DCFServer in-process, writing the results as JSON.\n")
+    p.add_argument("--operations",
+                   help="The operations to benchmark.",
+                   nargs='+',
+                   choices=OPERATIONS,
+                   default=OPERATIONS)
+    p.add_argument("--concurrency",
+                   help="The numbers of workers making requests at the same time.",
+                   type=int,
+                   nargs='+',
+                   default=[1, 10, 50])
+    p.add_argument("--payload-sizes",
+                   help="The sizes in bytes of the global model and of the model updates.",
+                   type=int,
+                   nargs='+',
+                   default=[10 ** 4, 10 ** 6, 10 ** 7])
+    p.add_argument("--num-requests",
+                   help="The number of requests made for each benchmark.",
+                   type=int,
+                   default=200)
+    p.add_argument("--port",
+                   help="The port the server listens on.",
+                   type=int,
+                   default=5050)
+    p.add_argument("--model-check-interval",
+                   help="The interval at which the server checks for a new global model.",
+                   type=float,
+                   default=0.05)
+    p.add_argument("--link-profile",
+                   help="The network link of the workers, emulated between the workers and the server.",
+                   choices=list(LINK_PROFILES),
+                   default=None)
+    p.add_argument("--output",
+                   help="The JSON file the results are written to.",
+                   type=str,
+                   default='benchmark_server_routes.json')
+    p.add_argument("--verbose",
+                   help="Log the requests of the server and of the workers.",
+                   action='store_true')
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    sys.argv = sys.argv[:1]
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    results = run_server_routes_benchmark(args.operations, args.concurrency, args.payload_sizes,
+                                          args.num_requests, port=args.port,
+                                          model_check_interval=args.model_check_interval,
+                                          link_profile=LINK_PROFILES.get(args.link_profile))
+    write_results(results, args.output, vars(args))
+    print(format_results(results))
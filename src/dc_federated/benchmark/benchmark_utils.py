@@ -0,0 +1,324 @@
+"""
+Utilities shared by the benchmarks: running an operation concurrently in
+greenlets, summarizing the latencies, measuring the resources of a server
+process and writing the results as JSON.
+"""
+
+import os
+import json
+import math
+import time
+import socket
+import platform
+import datetime
+
+import gevent
+from gevent import pool
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+SERVER_START_TIMEOUT = 60
+
+
+def percentile(sorted_values, q):
+    """
+    Returns the q-th percentile of the values, by the nearest rank method.
+
+    Parameters
+    ----------
+
+    sorted_values: float list
+        The values in increasing order.
+
+    q: float
+        The percentile, between 0 and 100.
+
+    Returns
+    -------
+
+    float:
+        The percentile, or None if there are no values.
+    """
+    if len(sorted_values) == 0:
+        return None
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize_latencies(latencies):
+    """
+    Summarizes a list of latencies.
+
+    Parameters
+    ----------
+
+    latencies: float list
+        The latencies in seconds.
+
+    Returns
+    -------
+
+    dict:
+        The number of latencies, their mean, minimum, maximum, and 50th, 95th
+        and 99th percentiles, in seconds.
+    """
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if len(values) > 0 else None,
+        'min': values[0] if len(values) > 0 else None,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': values[-1] if len(values) > 0 else None
+    }
+
+
+def run_concurrently(operation, num_requests, concurrency, prepare=None):
+    """
+    Runs num_requests calls of the operation from concurrency greenlets,
+    each greenlet making its calls one after the other, and times each
+    call. A call fails if it raises an exception or returns False.
+
+    Parameters
+    ----------
+
+    operation: int, int -> object
+        The operation, called with the index of the greenlet and the index
+        of the call.
+
+    num_requests: int
+        The total number of calls.
+
+    concurrency: int
+        The number of greenlets making the calls.
+
+    prepare: int, int -> object (default None)
+        If given, called with the same arguments before each call, without
+        being timed, and its result is passed to the operation as a third
+        argument - e.g. to get the challenge phrase a call needs.
+
+    Returns
+    -------
+
+    float list, int, float:
+        The latency of each successful call, the number of failed calls,
+        and the number of seconds taken by all the calls.
+    """
+    latencies = []
+    errors = 0
+
+    def run_client(client_index, num_calls):
+        nonlocal errors
+        for call_index in range(num_calls):
+            try:
+                args = (client_index, call_index) if prepare is None else \
+                    (client_index, call_index, prepare(client_index, call_index))
+            except Exception as e:
+                logger.warning(f"Benchmark call preparation failed: {e}")
+                errors += 1
+                continue
+            start = time.perf_counter()
+            try:
+                succeeded = operation(*args) is not False
+            except Exception as e:
+                logger.warning(f"Benchmark call failed: {e}")
+                succeeded = False
+            if succeeded:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    client_pool = pool.Pool(concurrency)
+    start = time.perf_counter()
+    for client_index in range(concurrency):
+        num_calls = num_requests // concurrency + (1 if client_index < num_requests % concurrency else 0)
+        client_pool.spawn(run_client, client_index, num_calls)
+    client_pool.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+def get_result(operation, latencies, errors, duration, **parameters):
+    """
+    Returns the result of a benchmark run.
+
+    Parameters
+    ----------
+
+    operation: str
+        The name of the operation benchmarked.
+
+    latencies: float list
+        The latency of each successful call.
+
+    errors: int
+        The number of failed calls.
+
+    duration: float
+        The number of seconds taken by all the calls.
+
+    **parameters:
+        The parameters of the run, such as the concurrency.
+
+    Returns
+    -------
+
+    dict:
+        The operation, parameters, number of calls and errors, duration,
+        throughput in successful calls per second and latency summary.
+    """
+    return dict({'operation': operation}, **parameters, **{
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'duration': duration,
+        'throughput': len(latencies) / duration if duration > 0 else None,
+        'latency': summarize_latencies(latencies)
+    })
+
+
+def get_rss(pid):
+    """
+    Returns the resident set size of a process, read from /proc.
+
+    Parameters
+    ----------
+
+    pid: int
+        The id of the process.
+
+    Returns
+    -------
+
+    int:
+        The resident set size in bytes, or None if it cannot be read.
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_cpu_time(pid):
+    """
+    Returns the CPU time used by a process so far, in user and system
+    mode, read from /proc.
+
+    Parameters
+    ----------
+
+    pid: int
+        The id of the process.
+
+    Returns
+    -------
+
+    float:
+        The CPU time in seconds, or None if it cannot be read.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # the fields after the name of the process, which may contain spaces
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def wait_for_server(process, port, host='127.0.0.1'):
+    """
+    Waits until a server started in a subprocess accepts connections.
+
+    Parameters
+    ----------
+
+    process: subprocess.Popen
+        The process of the server.
+
+    port: int
+        The port the server listens on.
+
+    host: str (default '127.0.0.1')
+        The host the server listens on.
+    """
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with code {process.returncode}.")
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"The server did not start on port {port}.")
+
+
+def write_results(results, output_file, config, **sections):
+    """
+    Writes the results of a benchmark to a JSON file, along with its
+    configuration and a description of the machine, so that runs before
+    and after a change can be compared.
+
+    Parameters
+    ----------
+
+    results: dict list
+        The results, as returned by get_result.
+
+    output_file: str
+        The path of the JSON file.
+
+    config: dict
+        The configuration of the benchmark.
+
+    **sections:
+        Further sections of the results, such as measurements over time.
+    """
+    with open(output_file, 'w') as f:
+        json.dump({
+            'timestamp': datetime.datetime.now().isoformat(),
+            'machine': {
+                'python': platform.python_version(),
+                'gevent': gevent.__version__,
+                'platform': platform.platform(),
+                'processor': platform.processor()
+            },
+            'config': config,
+            'results': results,
+            **sections
+        }, f, indent=2)
+    logger.info(f"Benchmark results written to {output_file}.")
+
+
+def format_results(results):
+    """
+    Formats the results as a table, with the latencies in milliseconds.
+
+    Parameters
+    ----------
+
+    results: dict list
+        The results, as returned by get_result.
+
+    Returns
+    -------
+
+    str:
+        The table.
+    """
+    lines = [f"{'operation':<20} {'concurrency':>11} {'payload':>10} {'requests':>8} {'errors':>6} "
+             f"{'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+
+    def ms(seconds):
+        return f"{seconds * 1000:9.2f}" if seconds is not None else f"{'-':>9}"
+
+    for r in results:
+        throughput = f"{r['throughput']:9.1f}" if r['throughput'] is not None else f"{'-':>9}"
+        lines.append(f"{r['operation']:<20} {r.get('concurrency', '-'):>11} {r.get('payload_size', '-'):>10} "
+                     f"{r['requests']:>8} {r['errors']:>6} {throughput} {ms(r['latency']['p50'])} "
+                     f"{ms(r['latency']['p95'])} {ms(r['latency']['p99'])}")
+    return '\n'.join(lines)
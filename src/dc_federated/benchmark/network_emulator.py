@@ -0,0 +1,381 @@
+"""
+A local TCP proxy emulating the network links of the workers - latency,
+jitter, bandwidth and packet loss - to benchmark the server and the workers
+under constrained links without any external service.
+"""
+
+from gevent import monkey; monkey.patch_all()
+import gevent
+from gevent import queue
+from gevent.server import StreamServer
+
+import math
+import time
+import socket
+import random
+import argparse
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+PROXY_CHUNK_SIZE = 8192
+PROXY_BACKLOG = 4096
+SEGMENT_SIZE = 1460
+
+
+class LinkProfile(object):
+    """
+    The characteristics of the network link of a worker.
+
+    Parameters
+    ----------
+
+    latency: float (default 0)
+        The one-way delay of the link in seconds, so that the round trip
+        time is twice the latency.
+
+    jitter: float (default 0)
+        The maximum variation of the latency in seconds - the delay of each
+        chunk of data is drawn uniformly within the latency plus or minus
+        the jitter. As over TCP, the data is still delivered in order.
+
+    upload_bandwidth: float (default None)
+        The bandwidth from the worker to the server in bytes per second, or
+        None for no limit.
+
+    download_bandwidth: float (default None)
+        The bandwidth from the server to the worker in bytes per second, or
+        None for no limit.
+
+    loss: float (default 0)
+        The probability that a TCP segment of SEGMENT_SIZE bytes is lost.
+        Over TCP a lost segment is retransmitted, so each lost segment
+        delays the data behind it by a round trip.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, upload_bandwidth=None, download_bandwidth=None, loss=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.upload_bandwidth = upload_bandwidth
+        self.download_bandwidth = download_bandwidth
+        self.loss = loss
+
+    def to_dict(self):
+        return {
+            'latency': self.latency,
+            'jitter': self.jitter,
+            'upload_bandwidth': self.upload_bandwidth,
+            'download_bandwidth': self.download_bandwidth,
+            'loss': self.loss
+        }
+
+
+# typical links, in bytes per second
+LINK_PROFILES = {
+    'lan': LinkProfile(latency=0.0005),
+    'lte': LinkProfile(latency=0.035, jitter=0.01, upload_bandwidth=5 * 10 ** 6 / 8,
+                       download_bandwidth=12 * 10 ** 6 / 8, loss=0.001),
+    '3g': LinkProfile(latency=0.15, jitter=0.03, upload_bandwidth=768 * 10 ** 3 / 8,
+                      download_bandwidth=1.6 * 10 ** 6 / 8, loss=0.01),
+    'satellite': LinkProfile(latency=0.3, jitter=0.05, upload_bandwidth=10 ** 6 / 8,
+                             download_bandwidth=10 * 10 ** 6 / 8, loss=0.005)
+}
+
+
+class NetworkEmulator(object):
+    """
+    A TCP proxy forwarding the connections it accepts to a target server,
+    such as a DCFServer, through emulated network links. Each connection
+    gets the link given by the profile, and each direction of the
+    connection is emulated separately:
+
+    - the TCP handshake takes a round trip before any data is forwarded.
+    - the data is read from the sender at the bandwidth of the link, so that
+      a sender writing faster than the link is held back, as by the TCP
+      window of a real link.
+    - each chunk of data is delivered after the latency, plus or minus the
+      jitter, and a round trip for each of its segments that is lost.
+      Chunks are delivered in order, so a delayed chunk holds back the ones
+      behind it.
+
+    The congestion control of TCP is not emulated: the bandwidth is not
+    reduced after losses, and there is no slow start.
+
+    Parameters
+    ----------
+
+    target_host: str
+        The host of the target server.
+
+    target_port: int
+        The port of the target server.
+
+    profile: LinkProfile or int -> LinkProfile
+        The link of every connection, or a function returning the link of
+        the connection of the given index (counting from 0 in the order the
+        connections are accepted), e.g. to emulate a mix of links.
+
+    listen_host: str (default '127.0.0.1')
+        The host the proxy listens on.
+
+    listen_port: int (default 0)
+        The port the proxy listens on, a free port if 0.
+
+    seed: int (default None)
+        The seed of the jitter and losses.
+    """
+    def __init__(self, target_host, target_port, profile, listen_host='127.0.0.1', listen_port=0, seed=None):
+        self.target_host = target_host
+        self.target_port = target_port
+        self.profile = profile
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.random = random.Random(seed)
+        self.server = None
+        self.open_sockets = set()
+        self.stats = {'connections': 0, 'upload_bytes': 0, 'download_bytes': 0, 'lost_segments': 0}
+
+    def get_profile(self, connection_index):
+        """
+        Returns the link of the connection of the given index.
+        """
+        if isinstance(self.profile, LinkProfile):
+            return self.profile
+        return self.profile(connection_index)
+
+    def start(self):
+        """
+        Starts accepting connections, in the background.
+        """
+        self.server = StreamServer((self.listen_host, self.listen_port), self.handle, backlog=PROXY_BACKLOG)
+        self.server.start()
+        self.listen_port = self.server.server_port
+        logger.info(f"Emulating the network from {self.listen_host}:{self.listen_port} "
+                    f"to {self.target_host}:{self.target_port}.")
+
+    def serve_forever(self):
+        """
+        Accepts connections until the process is stopped.
+        """
+        if self.server is None:
+            self.start()
+        self.server.serve_forever()
+
+    def stop(self):
+        """
+        Stops accepting connections and closes the open ones.
+        """
+        if self.server is not None:
+            self.server.stop(timeout=1)
+        for sock in list(self.open_sockets):
+            sock.close()
+
+    def handle(self, client, address):
+        """
+        Forwards a connection to the target server through an emulated link.
+
+        Parameters
+        ----------
+
+        client: socket.socket
+            The socket of the connection.
+
+        address: (str, int)
+            The address of the client.
+        """
+        profile = self.get_profile(self.stats['connections'])
+        self.stats['connections'] += 1
+        self.open_sockets.add(client)
+        upstream = None
+        try:
+            gevent.sleep(2 * profile.latency)
+            upstream = socket.create_connection((self.target_host, self.target_port))
+            self.open_sockets.add(upstream)
+            for sock in (client, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            gevent.joinall([
+                gevent.spawn(self.relay, client, upstream, profile, profile.upload_bandwidth, 'upload_bytes'),
+                gevent.spawn(self.relay, upstream, client, profile, profile.download_bandwidth, 'download_bytes')
+            ])
+        except OSError as e:
+            logger.warning(f"Could not connect {address} to {self.target_host}:{self.target_port}: {e}")
+        finally:
+            for sock in (client, upstream):
+                if sock is not None:
+                    sock.close()
+                    self.open_sockets.discard(sock)
+
+    def relay(self, source, destination, profile, bandwidth, stat):
+        """
+        Forwards the data from the source to the destination socket through
+        one direction of an emulated link, until the source closes.
+
+        Parameters
+        ----------
+
+        source: socket.socket
+            The socket the data is read from.
+
+        destination: socket.socket
+            The socket the data is written to.
+
+        profile: LinkProfile
+            The link.
+
+        bandwidth: float
+            The bandwidth of this direction of the link in bytes per
+            second, or None for no limit.
+
+        stat: str
+            The key of the stats counting the bytes forwarded.
+        """
+        chunks = queue.Queue()
+        writer = gevent.spawn(self.deliver, chunks, source, destination)
+        link_free_at = time.monotonic()
+        last_delivery = 0
+        try:
+            while True:
+                data = source.recv(PROXY_CHUNK_SIZE)
+                if len(data) == 0:
+                    break
+                now = time.monotonic()
+                link_free_at = now if bandwidth is None else max(now, link_free_at) + len(data) / bandwidth
+                delay = max(profile.latency + self.random.uniform(-profile.jitter, profile.jitter), 0)
+                if profile.loss > 0:
+                    lost_segments = sum(self.random.random() < profile.loss
+                                        for _ in range(math.ceil(len(data) / SEGMENT_SIZE)))
+                    self.stats['lost_segments'] += lost_segments
+                    delay += lost_segments * 2 * profile.latency
+                last_delivery = max(last_delivery, link_free_at + delay)
+                chunks.put((last_delivery, data))
+                self.stats[stat] += len(data)
+                # the sender is held back at the rate of the link
+                if link_free_at > now:
+                    gevent.sleep(link_free_at - now)
+        except OSError:
+            pass
+        finally:
+            chunks.put(None)
+            writer.join()
+
+    @staticmethod
+    def deliver(chunks, source, destination):
+        """
+        Writes the chunks of data to the destination socket at their
+        delivery times, and closes its writing side after the last one. If
+        the destination cannot be written to, the source is closed.
+
+        Parameters
+        ----------
+
+        chunks: gevent.queue.Queue
+            The (delivery time, data) of each chunk, followed by None.
+
+        source: socket.socket
+            The socket the data is read from.
+
+        destination: socket.socket
+            The socket the data is written to.
+        """
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    destination.shutdown(socket.SHUT_WR)
+                    return
+                deliver_at, data = chunk
+                if deliver_at > time.monotonic():
+                    gevent.sleep(deliver_at - time.monotonic())
+                destination.sendall(data)
+        except OSError:
+            source.close()
+
+
+def get_profile_from_args(args):
+    """
+    Returns the link profiles given on the command line, as named profiles
+    with their parameters overridden by the ones given, assigned to the
+    connections in turn.
+
+    Parameters
+    ----------
+
+    args: argparse.Namespace
+        The arguments, as parsed by get_args.
+
+    Returns
+    -------
+
+    int -> LinkProfile:
+        The link of the connection of each index.
+    """
+    profiles = []
+    for name in args.profile:
+        profile = LinkProfile(**LINK_PROFILES[name].to_dict())
+        for key in profile.to_dict():
+            if getattr(args, key) is not None:
+                setattr(profile, key, getattr(args, key))
+        profiles.append(profile)
+    return lambda connection_index: profiles[connection_index % len(profiles)]
+
+
+def get_args():
+    """
+    Parse the arguments of the network emulator.
+    """
+    p = argparse.ArgumentParser(
+        description="Forward the connections to a server through emulated network links.\n")
+    p.add_argument("--target-host",
+                   help="The host of the server.",
+                   type=str,
+                   default='127.0.0.1')
+    p.add_argument("--target-port",
+                   help="The port of the server.",
+                   type=int,
+                   required=True)
+    p.add_argument("--listen-host",
+                   help="The host the proxy listens on.",
+                   type=str,
+                   default='127.0.0.1')
+    p.add_argument("--listen-port",
+                   help="The port the proxy listens on.",
+                   type=int,
+                   required=True)
+    p.add_argument("--profile",
+                   help="The links of the connections, assigned to the connections in turn.",
+                   nargs='+',
+                   choices=list(LINK_PROFILES),
+                   default=['3g'])
+    p.add_argument("--latency",
+                   help="The one-way delay in seconds, overriding that of the profiles.",
+                   type=float,
+                   default=None)
+    p.add_argument("--jitter",
+                   help="The variation of the delay in seconds, overriding that of the profiles.",
+                   type=float,
+                   default=None)
+    p.add_argument("--upload-bandwidth",
+                   help="The bandwidth from the clients in bytes per second, overriding that of the profiles.",
+                   type=float,
+                   default=None)
+    p.add_argument("--download-bandwidth",
+                   help="The bandwidth to the clients in bytes per second, overriding that of the profiles.",
+                   type=float,
+                   default=None)
+    p.add_argument("--loss",
+                   help="The probability that a segment is lost, overriding that of the profiles.",
+                   type=float,
+                   default=None)
+    p.add_argument("--seed",
+                   help="The seed of the jitter and losses.",
+                   type=int,
+                   default=None)
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    NetworkEmulator(args.target_host, args.target_port, get_profile_from_args(args),
+                    args.listen_host, args.listen_port, args.seed).serve_forever()
@@ -53,6 +53,16 @@ def get_args():
                    default=None,
                    required=False)
 
+    p.add_argument("--pipelined",
+                   help="Upload the model update while the local model is being tested.",
+                   action='store_true')
+
+    p.add_argument("--model-cache-file",
+                   help="File in which to keep the latest global model so that it survives restarts.",
+                   type=str,
+                   default=None,
+                   required=False)
+
     return p.parse_args()
 
 
@@ -95,7 +105,9 @@ def run():
                                   private_key_file=args.private_key_file,
                                   server_protocol=args.server_protocol,
                                   server_host_ip=args.server_host_ip,
-                                  server_port=args.server_port)
+                                  server_port=args.server_port,
+                                  pipelined=args.pipelined,
+                                  model_cache_file=args.model_cache_file)
     fed_avg_worker.start()
 
 
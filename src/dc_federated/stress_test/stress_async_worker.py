@@ -0,0 +1,192 @@
+"""
+Run the workers for the basic stress test from a single asyncio event loop.
+"""
+
+import asyncio
+import argparse
+import datetime
+
+from dc_federated.backend import AsyncDCFWorker, GLOBAL_MODEL_VERSION
+from dc_federated.backend._async_http import AsyncConnectionPool
+from dc_federated.stress_test.stress_utils import get_worker_keys_from_chunk, get_stress_model, \
+    add_synthetic_model_args, get_synthetic_model_args
+
+import logging
+
+
+logger = logging.getLogger(__file__)
+logger.setLevel(level=logging.INFO)
+
+
+class SimpleAsyncLPWorker(object):
+    """
+    The asyncio counterpart of the SimpleLPWorker used in the stress test,
+    keeping track of the global model version for one AsyncDCFWorker.
+
+    Parameters
+    ----------
+
+    s_host: str
+        The server host
+
+    s_port: int
+        the server port
+
+    worker_keys: (SigningKey, str)
+        The private key and public key string of this worker, as returned by
+        get_worker_keys_from_chunk.
+
+    connection_pool: AsyncConnectionPool
+        The connection pool shared by the workers.
+    """
+    def __init__(self, s_host, s_port, worker_keys, connection_pool):
+        self.gm_version = 0
+        self.update = None
+        self.worker = AsyncDCFWorker(
+            server_protocol='http',
+            server_host_ip=s_host,
+            server_port=s_port,
+            global_model_version_changed_callback=self.global_model_changed_callback,
+            get_worker_version_of_global_model=self.get_last_global_model_version,
+            private_key_file=None,
+            connection_pool=connection_pool
+        )
+        self.worker.private_key, self.worker.public_key_str = worker_keys
+
+    def global_model_changed_callback(self, model_dict):
+        try:
+            # don't save the actual update because it will use up RAM
+            self.update = f"Global model received at {datetime.datetime.now()}"
+            self.gm_version = model_dict[GLOBAL_MODEL_VERSION]
+        except Exception as e:
+            logger.error(f"Invalid global model received: {e}")
+
+    def get_last_global_model_version(self):
+        return self.gm_version
+
+
+async def run_async_stress_worker(server_host_ip, server_port, num_runs, worker_model_real,
+                                  chunk_str, max_connections, synthetic_model_args=None):
+    """
+    Run the workers loop for the basic stress test with all the workers
+    in the chunk running in one event loop and sharing a connection pool.
+    The steps are the same as in stress_worker.run_stress_worker.
+
+    Parameters
+    ----------
+
+    server_host_ip: str
+        The ip-address of the host of the server.
+
+    server_port: int
+        The port at which the serer should listen to
+
+    num_runs: int
+        Number of runs of the sending of models etc. to perform
+
+    worker_model_real: bool
+        If true, the model update sent is a binary serialized version of
+        MobileNetV2 that is used in the plantvillage example.
+
+    chunk_str: str
+        String giving the chunk of keys to use.
+
+    max_connections: int
+        The maximum number of connections to the server open at once, or
+        None for no limit.
+
+    synthetic_model_args: dict (default None)
+        The arguments of get_stress_model for a synthetic model, as returned
+        by get_synthetic_model_args.
+    """
+    bin_model = get_stress_model(worker_model_real, "A 'local model update'!!", **(synthetic_model_args or {}))
+
+    pool = AsyncConnectionPool(max_connections=max_connections)
+    workers = [SimpleAsyncLPWorker(server_host_ip, server_port, worker_keys, pool)
+               for worker_keys in get_worker_keys_from_chunk(chunk_str)]
+    num_workers = len(workers)
+
+    logger.info(f"Registering {num_workers} workers")
+    await asyncio.gather(*[worker.worker.register_worker() for worker in workers])
+
+    async def get_model(worker):
+        worker.global_model_changed_callback(await worker.worker.get_global_model())
+
+    logger.info(f"Requesting the global model for {num_workers} workers")
+    await asyncio.gather(*[get_model(worker) for worker in workers])
+
+    done_count = 0
+
+    async def run_wg(worker):
+        nonlocal done_count
+        response = await worker.worker.send_model_update(bin_model)
+        logger.debug(f"Response from server sending model update: {response}")
+        await get_model(worker)
+        done_count += 1
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(1)
+            logger.info(f"{done_count} workers have received the global model update - "
+                        f"need to get to {num_workers}...")
+
+    for run_no in range(num_runs):
+        logger.info(f"********************** STARTING RUN {run_no + 1}:")
+        await asyncio.sleep(5)
+        done_count = 0
+        reporter = asyncio.ensure_future(report_progress())
+        await asyncio.gather(*[run_wg(worker) for worker in workers])
+        reporter.cancel()
+        logger.info(f"All {num_workers} workers have received the global model update.")
+
+    await pool.close()
+
+
+def get_args():
+    """
+    Parse the argument for the asyncio worker for the basic stress test.
+    """
+    # Make parser object
+    p = argparse.ArgumentParser(
+        description="Run this with the ip-address and port at which the stress_server.py was run.\n")
+
+    p.add_argument("--server-host-ip",
+                   help="The ip of the host of server",
+                   type=str,
+                   required=True)
+    p.add_argument("--server-port",
+                   help="The ip of the host of server",
+                   type=int,
+                   required=True)
+    p.add_argument("--num-runs",
+                   help="The number of iterations of simulated FL to run.",
+                   type=int,
+                   required=False,
+                   default=1)
+    p.add_argument("--worker-model-real",
+                   action='store_true')
+    p.add_argument("--chunk",
+                   type=str,
+                   required=False,
+                   default="1 of 1")
+    p.add_argument("--max-connections",
+                   help="The maximum number of connections to the server open at once.",
+                   type=int,
+                   required=False,
+                   default=None)
+    add_synthetic_model_args(p)
+
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    asyncio.run(run_async_stress_worker(
+        args.server_host_ip,
+        args.server_port,
+        args.num_runs,
+        args.worker_model_real,
+        args.chunk,
+        args.max_connections,
+        get_synthetic_model_args(args)
+    ))
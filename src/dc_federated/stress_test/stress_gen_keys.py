@@ -2,45 +2,175 @@
 Generate the keys for the basic stress test.
 """
 import os
+import sqlite3
 import argparse
-from nacl.encoding import HexEncoder
+from multiprocessing import Pool
 
-from dc_federated.backend.worker_key_pair_tool import gen_pair
+from gevent import monkey
+from nacl.signing import SigningKey
+from nacl.encoding import HexEncoder
 
 STRESS_KEYS_FOLDER = 'stress_keys_folder'
 STRESS_WORKER_KEY_LIST_FILE = 'stress_worker_public_keys.txt'
 STRESS_WORKER_PREFIX = 'stress_worker_key_file'
+STRESS_KEYSTORE_FILE = 'stress_worker_keys.db'
+# the number of keys generated by each task of the process pool
+KEY_GEN_BATCH_SIZE = 1000
+
+
+def gen_key_batch(num_keys):
+    """
+    Generates a batch of key pairs.
+
+    Parameters
+    ----------
+
+    num_keys: int
+        The number of key pairs to generate.
+
+    Returns
+    -------
+
+    (bytes, str) list:
+        The seed of each private key and the corresponding hex encoded
+        public key.
+    """
+    keys = []
+    for _ in range(num_keys):
+        sk = SigningKey.generate()
+        keys.append((sk.encode(), sk.verify_key.encode(encoder=HexEncoder).decode('utf-8')))
+    return keys
 
 
-def gen_stress_key_pairs(num_workers):
+def gen_stress_key_pairs(num_workers, num_processes=None, export_files=False):
     """
-    Generate the keys for the stress test. The list of public keys
-    is put in keys_folder/'stress_worker_public_keys.txt' while
-    each worker private key is put in 'stress_worker_key_file_{n}'
-    (+ '.pub' for the public key).
+    Generate the keys for the stress test, in parallel across num_processes
+    processes. The keys are put in a single SQLite keystore,
+    keys_folder/'stress_worker_keys.db', holding the seed of the private key
+    and the public key of each worker by index, from which each worker
+    process loads its own range. The list of public keys is put in
+    keys_folder/'stress_worker_public_keys.txt'. If export_files is set,
+    each worker private key is also put in 'stress_worker_key_file_{n}'
+    (+ '.pub' for the public key), as read by the worker applications.
 
     Parameters
     -----------
 
     num_workers: int
         The number of workers to generate the keys for.
-    """
-    private_keys = []
-    public_keys = []
 
+    num_processes: int (default None)
+        The number of processes generating the keys - the number of cores
+        if None. The keys are generated in the current process if gevent
+        has patched the threads, which the process pool relies on.
+
+    export_files: bool (default False)
+        Whether to also write the keys of each worker to their own files.
+    """
     if not os.path.exists(STRESS_KEYS_FOLDER):
         os.mkdir(STRESS_KEYS_FOLDER)
 
-    for n in range(num_workers):
-        private_key, public_key = gen_pair(os.path.join(STRESS_KEYS_FOLDER, STRESS_WORKER_PREFIX + f'_{n}'))
-        private_keys.append(private_key)
-        public_keys.append(public_key)
-
+    batch_sizes = [min(KEY_GEN_BATCH_SIZE, num_workers - start)
+                   for start in range(0, num_workers, KEY_GEN_BATCH_SIZE)]
+    keystore_file = os.path.join(STRESS_KEYS_FOLDER, STRESS_KEYSTORE_FILE)
+    if os.path.exists(keystore_file):
+        os.remove(keystore_file)
     worker_key_file = os.path.join(STRESS_KEYS_FOLDER, STRESS_WORKER_KEY_LIST_FILE)
-    with open(worker_key_file, 'w') as f:
-        for public_key in public_keys[:-1]:
-            f.write(public_key.encode(encoder=HexEncoder).decode('utf-8') + os.linesep)
-        f.write(public_keys[-1].encode(encoder=HexEncoder).decode('utf-8') + os.linesep)
+
+    pool = None if num_processes == 1 or monkey.is_module_patched('threading') else Pool(num_processes)
+    conn = sqlite3.connect(keystore_file)
+    try:
+        conn.execute("CREATE TABLE keys (idx INTEGER PRIMARY KEY, seed BLOB NOT NULL, public_key TEXT NOT NULL)")
+        # imap keeps the order of the batches, so the indices do not depend on the processes
+        batches = map(gen_key_batch, batch_sizes) if pool is None else pool.imap(gen_key_batch, batch_sizes)
+        with open(worker_key_file, 'w') as f:
+            n = 0
+            for batch in batches:
+                conn.executemany("INSERT INTO keys VALUES (?, ?, ?)",
+                                 [(n + i, seed, public_key) for i, (seed, public_key) in enumerate(batch)])
+                for seed, public_key in batch:
+                    f.write(public_key + os.linesep)
+                    if export_files:
+                        export_key_pair(os.path.join(STRESS_KEYS_FOLDER, STRESS_WORKER_PREFIX + f'_{n}'),
+                                        seed, public_key)
+                    n += 1
+        conn.commit()
+    finally:
+        conn.close()
+        if pool is not None:
+            pool.terminate()
+
+
+def export_key_pair(filename, seed, public_key):
+    """
+    Writes a key pair to the files of the worker key pair tool.
+
+    Parameters
+    ----------
+
+    filename: str
+        Name of the file to write the private key to - the public key is
+        written to filename + '.pub'.
+
+    seed: bytes
+        The seed of the private key.
+
+    public_key: str
+        The hex encoded public key.
+    """
+    with open(filename, 'w') as f:
+        f.write(HexEncoder.encode(seed).decode('utf-8'))
+    with open(filename + '.pub', 'w') as f:
+        f.write(public_key)
+
+
+def count_stress_keys():
+    """
+    Returns the number of workers whose keys are in the keystore.
+
+    Returns
+    -------
+
+    int:
+        The number of keys, or 0 if there is no keystore.
+    """
+    keystore_file = os.path.join(STRESS_KEYS_FOLDER, STRESS_KEYSTORE_FILE)
+    if not os.path.exists(keystore_file):
+        return 0
+    conn = sqlite3.connect(keystore_file)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM keys").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def load_stress_keys(start, end):
+    """
+    Loads the keys of the workers with indices from start to end from the
+    keystore.
+
+    Parameters
+    ----------
+
+    start: int
+        The index of the first worker.
+
+    end: int
+        The index after that of the last worker.
+
+    Returns
+    -------
+
+    (SigningKey, str) list:
+        The private key and the hex encoded public key of each worker.
+    """
+    conn = sqlite3.connect(os.path.join(STRESS_KEYS_FOLDER, STRESS_KEYSTORE_FILE))
+    try:
+        rows = conn.execute("SELECT seed, public_key FROM keys WHERE idx >= ? AND idx < ? ORDER BY idx",
+                            (start, end)).fetchall()
+    finally:
+        conn.close()
+    return [(SigningKey(seed), public_key) for seed, public_key in rows]
 
 
 def get_args():
@@ -55,10 +185,18 @@ def get_args():
                    help="The number of workers to generate the keys for.",
                    type=int,
                    required=True)
+    p.add_argument("--num-processes",
+                   help="The number of processes generating the keys - the number of cores by default.",
+                   type=int,
+                   required=False,
+                   default=None)
+    p.add_argument("--export-files",
+                   help="Also write the private and public key of each worker to their own files.",
+                   action='store_true')
 
     return p.parse_args()
 
 
 if __name__ == '__main__':
     args = get_args()
-    gen_stress_key_pairs(args.num_workers)
+    gen_stress_key_pairs(args.num_workers, args.num_processes, args.export_files)
@@ -0,0 +1,413 @@
+"""
+Run the basic stress test on the local machine: the server and several
+worker processes, gathering their timings into a single report.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import secrets
+import argparse
+import subprocess
+
+import requests
+
+from dc_federated.stress_test.stress_gen_keys import count_stress_keys, \
+    STRESS_KEYS_FOLDER, STRESS_WORKER_KEY_LIST_FILE
+from dc_federated.stress_test.stress_utils import add_synthetic_model_args, get_synthetic_model_args
+from dc_federated.stress_test.synthetic_model import parse_size
+from dc_federated.backend._constants import ADMIN_USERNAME, ADMIN_PASSWORD, MEMORY_ROUNDS_ROUTE
+from dc_federated.backend._leak_detector import find_unbounded_growth
+from dc_federated.benchmark.network_emulator import LINK_PROFILES
+from dc_federated.benchmark.benchmark_utils import get_result, write_results, format_results, get_rss, \
+    wait_for_server
+
+import logging
+
+
+logger = logging.getLogger(__file__)
+logger.setLevel(level=logging.INFO)
+
+LEAK_MIN_GROWTH = 10 ** 6
+ORCHESTRATOR_ADMIN_USERNAME = 'stress_orchestrator'
+
+
+def ensure_stress_keys(num_workers):
+    """
+    Generates the keys of num_workers workers in STRESS_KEYS_FOLDER, unless
+    the folder already holds the keys of exactly that many workers. As the
+    server expects an update from every worker whose key is in the folder,
+    a folder with the keys of a different number of workers is replaced.
+
+    Parameters
+    ----------
+
+    num_workers: int
+        The number of workers.
+    """
+    key_list_file = os.path.join(STRESS_KEYS_FOLDER, STRESS_WORKER_KEY_LIST_FILE)
+    if os.path.exists(key_list_file):
+        with open(key_list_file) as f:
+            num_public_keys = len([line for line in f if line.strip() != ''])
+        if num_public_keys == count_stress_keys() == num_workers:
+            logger.info(f"Using the keys of {num_workers} workers in {STRESS_KEYS_FOLDER}.")
+            return
+    if os.path.exists(STRESS_KEYS_FOLDER):
+        shutil.rmtree(STRESS_KEYS_FOLDER)
+    logger.info(f"Generating the keys of {num_workers} workers in {STRESS_KEYS_FOLDER}...")
+    # in a process of its own, as gevent has patched the threads of this one
+    subprocess.run([sys.executable, '-m', 'dc_federated.stress_test.stress_gen_keys',
+                    '--num-workers', str(num_workers)], check=True)
+
+
+def read_timings(timings_files):
+    """
+    Reads the timings recorded by the worker processes.
+
+    Parameters
+    ----------
+
+    timings_files: str list
+        The files written by the TimingRecorder of each worker process.
+
+    Returns
+    -------
+
+    dict list:
+        The timings.
+    """
+    timings = []
+    for timings_file in timings_files:
+        if os.path.exists(timings_file):
+            with open(timings_file) as f:
+                timings.extend(json.loads(line) for line in f if line.strip() != '')
+    return timings
+
+
+def make_report(timings, duration):
+    """
+    Summarizes the timings of the requests, per request, and of the runs,
+    from the start of the first process to start the run to the end of the
+    last process to finish it.
+
+    Parameters
+    ----------
+
+    timings: dict list
+        The timings recorded by the worker processes.
+
+    duration: float
+        The number of seconds the worker processes ran for.
+
+    Returns
+    -------
+
+    dict list, dict list:
+        The results of the requests, as returned by get_result, and the runs.
+    """
+    results = []
+    for name in sorted({t['name'] for t in timings if t['kind'] == 'request'}):
+        requests = [t for t in timings if t['kind'] == 'request' and t['name'] == name]
+        latencies = [t['end'] - t['start'] for t in requests if t['ok']]
+        results.append(get_result(name, latencies, len(requests) - len(latencies), duration))
+
+    rounds = []
+    for run in sorted({t['name'] for t in timings if t['kind'] == 'round'}):
+        run_timings = [t for t in timings if t['kind'] == 'round' and t['name'] == run]
+        start = min(t['start'] for t in run_timings)
+        end = max(t['end'] for t in run_timings)
+        rounds.append({'run': run, 'processes': len(run_timings), 'start': start, 'end': end,
+                       'duration': end - start})
+    return results, rounds
+
+
+def get_memory_rounds(server_port, admin_auth):
+    """
+    Returns the memory reports of the rounds of a server running with leak
+    detection on this machine.
+
+    Parameters
+    ----------
+
+    server_port: int
+        The port at which the server listens.
+
+    admin_auth: (str, str)
+        The admin username and password of the server.
+
+    Returns
+    -------
+
+    dict list:
+        The reports of the rounds, oldest first.
+    """
+    memory_rounds = requests.get(f"http://127.0.0.1:{server_port}/{MEMORY_ROUNDS_ROUTE}", auth=admin_auth).json()
+    if not isinstance(memory_rounds, list):
+        raise RuntimeError(f"The server did not return the memory of its rounds: {memory_rounds}")
+    return memory_rounds
+
+
+def run_stress_orchestrator(num_workers, num_processes, num_runs, output_dir, server_port=5000,
+                            round_pause=0, rss_interval=1.0, timeout=None, model_real=False,
+                            synthetic_model_args=None, leak_check_rounds=None, leak_min_growth=LEAK_MIN_GROWTH,
+                            link_profiles=None):
+    """
+    Runs the basic stress test locally: generates the keys of the workers,
+    starts stress_server.py and num_processes stress_worker.py processes,
+    each with its chunk of the workers, samples the resident set size of
+    the server while the workers run, and writes a report with the
+    throughput, latency percentiles and errors of each request, the
+    duration of each run and the memory of the server over time. The
+    output of each process is written to a log file in output_dir.
+
+    Parameters
+    ----------
+
+    num_workers: int
+        The total number of workers.
+
+    num_processes: int
+        The number of worker processes.
+
+    num_runs: int
+        The number of runs of each worker process.
+
+    output_dir: str
+        The folder the logs, timings and report are written to.
+
+    server_port: int (default 5000)
+        The port at which the server listens.
+
+    round_pause: float (default 0)
+        The number of seconds the server waits before changing the global
+        model at the end of each run.
+
+    rss_interval: float (default 1.0)
+        The interval in seconds between the samples of the memory of the server.
+
+    timeout: float (default None)
+        The number of seconds after which the worker processes are stopped.
+
+    model_real: bool (default False)
+        Whether the server and workers exchange MobileNetV2 models.
+
+    synthetic_model_args: dict (default None)
+        The arguments of get_stress_model for the synthetic models the
+        server and workers exchange, as returned by get_synthetic_model_args.
+
+    leak_check_rounds: int (default None)
+        If given, the server runs with leak detection, and the test fails
+        with a RuntimeError, once the report is written, if the memory of the
+        server grew in each of the last leak_check_rounds rounds by more
+        than leak_min_growth bytes in total. Each run makes a round, so
+        num_runs should be at least leak_check_rounds.
+
+    leak_min_growth: int (default LEAK_MIN_GROWTH)
+        The growth in bytes over the last leak_check_rounds rounds above
+        which the test fails.
+
+    link_profiles: str list (default None)
+        If given, the names of the LINK_PROFILES of the workers: the
+        workers connect to a network_emulator.py process listening on
+        server_port + 1, which forwards their connections to the server
+        through the links, assigned to the connections in turn.
+
+    Returns
+    -------
+
+    str:
+        The path of the report.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    ensure_stress_keys(num_workers)
+    processes = []
+    log_files = []
+
+    def start_process(module, args, log_name, env=None):
+        log_file = open(os.path.join(output_dir, log_name), 'w')
+        log_files.append(log_file)
+        process = subprocess.Popen([sys.executable, '-m', module] + args, stdout=log_file, stderr=subprocess.STDOUT,
+                                   env=env)
+        processes.append(process)
+        return process
+
+    model_args = []
+    if synthetic_model_args is not None and synthetic_model_args['synthetic_model_size'] is not None:
+        for name, value in synthetic_model_args.items():
+            model_args += ['--' + name.replace('_', '-'), str(value)]
+
+    server_env = None
+    memory_rounds = None
+    if leak_check_rounds is not None:
+        admin_auth = (ORCHESTRATOR_ADMIN_USERNAME, secrets.token_hex(16))
+        server_env = dict(os.environ, **{ADMIN_USERNAME: admin_auth[0], ADMIN_PASSWORD: admin_auth[1]})
+
+    try:
+        server_args = ['--server-port', str(server_port), '--round-pause', str(round_pause)] + model_args
+        server_args += (['--global-model-real'] if model_real else []) + \
+            (['--leak-detection'] if leak_check_rounds is not None else [])
+        server = start_process('dc_federated.stress_test.stress_server', server_args, 'server.log', server_env)
+        wait_for_server(server, server_port)
+        logger.info(f"Stress server started with pid {server.pid}.")
+        worker_port = server_port
+        if link_profiles is not None:
+            worker_port = server_port + 1
+            emulator = start_process('dc_federated.benchmark.network_emulator',
+                                     ['--target-port', str(server_port), '--listen-port', str(worker_port),
+                                      '--profile'] + link_profiles, 'network_emulator.log')
+            wait_for_server(emulator, worker_port)
+            logger.info(f"Network emulator started with pid {emulator.pid}.")
+
+        timings_files = []
+        workers = []
+        start = time.time()
+        for k in range(1, num_processes + 1):
+            timings_file = os.path.join(output_dir, f"timings_{k}.jsonl")
+            if os.path.exists(timings_file):
+                os.remove(timings_file)
+            timings_files.append(timings_file)
+            worker_args = ['--server-host-ip', '127.0.0.1', '--server-port', str(worker_port),
+                           '--num-runs', str(num_runs), '--chunk', f"{k} of {num_processes}",
+                           '--timings-file', timings_file] + model_args
+            workers.append(start_process('dc_federated.stress_test.stress_worker',
+                                         worker_args + (['--worker-model-real'] if model_real else []),
+                                         f"worker_{k}.log"))
+
+        server_rss = []
+        timed_out = False
+        while any(worker.poll() is None for worker in workers):
+            if timeout is not None and time.time() - start > timeout:
+                logger.warning(f"The worker processes did not finish within {timeout} seconds - stopping them.")
+                timed_out = True
+                break
+            server_rss.append([time.time() - start, get_rss(server.pid)])
+            time.sleep(rss_interval)
+        duration = time.time() - start
+        if leak_check_rounds is not None:
+            try:
+                memory_rounds = get_memory_rounds(server_port, admin_auth)
+            except (requests.RequestException, ValueError, RuntimeError) as e:
+                logger.warning(f"Could not get the memory of the rounds from the server: {e}")
+                memory_rounds = []
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+                process.wait()
+        for log_file in log_files:
+            log_file.close()
+
+    results, rounds = make_report(read_timings(timings_files), duration)
+    rss_values = [rss for _, rss in server_rss if rss is not None]
+    report_file = os.path.join(output_dir, 'stress_report.json')
+    config = {'num_workers': num_workers, 'num_processes': num_processes, 'num_runs': num_runs,
+              'round_pause': round_pause, 'model_real': model_real, 'leak_check_rounds': leak_check_rounds,
+              'leak_min_growth': leak_min_growth, 'link_profiles': link_profiles, **(synthetic_model_args or {})}
+    memory_growth = None
+    if leak_check_rounds is not None:
+        if len(memory_rounds) < leak_check_rounds + 1:
+            logger.warning(f"The server took the memory snapshots of {len(memory_rounds)} rounds, too few to "
+                           f"check the growth over {leak_check_rounds} rounds.")
+        memory_growth = find_unbounded_growth(memory_rounds, leak_check_rounds, leak_min_growth)
+    write_results(results, report_file, config,
+                  memory_rounds=memory_rounds,
+                  memory_growth=memory_growth,
+                  duration=duration,
+                  timed_out=timed_out,
+                  worker_exit_codes=[worker.returncode for worker in workers],
+                  rounds=rounds,
+                  server_rss=server_rss,
+                  server_max_rss=max(rss_values) if len(rss_values) > 0 else None)
+
+    print(format_results(results))
+    for r in rounds:
+        print(f"Run {r['run']}: {r['duration']:.2f} seconds over {r['processes']} processes")
+    if len(rss_values) > 0:
+        print(f"Server RSS: {rss_values[0] / 2 ** 20:.1f} MB at the start, "
+              f"{max(rss_values) / 2 ** 20:.1f} MB at most, {rss_values[-1] / 2 ** 20:.1f} MB at the end")
+    if memory_rounds is not None and len(memory_rounds) > 0:
+        print("Server traced memory at the start of each round: " +
+              ', '.join(f"{r['traced_bytes'] / 2 ** 20:.1f} MB" for r in memory_rounds))
+    if memory_growth is not None:
+        raise RuntimeError(f"Unbounded memory growth: {memory_growth} See {report_file}.")
+    return report_file
+
+
+def get_args():
+    """
+    Parse the arguments of the stress orchestrator.
+    """
+    p = argparse.ArgumentParser(
+        description="Run the stress server and workers on this machine and report on the test.\n")
+    p.add_argument("--num-workers",
+                   help="The total number of workers.",
+                   type=int,
+                   required=True)
+    p.add_argument("--num-processes",
+                   help="The number of worker processes, each running a chunk of the workers.",
+                   type=int,
+                   required=False,
+                   default=4)
+    p.add_argument("--num-runs",
+                   help="The number of iterations of simulated FL to run.",
+                   type=int,
+                   required=False,
+                   default=1)
+    p.add_argument("--output-dir",
+                   help="The folder the logs, timings and report are written to.",
+                   type=str,
+                   required=False,
+                   default='stress_results')
+    p.add_argument("--server-port",
+                   help="The port at which the server listens.",
+                   type=int,
+                   required=False,
+                   default=5000)
+    p.add_argument("--round-pause",
+                   help="The number of seconds the server waits before changing the global model.",
+                   type=float,
+                   required=False,
+                   default=0)
+    p.add_argument("--rss-interval",
+                   help="The interval in seconds between the samples of the memory of the server.",
+                   type=float,
+                   required=False,
+                   default=1.0)
+    p.add_argument("--timeout",
+                   help="The number of seconds after which the worker processes are stopped.",
+                   type=float,
+                   required=False,
+                   default=None)
+    p.add_argument("--model-real",
+                   action='store_true')
+    p.add_argument("--leak-check-rounds",
+                   help="Run the server with leak detection, and fail if its memory grows in each of this "
+                        "many last rounds.",
+                   type=int,
+                   required=False,
+                   default=None)
+    p.add_argument("--leak-min-growth",
+                   help="The growth of the memory over the checked rounds above which the test fails, "
+                        "e.g. 1MB.",
+                   type=parse_size,
+                   required=False,
+                   default=LEAK_MIN_GROWTH)
+    p.add_argument("--link-profiles",
+                   help="Connect the workers to the server through emulated network links, assigned to "
+                        "the connections in turn.",
+                   nargs='+',
+                   choices=list(LINK_PROFILES),
+                   required=False,
+                   default=None)
+    add_synthetic_model_args(p)
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    run_stress_orchestrator(args.num_workers, args.num_processes, args.num_runs, args.output_dir,
+                            args.server_port, args.round_pause, args.rss_interval, args.timeout,
+                            args.model_real, get_synthetic_model_args(args), args.leak_check_rounds,
+                            args.leak_min_growth, args.link_profiles)
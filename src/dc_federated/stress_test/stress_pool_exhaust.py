@@ -2,20 +2,14 @@
 Check that repeated registration with the same does not kill the pool size.
 """
 
-import os
 import argparse
-import msgpack
-import io
 
-import torch
-import torchvision.models as models
-
-from dc_federated.stress_test.stress_utils import get_worker_keys_from_chunk, SimpleLPWorker
+from dc_federated.stress_test.stress_utils import get_worker_keys_from_chunk, SimpleLPWorker, \
+    get_stress_model, add_synthetic_model_args, get_synthetic_model_args
 from gevent import Greenlet, sleep
 
 from dc_federated.backend import DCFWorker
 from dc_federated.backend._constants import *
-from dc_federated.stress_test.stress_gen_keys import STRESS_KEYS_FOLDER
 
 import logging
 
@@ -24,7 +18,7 @@ logger = logging.getLogger(__file__)
 logger.setLevel(level=logging.INFO)
 
 
-def run_pool_exhaust_test(server_host_ip, server_port, num_runs, global_model_real):
+def run_pool_exhaust_test(server_host_ip, server_port, num_runs, global_model_real, synthetic_model_args=None):
     """
     Run the workers loop to exhaust the gevent pool in a stress test.
     This involves running requesting the global model from the server
@@ -48,21 +42,17 @@ def run_pool_exhaust_test(server_host_ip, server_port, num_runs, global_model_re
     global_model_real: bool
         If true, the global model returned is a bianry serialized version of
         MobileNetV2 that is used in the plantvillage example.
+
+    synthetic_model_args: dict (default None)
+        The arguments of get_stress_model for a synthetic model, as returned
+        by get_synthetic_model_args.
     """
     workers = []
-    if global_model_real:
-        model_data = io.BytesIO()
-        torch.save(models.mobilenet_v2(pretrained=True), model_data)
-        bin_model = model_data.getvalue()
-    else:
-        bin_model = msgpack.packb("A 'local model update'!!")
+    bin_model = get_stress_model(global_model_real, "A 'local model update'!!", **(synthetic_model_args or {}))
 
     chunk_str = "1 of 1"
-    for fn in get_worker_keys_from_chunk(chunk_str):
-        workers.append(SimpleLPWorker(
-            server_host_ip, server_port,
-            os.path.join(STRESS_KEYS_FOLDER, fn))
-        )
+    for worker_keys in get_worker_keys_from_chunk(chunk_str):
+        workers.append(SimpleLPWorker(server_host_ip, server_port, worker_keys))
 
     num_workers = len(workers)
     for i, worker in enumerate(workers):
@@ -135,6 +125,7 @@ def get_args():
                    default=20)
     p.add_argument("--global-model-real",
                    action='store_true')
+    add_synthetic_model_args(p)
     return p.parse_args()
 
 
@@ -144,5 +135,6 @@ if __name__ == '__main__':
         args.server_host_ip,
         args.server_port,
         args.num_runs,
-        args.global_model_real
+        args.global_model_real,
+        get_synthetic_model_args(args)
     )
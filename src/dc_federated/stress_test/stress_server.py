@@ -4,17 +4,15 @@ Run the server for the basic stress test.
 
 import sys
 import os
-import io
 import datetime
-import msgpack
 import argparse
 
 from gevent import sleep
-import torch
-import torchvision.models as models
 
 from dc_federated.backend import DCFServer, create_model_dict, WID_LEN
 from dc_federated.stress_test.stress_gen_keys import STRESS_KEYS_FOLDER, STRESS_WORKER_KEY_LIST_FILE
+from dc_federated.stress_test.stress_utils import get_stress_model, add_synthetic_model_args, \
+    get_synthetic_model_args
 
 import logging
 
@@ -23,7 +21,8 @@ logger = logging.getLogger(__file__)
 logger.setLevel(level=logging.INFO)
 
 
-def run_stress_server(global_model_real=False):
+def run_stress_server(global_model_real=False, server_port=5000, round_pause=10, synthetic_model_args=None,
+                      leak_detection=False):
     """
     Runs the server for the basic stress test. This is started with a list of
     public keys and increments the model number/returns a model when it has received
@@ -35,6 +34,21 @@ def run_stress_server(global_model_real=False):
     global_model_real: bool
         If true, the global model returned is a bianry serialized version of
         MobileNetV2 that is used in the plantvillage example.
+
+    server_port: int (default 5000)
+        The port at which the server listens.
+
+    round_pause: float (default 10)
+        The number of seconds the server waits, once it has received an
+        update from each of the workers, before changing the global model.
+
+    synthetic_model_args: dict (default None)
+        The arguments of get_stress_model for a synthetic model, as returned
+        by get_synthetic_model_args.
+
+    leak_detection: bool (default False)
+        Whether the server takes a snapshot of its memory at the start of
+        each round, to report the memory that grows from round to round.
     """
     server_model_check_interval = 1
     worker_ids = []
@@ -42,12 +56,7 @@ def run_stress_server(global_model_real=False):
     global_model_version = 1
     updates_received_count = 0
 
-    if global_model_real:
-        model_data = io.BytesIO()
-        torch.save(models.mobilenet_v2(pretrained=True), model_data)
-        bin_model = model_data.getvalue()
-    else:
-        bin_model = msgpack.packb("A 'Global Model'!!")
+    bin_model = get_stress_model(global_model_real, "A 'Global Model'!!", **(synthetic_model_args or {}))
 
     def test_register_func_cb(id):
         worker_ids.append(id)
@@ -73,7 +82,7 @@ def run_stress_server(global_model_real=False):
             del update
             updates_received_count += 1
             if updates_received_count == num_workers:
-                halt_time = 10
+                halt_time = round_pause
                 logger.info(f"Sleeping for {halt_time} seconds now...")
                 sleep(halt_time)
                 logger.info(f"Done sleeping ... changing global model...")
@@ -91,7 +100,7 @@ def run_stress_server(global_model_real=False):
     keys_list_file = os.path.join(STRESS_KEYS_FOLDER, STRESS_WORKER_KEY_LIST_FILE)
     dcf_server = DCFServer(
         server_host_ip='127.0.0.1',
-        server_port=5000,
+        server_port=server_port,
         register_worker_callback=test_register_func_cb,
         unregister_worker_callback=test_unregister_func_cb,
         return_global_model_callback=test_ret_global_model_cb,
@@ -100,7 +109,8 @@ def run_stress_server(global_model_real=False):
         server_mode_safe=True,
         key_list_file=keys_list_file,
         model_check_interval=server_model_check_interval,
-        load_last_session_workers=False
+        load_last_session_workers=False,
+        leak_detection=leak_detection
     )
     num_workers = len(dcf_server.worker_manager.allowed_workers)
     dcf_server.start_server()
@@ -117,6 +127,22 @@ def get_args():
         "--global-model-real",
         action='store_true'
     )
+    p.add_argument("--server-port",
+                   help="The port at which the server listens.",
+                   type=int,
+                   required=False,
+                   default=5000)
+    p.add_argument("--round-pause",
+                   help="The number of seconds to wait before changing the global model once all the "
+                        "updates of a run have been received.",
+                   type=float,
+                   required=False,
+                   default=10)
+    p.add_argument("--leak-detection",
+                   help="Snapshot the memory of the server at the start of each round - the reports are "
+                        "returned by the memory_rounds admin route.",
+                   action='store_true')
+    add_synthetic_model_args(p)
 
     return p.parse_args()
 
@@ -124,4 +150,5 @@ def get_args():
 if __name__ == '__main__':
     args = get_args()
     sys.argv = sys.argv[:1]
-    run_stress_server(args.global_model_real)
+    run_stress_server(args.global_model_real, args.server_port, args.round_pause, get_synthetic_model_args(args),
+                      args.leak_detection)
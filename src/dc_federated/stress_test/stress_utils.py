@@ -1,10 +1,18 @@
+import io
 import math
 import os
 import re
+import json
+import time
 import datetime
 
+import msgpack
+
 from dc_federated.backend import DCFWorker, GLOBAL_MODEL, GLOBAL_MODEL_VERSION
-from dc_federated.stress_test.stress_gen_keys import STRESS_WORKER_PREFIX, STRESS_KEYS_FOLDER
+from dc_federated.stress_test.stress_gen_keys import STRESS_WORKER_PREFIX, STRESS_KEYS_FOLDER, STRESS_KEYSTORE_FILE, \
+    count_stress_keys, load_stress_keys
+from dc_federated.stress_test.synthetic_model import SYNTHETIC_DTYPES, SYNTHETIC_NUM_LAYERS, parse_size, \
+    get_synthetic_model_bytes
 
 import logging
 
@@ -14,7 +22,9 @@ logger.setLevel(level=logging.INFO)
 
 def get_worker_keys_from_chunk(chunk_str):
     """
-    Gets the set of worker keys from the chunk string description.
+    Gets the keys of the workers in the chunk from the chunk string
+    description, loading only that range of the keystore. If there is no
+    keystore, the keys are read from the files of the individual workers.
 
     Parameters
     ----------
@@ -25,21 +35,29 @@ def get_worker_keys_from_chunk(chunk_str):
     Returns
     -------
 
-    str list:
-        List of valid worker kyes for this process.
+    (SigningKey, str) list:
+        The private key and public key string of each worker of this process.
     """
     k, n = parse_chunk(chunk_str)
     print(f"n = {n} , k = {k}")
     if n is None or k is None: return []
-    files = [(fn, int(fn[len(STRESS_WORKER_PREFIX)+1:]))
-             for fn in os.listdir(STRESS_KEYS_FOLDER)
-             if fn.startswith(STRESS_WORKER_PREFIX) and not fn.endswith('.pub')]
-    if n > len(files):
-        logger.error(f"n in {chunk_str} cannot be greater than number of keys ({len(files)})")
+    if os.path.exists(os.path.join(STRESS_KEYS_FOLDER, STRESS_KEYSTORE_FILE)):
+        num_keys = count_stress_keys()
+        files = None
+    else:
+        files = [(fn, int(fn[len(STRESS_WORKER_PREFIX)+1:]))
+                 for fn in os.listdir(STRESS_KEYS_FOLDER)
+                 if fn.startswith(STRESS_WORKER_PREFIX) and not fn.endswith('.pub')]
+        num_keys = len(files)
+    if n > num_keys:
+        logger.error(f"n in {chunk_str} cannot be greater than number of keys ({num_keys})")
         return []
-    chunk_len = math.ceil(len(files) / n)
+    chunk_len = math.ceil(num_keys / n)
+    if files is None:
+        return load_stress_keys((k-1)*chunk_len, k*chunk_len)
     files = sorted(files, key=lambda x: x[1])
-    return [fn for fn, idx in files[(k-1)*chunk_len:  k*chunk_len]]
+    return [DCFWorker.get_keys_from_file(os.path.join(STRESS_KEYS_FOLDER, fn))
+            for fn, idx in files[(k-1)*chunk_len:  k*chunk_len]]
 
 
 def parse_chunk(chunk_str):
@@ -69,6 +87,100 @@ def parse_chunk(chunk_str):
         return None, None
 
 
+
+def get_stress_model(model_real, placeholder, synthetic_model_size=None,
+                     synthetic_model_layers=SYNTHETIC_NUM_LAYERS, synthetic_model_dtype='float32',
+                     synthetic_model_seed=0):
+    """
+    Returns the model sent by a stress test process: MobileNetV2 if
+    model_real is set, a synthetic state dict if its size is given, and
+    the placeholder string otherwise.
+
+    Parameters
+    ----------
+
+    model_real: bool
+        If true, the model is a binary serialized version of MobileNetV2,
+        whose pretrained weights are downloaded.
+
+    placeholder: str
+        The string sent when no model is asked for.
+
+    synthetic_model_size: int (default None)
+        The size in bytes of the tensors of the synthetic model.
+
+    synthetic_model_layers: int (default SYNTHETIC_NUM_LAYERS)
+        The number of tensors of the synthetic model.
+
+    synthetic_model_dtype: str (default 'float32')
+        The dtype of the tensors of the synthetic model.
+
+    synthetic_model_seed: int (default 0)
+        The seed of the values of the synthetic model.
+
+    Returns
+    -------
+
+    bytes:
+        The serialized model.
+    """
+    if model_real:
+        import torch
+        import torchvision.models as models
+        model_data = io.BytesIO()
+        torch.save(models.mobilenet_v2(pretrained=True), model_data)
+        return model_data.getvalue()
+    if synthetic_model_size is not None:
+        return get_synthetic_model_bytes(synthetic_model_size, synthetic_model_layers,
+                                         synthetic_model_dtype, synthetic_model_seed)
+    return msgpack.packb(placeholder)
+
+
+def add_synthetic_model_args(p):
+    """
+    Adds the arguments of the synthetic model to the argument parser of
+    a stress test script.
+
+    Parameters
+    ----------
+
+    p: argparse.ArgumentParser
+        The parser.
+    """
+    p.add_argument("--synthetic-model-size",
+                   help="Send a synthetic model whose tensors take this many bytes, e.g. 10MB or 1GB.",
+                   type=parse_size,
+                   required=False,
+                   default=None)
+    p.add_argument("--synthetic-model-layers",
+                   help="The number of tensors of the synthetic model.",
+                   type=int,
+                   required=False,
+                   default=SYNTHETIC_NUM_LAYERS)
+    p.add_argument("--synthetic-model-dtype",
+                   help="The dtype of the tensors of the synthetic model.",
+                   choices=SYNTHETIC_DTYPES,
+                   required=False,
+                   default='float32')
+    p.add_argument("--synthetic-model-seed",
+                   help="The seed of the values of the synthetic model.",
+                   type=int,
+                   required=False,
+                   default=0)
+
+
+def get_synthetic_model_args(args):
+    """
+    Returns the synthetic model arguments parsed by a stress test script,
+    as keyword arguments of get_stress_model.
+    """
+    return {
+        'synthetic_model_size': args.synthetic_model_size,
+        'synthetic_model_layers': args.synthetic_model_layers,
+        'synthetic_model_dtype': args.synthetic_model_dtype,
+        'synthetic_model_seed': args.synthetic_model_seed
+    }
+
 class SimpleLPWorker(object):
     """
     Simple worker class for the stress testing. This class was created because
@@ -84,10 +196,11 @@ class SimpleLPWorker(object):
     s_port: int
         the server port
 
-    private_key_file: str
-        The file containing the private key for this worker.
+    worker_keys: (SigningKey, str)
+        The private key and public key string of this worker, as returned by
+        get_worker_keys_from_chunk.
     """
-    def __init__(self, s_host, s_port, private_key_file):
+    def __init__(self, s_host, s_port, worker_keys):
         self.gm_version = 0
         self.update = None
         self.worker = DCFWorker(
@@ -96,8 +209,9 @@ class SimpleLPWorker(object):
             server_port=s_port,
             global_model_version_changed_callback=self.global_model_changed_callback,
             get_worker_version_of_global_model=self.get_last_global_model_version,
-            private_key_file=private_key_file
+            private_key_file=None
         )
+        self.worker.private_key, self.worker.public_key_str = worker_keys
 
     def global_model_changed_callback(self, model_dict):
         print(f'Received global model for {self.worker.worker_id}')
@@ -111,4 +225,89 @@ class SimpleLPWorker(object):
             print(model_dict)
 
     def get_last_global_model_version(self):
-        return self.gm_version
\ No newline at end of file
+        return self.gm_version
+
+
+class TimingRecorder(object):
+    """
+    Records the timings of the requests and rounds of a stress test process,
+    one JSON object per line, so that the stress orchestrator can gather
+    the timings of all the processes. The times are wall clock times, so
+    that the timings of different processes on the same machine can be
+    compared. Nothing is recorded if no file is given.
+
+    Parameters
+    ----------
+
+    timings_file: str
+        The file the timings are appended to, or None.
+
+    process: str
+        The name of the process, e.g. its chunk string.
+    """
+    def __init__(self, timings_file, process):
+        self.file = None if timings_file is None else open(timings_file, 'a')
+        self.process = process
+
+    def record(self, kind, name, start, end, ok=True):
+        """
+        Records a timing.
+
+        Parameters
+        ----------
+
+        kind: str
+            'request' or 'round'.
+
+        name: str
+            The name of the request, or the number of the round.
+
+        start: float
+            The time the request or round started.
+
+        end: float
+            The time the request or round ended.
+
+        ok: bool (default True)
+            Whether the request succeeded.
+        """
+        if self.file is not None:
+            self.file.write(json.dumps({'process': self.process, 'kind': kind, 'name': name,
+                                        'start': start, 'end': end, 'ok': ok}) + '\n')
+            self.file.flush()
+
+    def time_request(self, name, call, is_ok=lambda result: True):
+        """
+        Calls and times a request. A request raising an exception is recorded
+        as failed, and the exception is raised again.
+
+        Parameters
+        ----------
+
+        name: str
+            The name of the request.
+
+        call: () -> object
+            The request.
+
+        is_ok: object -> bool
+            Whether the result of the request means it succeeded.
+
+        Returns
+        -------
+
+        object:
+            The result of the request.
+        """
+        start = time.time()
+        try:
+            result = call()
+        except Exception:
+            self.record('request', name, start, time.time(), ok=False)
+            raise
+        self.record('request', name, start, time.time(), ok=is_ok(result))
+        return result
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
@@ -2,18 +2,14 @@
 Run the workers for the basic stress test.
 """
 
-import os
+import time
 import argparse
-import msgpack
-import io
 
-import torch
-import torchvision.models as models
-
-from dc_federated.stress_test.stress_utils import get_worker_keys_from_chunk, SimpleLPWorker
+from dc_federated.stress_test.stress_utils import get_worker_keys_from_chunk, SimpleLPWorker, TimingRecorder, \
+    get_stress_model, add_synthetic_model_args, get_synthetic_model_args
 from gevent import Greenlet, sleep
 
-from dc_federated.stress_test.stress_gen_keys import STRESS_KEYS_FOLDER
+from dc_federated.backend import is_valid_model_dict
 
 import logging
 
@@ -22,7 +18,8 @@ logger = logging.getLogger(__file__)
 logger.setLevel(level=logging.INFO)
 
 
-def run_stress_worker(server_host_ip, server_port, num_runs, worker_model_real, chunk_str):
+def run_stress_worker(server_host_ip, server_port, num_runs, worker_model_real, chunk_str, timings_file=None,
+                      synthetic_model_args=None):
     """
     Run the workers loop for the basic stress test. This involves
     creating a a set of workers according to the keys in STRESS_KEYS_FOLDER then:
@@ -50,30 +47,32 @@ def run_stress_worker(server_host_ip, server_port, num_runs, worker_model_real,
 
     chunk_str: str
         String giving the chunk of keys to use.
+
+    timings_file: str (default None)
+        If given, the timings of the requests and of the runs are appended
+        to this file, as read by the stress orchestrator.
+
+    synthetic_model_args: dict (default None)
+        The arguments of get_stress_model for a synthetic model, as returned
+        by get_synthetic_model_args.
     """
+    recorder = TimingRecorder(timings_file, chunk_str)
     workers = []
-    if worker_model_real:
-        model_data = io.BytesIO()
-        torch.save(models.mobilenet_v2(pretrained=True), model_data)
-        bin_model = model_data.getvalue()
-    else:
-        bin_model = msgpack.packb("A 'local model update'!!")
-
-    for fn in get_worker_keys_from_chunk(chunk_str):
-        workers.append(SimpleLPWorker(
-           server_host_ip, server_port,
-           os.path.join(STRESS_KEYS_FOLDER, fn))
-        )
+    bin_model = get_stress_model(worker_model_real, "A 'local model update'!!", **(synthetic_model_args or {}))
+
+    for worker_keys in get_worker_keys_from_chunk(chunk_str):
+        workers.append(SimpleLPWorker(server_host_ip, server_port, worker_keys))
 
     num_workers = len(workers)
     for i, worker in enumerate(workers):
         logger.info(f'Registering {i} th worker')
-        worker.worker.register_worker()
+        recorder.time_request('register_worker', worker.worker.register_worker)
 
     # get the current global model and check
     for i, worker in enumerate(workers):
         print(f"Requesting global model for {worker.worker.worker_id} (no. {i}) ")
-        worker.global_model_changed_callback(worker.worker.get_global_model())
+        worker.global_model_changed_callback(
+            recorder.time_request('get_global_model', worker.worker.get_global_model, is_valid_model_dict))
 
     done_count = 0
 
@@ -81,7 +80,7 @@ def run_stress_worker(server_host_ip, server_port, num_runs, worker_model_real,
         nonlocal done_count
         logger.info(f"Starting long poll for {gl_worker.worker.worker_id} (no. {num})")
         gl_worker.global_model_changed_callback(
-            gl_worker.worker.get_global_model())
+            recorder.time_request('get_global_model', gl_worker.worker.get_global_model, is_valid_model_dict))
         logger.info(f"Long poll for {gl_worker.worker.worker_id} finished")
         done_count += 1
 
@@ -89,8 +88,11 @@ def run_stress_worker(server_host_ip, server_port, num_runs, worker_model_real,
         for run_no in range(num_runs):
             logger.info(f"********************** STARTING RUN {run_no + 1}:")
             sleep(5)
+            run_start = time.time()
             for i, worker in enumerate(workers):
-                response = worker.worker.send_model_update(bin_model)
+                response = recorder.time_request(
+                    'send_model_update', lambda: worker.worker.send_model_update(bin_model),
+                    lambda response: response.startswith(b"Update received"))
                 logger.info(f"Response from server sending model update: {response}")
                 logger.info(f"Spawning for worker {i}")
                 Greenlet.spawn(run_wg, worker, i)
@@ -101,9 +103,12 @@ def run_stress_worker(server_host_ip, server_port, num_runs, worker_model_real,
                 sleep(1)
                 logger.info(f"{done_count} workers have received the global model update - need to get to {num_workers}...")
             done_count = 0
+            recorder.record('round', run_no + 1, run_start, time.time())
     except Exception as e:
         print(e)
         exit()
+    finally:
+        recorder.close()
 
 def get_args():
     """
@@ -132,6 +137,12 @@ def get_args():
                    type=str,
                    required=False,
                    default="1 of 1")
+    p.add_argument("--timings-file",
+                   help="The file the timings of the requests and runs are appended to.",
+                   type=str,
+                   required=False,
+                   default=None)
+    add_synthetic_model_args(p)
 
     return p.parse_args()
 
@@ -143,5 +154,7 @@ if __name__ == '__main__':
         args.server_port,
         args.num_runs,
         args.worker_model_real,
-        args.chunk
+        args.chunk,
+        args.timings_file,
+        get_synthetic_model_args(args)
     )
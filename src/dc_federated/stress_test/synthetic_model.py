@@ -0,0 +1,125 @@
+"""
+Generate synthetic models of a given size for the stress tests, without
+downloading any weights.
+"""
+
+import io
+import re
+from collections import OrderedDict
+
+import logging
+
+
+logger = logging.getLogger(__file__)
+logger.setLevel(level=logging.INFO)
+
+# torch is only imported when a model is generated, so that the scripts not
+# generating one do not need it
+SYNTHETIC_DTYPES = ['float64', 'float32', 'float16', 'bfloat16', 'int8']
+SYNTHETIC_NUM_LAYERS = 50
+SIZE_UNITS = {'': 1, 'KB': 10 ** 3, 'MB': 10 ** 6, 'GB': 10 ** 9, 'KIB': 2 ** 10, 'MIB': 2 ** 20, 'GIB': 2 ** 30}
+
+
+def parse_size(size_str):
+    """
+    Parses a size given as a number of bytes with an optional unit, such as
+    '10MB' or '1.5GiB'.
+
+    Parameters
+    ----------
+
+    size_str: str
+        The size.
+
+    Returns
+    -------
+
+    int:
+        The size in bytes.
+    """
+    match = re.fullmatch(r"\s*([0-9]*\.?[0-9]+)\s*([a-zA-Z]*)\s*", size_str)
+    if match is None or match.group(2).upper() not in SIZE_UNITS:
+        raise ValueError(f"Invalid size {size_str} - expected e.g. 1000000, 10MB or 1GiB.")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def make_synthetic_state_dict(total_size, num_layers=SYNTHETIC_NUM_LAYERS, dtype='float32', seed=0):
+    """
+    Builds a state dict of num_layers tensors whose data add up to
+    total_size bytes (rounded down to whole elements), shared as evenly as
+    possible between the layers. The values are drawn from a normal
+    distribution (uniformly for integer dtypes) with the given seed, so they
+    compress about as badly as trained weights, and the same arguments
+    always give the same state dict.
+
+    Parameters
+    ----------
+
+    total_size: int
+        The total size in bytes of the tensors.
+
+    num_layers: int (default SYNTHETIC_NUM_LAYERS)
+        The number of tensors.
+
+    dtype: str (default 'float32')
+        The dtype of the tensors, one of SYNTHETIC_DTYPES.
+
+    seed: int (default 0)
+        The seed of the values.
+
+    Returns
+    -------
+
+    OrderedDict:
+        The state dict, with keys 'layers.<n>.weight'.
+    """
+    import torch
+    if dtype not in SYNTHETIC_DTYPES:
+        raise ValueError(f"Unsupported dtype {dtype} - expected one of {', '.join(SYNTHETIC_DTYPES)}.")
+    torch_dtype = getattr(torch, dtype)
+    num_elements = total_size // torch.tensor([], dtype=torch_dtype).element_size()
+    num_layers = max(min(num_layers, num_elements), 1)
+    generator = torch.Generator().manual_seed(seed)
+    state_dict = OrderedDict()
+    for n in range(num_layers):
+        layer_elements = num_elements // num_layers + (1 if n < num_elements % num_layers else 0)
+        if torch_dtype.is_floating_point:
+            state_dict[f"layers.{n}.weight"] = torch.randn(layer_elements, generator=generator).to(torch_dtype)
+        else:
+            state_dict[f"layers.{n}.weight"] = torch.randint(
+                -128, 128, (layer_elements,), generator=generator, dtype=torch_dtype)
+    return state_dict
+
+
+def get_synthetic_model_bytes(total_size, num_layers=SYNTHETIC_NUM_LAYERS, dtype='float32', seed=0):
+    """
+    Returns a synthetic state dict serialized with torch.save, as the
+    models exchanged by the workers and server of the FedAvg algorithm.
+
+    Parameters
+    ----------
+
+    total_size: int
+        The total size in bytes of the tensors.
+
+    num_layers: int (default SYNTHETIC_NUM_LAYERS)
+        The number of tensors.
+
+    dtype: str (default 'float32')
+        The dtype of the tensors, one of SYNTHETIC_DTYPES.
+
+    seed: int (default 0)
+        The seed of the values.
+
+    Returns
+    -------
+
+    bytes:
+        The serialized state dict.
+    """
+    import torch
+    model_data = io.BytesIO()
+    torch.save(make_synthetic_state_dict(total_size, num_layers, dtype, seed), model_data)
+    logger.info(f"Generated a synthetic model of {num_layers} {dtype} layers "
+                f"({model_data.tell()} bytes serialized).")
+    return model_data.getvalue()
@@ -5,9 +5,10 @@ Contains utility functions to be used within the demo.
 
 import socket
 import logging
+import socketserver
 
 from bottle import Bottle, ServerAdapter, WSGIRefServer
-from wsgiref.simple_server import make_server, WSGIRequestHandler
+from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
 
 
 logger = logging.getLogger(__name__)
@@ -35,6 +36,7 @@ class StoppableServer(ServerAdapter):
     """
 
     server = None
+    server_class = WSGIServer
 
     def run(self, handler):
         if self.quiet:
@@ -42,9 +44,23 @@ class StoppableServer(ServerAdapter):
                 def log_request(*args, **kw): pass
             self.options['handler_class'] = QuietHandler
         self.server = make_server(
-            self.host, self.port, handler, **self.options)
+            self.host, self.port, handler, server_class=self.server_class, **self.options)
         self.server.serve_forever()
 
     def shutdown(self):
         logger.info("Shutting down server.")
         self.server.shutdown()
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class StoppableConcurrentServer(StoppableServer):
+    """
+    A StoppableServer that handles each request in its own thread (a greenlet
+    when gevent has patched the threading module), so that long lived
+    requests such as event streams do not hold up the other requests.
+    Meant to be used for testing.
+    """
+    server_class = ThreadingWSGIServer
@@ -0,0 +1,99 @@
+"""
+Tests for the asynchronous and sampled logging mode of the server.
+"""
+
+from gevent import monkey; monkey.patch_all()
+
+import io
+import logging
+
+from dc_federated.backend._async_logging import LogSampler, log_sampler, log_routine, \
+    enable_async_logging, disable_async_logging, AsyncLogHandler
+
+_get_ident = monkey.get_original('_thread', 'get_ident')
+
+
+def test_log_sampler():
+    now = 0.0
+    sampler = LogSampler(period=10, burst=2, clock=lambda: now)
+    assert sampler.sample('a', 'Returned global model to %s.') == 'Returned global model to %s.'
+    sampler.enabled = True
+    assert [sampler.sample('a', 'Returned global model to %s.') for _ in range(4)] == \
+        ['Returned global model to %s.', 'Returned global model to %s.', None, None]
+    # other messages and loggers are sampled separately
+    assert sampler.sample('a', 'Pushed global model version change to %s.') is not None
+    assert sampler.sample('b', 'Returned global model to %s.') is not None
+
+    now = 10.0
+    assert sampler.sample('a', 'Returned global model to %s.') == \
+        'Returned global model to %s. [2 similar messages dropped]'
+    assert sampler.sample('a', 'Returned global model to %s.') == 'Returned global model to %s.'
+    assert sampler.sample('a', 'Returned global model to %s.') is None
+
+
+class ThreadRecordingHandler(logging.StreamHandler):
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.threads = set()
+
+    def emit(self, record):
+        self.threads.add(_get_ident())
+        super().emit(record)
+
+
+def test_async_logging():
+    root = logging.getLogger()
+    test_logger = logging.getLogger('dc_federated.test_async_logging')
+    test_logger.setLevel(logging.INFO)
+    stream = io.StringIO()
+    handler = ThreadRecordingHandler(stream)
+    handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    old_handlers = list(root.handlers)
+    for old_handler in old_handlers:
+        root.removeHandler(old_handler)
+    root.addHandler(handler)
+    try:
+        async_handler = enable_async_logging(period=60, burst=3)
+        assert enable_async_logging() is async_handler
+        assert root.handlers == [async_handler]
+        for i in range(10):
+            log_routine(test_logger, "Returned global model to %s.", f"worker{i}")
+        test_logger.warning("Unknown worker %s tried to send an update.", "worker0")
+        try:
+            raise ValueError("bad update")
+        except ValueError:
+            test_logger.exception("Update failed.")
+        disable_async_logging()
+
+        assert root.handlers == [handler]
+        lines = stream.getvalue().splitlines()
+        assert lines[0:3] == [f"INFO Returned global model to worker{i}." for i in range(3)]
+        assert lines[3] == "WARNING Unknown worker worker0 tried to send an update."
+        assert lines[4] == "ERROR Update failed."
+        assert lines[-1] == "ValueError: bad update"
+        # the records were written by the thread of the handler
+        assert handler.threads and _get_ident() not in handler.threads
+        assert not log_sampler.enabled
+    finally:
+        disable_async_logging()
+        root.removeHandler(handler)
+        for old_handler in old_handlers:
+            root.addHandler(old_handler)
+
+
+def test_async_log_handler_queue_limit():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    async_handler = AsyncLogHandler([handler], max_records=2)
+    test_logger = logging.getLogger('dc_federated.test_async_log_handler')
+    test_logger.propagate = False
+    test_logger.addHandler(async_handler)
+    try:
+        for i in range(5):
+            test_logger.warning("Message %d", i)
+        async_handler.start()
+        async_handler.stop()
+        assert stream.getvalue().splitlines() == \
+            ["Message 0", "Message 1", "3 log records were dropped as the log queue was full."]
+    finally:
+        test_logger.removeHandler(async_handler)
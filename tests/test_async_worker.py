@@ -0,0 +1,151 @@
+"""
+Tests for the AsyncDCFWorker and its connection pool.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import asyncio
+import msgpack
+
+from nacl.encoding import HexEncoder
+
+from dc_federated.backend import DCFServer, AsyncDCFWorker, create_model_dict
+from dc_federated.backend._async_http import AsyncConnectionPool
+from dc_federated.backend._constants import *
+from dc_federated.backend.worker_key_pair_tool import gen_pair
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+def test_async_connection_pool():
+    connections = 0
+
+    async def handle(reader, writer):
+        nonlocal connections
+        connections += 1
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except asyncio.IncompleteReadError:
+                break
+            length = int([line.split(b':')[1] for line in head.split(b'\r\n')
+                          if line.lower().startswith(b'content-length')][0])
+            body = await reader.readexactly(length)
+            if head.startswith(b'GET /chunked'):
+                writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+                             b'5\r\nhello\r\n6\r\n world\r\n0\r\n\r\n')
+            else:
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body))
+            await writer.drain()
+        writer.close()
+
+    async def run_requests():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        pool = AsyncConnectionPool(max_connections=1)
+        responses = await asyncio.gather(*[
+            pool.request('POST', f"http://127.0.0.1:{port}/echo", f"request {n}".encode())
+            for n in range(5)])
+        chunked = await pool.request('GET', f"http://127.0.0.1:{port}/chunked")
+        await pool.close()
+        server.close()
+        return responses, chunked
+
+    responses, chunked = asyncio.run(run_requests())
+    assert [response.content for response in responses] == [f"request {n}".encode() for n in range(5)]
+    assert chunked.content == b'hello world'
+    # all the requests went through a single keep-alive connection
+    assert connections == 1
+
+
+def test_async_worker():
+    num_workers = 5
+    keys_folder = 'async_keys_folder'
+    if not os.path.exists(keys_folder):
+        os.mkdir(keys_folder)
+    key_files = [os.path.join(keys_folder, f"async_worker_key_{n}") for n in range(num_workers)]
+    public_keys = [gen_pair(key_file)[1] for key_file in key_files]
+    worker_key_file = os.path.join(keys_folder, 'async_worker_public_keys.txt')
+    with open(worker_key_file, 'w') as f:
+        for public_key in public_keys:
+            f.write(public_key.encode(encoder=HexEncoder).decode('utf-8') + os.linesep)
+
+    worker_ids = []
+    worker_updates = {}
+    global_model_version = "1"
+
+    def test_rec_server_update_cb(worker_id, update):
+        worker_updates[worker_id] = update
+        return f"Update received for worker {worker_id[0:WID_LEN]}."
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: worker_ids.append(worker_id),
+        unregister_worker_callback=lambda worker_id: worker_ids.remove(worker_id),
+        return_global_model_callback=lambda: create_model_dict(
+            msgpack.packb("Pickle dump of a string"), global_model_version),
+        is_global_model_most_recent=lambda version: version == global_model_version,
+        receive_worker_update_callback=test_rec_server_update_cb,
+        server_mode_safe=True,
+        key_list_file=worker_key_file,
+        load_last_session_workers=False,
+        model_check_interval=0.2
+    )
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8083)
+    server_gl = Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    worker_versions = ["0"] * num_workers
+
+    def changed_callback(n):
+        def callback(model_dict):
+            worker_versions[n] = model_dict[GLOBAL_MODEL_VERSION]
+        return callback
+
+    async def run_workers():
+        nonlocal global_model_version
+        pool = AsyncConnectionPool(max_connections=num_workers)
+        workers = [AsyncDCFWorker(
+            server_protocol='http',
+            server_host_ip=dcf_server.server_host_ip,
+            server_port=dcf_server.server_port,
+            global_model_version_changed_callback=changed_callback(n),
+            get_worker_version_of_global_model=lambda n=n: worker_versions[n],
+            private_key_file=key_files[n],
+            connection_pool=pool) for n in range(num_workers)]
+
+        await asyncio.gather(*[worker.register_worker() for worker in workers])
+        models = await asyncio.gather(*[worker.get_global_model() for worker in workers])
+        for n, model_dict in enumerate(models):
+            assert model_dict[GLOBAL_MODEL_VERSION] == "1"
+            workers[n].global_model_version_changed_callback(model_dict)
+
+        responses = await asyncio.gather(*[
+            worker.send_model_update(msgpack.packb(f"Update from {n}")) for n, worker in enumerate(workers)])
+        assert all(response.startswith(b"Update received") for response in responses)
+
+        # the workers wait for the next global model
+        run_tasks = [asyncio.ensure_future(worker.run()) for worker in workers]
+        await asyncio.sleep(1)
+        assert worker_versions == ["1"] * num_workers
+        global_model_version = "2"
+        for _ in range(50):
+            await asyncio.sleep(0.2)
+            if worker_versions == ["2"] * num_workers:
+                break
+        for task in run_tasks:
+            task.cancel()
+        await pool.close()
+        return workers
+
+    workers = asyncio.run(run_workers())
+    assert sorted(worker_ids) == sorted(worker.worker_id for worker in workers)
+    assert worker_versions == ["2"] * num_workers
+    for n, worker in enumerate(workers):
+        assert msgpack.unpackb(worker_updates[worker.worker_id]) == f"Update from {n}"
+
+    stoppable_server.shutdown()
+    for f in os.listdir(keys_folder):
+        os.remove(os.path.join(keys_folder, f))
+    os.rmdir(keys_folder)
@@ -0,0 +1,53 @@
+"""
+Tests for the benchmark of the aggregation of the FedAvgServer.
+"""
+
+from gevent import monkey; monkey.patch_all()
+
+import torch
+
+from dc_federated.benchmark.benchmark_aggregation import run_aggregation_benchmark, format_aggregation_results, \
+    TensorAllocationCounter
+
+
+def test_tensor_allocation_counter():
+    a = torch.ones(1000)
+    with TensorAllocationCounter() as counter:
+        b = a * 2
+        b.add_(a)
+        c = b.view(10, 100)
+        d = a + 1
+        del b, c
+        e = a - 1
+    assert counter.allocations == 3
+    assert counter.allocated_bytes == 12000
+    assert counter.peak_bytes == 8000
+    assert counter.live_bytes == 8000
+
+
+def test_aggregation_benchmark():
+    results = run_aggregation_benchmark(['mnist', '100KB'], ['float32', 'bfloat16'], [2, 5], repeats=2,
+                                        synthetic_layers=4)
+    assert [(r['model'], r['dtype'], r['num_workers']) for r in results] == [
+        (model, dtype, num_workers) for model in ['mnist', '100KB'] for dtype in ['float32', 'bfloat16']
+        for num_workers in [2, 5]]
+    results = {(r['model'], r['dtype'], r['num_workers']): r for r in results}
+
+    synthetic = results[('100KB', 'float32', 5)]
+    assert synthetic['model_size'] == 100000
+    assert synthetic['requests'] == 2 and synthetic['errors'] == 0
+    assert synthetic['latency']['count'] == 2
+    # each of the 4 layers takes a multiplication and an addition per worker, and a division and two copies
+    assert synthetic['allocations'] == 4 * (2 * 5 - 1 + 3)
+    assert synthetic['peak_bytes'] >= 100000
+    assert results[('100KB', 'float32', 2)]['allocations'] < synthetic['allocations']
+    assert results[('mnist', 'float32', 2)]['model_size'] > 4 * 10 ** 6
+
+    # the aggregation goes through numpy, which has no bfloat16
+    assert results[('mnist', 'bfloat16', 2)]['errors'] == 2
+    assert 'error' in results[('mnist', 'bfloat16', 2)]
+
+    table = format_aggregation_results(list(results.values())).splitlines()
+    assert len(table) == 9
+    assert table[1].startswith('mnist          float32         2')
+    assert 'error' in table[3]
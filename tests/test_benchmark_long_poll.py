@@ -0,0 +1,27 @@
+"""
+Tests for the benchmark of the long polling of the DCFServer.
+"""
+
+from gevent import monkey; monkey.patch_all()
+
+from dc_federated.benchmark.benchmark_long_poll import run_long_poll_benchmark, format_long_poll_results
+
+
+def test_long_poll_benchmark():
+    # more waiters than select can watch, so that the server holds sockets numbered over 1024
+    results = run_long_poll_benchmark([20, 1100], port=8105, model_check_interval=0.05, idle_seconds=0.5,
+                                      timeout=60)
+    assert [r['waiters'] for r in results] == [20, 1100]
+    for r in results:
+        assert r['operation'] == 'long_poll_wakeup'
+        assert r['errors'] == 0
+        assert r['latency']['count'] == r['waiters']
+        assert r['duration'] == r['latency']['max']
+        assert r['server_rss_parked'] > r['server_rss_before'] > 0
+        assert r['server_rss_per_waiter'] > 0
+        assert r['server_idle_cpu'] >= 0
+    assert results[0]['latency']['max'] < 5
+
+    table = format_long_poll_results(results).splitlines()
+    assert len(table) == 3
+    assert table[2].split()[:2] == ['1100', '0']
@@ -0,0 +1,45 @@
+"""
+Tests for the benchmark of the server routes.
+"""
+
+from gevent import monkey; monkey.patch_all()
+
+import os
+import json
+
+from dc_federated.benchmark.benchmark_utils import percentile, summarize_latencies, write_results
+from dc_federated.benchmark.benchmark_server_routes import run_server_routes_benchmark, OPERATIONS
+
+
+def test_latency_summary():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([0.5], 95) == 0.5
+    assert percentile([], 50) is None
+    summary = summarize_latencies([3, 1, 2])
+    assert summary == {'count': 3, 'mean': 2, 'min': 1, 'p50': 2, 'p95': 3, 'p99': 3, 'max': 3}
+
+
+def test_server_routes_benchmark():
+    output_file = 'test_benchmark_server_routes.json'
+    results = run_server_routes_benchmark(OPERATIONS, [1, 3], [1000, 100000], 6, port=8104)
+    try:
+        assert [(r['operation'], r['concurrency'], r.get('payload_size')) for r in results[-4:]] == [
+            ('update_upload', 1, 1000), ('update_upload', 1, 100000),
+            ('update_upload', 3, 1000), ('update_upload', 3, 100000)]
+        assert len(results) == 16
+        for r in results:
+            assert r['errors'] == 0
+            assert r['requests'] == r['latency']['count'] == 6
+            assert r['throughput'] > 0
+            assert 0 < r['latency']['p50'] <= r['latency']['p95'] <= r['latency']['p99']
+
+        write_results(results, output_file, {'num_requests': 6})
+        with open(output_file) as f:
+            written = json.load(f)
+        assert written['config'] == {'num_requests': 6}
+        assert written['results'] == results
+    finally:
+        if os.path.exists(output_file):
+            os.remove(output_file)
@@ -0,0 +1,89 @@
+"""
+Tests for the binary (msgpack and octet-stream) protocol between the
+workers and the server.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import zlib
+
+from nacl.encoding import HexEncoder
+
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.backend.worker_key_pair_tool import gen_pair
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+def test_binary_protocol():
+    key_files = ['binary_protocol_test_key_0', 'binary_protocol_test_key_1']
+    worker_updates = {}
+
+    def test_rec_server_update_cb(worker_id, update):
+        worker_updates[worker_id] = worker_updates.get(worker_id, []) + [update]
+        return f"Update received for worker {worker_id[0:WID_LEN]}."
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(b"model", "1"),
+        is_global_model_most_recent=lambda version: version == "1",
+        receive_worker_update_callback=test_rec_server_update_cb,
+        server_mode_safe=True,
+        key_list_file=None,
+        load_last_session_workers=False
+    )
+    for key_file in key_files:
+        _, public_key = gen_pair(key_file)
+        dcf_server.worker_manager.add_worker(public_key.encode(encoder=HexEncoder).decode('utf-8'))
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8089)
+    server_gl = Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    def create_worker(key_file, binary_protocol, upload_chunk_size=None):
+        return DCFWorker(
+            server_protocol='http',
+            server_host_ip=dcf_server.server_host_ip,
+            server_port=dcf_server.server_port,
+            global_model_version_changed_callback=lambda model_dict: None,
+            get_worker_version_of_global_model=lambda: "0",
+            private_key_file=key_file,
+            upload_chunk_size=upload_chunk_size,
+            binary_protocol=binary_protocol)
+
+    binary_worker = create_worker(key_files[0], binary_protocol=True)
+    json_worker = create_worker(key_files[1], binary_protocol=False)
+    for worker in [binary_worker, json_worker]:
+        worker_id = worker.register_worker()
+        assert worker.use_binary_protocol == worker.binary_protocol
+
+        model_dict = worker.get_global_model()
+        assert model_dict[GLOBAL_MODEL] == b"model"
+        assert model_dict[GLOBAL_MODEL_VERSION] == "1"
+
+        model_update = os.urandom(1000)
+        response = worker.send_model_update(model_update)
+        assert response == f"Update received for worker {worker_id[0:WID_LEN]}.".encode()
+        assert worker_updates[worker_id] == [model_update]
+
+    # chunked uploads also work with the binary protocol
+    chunked_worker = create_worker(key_files[0], binary_protocol=True, upload_chunk_size=300)
+    worker_id = chunked_worker.register_worker()
+    model_update = os.urandom(1000)
+    chunked_worker.send_model_update(model_update)
+    assert worker_updates[worker_id][-1] == model_update
+
+    # an update whose signature does not match is rejected
+    signed_phrase = binary_worker.get_signed_phrase(b"not the hash of the update")
+    assert isinstance(signed_phrase, bytes)
+    response = binary_worker.post_model_update(zlib.compress(b"update"), signed_phrase)
+    assert response == INVALID_WORKER.encode()
+    assert len(worker_updates[binary_worker.worker_id]) == 2
+
+    stoppable_server.shutdown()
+    for key_file in key_files:
+        os.remove(key_file)
+        os.remove(key_file + '.pub')
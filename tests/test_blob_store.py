@@ -0,0 +1,111 @@
+"""
+Tests for serving the global model from the content-addressed blob store.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import shutil
+import zlib
+import hashlib
+import msgpack
+import requests
+
+import dc_federated.backend.dcf_worker as dcf_worker_module
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+def test_blob_store():
+    blob_dir = 'test_model_blobs'
+    global_model_version = "1"
+    models = {version: os.urandom(3 * DOWNLOAD_CHUNK_SIZE) for version in ["1", "2", "3"]}
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(
+            models[global_model_version], global_model_version),
+        is_global_model_most_recent=lambda version: version == global_model_version,
+        receive_worker_update_callback=lambda worker_id, update: "Update received.",
+        server_mode_safe=False,
+        key_list_file=None,
+        model_check_interval=0.1,
+        model_blob_dir=blob_dir
+    )
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8100)
+    Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    worker = DCFWorker(
+        server_protocol='http',
+        server_host_ip=dcf_server.server_host_ip,
+        server_port=dcf_server.server_port,
+        global_model_version_changed_callback=lambda model_dict: None,
+        get_worker_version_of_global_model=lambda: "1",
+        private_key_file=None)
+    worker.register_worker()
+
+    try:
+        # the model is written once to a file named by its hash
+        assert worker.fetch_global_model() == create_model_dict(models["1"], "1")
+        compressed_model = zlib.compress(msgpack.packb(create_model_dict(models["1"], "1")))
+        content_hash = hashlib.sha256(compressed_model).hexdigest()
+        assert os.listdir(blob_dir) == [content_hash]
+        assert dcf_server.compressed_global_model[1] is None
+
+        # ranges are served only for the current version
+        def get_range(if_range):
+            return requests.post(f"http://{dcf_server.server_host_ip}:{dcf_server.server_port}/"
+                                 f"{RETURN_GLOBAL_MODEL_ROUTE}",
+                                 json={WORKER_ID_KEY: worker.worker_id, SIGNED_PHRASE: worker.get_signed_phrase()},
+                                 headers={'Range': 'bytes=100-199', 'If-Range': if_range})
+        response = get_range(content_hash)
+        assert response.status_code == 206
+        assert response.content == compressed_model[100:200]
+        response = get_range("outdated hash")
+        assert response.status_code == 200
+        assert response.content == compressed_model
+
+        # an interrupted download is resumed where it stopped
+        session_post = worker.session.post
+        range_headers = []
+
+        def interrupted_post(url, **kwargs):
+            response = session_post(url, **kwargs)
+            range_headers.append(kwargs.get('headers', {}).get('Range'))
+            if len(range_headers) == 1:
+                iter_content = response.iter_content
+
+                def interrupted_iter_content(chunk_size):
+                    for i, chunk in enumerate(iter_content(chunk_size)):
+                        if i == 1:
+                            raise requests.exceptions.ChunkedEncodingError("Connection dropped.")
+                        yield chunk
+                response.iter_content = interrupted_iter_content
+            return response
+
+        worker.session.post = interrupted_post
+        old_interval = dcf_worker_module.DOWNLOAD_RETRY_INTERVAL
+        try:
+            dcf_worker_module.DOWNLOAD_RETRY_INTERVAL = 0.1
+            global_model_version = "2"
+            assert worker.fetch_global_model() == create_model_dict(models["2"], "2")
+        finally:
+            dcf_worker_module.DOWNLOAD_RETRY_INTERVAL = old_interval
+            worker.session.post = session_post
+        assert range_headers == [None, f"bytes={DOWNLOAD_CHUNK_SIZE}-"]
+        assert worker.partial_global_model is None
+
+        # only the most recent versions are kept
+        assert len(os.listdir(blob_dir)) == 2
+        global_model_version = "3"
+        assert worker.fetch_global_model() == create_model_dict(models["3"], "3")
+        assert len(os.listdir(blob_dir)) == 2
+        assert content_hash not in os.listdir(blob_dir)
+    finally:
+        stoppable_server.shutdown()
+        shutil.rmtree(blob_dir, ignore_errors=True)
@@ -0,0 +1,162 @@
+"""
+Tests for the challenge phrase store used by the WorkerManager and the
+handling of rate limited challenge phrase requests by the DCFWorker.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import msgpack
+
+from nacl.encoding import HexEncoder
+from nacl.signing import SigningKey
+
+import dc_federated.backend.dcf_worker as dcf_worker_module
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._challenge_store import ChallengeStore
+from dc_federated.backend._worker_manager import WorkerManager
+from dc_federated.backend._constants import *
+from dc_federated.backend.worker_key_pair_tool import gen_pair
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+class FakeClock(object):
+    """
+    Clock that only moves when told to.
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_challenge_store():
+    clock = FakeClock()
+    store = ChallengeStore(ttl=60, rate=1.0, burst=3, clock=clock)
+
+    # challenges are unique even when issued at the same time
+    phrases = [store.issue(f"worker_{n}") for n in range(3)]
+    assert len(set(phrases)) == 3
+    assert len(store) == 3
+
+    # a challenge can only be consumed once
+    assert store.consume("worker_0") == phrases[0]
+    assert store.consume("worker_0") is None
+
+    # a new challenge replaces the old one
+    new_phrase = store.issue("worker_1")
+    assert new_phrase != phrases[1]
+    assert store.consume("worker_1") == new_phrase
+    assert len(store) == 1
+
+    # challenges expire after the ttl and the memory is reclaimed
+    clock.now += 61
+    assert store.consume("worker_2") is None
+    store.issue("worker_3")
+    assert len(store) == 1
+    clock.now += 200
+    store.issue("worker_4")
+    assert len(store) == 1
+    assert store.consume("worker_3") is None
+
+    # the token bucket limits the rate at which challenges are issued
+    for _ in range(3):
+        assert store.issue("worker_5") is not None
+    assert store.issue("worker_5") is None
+    clock.now += 1
+    assert store.issue("worker_5") is not None
+    assert store.issue("worker_5") is None
+
+    # forgetting a worker drops its challenge and resets its rate limit
+    store.forget("worker_5")
+    assert store.consume("worker_5") is None
+    assert store.issue("worker_5") is not None
+
+    # invalid parameters are rejected
+    for kwargs in [{'ttl': 0}, {'num_buckets': 0}, {'burst': 0}, {'rate': 0}]:
+        try:
+            ChallengeStore(**kwargs)
+        except ValueError:
+            pass
+        else:
+            assert False
+
+
+def test_worker_manager_rate_limit():
+    public_key_str = SigningKey.generate().verify_key.encode(encoder=HexEncoder).decode('utf-8')
+    worker_manager = WorkerManager(server_mode_safe=True,
+                                   key_list_file=None,
+                                   load_last_session_workers=False,
+                                   challenge_rate=0.001,
+                                   challenge_burst=2)
+    worker_id, success = worker_manager.add_worker(public_key_str)
+    assert success
+    assert worker_manager.get_challenge_phrase("unknown worker") == INVALID_WORKER
+    assert worker_manager.get_challenge_phrase(worker_id) != RATE_LIMITED_WORKER
+    assert worker_manager.get_challenge_phrase(worker_id) != RATE_LIMITED_WORKER
+    assert worker_manager.get_challenge_phrase(worker_id) == RATE_LIMITED_WORKER
+
+    # challenges are neither issued nor rate limited in unsafe mode
+    worker_manager = WorkerManager(server_mode_safe=False,
+                                   key_list_file=None,
+                                   challenge_rate=0.001,
+                                   challenge_burst=1)
+    worker_id, success = worker_manager.add_worker("dummy public key")
+    for _ in range(3):
+        assert worker_manager.get_challenge_phrase(worker_id) == NO_AUTHENTICATION
+
+
+def test_worker_challenge_backoff():
+    key_file = 'challenge_test_key'
+    _, public_key = gen_pair(key_file)
+    global_model_version = "1"
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(msgpack.packb("model"), global_model_version),
+        is_global_model_most_recent=lambda version: version == global_model_version,
+        receive_worker_update_callback=lambda worker_id, update: "Update received.",
+        server_mode_safe=True,
+        key_list_file=None,
+        load_last_session_workers=False,
+        challenge_rate=1.0,
+        challenge_burst=1
+    )
+    dcf_server.worker_manager.add_worker(public_key.encode(encoder=HexEncoder).decode('utf-8'))
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8081)
+    server_gl = Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    worker = DCFWorker(
+        server_protocol='http',
+        server_host_ip=dcf_server.server_host_ip,
+        server_port=dcf_server.server_port,
+        global_model_version_changed_callback=lambda model_dict: None,
+        get_worker_version_of_global_model=lambda: "0",
+        private_key_file=key_file)
+    worker.register_worker()
+
+    old_retries, old_interval = \
+        dcf_worker_module.CHALLENGE_PHRASE_MAX_RETRIES, dcf_worker_module.CHALLENGE_PHRASE_RETRY_INTERVAL
+    try:
+        dcf_worker_module.CHALLENGE_PHRASE_RETRY_INTERVAL = 0.6
+
+        # the second request is rate limited, the worker waits and gets a new phrase
+        assert DCFWorker.is_valid_challenge_phrase(worker.get_challenge_phrase())
+        assert DCFWorker.is_valid_challenge_phrase(worker.get_challenge_phrase())
+
+        # once the retries run out the error is returned, not signed and sent on
+        dcf_worker_module.CHALLENGE_PHRASE_MAX_RETRIES = 1
+        dcf_worker_module.CHALLENGE_PHRASE_RETRY_INTERVAL = 0.01
+        assert worker.get_challenge_phrase() == RATE_LIMITED_WORKER.encode()
+        assert worker.get_global_model() == RATE_LIMITED_WORKER.encode()
+    finally:
+        dcf_worker_module.CHALLENGE_PHRASE_MAX_RETRIES = old_retries
+        dcf_worker_module.CHALLENGE_PHRASE_RETRY_INTERVAL = old_interval
+        stoppable_server.shutdown()
+        os.remove(key_file)
+        os.remove(key_file + '.pub')
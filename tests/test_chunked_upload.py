@@ -0,0 +1,107 @@
+"""
+Tests for the resumable chunked upload of model updates.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import zlib
+import hashlib
+import requests
+
+from nacl.encoding import HexEncoder
+
+import dc_federated.backend.dcf_worker as dcf_worker_module
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.backend.worker_key_pair_tool import gen_pair
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+def test_chunked_upload():
+    key_file = 'chunked_upload_test_key'
+    _, public_key = gen_pair(key_file)
+    worker_updates = {}
+
+    def test_rec_server_update_cb(worker_id, update):
+        worker_updates[worker_id] = worker_updates.get(worker_id, []) + [update]
+        return f"Update received for worker {worker_id[0:WID_LEN]}."
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(b"model", "1"),
+        is_global_model_most_recent=lambda version: version == "1",
+        receive_worker_update_callback=test_rec_server_update_cb,
+        server_mode_safe=True,
+        key_list_file=None,
+        load_last_session_workers=False
+    )
+    dcf_server.worker_manager.add_worker(public_key.encode(encoder=HexEncoder).decode('utf-8'))
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8084)
+    server_gl = Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    worker = DCFWorker(
+        server_protocol='http',
+        server_host_ip=dcf_server.server_host_ip,
+        server_port=dcf_server.server_port,
+        global_model_version_changed_callback=lambda model_dict: None,
+        get_worker_version_of_global_model=lambda: "0",
+        private_key_file=key_file,
+        upload_chunk_size=10000)
+    worker_id = worker.register_worker()
+
+    # incompressible so that the upload takes several chunks
+    model_update = os.urandom(45000)
+    chunks_sent = []
+    session_put = worker.session.put
+
+    def flaky_put(url, data, headers):
+        chunks_sent.append(int(headers[UPLOAD_OFFSET_HEADER]))
+        if len(chunks_sent) == 2:
+            raise requests.exceptions.ConnectionError("Connection dropped before sending.")
+        response = session_put(url, data=data, headers=headers)
+        if len(chunks_sent) == 4:
+            raise requests.exceptions.ConnectionError("Connection dropped before the acknowledgement.")
+        return response
+
+    worker.session.put = flaky_put
+    old_interval = dcf_worker_module.UPLOAD_RETRY_INTERVAL
+    try:
+        dcf_worker_module.UPLOAD_RETRY_INTERVAL = 0.1
+        response = worker.send_model_update(model_update)
+    finally:
+        dcf_worker_module.UPLOAD_RETRY_INTERVAL = old_interval
+        worker.session.put = session_put
+
+    assert response == f"Update received for worker {worker_id[0:WID_LEN]}.".encode()
+    assert worker_updates[worker_id] == [model_update]
+    # the chunk that never arrived is sent again, the one that did is skipped
+    chunk_len = 10000
+    assert chunks_sent == [0, chunk_len, chunk_len, 2 * chunk_len, 3 * chunk_len, 4 * chunk_len]
+
+    # an update that doesn't match the signed hash is rejected
+    upload_loc = f"http://{dcf_server.server_host_ip}:{dcf_server.server_port}/{UPLOAD_SESSION_ROUTE}/{worker_id}"
+    signed_phrase = worker.get_signed_phrase(b"not the hash of the update")
+    data = zlib.compress(b"data")
+    reply = requests.post(upload_loc, json={UPLOAD_SIZE_KEY: len(data), SIGNED_PHRASE: signed_phrase}).json()
+    upload_id = reply[UPLOAD_ID_KEY]
+    # a chunk that doesn't match its checksum is not accepted
+    reply = requests.put(f"{upload_loc}/{upload_id}", data=data, headers={
+        UPLOAD_OFFSET_HEADER: "0", UPLOAD_CHECKSUM_HEADER: hashlib.sha256(b"other").hexdigest()}).json()
+    assert reply == {UPLOAD_OFFSET_KEY: 0}
+    reply = requests.put(f"{upload_loc}/{upload_id}", data=data, headers={
+        UPLOAD_OFFSET_HEADER: "0", UPLOAD_CHECKSUM_HEADER: hashlib.sha256(data).hexdigest()}).json()
+    assert reply[UPLOAD_RESPONSE_KEY] == INVALID_WORKER
+    assert len(worker_updates[worker_id]) == 1
+
+    # unknown uploads are reported as such
+    reply = requests.get(f"{upload_loc}/not_an_upload").json()
+    assert reply[ERROR_MESSAGE_KEY] == UNKNOWN_UPLOAD
+
+    stoppable_server.shutdown()
+    os.remove(key_file)
+    os.remove(key_file + '.pub')
@@ -0,0 +1,111 @@
+"""
+Tests for the scheduling of the global model downloads of the workers.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import time
+import requests
+
+import dc_federated.backend.dcf_worker as dcf_worker_module
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.backend._download_scheduler import DownloadScheduler
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+def test_download_scheduler():
+    now = 100.0
+    scheduler = DownloadScheduler(egress_budget=1000, clock=lambda: now)
+    assert scheduler.assign(500) == 0
+    assert scheduler.assign(500) == 0.5
+    assert scheduler.assign(2000) == 1.0
+    now = 102.5
+    assert scheduler.assign(1000) == 0.5
+    # once the slots have passed, downloads start straight away
+    now = 200.0
+    assert scheduler.assign(1000) == 0
+
+
+def test_download_schedule():
+    global_model_version = "1"
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(b"x" * 1000, global_model_version),
+        is_global_model_most_recent=lambda version: version == global_model_version,
+        receive_worker_update_callback=lambda worker_id, update: "Update received.",
+        server_mode_safe=False,
+        key_list_file=None,
+        model_check_interval=0.1,
+        egress_budget=1000
+    )
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8088)
+    server_gl = Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    def create_worker(follow_download_schedule=True):
+        worker = DCFWorker(
+            server_protocol='http',
+            server_host_ip=dcf_server.server_host_ip,
+            server_port=dcf_server.server_port,
+            global_model_version_changed_callback=lambda model_dict: None,
+            get_worker_version_of_global_model=lambda: "1",
+            private_key_file=None,
+            follow_download_schedule=follow_download_schedule)
+        worker.register_worker()
+        return worker
+
+    workers = [create_worker() for _ in range(3)]
+    unscheduled_worker = create_worker(follow_download_schedule=False)
+    received_at = {}
+
+    def get_global_model(worker):
+        model_dict = worker.get_global_model()
+        received_at[worker.worker_id] = time.monotonic()
+        assert model_dict[GLOBAL_MODEL_VERSION] == "2"
+
+    old_jitter = dcf_worker_module.DOWNLOAD_DELAY_JITTER
+    try:
+        dcf_worker_module.DOWNLOAD_DELAY_JITTER = 0
+        greenlets = [Greenlet.spawn(get_global_model, worker) for worker in workers + [unscheduled_worker]]
+        sleep(0.5)
+        released_at = time.monotonic()
+        global_model_version = "2"
+        gevent.joinall(greenlets, raise_error=True)
+    finally:
+        dcf_worker_module.DOWNLOAD_DELAY_JITTER = old_jitter
+
+    # the downloads of the scheduled workers are spread out one second apart
+    times = sorted(received_at[worker.worker_id] - released_at for worker in workers)
+    assert times[1] - times[0] > 0.8
+    assert times[2] - times[1] > 0.8
+    assert received_at[unscheduled_worker.worker_id] - released_at < 1
+
+    # a failed download is retried
+    worker = workers[0]
+    session_post = worker.session.post
+    failures = []
+
+    def flaky_post(url, **kwargs):
+        if url.endswith(RETURN_GLOBAL_MODEL_ROUTE) and len(failures) < 2:
+            failures.append(url)
+            raise requests.exceptions.ConnectionError("Connection dropped.")
+        return session_post(url, **kwargs)
+
+    worker.get_worker_version_global_model = lambda: "1"
+    worker.session.post = flaky_post
+    old_interval = dcf_worker_module.DOWNLOAD_RETRY_INTERVAL
+    try:
+        dcf_worker_module.DOWNLOAD_RETRY_INTERVAL = 0.1
+        model_dict = worker.get_global_model()
+    finally:
+        dcf_worker_module.DOWNLOAD_RETRY_INTERVAL = old_interval
+        worker.session.post = session_post
+    assert len(failures) == 2
+    assert model_dict[GLOBAL_MODEL_VERSION] == "2"
+
+    stoppable_server.shutdown()
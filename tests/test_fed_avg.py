@@ -15,6 +15,7 @@ import torch.nn.functional as F
 
 from dc_federated.algorithms.fed_avg import FedAvgServer, FedAvgModelTrainer
 from dc_federated.backend import GLOBAL_MODEL, GLOBAL_MODEL_VERSION
+from dc_federated.backend._constants import DESERIALIZE_EVENT, AGGREGATE_EVENT, TEST_EVENT
 
 
 
@@ -137,3 +138,39 @@ def test_fed_avg_server():
 
     assert_models_equal(
         fed_avg_server.global_model_trainer.model, test_global_model)
+
+    # the stages of the round are recorded in its timeline
+    timeline = fed_avg_server.round_timeline
+    assert [(e['event'], e['worker_id']) for e in timeline.rounds[0]['events']] == [
+        (DESERIALIZE_EVENT, dummy_worker_id_1),
+        (DESERIALIZE_EVENT, dummy_worker_id_2),
+        (AGGREGATE_EVENT, None),
+        (TEST_EVENT, None)
+    ]
+    assert timeline.current_version == 1
+
+
+def test_fed_avg_server_leak_detection():
+    fed_avg_server = FedAvgServer(FedAvgTestTrainer(), key_list_file=None, update_lim=2, leak_detection=True)
+    detector = fed_avg_server.server.leak_detector
+    try:
+        worker_ids = ["dummy_worker_id_1", "dummy_worker_id_2"]
+        for worker_id in worker_ids:
+            fed_avg_server.register_worker(worker_id)
+        for _ in range(2):
+            for worker_id in worker_ids:
+                model_update = io.BytesIO()
+                torch.save(FedAvgTestModel(), model_update)
+                fed_avg_server.receive_worker_update(worker_id, msgpack.packb((10, model_update.getvalue())))
+
+        # a snapshot is taken at the start of each round, once the model has been aggregated
+        rounds = detector.list_rounds()
+        assert [r['version'] for r in rounds] == [0, 1, 2]
+        assert rounds[0]['sizes']['worker_updates'] == 0
+        assert rounds[0]['sizes']['worker_update_bytes'] == 0
+        assert rounds[2]['sizes']['worker_updates'] == 2
+        assert rounds[2]['sizes']['worker_update_bytes'] == 2 * (10 * 2 + 2) * 4
+        assert rounds[0]['growth'] is None
+        assert rounds[2]['growth'] is not None
+    finally:
+        detector.stop()
@@ -0,0 +1,102 @@
+"""
+Tests for the pipelined mode of the FedAvgWorker, where the upload of the
+model update overlaps with the testing of the local model.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import io
+import time
+import msgpack
+import torch
+
+from torch import nn
+
+from dc_federated.algorithms.fed_avg import FedAvgWorker, FedAvgModelTrainer
+from dc_federated.backend import DCFServer, create_model_dict
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+class SlowTestTrainer(FedAvgModelTrainer):
+    """
+    Trainer whose testing takes a while.
+    """
+    def __init__(self):
+        self.model = nn.Linear(4, 2)
+
+    def train(self):
+        time.sleep(0.1)
+
+    def test(self):
+        time.sleep(0.5)
+
+    def get_model(self):
+        return self.model
+
+    def load_model(self, model_file):
+        self.model = torch.load(model_file)
+
+    def load_model_from_state_dict(self, state_dict):
+        self.model.load_state_dict(state_dict)
+
+    def get_per_session_train_size(self):
+        return 10
+
+
+def test_fed_avg_pipelined():
+    worker_updates = []
+    global_model_version = "1"
+
+    def test_rec_server_update_cb(worker_id, update):
+        # a slow upload
+        sleep(0.5)
+        worker_updates.append(msgpack.unpackb(update))
+        return "Update received."
+
+    def test_ret_global_model_cb():
+        model_data = io.BytesIO()
+        torch.save(nn.Linear(4, 2), model_data)
+        return create_model_dict(model_data.getvalue(), global_model_version)
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=test_ret_global_model_cb,
+        is_global_model_most_recent=lambda version: version == global_model_version,
+        receive_worker_update_callback=test_rec_server_update_cb,
+        server_mode_safe=False,
+        key_list_file=None,
+        model_check_interval=0.2
+    )
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8086)
+    server_gl = Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    workers = {}
+    for pipelined in [False, True]:
+        workers[pipelined] = FedAvgWorker(SlowTestTrainer(), None,
+                                          server_host_ip=dcf_server.server_host_ip,
+                                          server_port=dcf_server.server_port,
+                                          pipelined=pipelined)
+    # the pipelined worker returns before its upload has finished
+    assert len(worker_updates) == 1
+    workers[True].upload_greenlet.join()
+    assert len(worker_updates) == 2
+
+    # a round of the pipelined worker after receiving a new global model
+    worker = workers[True]
+    worker.global_model_version_changed_callback(worker.worker.get_global_model())
+    worker.upload_greenlet.join()
+    assert len(worker_updates) == 3
+    assert worker.worker_version_of_global_model == global_model_version
+
+    sequential_timings = workers[False].get_phase_timings()[0]
+    assert sequential_timings['round'] >= sequential_timings['test'] + sequential_timings['upload']
+    for timings in worker.get_phase_timings():
+        # the upload and the testing overlap
+        assert timings['round'] < timings['train'] + timings['test'] + timings['upload']
+    assert 'load' in worker.get_phase_timings()[1]
+
+    stoppable_server.shutdown()
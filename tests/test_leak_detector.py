@@ -0,0 +1,127 @@
+"""
+Tests for the detection of the memory growing from round to round.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import json
+import requests
+
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.backend._leak_detector import LeakDetector, find_unbounded_growth
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+class LeakedObject(object):
+    pass
+
+
+def test_leak_detector():
+    leaked = []
+    cache = {}
+    detector = LeakDetector(top_n=3)
+    detector.add_size_probe('leaked', lambda: len(leaked))
+    detector.add_size_probe('broken', lambda: 1 / 0)
+    try:
+        for version in range(5):
+            leaked.extend(LeakedObject() for _ in range(1000))
+            cache.clear()
+            cache.update({i: str(i) for i in range(1000)})
+            assert detector.snapshot_round(version) is not None
+        assert detector.snapshot_round(4) is None
+
+        rounds = detector.list_rounds()
+        assert [r['version'] for r in rounds] == list(range(5))
+        assert rounds[0]['growth'] is None and rounds[0]['total_growth'] is None
+        assert rounds[4]['sizes'] == {'leaked': 5000, 'broken': None}
+
+        # the leak is the top growing site and type, while the cache does not grow after the first round
+        growth = rounds[4]['growth']
+        assert len(growth['sites']) <= 3
+        assert growth['sites'][0]['traceback'][-1].startswith(__file__)
+        assert growth['sites'][0]['count_diff'] >= 1000
+        assert growth['types'][0] == {'type': f"{__name__}.LeakedObject", 'count_diff': 1000, 'count': 5000}
+        assert rounds[4]['total_growth']['types'][0]['count_diff'] == 4000
+        assert rounds[4]['traced_bytes'] - rounds[0]['traced_bytes'] == rounds[4]['total_growth']['traced_bytes']
+
+        assert find_unbounded_growth(rounds, 5, 10 ** 5) is None
+        assert find_unbounded_growth(rounds, 4, 10 ** 7) is None
+        description = find_unbounded_growth(rounds, 4, 10 ** 5)
+        assert description.startswith('The traced memory grew in each of the last 4 rounds')
+        assert os.path.basename(__file__) in description
+
+        # memory that stops growing passes, whatever the small allocations in between
+        leaked.clear()
+        for version in range(5, 10):
+            detector.snapshot_round(version)
+        assert find_unbounded_growth(detector.list_rounds(), 4, 10 ** 5) is None
+    finally:
+        detector.stop()
+
+
+def test_memory_rounds_route():
+    os.environ[ADMIN_USERNAME] = 'admin'
+    os.environ[ADMIN_PASSWORD] = 'str0ng_s3cr3t'
+    admin_auth = ('admin', 'str0ng_s3cr3t')
+    leaked_updates = []
+    global_model_version = "1"
+    worker_model_version = "0"
+
+    def global_model_changed_callback(model_dict):
+        nonlocal worker_model_version
+        worker_model_version = model_dict[GLOBAL_MODEL_VERSION]
+
+    def leaky_update_callback(worker_id, update):
+        nonlocal global_model_version
+        leaked_updates.append(bytes(update) * 1000)
+        global_model_version = str(int(global_model_version) + 1)
+        return "Update received."
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(b"model", global_model_version),
+        is_global_model_most_recent=lambda version: version == global_model_version,
+        receive_worker_update_callback=leaky_update_callback,
+        server_mode_safe=False,
+        key_list_file=None,
+        model_check_interval=0.1,
+        leak_detection=True
+    )
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8106)
+    Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    worker = DCFWorker(
+        server_protocol='http',
+        server_host_ip=dcf_server.server_host_ip,
+        server_port=dcf_server.server_port,
+        global_model_version_changed_callback=global_model_changed_callback,
+        get_worker_version_of_global_model=lambda: worker_model_version,
+        private_key_file=None)
+    memory_loc = f"http://{dcf_server.server_host_ip}:{dcf_server.server_port}/{MEMORY_ROUNDS_ROUTE}"
+    try:
+        worker.register_worker()
+        # the server takes a snapshot when it first sees each version of the global model
+        for _ in range(4):
+            global_model_changed_callback(worker.get_global_model())
+            worker.send_model_update(b"update" * 100)
+        global_model_changed_callback(worker.get_global_model())
+
+        assert requests.get(memory_loc).status_code == 401
+        rounds = requests.get(memory_loc, auth=admin_auth).json()
+        assert [r['version'] for r in rounds] == ['1', '2', '3', '4', '5']
+        assert set(rounds[0]['sizes']) == {'model_version_requests', 'event_subscriptions', 'challenge_phrases',
+                                           'upload_sessions', 'gevent_pool_greenlets'}
+        assert rounds[4]['total_growth']['traced_bytes'] >= 4 * 600000
+        assert find_unbounded_growth(rounds, 4, 10 ** 6) is not None
+    finally:
+        stoppable_server.shutdown()
+        dcf_server.leak_detector.stop()
+
+    dcf_server.leak_detector = None
+    assert ERROR_MESSAGE_KEY in json.loads(dcf_server.admin_list_memory_rounds())
@@ -0,0 +1,102 @@
+"""
+Tests for the metrics of the server.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import requests
+
+from nacl.encoding import HexEncoder
+
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.backend._metrics import Counter, Gauge, Histogram
+from dc_federated.backend.worker_key_pair_tool import gen_pair
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+def test_metric_rendering():
+    histogram = Histogram('latency_seconds', 'Latency.', ['route'], buckets=(0.1, 1))
+    for value in [0.05, 0.5, 0.5, 5]:
+        histogram.observe(value, 'a"b')
+    assert histogram.render() == (
+        '# HELP latency_seconds Latency.\n'
+        '# TYPE latency_seconds histogram\n'
+        'latency_seconds_bucket{route="a\\"b",le="0.1"} 1\n'
+        'latency_seconds_bucket{route="a\\"b",le="1"} 3\n'
+        'latency_seconds_bucket{route="a\\"b",le="+Inf"} 4\n'
+        'latency_seconds_sum{route="a\\"b"} 6.05\n'
+        'latency_seconds_count{route="a\\"b"} 4\n')
+
+    counter = Counter('bytes_total', 'Bytes.', ['route', 'method'])
+    counter.inc(10, 'x', 'GET')
+    counter.inc(5, 'x', 'GET')
+    assert counter.render().splitlines()[-1] == 'bytes_total{route="x",method="GET"} 15'
+    assert Gauge('greenlets', 'Greenlets.', function=lambda: 3).render().splitlines()[-1] == 'greenlets 3'
+
+
+def test_metrics_route():
+    os.environ[ADMIN_USERNAME] = 'admin'
+    os.environ[ADMIN_PASSWORD] = 'str0ng_s3cr3t'
+    admin_auth = ('admin', 'str0ng_s3cr3t')
+    key_file = 'metrics_test_key'
+    _, public_key = gen_pair(key_file)
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(b"model" * 1000, "1"),
+        is_global_model_most_recent=lambda version: version == "1",
+        receive_worker_update_callback=lambda worker_id, update: "Update received.",
+        server_mode_safe=True,
+        key_list_file=None,
+        load_last_session_workers=False,
+        model_check_interval=0.1
+    )
+    dcf_server.worker_manager.add_worker(public_key.encode(encoder=HexEncoder).decode('utf-8'))
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8101)
+    Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    worker = DCFWorker(
+        server_protocol='http',
+        server_host_ip=dcf_server.server_host_ip,
+        server_port=dcf_server.server_port,
+        global_model_version_changed_callback=lambda model_dict: None,
+        get_worker_version_of_global_model=lambda: "0",
+        private_key_file=key_file)
+    try:
+        worker.register_worker()
+        assert worker.get_global_model() == create_model_dict(b"model" * 1000, "1")
+        assert worker.send_model_update(b"update") == b"Update received."
+
+        metrics_loc = f"http://{dcf_server.server_host_ip}:{dcf_server.server_port}/{METRICS_ROUTE}"
+        assert requests.get(metrics_loc).status_code == 401
+        response = requests.get(metrics_loc, auth=admin_auth)
+        assert response.headers['Content-Type'] == METRICS_CONTENT_TYPE
+        samples = {}
+        for line in response.text.splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+
+        return_route = f'route="/{RETURN_GLOBAL_MODEL_ROUTE}",method="POST"'
+        assert samples[f'dcf_request_duration_seconds_count{{{return_route}}}'] == 1
+        compressed_size = dcf_server.compressed_global_model[2]
+        assert samples[f'dcf_response_bytes_total{{{return_route}}}'] == compressed_size
+        assert samples[f'dcf_request_bytes_total{{{return_route}}}'] > 0
+        assert samples['dcf_compression_duration_seconds_count{operation="compress"}'] == 1
+        assert samples['dcf_compression_duration_seconds_count{operation="decompress"}'] == 1
+        # registration, notification, download and update
+        assert samples['dcf_signature_verification_duration_seconds_count'] == 4
+        assert samples['dcf_worker_update_callback_duration_seconds_count'] == 1
+        assert samples['dcf_active_long_polls'] == 0
+        assert 'dcf_gevent_pool_greenlets' in samples
+    finally:
+        stoppable_server.shutdown()
+        for f in [key_file, key_file + '.pub']:
+            if os.path.exists(f):
+                os.remove(f)
@@ -0,0 +1,91 @@
+"""
+Tests for the network emulator.
+"""
+
+from gevent import monkey; monkey.patch_all()
+import gevent
+from gevent.server import StreamServer
+
+import os
+import time
+import socket
+
+from dc_federated.benchmark.network_emulator import NetworkEmulator, LinkProfile
+from dc_federated.benchmark.benchmark_server_routes import run_server_routes_benchmark
+
+
+def echo(sock, address):
+    """
+    Sends back the data received, until the client closes its side.
+    """
+    while True:
+        data = sock.recv(65536)
+        if len(data) == 0:
+            break
+        sock.sendall(data)
+    sock.close()
+
+
+def exchange(port, data):
+    """
+    Sends the data through the emulator and returns the data echoed back and
+    the time taken.
+    """
+    start = time.perf_counter()
+    sock = socket.create_connection(('127.0.0.1', port))
+    sender = gevent.spawn(lambda: (sock.sendall(data), sock.shutdown(socket.SHUT_WR)))
+    received = []
+    while True:
+        chunk = sock.recv(65536)
+        if len(chunk) == 0:
+            break
+        received.append(chunk)
+    sender.join()
+    sock.close()
+    return b''.join(received), time.perf_counter() - start
+
+
+def test_network_emulator():
+    echo_server = StreamServer(('127.0.0.1', 8107), echo)
+    echo_server.start()
+    profiles = [LinkProfile(latency=0.1, jitter=0.05),
+                LinkProfile(download_bandwidth=10 ** 6),
+                LinkProfile(latency=0.01, loss=0.2)]
+    emulator = NetworkEmulator('127.0.0.1', 8107, lambda index: profiles[index], listen_port=8108, seed=0)
+    emulator.start()
+    try:
+        # a round trip for the handshake and one for the data
+        data = os.urandom(10 ** 5)
+        received, duration = exchange(8108, data)
+        assert received == data
+        assert 0.4 - 2 * 0.05 <= duration < 2
+
+        # the data echoed back is limited by the download bandwidth
+        data = os.urandom(5 * 10 ** 5)
+        received, duration = exchange(8108, data)
+        assert received == data
+        assert 0.5 <= duration < 2
+
+        # a lost segment delays the data by a round trip, on top of the handshake and the data
+        received, duration = exchange(8108, data)
+        assert received == data
+        assert emulator.stats['lost_segments'] > 0
+        assert duration >= 3 * 0.02
+        assert emulator.stats['connections'] == 3
+        assert emulator.stats['upload_bytes'] == emulator.stats['download_bytes'] == 11 * 10 ** 5
+    finally:
+        emulator.stop()
+        echo_server.stop()
+
+
+def test_server_routes_benchmark_link_profile():
+    link_profile = LinkProfile(latency=0.05, download_bandwidth=10 ** 6)
+    direct, emulated = [run_server_routes_benchmark(['model_download'], [2], [2 * 10 ** 5], 4, port=port,
+                                                    link_profile=profile)[0]
+                        for port, profile in ((8109, None), (8110, link_profile))]
+    for r in (direct, emulated):
+        assert r['errors'] == 0
+        assert r['latency']['count'] == 4
+    # the download of the model takes a round trip and 0.2 seconds at the bandwidth of the link
+    assert emulated['latency']['min'] >= 0.3
+    assert emulated['latency']['min'] > direct['latency']['min']
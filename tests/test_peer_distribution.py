@@ -0,0 +1,105 @@
+"""
+Tests for the distribution of the global model between peer workers.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.backend.worker_key_pair_tool import gen_pair
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+def test_peer_distribution():
+    server_key_file = 'peer_distribution_server_key'
+    other_key_file = 'peer_distribution_other_key'
+    gen_pair(server_key_file)
+    gen_pair(other_key_file)
+    global_model_version = "1"
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(
+            global_model_version.encode() * 10000, global_model_version),
+        is_global_model_most_recent=lambda version: version == global_model_version,
+        receive_worker_update_callback=lambda worker_id, update: "Update received.",
+        server_mode_safe=False,
+        key_list_file=None,
+        model_check_interval=0.1,
+        model_signing_key_file=server_key_file
+    )
+    server_downloads = []
+    return_global_model = dcf_server.return_global_model
+
+    def counting_return_global_model():
+        server_downloads.append(1)
+        return return_global_model()
+
+    dcf_server.return_global_model = counting_return_global_model
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8093)
+    Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    def create_worker(peer_port, peer_site='site a', server_public_key_file=server_key_file + '.pub'):
+        worker = DCFWorker(
+            server_protocol='http',
+            server_host_ip=dcf_server.server_host_ip,
+            server_port=dcf_server.server_port,
+            global_model_version_changed_callback=lambda model_dict: None,
+            get_worker_version_of_global_model=lambda: "1",
+            private_key_file=None,
+            peer_port=peer_port,
+            peer_site=peer_site,
+            server_public_key_file=server_public_key_file)
+        worker.register_worker()
+        return worker
+
+    workers = [create_worker(port) for port in range(8094, 8098)]
+    other_site_worker = create_worker(8098, peer_site='site b')
+    untrusting_worker = create_worker(8099, server_public_key_file=other_key_file + '.pub')
+    try:
+        # only the first worker downloads the model from the server
+        for worker in workers:
+            model_dict = worker.fetch_global_model()
+            assert model_dict == create_model_dict(b"1" * 10000, "1")
+        assert len(server_downloads) == 1
+
+        # peers are only exchanged within a site
+        assert other_site_worker.fetch_global_model()[GLOBAL_MODEL_VERSION] == "1"
+        assert len(server_downloads) == 2
+
+        # the peers are not used if the content hash was not signed by the server
+        assert untrusting_worker.fetch_global_model()[GLOBAL_MODEL_VERSION] == "1"
+        assert len(server_downloads) == 3
+
+        # a peer returning a corrupt model is skipped
+        for worker in workers[:-1]:
+            worker.peer_server.content = b"corrupt model"
+        for _ in range(5):
+            assert workers[0].fetch_global_model() == create_model_dict(b"1" * 10000, "1")
+        assert len(server_downloads) == 3
+
+        # the workers fall back to the server if no peer returns the model
+        for worker in workers:
+            worker.peer_server.content = b"corrupt model"
+        assert workers[1].fetch_global_model() == create_model_dict(b"1" * 10000, "1")
+        assert len(server_downloads) == 4
+
+        # the peers holding the old model are forgotten once the model changes
+        global_model_version = "2"
+        assert workers[2].fetch_global_model()[GLOBAL_MODEL_VERSION] == "2"
+        assert workers[3].fetch_global_model()[GLOBAL_MODEL_VERSION] == "2"
+        assert len(server_downloads) == 5
+    finally:
+        for worker in workers + [other_site_worker, untrusting_worker]:
+            if worker.peer_server.server.started:
+                worker.peer_server.stop()
+        stoppable_server.shutdown()
+        for f in [server_key_file, server_key_file + '.pub', other_key_file, other_key_file + '.pub']:
+            if os.path.exists(f):
+                os.remove(f)
@@ -0,0 +1,132 @@
+"""
+Tests for the sampling profiler of the server.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import time
+import pstats
+import requests
+
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.backend._profiler import SamplingProfiler
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+def busy_loop(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        sum(range(1000))
+
+
+def waiting_greenlet():
+    gevent.sleep(1)
+
+
+def wait_for(profiler):
+    while profiler.is_running():
+        sleep(0.05)
+
+
+def test_sampling_profiler():
+    profile_file = 'test_sampling_profile.pstats'
+    profiler = SamplingProfiler(interval=0.001)
+    assert profiler.start(0.5)
+    assert not profiler.start(0.5)
+    waiting = Greenlet.spawn(waiting_greenlet)
+    sleep(0)
+    busy_loop(0.6)
+    wait_for(profiler)
+    waiting.join()
+
+    # only the running greenlet is sampled
+    collapsed = profiler.get_collapsed_stacks()
+    assert 'busy_loop' in collapsed
+    assert 'waiting_greenlet' not in collapsed
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in collapsed.splitlines()) > 20
+
+    try:
+        with open(profile_file, 'wb') as f:
+            f.write(profiler.get_pstats())
+        stats = pstats.Stats(profile_file)
+        busy_loop_stats = [stat for function, stat in stats.stats.items() if function[2] == 'busy_loop']
+        assert len(busy_loop_stats) == 1
+        # cumulative time, within the sampling error
+        assert 0.3 < busy_loop_stats[0][3] < 0.7
+    finally:
+        os.remove(profile_file)
+
+
+def test_profiler_routes():
+    os.environ[ADMIN_USERNAME] = 'admin'
+    os.environ[ADMIN_PASSWORD] = 'str0ng_s3cr3t'
+    admin_auth = ('admin', 'str0ng_s3cr3t')
+    os.environ[PROFILE_SECONDS] = '0.5'
+    os.environ[PROFILE_OUTPUT] = 'test_startup_profile'
+    startup_profile = f"test_startup_profile_{os.getpid()}"
+
+    def slow_update_callback(worker_id, update):
+        busy_loop(0.3)
+        return "Update received."
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(b"model", "1"),
+        is_global_model_most_recent=lambda version: version == "1",
+        receive_worker_update_callback=slow_update_callback,
+        server_mode_safe=False,
+        key_list_file=None,
+        model_check_interval=0.1
+    )
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8103)
+    Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    worker = DCFWorker(
+        server_protocol='http',
+        server_host_ip=dcf_server.server_host_ip,
+        server_port=dcf_server.server_port,
+        global_model_version_changed_callback=lambda model_dict: None,
+        get_worker_version_of_global_model=lambda: "0",
+        private_key_file=None)
+    profiler_loc = f"http://{dcf_server.server_host_ip}:{dcf_server.server_port}/{PROFILER_ROUTE}"
+    try:
+        # the environment variable profiles the process from the first request
+        worker.register_worker()
+        worker.send_model_update(b"update")
+        wait_for(dcf_server.profiler)
+        with open(startup_profile + '.collapsed') as f:
+            assert 'slow_update_callback' in f.read()
+        assert len(pstats.Stats(startup_profile + '.pstats').stats) > 0
+
+        # the admin route profiles the process for the given window
+        assert requests.post(profiler_loc, json={PROFILE_DURATION_KEY: 1}).status_code == 401
+        assert ERROR_MESSAGE_KEY in requests.post(profiler_loc, json={}, auth=admin_auth).json()
+        assert SUCCESS_MESSAGE_KEY in requests.post(
+            profiler_loc, json={PROFILE_DURATION_KEY: 1}, auth=admin_auth).json()
+        assert ERROR_MESSAGE_KEY in requests.post(
+            profiler_loc, json={PROFILE_DURATION_KEY: 1}, auth=admin_auth).json()
+        assert ERROR_MESSAGE_KEY in requests.get(profiler_loc, auth=admin_auth).json()
+        worker.send_model_update(b"update")
+        wait_for(dcf_server.profiler)
+
+        response = requests.get(profiler_loc, auth=admin_auth)
+        assert response.headers['Content-Disposition'].endswith('.collapsed"')
+        assert 'slow_update_callback' in response.text
+        assert 'process_worker_update' in response.text
+        response = requests.get(profiler_loc, params={PROFILE_FORMAT_KEY: PSTATS_PROFILE_FORMAT}, auth=admin_auth)
+        with open(startup_profile + '.pstats', 'wb') as f:
+            f.write(response.content)
+        assert any(function[2] == 'slow_update_callback' for function in pstats.Stats(startup_profile + '.pstats').stats)
+    finally:
+        stoppable_server.shutdown()
+        del os.environ[PROFILE_SECONDS]
+        del os.environ[PROFILE_OUTPUT]
+        for extension in ['.collapsed', '.pstats']:
+            if os.path.exists(startup_profile + extension):
+                os.remove(startup_profile + extension)
@@ -0,0 +1,79 @@
+"""
+Tests for the server-sent events stream of global model version changes.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import requests
+
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.utils import StoppableConcurrentServer, get_host_ip
+
+
+def test_push_notifications():
+    os.environ[ADMIN_USERNAME] = 'admin'
+    os.environ[ADMIN_PASSWORD] = 'str0ng_s3cr3t'
+    admin_auth = ('admin', 'str0ng_s3cr3t')
+    global_model_version = "1"
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(b"model", global_model_version),
+        is_global_model_most_recent=lambda version: version == global_model_version,
+        receive_worker_update_callback=lambda worker_id, update: "Update received.",
+        server_mode_safe=False,
+        key_list_file=None,
+        model_check_interval=0.1,
+        egress_budget=1000
+    )
+    subscriptions = []
+    subscribe = dcf_server.subscribe_to_model_version_events
+
+    def counting_subscribe():
+        subscriptions.append(1)
+        return subscribe()
+
+    dcf_server.subscribe_to_model_version_events = counting_subscribe
+    stoppable_server = StoppableConcurrentServer(host=get_host_ip(), port=8090)
+    server_gl = Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    received_versions = []
+    worker = DCFWorker(
+        server_protocol='http',
+        server_host_ip=dcf_server.server_host_ip,
+        server_port=dcf_server.server_port,
+        global_model_version_changed_callback=lambda model_dict: received_versions.append(
+            model_dict[GLOBAL_MODEL_VERSION]),
+        get_worker_version_of_global_model=lambda: "1",
+        private_key_file=None,
+        push_notifications=True)
+    worker_id = worker.register_worker()
+    worker_gl = Greenlet.spawn(worker.run)
+    sleep(1)
+    assert received_versions == []
+
+    # several rounds are pushed over a single subscription
+    for version in ["2", "3", "4"]:
+        global_model_version = version
+        sleep(1)
+    assert received_versions == ["2", "3", "4"]
+    assert len(subscriptions) == 1
+
+    # the worker is told when it is unregistered, and no longer gets models
+    response = requests.put(
+        f"http://{dcf_server.server_host_ip}:{dcf_server.server_port}/{WORKERS_ROUTE}/{worker_id}",
+        json={REGISTRATION_STATUS_KEY: False}, auth=admin_auth)
+    assert not response.json()[REGISTRATION_STATUS_KEY]
+    global_model_version = "5"
+    sleep(EVENT_RECONNECT_INTERVAL + 1)
+    assert received_versions == ["2", "3", "4"]
+    assert len(subscriptions) > 1
+
+    worker_gl.kill()
+    stoppable_server.shutdown()
@@ -0,0 +1,115 @@
+"""
+Tests for the timelines of the federated learning rounds.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import requests
+
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.backend._round_timeline import RoundTimeline
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+def test_critical_path():
+    now = 100.0
+    timeline = RoundTimeline(max_rounds=2, clock=lambda: now)
+    timeline.start_round(1)
+    for event, worker_id, start, end in [
+            (NOTIFY_EVENT, 'a', 101, 101), (NOTIFY_EVENT, 'b', 101, 101),
+            (DOWNLOAD_EVENT, 'a', 102, 104), (DOWNLOAD_EVENT, 'b', 103, 108),
+            (UPLOAD_EVENT, 'a', 110, 110), (DESERIALIZE_EVENT, 'a', 110, 111),
+            (UPLOAD_EVENT, 'b', 120, 120), (DESERIALIZE_EVENT, 'b', 120, 122),
+            (AGGREGATE_EVENT, None, 122, 125), (TEST_EVENT, None, 125, 130)]:
+        timeline.record(event, worker_id, start, end)
+    critical_path = RoundTimeline.get_critical_path(timeline.find_round('1'))
+    assert critical_path == {
+        'critical_worker': 'b',
+        'stages': [('notify', 1), ('download_wait', 2), ('download', 5), ('train_and_upload', 12),
+                   ('deserialize', 2), ('aggregate', 3), ('test', 5)],
+        'total': 30,
+        'workers': [{'worker_id': 'b', 'upload_after': 20}, {'worker_id': 'a', 'upload_after': 10}]
+    }
+
+    # events of a round are added to it after the next one starts, and old rounds are dropped
+    timeline.start_round(2)
+    with timeline.span(TEST_EVENT, version=1):
+        now = 140.0
+    assert timeline.find_round('1')['events'][-1] == \
+        {'event': TEST_EVENT, 'worker_id': None, 'start': 100.0, 'end': 140.0}
+    timeline.start_round(3)
+    assert [r['version'] for r in timeline.list_rounds()] == [2, 3]
+
+
+def test_round_timeline_route():
+    os.environ[ADMIN_USERNAME] = 'admin'
+    os.environ[ADMIN_PASSWORD] = 'str0ng_s3cr3t'
+    admin_auth = ('admin', 'str0ng_s3cr3t')
+    global_model_version = 1
+    updates = []
+
+    def test_rec_server_update_cb(worker_id, update):
+        nonlocal global_model_version
+        updates.append(worker_id)
+        if len(updates) == 2:
+            with dcf_server.round_timeline.span(AGGREGATE_EVENT):
+                sleep(0.2)
+            global_model_version += 1
+        return "Update received."
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(b"model", global_model_version),
+        is_global_model_most_recent=lambda version: version == global_model_version,
+        receive_worker_update_callback=test_rec_server_update_cb,
+        server_mode_safe=False,
+        key_list_file=None,
+        model_check_interval=0.1
+    )
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8102)
+    Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    workers = []
+    for _ in range(2):
+        workers.append(DCFWorker(
+            server_protocol='http',
+            server_host_ip=dcf_server.server_host_ip,
+            server_port=dcf_server.server_port,
+            global_model_version_changed_callback=lambda model_dict: None,
+            get_worker_version_of_global_model=lambda: 0,
+            private_key_file=None))
+        workers[-1].register_worker()
+    try:
+        for worker in workers:
+            assert worker.get_global_model()[GLOBAL_MODEL_VERSION] == 1
+        for worker in workers:
+            sleep(0.1)
+            worker.send_model_update(b"update")
+
+        timeline_loc = f"http://{dcf_server.server_host_ip}:{dcf_server.server_port}/{ROUND_TIMELINE_ROUTE}"
+        assert requests.get(timeline_loc).status_code == 401
+        assert [r['version'] for r in requests.get(timeline_loc, auth=admin_auth).json()] == [1]
+
+        timeline = requests.get(f"{timeline_loc}/1", auth=admin_auth).json()
+        assert [(e['event'], e['worker_id']) for e in timeline['events']] == [
+            (NOTIFY_EVENT, workers[0].worker_id), (DOWNLOAD_EVENT, workers[0].worker_id),
+            (NOTIFY_EVENT, workers[1].worker_id), (DOWNLOAD_EVENT, workers[1].worker_id),
+            (UPLOAD_EVENT, workers[0].worker_id), (UPLOAD_EVENT, workers[1].worker_id),
+            (AGGREGATE_EVENT, None)]
+        critical_path = timeline['critical_path']
+        assert critical_path['critical_worker'] == workers[1].worker_id
+        stages = dict(critical_path['stages'])
+        assert stages['aggregate'] >= 0.2
+        assert stages['deserialize'] is None
+        assert all(stages[stage] >= 0 for stage in ['notify', 'download_wait', 'download', 'train_and_upload'])
+        assert [w['worker_id'] for w in critical_path['workers']] == [w.worker_id for w in reversed(workers)]
+
+        assert ERROR_MESSAGE_KEY in requests.get(f"{timeline_loc}/7", auth=admin_auth).json()
+    finally:
+        stoppable_server.shutdown()
@@ -0,0 +1,106 @@
+"""
+Tests for running the server with several processes sharing their state.
+Two servers sharing a state file stand in for two server processes.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import zlib
+import msgpack
+import pytest
+import requests
+
+from nacl.encoding import HexEncoder
+
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.backend.worker_key_pair_tool import gen_pair
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+def test_shared_state():
+    key_file = 'shared_state_test_key'
+    state_file = 'test_shared_state.db'
+    _, public_key = gen_pair(key_file)
+    global_model_version = "1"
+    callback_calls = {'a': [], 'b': []}
+
+    def create_server(name):
+        def test_rec_server_update_cb(worker_id, update):
+            callback_calls[name].append(('update', update))
+            return f"Update received by {name}."
+
+        return DCFServer(
+            register_worker_callback=lambda worker_id: callback_calls[name].append(('register', worker_id)),
+            unregister_worker_callback=lambda worker_id: callback_calls[name].append(('unregister', worker_id)),
+            return_global_model_callback=lambda: create_model_dict(b"model " + global_model_version.encode(),
+                                                                   global_model_version),
+            is_global_model_most_recent=lambda version: version == global_model_version,
+            receive_worker_update_callback=test_rec_server_update_cb,
+            server_mode_safe=True,
+            key_list_file=None,
+            load_last_session_workers=False,
+            model_check_interval=0.1,
+            shared_state_file=state_file
+        )
+
+    with pytest.raises(ValueError):
+        DCFServer(None, None, None, None, None, False, None, num_server_processes=2)
+
+    server_a, server_b = create_server('a'), create_server('b')
+    server_a.worker_manager.add_worker(public_key.encode(encoder=HexEncoder).decode('utf-8'))
+    stoppable_servers = []
+    for server, port in [(server_a, 8091), (server_b, 8092)]:
+        stoppable_servers.append(StoppableServer(host=get_host_ip(), port=port))
+        Greenlet.spawn(server.start_server, stoppable_servers[-1])
+    sleep(2)
+
+    def create_worker(server):
+        return DCFWorker(
+            server_protocol='http',
+            server_host_ip=server.server_host_ip,
+            server_port=server.server_port,
+            global_model_version_changed_callback=lambda model_dict: None,
+            get_worker_version_of_global_model=lambda: "1",
+            private_key_file=key_file)
+
+    # the worker registers with one process and is known to the other
+    worker_a = create_worker(server_a)
+    worker_id = worker_a.register_worker()
+    assert server_b.worker_manager.is_worker_registered(worker_id)
+
+    # a challenge phrase from one process can be answered to the other
+    challenge_phrase = worker_a.get_challenge_phrase()
+    response = requests.post(
+        f"http://{server_b.server_host_ip}:{server_b.server_port}/{RETURN_GLOBAL_MODEL_ROUTE}",
+        json={WORKER_ID_KEY: worker_id, SIGNED_PHRASE: worker_a.get_signed_phrase(challenge_phrase)})
+    model_dict = msgpack.unpackb(zlib.decompress(response.content))
+    assert model_dict == create_model_dict(b"model 1", "1")
+
+    # updates sent to either process reach the callback of the owner
+    worker_b = create_worker(server_b)
+    worker_b.worker_id = worker_id
+    responses = [worker.send_model_update(b"update") for worker in [worker_a, worker_b]]
+    owner = 'a' if len(callback_calls['a']) > 0 else 'b'
+    other = 'b' if owner == 'a' else 'a'
+    assert responses == [f"Update received by {owner}.".encode()] * 2
+    assert callback_calls[owner] == [('register', worker_id), ('update', b"update"), ('update', b"update")]
+    assert callback_calls[other] == []
+
+    # new global models are published to all the processes
+    global_model_version = "2"
+    model_dict = worker_b.get_global_model()
+    assert model_dict[GLOBAL_MODEL] == b"model 2"
+    assert model_dict[GLOBAL_MODEL_VERSION] == "2"
+
+    server_b.worker_manager.set_registration_status(worker_id, False)
+    assert not server_a.worker_manager.is_worker_registered(worker_id)
+
+    for stoppable_server in stoppable_servers:
+        stoppable_server.shutdown()
+    for f in [key_file, key_file + '.pub', state_file, state_file + '-wal', state_file + '-shm']:
+        if os.path.exists(f):
+            os.remove(f)
@@ -0,0 +1,85 @@
+"""
+Tests for the streaming download and in place decoding of the global model.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import io
+import os
+import msgpack
+import torch
+
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.backend._msgpack_view import unpack_map_view
+from dc_federated.backend.backend_utils import BufferReader
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+def test_unpack_map_view():
+    dct = {
+        GLOBAL_MODEL: os.urandom(70000),
+        GLOBAL_MODEL_VERSION: "2",
+        "small_bin": b"abc",
+        "ints": [0, 1, -1, -33, 200, 70000, 2 ** 40, -2 ** 40],
+        "floats": [1.5, -0.25],
+        "nested": {"a": [None, True, False], "s": "x" * 300, "long_list": list(range(20))},
+        "ext": msgpack.ExtType(5, b"12345678"),
+        7: "integer key"
+    }
+    packed = msgpack.packb(dct)
+    unpacked = unpack_map_view(packed)
+    assert isinstance(unpacked[GLOBAL_MODEL], memoryview)
+    assert {k: bytes(v) if isinstance(v, memoryview) else v for k, v in unpacked.items()} == \
+        msgpack.unpackb(packed, strict_map_key=False)
+
+    # the binary values are not copied
+    buffer = bytearray(packed)
+    unpacked = unpack_map_view(buffer)
+    assert unpacked[GLOBAL_MODEL].obj is buffer
+
+    # the reader loads without copying the buffer
+    model = torch.nn.Linear(3, 2)
+    model_data = io.BytesIO()
+    torch.save(model.state_dict(), model_data)
+    state_dict = torch.load(BufferReader(memoryview(model_data.getvalue())))
+    assert torch.equal(state_dict['weight'], model.state_dict()['weight'])
+
+
+def test_streaming_download():
+    global_model = os.urandom(3 * 1024 * 1024)
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=lambda: create_model_dict(global_model, "1"),
+        is_global_model_most_recent=lambda version: version == "1",
+        receive_worker_update_callback=lambda worker_id, update: "Update received.",
+        server_mode_safe=False,
+        key_list_file=None,
+        model_check_interval=0.2
+    )
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8085)
+    server_gl = Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    workers = [DCFWorker(
+        server_protocol='http',
+        server_host_ip=dcf_server.server_host_ip,
+        server_port=dcf_server.server_port,
+        global_model_version_changed_callback=lambda model_dict: None,
+        get_worker_version_of_global_model=lambda: "0",
+        private_key_file=None,
+        stream_global_model=stream) for stream in (True, False)]
+    for worker in workers:
+        worker.register_worker()
+    streamed, not_streamed = [worker.get_global_model() for worker in workers]
+
+    assert isinstance(streamed[GLOBAL_MODEL], memoryview)
+    assert streamed[GLOBAL_MODEL] == global_model
+    assert streamed[GLOBAL_MODEL_VERSION] == "1"
+    assert not_streamed == {GLOBAL_MODEL: global_model, GLOBAL_MODEL_VERSION: "1"}
+
+    stoppable_server.shutdown()
@@ -0,0 +1,35 @@
+"""
+Tests for the keystore of the stress test.
+"""
+
+import os
+
+from nacl.signing import VerifyKey
+from nacl.encoding import HexEncoder
+
+from dc_federated.stress_test.stress_gen_keys import gen_stress_key_pairs, count_stress_keys, \
+    STRESS_KEYS_FOLDER, STRESS_WORKER_KEY_LIST_FILE, STRESS_KEYSTORE_FILE, KEY_GEN_BATCH_SIZE
+from dc_federated.stress_test.stress_utils import get_worker_keys_from_chunk
+
+
+def test_stress_keystore(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    num_workers = KEY_GEN_BATCH_SIZE + 5
+    gen_stress_key_pairs(num_workers, num_processes=2, export_files=True)
+    assert count_stress_keys() == num_workers
+    with open(os.path.join(STRESS_KEYS_FOLDER, STRESS_WORKER_KEY_LIST_FILE)) as f:
+        public_keys = f.read().split()
+    assert len(set(public_keys)) == num_workers
+
+    chunks = [get_worker_keys_from_chunk(f"{k} of 3") for k in range(1, 4)]
+    assert [len(chunk) for chunk in chunks] == [335, 335, 335]
+    keys = [worker_keys for chunk in chunks for worker_keys in chunk]
+    assert [public_key for _, public_key in keys] == public_keys
+    private_key, public_key = keys[500]
+    VerifyKey(public_key.encode(), encoder=HexEncoder).verify(private_key.sign(b'phrase to sign'))
+
+    # the exported files hold the same keys
+    os.remove(os.path.join(STRESS_KEYS_FOLDER, STRESS_KEYSTORE_FILE))
+    assert count_stress_keys() == 0
+    file_keys = get_worker_keys_from_chunk("2 of 3")
+    assert [(bytes(sk), pk) for sk, pk in file_keys] == [(bytes(sk), pk) for sk, pk in chunks[1]]
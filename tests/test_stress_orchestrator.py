@@ -0,0 +1,39 @@
+"""
+Tests for the report of the stress orchestrator.
+"""
+
+import os
+
+from dc_federated.stress_test.stress_utils import TimingRecorder
+from dc_federated.stress_test.stress_orchestrator import read_timings, make_report
+
+
+def test_stress_report():
+    timings_files = ['test_timings_1.jsonl', 'test_timings_2.jsonl']
+    try:
+        for k, timings_file in enumerate(timings_files):
+            recorder = TimingRecorder(timings_file, f"{k + 1} of 2")
+            assert recorder.time_request('register_worker', lambda: 'worker_id') == 'worker_id'
+            recorder.record('request', 'send_model_update', 10.0, 10.5 + k)
+            recorder.record('request', 'send_model_update', 10.0, 11.0, ok=False)
+            try:
+                recorder.time_request('get_global_model', lambda: 1 / 0)
+            except ZeroDivisionError:
+                pass
+            recorder.record('round', 1, 10.0 + k, 12.0 + k)
+            recorder.close()
+
+        results, rounds = make_report(read_timings(timings_files), duration=4.0)
+        results = {r['operation']: r for r in results}
+        assert results['send_model_update']['requests'] == 4
+        assert results['send_model_update']['errors'] == 2
+        assert results['send_model_update']['throughput'] == 0.5
+        assert results['send_model_update']['latency']['p50'] == 0.5
+        assert results['send_model_update']['latency']['max'] == 1.5
+        assert results['register_worker']['errors'] == 0
+        assert results['get_global_model']['errors'] == 2
+        assert rounds == [{'run': 1, 'processes': 2, 'start': 10.0, 'end': 13.0, 'duration': 3.0}]
+    finally:
+        for timings_file in timings_files:
+            if os.path.exists(timings_file):
+                os.remove(timings_file)
@@ -0,0 +1,55 @@
+"""
+Tests for the synthetic models of the stress tests.
+"""
+
+import io
+
+import msgpack
+import pytest
+import torch
+
+from dc_federated.stress_test.synthetic_model import parse_size, make_synthetic_state_dict, \
+    get_synthetic_model_bytes, SYNTHETIC_DTYPES
+from dc_federated.stress_test.stress_utils import get_stress_model
+
+
+def test_parse_size():
+    assert parse_size('1000') == 1000
+    assert parse_size('10MB') == 10 * 10 ** 6
+    assert parse_size('1.5kb') == 1500
+    assert parse_size('1GiB') == 2 ** 30
+    with pytest.raises(ValueError):
+        parse_size('10 apples')
+
+
+def test_make_synthetic_state_dict():
+    for dtype in SYNTHETIC_DTYPES:
+        state_dict = make_synthetic_state_dict(100003, num_layers=7, dtype=dtype)
+        assert list(state_dict.keys()) == [f"layers.{n}.weight" for n in range(7)]
+        assert all(t.dtype == getattr(torch, dtype) for t in state_dict.values())
+        element_size = state_dict['layers.0.weight'].element_size()
+        assert sum(t.numel() for t in state_dict.values()) == 100003 // element_size
+
+    # the same seed gives the same model, another seed another one
+    state_dict = make_synthetic_state_dict(1000, num_layers=3, seed=1)
+    assert all(torch.equal(t, u) for t, u in
+               zip(state_dict.values(), make_synthetic_state_dict(1000, num_layers=3, seed=1).values()))
+    assert not torch.equal(state_dict['layers.0.weight'],
+                           make_synthetic_state_dict(1000, num_layers=3, seed=2)['layers.0.weight'])
+
+    # there are never more layers than elements
+    assert len(make_synthetic_state_dict(8, num_layers=50)) == 2
+
+    with pytest.raises(ValueError):
+        make_synthetic_state_dict(1000, dtype='complex64')
+
+
+def test_get_stress_model():
+    model_bytes = get_synthetic_model_bytes(10 ** 6, num_layers=10, dtype='float16')
+    assert model_bytes == get_stress_model(False, 'placeholder', synthetic_model_size=10 ** 6,
+                                           synthetic_model_layers=10, synthetic_model_dtype='float16')
+    state_dict = torch.load(io.BytesIO(model_bytes))
+    assert sum(t.numel() * t.element_size() for t in state_dict.values()) == 10 ** 6
+    assert len(model_bytes) < 1.1 * 10 ** 6
+
+    assert msgpack.unpackb(get_stress_model(False, 'placeholder')) == 'placeholder'
@@ -0,0 +1,133 @@
+"""
+Tests for the worker liveness tracking of the DCFServer.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import os
+import json
+import socket
+import msgpack
+import requests
+
+from dc_federated.backend import DCFServer, DCFWorker, create_model_dict
+from dc_federated.backend._constants import *
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+class FakeClock(object):
+    """
+    Clock that only moves when told to.
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_worker_liveness():
+    worker_ids = []
+    global_model_version = "1"
+    os.environ[ADMIN_USERNAME] = 'admin'
+    os.environ[ADMIN_PASSWORD] = 'str0ng_s3cr3t'
+    admin_auth = ('admin', 'str0ng_s3cr3t')
+
+    def test_register_func_cb(id):
+        worker_ids.append(id)
+
+    def test_unregister_func_cb(id):
+        worker_ids.remove(id)
+
+    def test_ret_global_model_cb():
+        return create_model_dict(
+            msgpack.packb("Pickle dump of a string"),
+            global_model_version)
+
+    def is_global_model_most_recent(version):
+        return version == global_model_version
+
+    def test_rec_server_update_cb(worker_id, update):
+        return f"Update received for worker {worker_id[0:WID_LEN]}."
+
+    dcf_server = DCFServer(
+        register_worker_callback=test_register_func_cb,
+        unregister_worker_callback=test_unregister_func_cb,
+        return_global_model_callback=test_ret_global_model_cb,
+        is_global_model_most_recent=is_global_model_most_recent,
+        receive_worker_update_callback=test_rec_server_update_cb,
+        server_mode_safe=False,
+        key_list_file=None,
+        model_check_interval=0.2,
+        worker_idle_timeout=100,
+        unregister_idle_workers=True,
+        liveness_check_interval=0.2
+    )
+    clock = FakeClock()
+    dcf_server.worker_manager.clock = clock
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8082)
+
+    def begin_server():
+        dcf_server.start_server(stoppable_server)
+    server_gl = Greenlet.spawn(begin_server)
+    sleep(2)
+
+    server_loc = f"http://{dcf_server.server_host_ip}:{dcf_server.server_port}"
+    dcf_worker = DCFWorker(
+        server_protocol='http',
+        server_host_ip=dcf_server.server_host_ip,
+        server_port=dcf_server.server_port,
+        global_model_version_changed_callback=lambda model_dict: None,
+        get_worker_version_of_global_model=lambda: global_model_version,
+        private_key_file=None)
+    worker_id = dcf_worker.register_worker()
+    assert worker_ids == [worker_id]
+
+    workers_list = json.loads(requests.get(f"{server_loc}/{WORKERS_ROUTE}", auth=admin_auth).content)
+    assert workers_list[0][LAST_SEEN_KEY] is not None
+
+    # park a long poll and then drop the connection - the server should notice
+    body = json.dumps({WORKER_ID_KEY: worker_id,
+                       LAST_WORKER_MODEL_VERSION: global_model_version,
+                       SIGNED_PHRASE: ""}).encode()
+    sock = socket.create_connection((dcf_server.server_host_ip, dcf_server.server_port))
+    sock.sendall(f"POST /{NOTIFY_ME_IF_GM_VERSION_UPDATED_ROUTE} HTTP/1.1\r\n"
+                 f"Host: {dcf_server.server_host_ip}\r\n"
+                 f"Content-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    sleep(0.6)
+    assert worker_id in dcf_server.model_version_req_dict
+    sock.close()
+    sleep(0.6)
+    assert worker_id not in dcf_server.model_version_req_dict
+
+    # the worker is reported as idle once enough time has passed
+    clock.now += 50
+    idle_workers = json.loads(requests.get(f"{server_loc}/{IDLE_WORKERS_ROUTE}",
+                                           params={IDLE_TIME_KEY: 10}, auth=admin_auth).content)
+    assert [worker[WORKER_ID_KEY] for worker in idle_workers] == [worker_id]
+    sleep(0.5)
+    assert worker_ids == [worker_id]
+
+    # and it is unregistered after worker_idle_timeout seconds
+    clock.now += 51
+    sleep(0.5)
+    assert len(worker_ids) == 0
+    assert not dcf_server.worker_manager.is_worker_registered(worker_id)
+
+    # the worker is told it was unregistered for being idle and registers again
+    assert dcf_worker.get_global_model() == IDLE_UNREGISTERED_WORKER.encode()
+    assert len(worker_ids) == 1
+    assert dcf_worker.worker_id == worker_ids[0]
+    assert dcf_server.worker_manager.is_worker_registered(dcf_worker.worker_id)
+
+    # but a worker unregistered by the admin stays unregistered
+    requests.put(f"{server_loc}/{WORKERS_ROUTE}/{dcf_worker.worker_id}",
+                 json={REGISTRATION_STATUS_KEY: False}, auth=admin_auth)
+    assert len(worker_ids) == 0
+    assert dcf_worker.get_global_model() == UNREGISTERED_WORKER.encode()
+    assert len(worker_ids) == 0
+
+    stoppable_server.shutdown()
@@ -0,0 +1,116 @@
+"""
+Tests for the on-disk global model cache of the workers.
+"""
+
+import gevent
+from gevent import Greenlet, sleep
+from gevent import monkey; monkey.patch_all()
+
+import io
+import os
+import torch
+
+from torch import nn
+
+from dc_federated.algorithms.fed_avg import FedAvgWorker, FedAvgModelTrainer
+from dc_federated.backend import DCFServer, create_model_dict, GLOBAL_MODEL, GLOBAL_MODEL_VERSION
+from dc_federated.backend.worker_model_cache import WorkerModelCache
+from dc_federated.utils import StoppableServer, get_host_ip
+
+
+class CacheTestTrainer(FedAvgModelTrainer):
+    """
+    Dummy trainer for the test.
+    """
+    def __init__(self):
+        self.model = nn.Linear(4, 2)
+
+    def train(self):
+        pass
+
+    def test(self):
+        pass
+
+    def get_model(self):
+        return self.model
+
+    def load_model(self, model_file):
+        self.model = torch.load(model_file)
+
+    def load_model_from_state_dict(self, state_dict):
+        self.model.load_state_dict(state_dict)
+
+    def get_per_session_train_size(self):
+        return 10
+
+
+def test_worker_model_cache():
+    cache_file = 'test_worker_model_cache.bin'
+    cache = WorkerModelCache(cache_file)
+    assert cache.load() is None
+
+    model = os.urandom(10000)
+    cache.save(create_model_dict(model, 3))
+    cache.save(create_model_dict(memoryview(model), 4))
+    model_dict = cache.load()
+    assert model_dict[GLOBAL_MODEL] == model
+    assert model_dict[GLOBAL_MODEL_VERSION] == 4
+    assert not os.path.exists(cache_file + '.tmp')
+
+    # a corrupted or truncated file is ignored
+    with open(cache_file, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xff]))
+    assert cache.load() is None
+    with open(cache_file, 'r+b') as f:
+        f.truncate(100)
+    assert cache.load() is None
+
+    cache.clear()
+    assert not os.path.exists(cache_file)
+
+
+def test_fed_avg_worker_restart_from_cache():
+    cache_file = 'test_fed_avg_worker_cache.bin'
+    global_model = nn.Linear(4, 2)
+    model_requests = 0
+
+    def test_ret_global_model_cb():
+        nonlocal model_requests
+        model_requests += 1
+        model_data = io.BytesIO()
+        torch.save(global_model, model_data)
+        return create_model_dict(model_data.getvalue(), "3")
+
+    dcf_server = DCFServer(
+        register_worker_callback=lambda worker_id: None,
+        unregister_worker_callback=lambda worker_id: None,
+        return_global_model_callback=test_ret_global_model_cb,
+        is_global_model_most_recent=lambda version: version == "3",
+        receive_worker_update_callback=lambda worker_id, update: "Update received.",
+        server_mode_safe=False,
+        key_list_file=None,
+        model_check_interval=0.2
+    )
+    stoppable_server = StoppableServer(host=get_host_ip(), port=8087)
+    server_gl = Greenlet.spawn(dcf_server.start_server, stoppable_server)
+    sleep(2)
+
+    worker = FedAvgWorker(CacheTestTrainer(), None, server_host_ip=dcf_server.server_host_ip,
+                          server_port=dcf_server.server_port, model_cache_file=cache_file)
+    worker.global_model_version_changed_callback(worker.worker.get_global_model())
+    assert worker.worker_version_of_global_model == "3"
+    assert os.path.exists(cache_file)
+
+    # the restarted worker starts from the cached model and version
+    model_requests = 0
+    restarted = FedAvgWorker(CacheTestTrainer(), None, server_host_ip=dcf_server.server_host_ip,
+                             server_port=dcf_server.server_port, model_cache_file=cache_file)
+    assert restarted.worker_version_of_global_model == "3"
+    assert torch.equal(restarted.fed_model.get_model().weight, global_model.weight)
+    assert model_requests == 0
+
+    stoppable_server.shutdown()
+    WorkerModelCache(cache_file).clear()